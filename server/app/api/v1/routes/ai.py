@@ -1,3 +1,6 @@
+import asyncio
+import logging
+
 from fastapi import APIRouter, Depends, Request, HTTPException, status
 from fastapi.responses import StreamingResponse
 from typing import Optional, Dict, Any, List
@@ -7,11 +10,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.security import get_current_user, require_role
 from app.models.user import User, UserRole
 from app.services.ai_service import AIService
-from app.services.ai_memory import ChatMemoryRepository, build_history_stub
-from app.services.rate_limit import RateLimiter
+from app.services.ai_semantic_cache import semantic_response_cache
+from app.services.ai_memory import ChatMemoryRepository
+from app.services.rate_limiter import rate_limiter
 from app.services.ai_tools import AiToolRegistry
 from app.services.ai_intent import extract_intent
-from app.services.ai_function_calling import process_function_calls
+from app.services.ai_function_calling import process_function_calls, stream_function_calls
 from app.services.ai_quota_manager import ai_quota_manager, UsageStats
 from app.services.permission_aware_search import permission_search_service
 from app.db.session import get_async_session
@@ -19,6 +23,7 @@ import app.services.ai_functions  # Импортируем для регистр
 import app.services.ai_analytics_tools  # Импортируем аналитические инструменты
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/ai", tags=["AI"])
 
 
@@ -62,20 +67,36 @@ class AllQuotasResponse(BaseModel):
 
 
 memory = ChatMemoryRepository()
-limiter = RateLimiter()
+# Лимит AI-чата на пользователя
+AI_CHAT_RATE_LIMIT = 10
+AI_CHAT_RATE_WINDOW = 30
 tools = AiToolRegistry()
 
 
-@router.post("/chat", response_model=ChatResponse, summary="AI чат (Gemini/OpenRouter/Ollama)")
-async def ai_chat(payload: ChatRequest, request: Request, current_user: User = Depends(get_current_user)) -> ChatResponse:
-    text = payload.message.strip()
-    if not text:
-        return ChatResponse(reply="Пожалуйста, задайте вопрос.")
-    await limiter.check(current_user.id)
-    pieces = [
-        f"Пользователь: {getattr(current_user, 'username', 'unknown')}",
-        f"Роль: {getattr(current_user, 'role', 'unknown')}",
-    ]
+def _tool_scope(user: User):
+    # Результаты функций кэшируются отдельно для каждого пользователя
+    return (getattr(user, 'id', None), str(getattr(user, 'role', None)))
+
+
+def _sse_data(text: str) -> str:
+    # Каждая строка — отдельное поле data:, иначе перевод строки в ответе рвёт событие
+    lines = (text or "").replace("\r\n", "\n").split("\n")
+    return "".join(f"data: {line}\n" for line in lines) + "\n"
+
+
+async def _remember_turn(user_id: int, question: str, answer: str) -> None:
+    # Вызывается из finally потока: при обрыве соединения сохраняется уже полученная часть
+    # ответа, shield не даёт повторной отмене прервать запись
+    try:
+        await asyncio.shield(memory.append_turn(user_id, question, answer))
+    except Exception as e:
+        logger.error(f"Failed to store chat turn for user {user_id}: {e}")
+
+
+def _user_context(payload: ChatRequest, user: User, with_username: bool = True) -> str:
+    """Строка контекста пользователя для промпта: роль, курс/студент, FrontendContext."""
+    pieces = [f"Пользователь: {getattr(user, 'username', 'unknown')}"] if with_username else []
+    pieces.append(f"Роль: {getattr(user, 'role', 'unknown')}")
     if payload.scope:
         pieces.append(f"Scope: {payload.scope}")
     if payload.student_id:
@@ -84,26 +105,52 @@ async def ai_chat(payload: ChatRequest, request: Request, current_user: User = D
         pieces.append(f"CourseID: {payload.course_id}")
     if payload.context:
         pieces.append(f"FrontendContext: {payload.context}")
-    user_context = " | ".join(pieces)
-    service = AIService()
-    # Память: добавляем вопрос / читаем контекст
-    await memory.append_message(current_user.id, role="user", content=text)
-    recent = await memory.get_recent_messages(current_user.id, limit=8)
-    history_stub = build_history_stub(recent, max_chars=1200)
-    # Инструменты: краткая выжимка метрик
-    auth_header = f"Bearer {getattr(current_user, 'token', '')}"  # нет сохраненного токена → используем заголовок ниже
-    # Вытянем из контекста запроса реальный Authorization
-    # Прокси реального Authorization из запроса (без записи в память)
-    # FastAPI сам пробросит заголовки в зависимости — здесь формируем строку
-    auth_header_value = request.headers.get('Authorization')
+    return " | ".join(pieces)
+
+
+def _shared_cache_scope(payload: ChatRequest, user: User, history_stub: str, lang: str):
+    """Область семантического кэша, если в промпте нет ничего личного, иначе None.
 
+    Без истории, FrontendContext и StudentID (имя пользователя в такой промпт не
+    попадает) ответ определяется вопросом, ролью, курсом и выжимкой метрик —
+    его можно отдавать другим пользователям того же курса и роли.
+    """
+    if history_stub or payload.context or payload.student_id:
+        return None
+    return semantic_response_cache.scope(getattr(user, 'role', None), payload.course_id, None, payload.scope, lang)
+
+
+def _request_language(request: Request) -> str:
+    # Язык ответа по Accept-Language
+    accept_lang = (request.headers.get('Accept-Language') or 'ru').lower()
+    if accept_lang.startswith('en'):
+        return 'en'
+    if accept_lang.startswith('kk') or accept_lang.startswith('kz'):
+        return 'kz'
+    return 'ru'
+
+
+@router.post("/chat", response_model=ChatResponse, summary="AI чат (Gemini/OpenRouter/Ollama)")
+async def ai_chat(payload: ChatRequest, request: Request, current_user: User = Depends(get_current_user)) -> ChatResponse:
+    text = payload.message.strip()
+    if not text:
+        return ChatResponse(reply="Пожалуйста, задайте вопрос.")
+    await rate_limiter.check("ai:chat", str(current_user.id), limit=AI_CHAT_RATE_LIMIT,
+                             window_seconds=AI_CHAT_RATE_WINDOW, request=request)
+    service = AIService()
+    # Память: краткое содержание и последние сообщения в пределах бюджета токенов
+    history_stub = await memory.get_history(current_user.id)
+    lang = _request_language(request)
+    cache_scope = _shared_cache_scope(payload, current_user, history_stub, lang)
+    user_context = _user_context(payload, current_user, with_username=cache_scope is None)
     # Студент может видеть только свои данные
     requested_student_id = payload.student_id
     if getattr(current_user, 'role', None) == 'student' and requested_student_id and requested_student_id != getattr(current_user, 'id', None):
         requested_student_id = None
 
+    # Инструменты: краткая выжимка метрик (в процессе, без запросов к собственному API)
     tool_summary = await tools.gather_context(
-        auth_header=auth_header_value,
+        user=current_user,
         role=getattr(current_user, 'role', None),
         scope=payload.scope,
         student_id=requested_student_id,
@@ -111,16 +158,16 @@ async def ai_chat(payload: ChatRequest, request: Request, current_user: User = D
     )
     extra = (f"\nКраткие данные:\n{tool_summary}" if tool_summary else "")
     user_context = user_context + (f" | History:\n{history_stub}" if history_stub else "") + extra
-    # Language detection from headers (Accept-Language)
-    accept_lang = (request.headers.get('Accept-Language') or 'ru').lower()
-    lang = 'ru'
-    if accept_lang.startswith('en'):
-        lang = 'en'
-    elif accept_lang.startswith('kk') or accept_lang.startswith('kz'):
-        lang = 'kz'
 
-    reply = service.generate_reply(user_message=text, user_context=user_context, role=getattr(current_user, 'role', None), language=lang)
-    await memory.append_message(current_user.id, role="assistant", content=reply)
+    # Похожий вопрос в том же курсе/роли при неизменных данных — ответ из кэша
+    reply = None
+    if cache_scope is not None:
+        reply = await semantic_response_cache.lookup(text, cache_scope, tool_summary)
+    if reply is None:
+        reply = await service.generate_reply(user_message=text, user_context=user_context, role=getattr(current_user, 'role', None), language=lang)
+        if cache_scope is not None and service.last_call_ok:
+            await semantic_response_cache.store(text, cache_scope, tool_summary, reply)
+    await memory.append_turn(current_user.id, text, reply)
     return ChatResponse(reply=reply)
 
 
@@ -131,29 +178,17 @@ async def ai_chat_stream(payload: ChatRequest, request: Request, current_user: U
         def _err():
             yield "data: Пожалуйста, задайте вопрос.\n\n"
         return StreamingResponse(_err(), media_type="text/event-stream")
-    await limiter.check(current_user.id)
-    pieces = [
-        f"Пользователь: {getattr(current_user, 'username', 'unknown')}",
-        f"Роль: {getattr(current_user, 'role', 'unknown')}",
-    ]
-    if payload.scope:
-        pieces.append(f"Scope: {payload.scope}")
-    if payload.student_id:
-        pieces.append(f"StudentID: {payload.student_id}")
-    if payload.course_id:
-        pieces.append(f"CourseID: {payload.course_id}")
-    if payload.context:
-        pieces.append(f"FrontendContext: {payload.context}")
-    user_context = " | ".join(pieces)
-    await memory.append_message(current_user.id, role="user", content=text)
-    recent = await memory.get_recent_messages(current_user.id, limit=8)
-    history_stub = build_history_stub(recent, max_chars=1200)
-    auth_header_value = request.headers.get('Authorization')
+    await rate_limiter.check("ai:chat", str(current_user.id), limit=AI_CHAT_RATE_LIMIT,
+                             window_seconds=AI_CHAT_RATE_WINDOW, request=request)
+    history_stub = await memory.get_history(current_user.id)
+    lang = _request_language(request)
+    cache_scope = _shared_cache_scope(payload, current_user, history_stub, lang)
+    user_context = _user_context(payload, current_user, with_username=cache_scope is None)
     requested_student_id = payload.student_id
     if getattr(current_user, 'role', None) == 'student' and requested_student_id and requested_student_id != getattr(current_user, 'id', None):
         requested_student_id = None
     tool_summary = await tools.gather_context(
-        auth_header=auth_header_value,
+        user=current_user,
         role=getattr(current_user, 'role', None),
         scope=payload.scope,
         student_id=requested_student_id,
@@ -162,26 +197,28 @@ async def ai_chat_stream(payload: ChatRequest, request: Request, current_user: U
     extra = (f"\nКраткие данные:\n{tool_summary}" if tool_summary else "")
     user_context = user_context + (f" | History:\n{history_stub}" if history_stub else "") + extra
 
-    # Настоящий стриминг для Ollama
+    # Настоящий стриминг: фрагменты приходят от провайдера по мере генерации
     service = AIService()
     
     async def _gen():
         full_response = ""
-        # Language detection
-        accept_lang = (request.headers.get('Accept-Language') or 'ru').lower()
-        lang = 'ru'
-        if accept_lang.startswith('en'):
-            lang = 'en'
-        elif accept_lang.startswith('kk') or accept_lang.startswith('kz'):
-            lang = 'kz'
-
-        async for chunk in service.generate_stream(user_message=text, user_context=user_context, role=getattr(current_user, 'role', None), language=lang):
-            full_response += chunk
-            yield f"data: {chunk}\n\n"
-        yield "event: end\n"
-        yield "data: [END]\n\n"
-        # Сохраняем полный ответ в память
-        await memory.append_message(current_user.id, role="assistant", content=full_response)
+        try:
+            cached = None
+            if cache_scope is not None:
+                cached = await semantic_response_cache.lookup(text, cache_scope, tool_summary)
+            if cached is not None:
+                full_response = cached
+                yield _sse_data(cached)
+            else:
+                async for chunk in service.generate_stream(user_message=text, user_context=user_context, role=getattr(current_user, 'role', None), language=lang):
+                    full_response += chunk
+                    yield _sse_data(chunk)
+                if cache_scope is not None and service.last_call_ok:
+                    await semantic_response_cache.store(text, cache_scope, tool_summary, full_response)
+            yield "event: end\n"
+            yield "data: [END]\n\n"
+        finally:
+            await _remember_turn(current_user.id, text, full_response)
 
     return StreamingResponse(_gen(), media_type="text/event-stream")
 
@@ -191,10 +228,15 @@ async def ai_intent(payload: ChatRequest, current_user: User = Depends(get_curre
     text = (payload.message or "").strip()
     if not text:
         return IntentResponse(action="none", params={}, confidence=0.0)
-    intent = extract_intent(text)
+    intent = await extract_intent(text)
     return IntentResponse(**intent)
 
 
+@router.get("/cache/stats", summary="Статистика семантического кэша ответов")
+async def ai_cache_stats(current_user: User = Depends(require_role(UserRole.admin))) -> Dict[str, Any]:
+    return semantic_response_cache.get_stats()
+
+
 @router.post("/function", response_model=ChatResponse, summary="AI чат с вызовом функций")
 async def ai_function_chat(payload: ChatRequest, request: Request, current_user: User = Depends(get_current_user)) -> ChatResponse:
     """Endpoint для чата с поддержкой вызова функций"""
@@ -202,42 +244,56 @@ async def ai_function_chat(payload: ChatRequest, request: Request, current_user:
     if not text:
         return ChatResponse(reply="Пожалуйста, задайте вопрос.")
     
-    await limiter.check(current_user.id)
-    
-    # Формируем системный контекст
-    pieces = [
-        f"Пользователь: {getattr(current_user, 'username', 'unknown')}",
-        f"Роль: {getattr(current_user, 'role', 'unknown')}",
-    ]
-    if payload.scope:
-        pieces.append(f"Scope: {payload.scope}")
-    if payload.student_id:
-        pieces.append(f"StudentID: {payload.student_id}")
-    if payload.course_id:
-        pieces.append(f"CourseID: {payload.course_id}")
-    if payload.context:
-        pieces.append(f"FrontendContext: {payload.context}")
-    
-    system_context = " | ".join(pieces)
+    await rate_limiter.check("ai:chat", str(current_user.id), limit=AI_CHAT_RATE_LIMIT,
+                             window_seconds=AI_CHAT_RATE_WINDOW, request=request)
     
-    # Сохраняем сообщение пользователя в историю
-    await memory.append_message(current_user.id, role="user", content=text)
+    system_context = _user_context(payload, current_user)
     
-    # Получаем историю сообщений
-    recent = await memory.get_recent_messages(current_user.id, limit=8)
-    history_stub = build_history_stub(recent, max_chars=1200)
+    # Получаем историю сообщений (вопрос и ответ сохраняются вместе после ответа)
+    history_stub = await memory.get_history(current_user.id)
     if history_stub:
         system_context += f" | История диалога:\n{history_stub}"
     
     # Обрабатываем сообщение с возможным вызовом функций
-    reply = await process_function_calls(text, system_context)
+    reply = await process_function_calls(text, system_context, scope=_tool_scope(current_user))
     
-    # Сохраняем ответ в историю
-    await memory.append_message(current_user.id, role="assistant", content=reply)
+    # Сохраняем вопрос и ответ в историю
+    await memory.append_turn(current_user.id, text, reply)
     
     return ChatResponse(reply=reply)
 
 
+@router.post("/function/stream", summary="AI чат с вызовом функций (SSE)")
+async def ai_function_chat_stream(payload: ChatRequest, request: Request, current_user: User = Depends(get_current_user)):
+    """Как /function, но финальный ответ после выполнения функций отдается потоком"""
+    text = payload.message.strip()
+    if not text:
+        def _err():
+            yield "data: Пожалуйста, задайте вопрос.\n\n"
+        return StreamingResponse(_err(), media_type="text/event-stream")
+    
+    await rate_limiter.check("ai:chat", str(current_user.id), limit=AI_CHAT_RATE_LIMIT,
+                             window_seconds=AI_CHAT_RATE_WINDOW, request=request)
+    
+    system_context = _user_context(payload, current_user)
+    history_stub = await memory.get_history(current_user.id)
+    if history_stub:
+        system_context += f" | История диалога:\n{history_stub}"
+    
+    async def _gen():
+        full_response = ""
+        try:
+            async for chunk in stream_function_calls(text, system_context, scope=_tool_scope(current_user)):
+                full_response += chunk
+                yield _sse_data(chunk)
+            yield "event: end\n"
+            yield "data: [END]\n\n"
+        finally:
+            await _remember_turn(current_user.id, text, full_response)
+    
+    return StreamingResponse(_gen(), media_type="text/event-stream")
+
+
 @router.post("/search", response_model=SearchResponse, summary="Permission-aware content search")
 async def ai_search(
     request_data: SearchRequest,
@@ -1,4 +1,4 @@
-from typing import Optional, List, Dict, Literal
+from typing import Optional, List, Literal
 import logging
 import statistics
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
@@ -8,7 +8,7 @@ from datetime import datetime, timezone, timedelta
 
 from app.db.session import get_async_session
 from app.core.security import get_current_user, require_role
-from app.services.rate_limiter import rate_limiter
+from app.services.rate_limiter import rate_limiter, client_ip
 from app.models.user import User, UserRole
 from app.models.course import Course
 from app.models.assignment import Assignment
@@ -18,6 +18,8 @@ from app.models.student import Student
 from app.models.group import Group
 from app.models.enrollment import Enrollment, EnrollmentRole, EnrollmentStatus
 from app.services.risk_analytics import risk_analytics_service, RiskLevel, PerformanceStatus
+from app.services.cache import analytics_cache
+from app.services.course_analytics import course_analytics_service
 
 logger = logging.getLogger(__name__)
 
@@ -38,120 +40,10 @@ async def get_course_overview(
     current_user: User = Depends(get_current_user)
 ):
     """Получить общий обзор курса с ключевыми метриками."""
-    
-    # Проверяем права доступа
-    if current_user.role not in [UserRole.teacher, UserRole.admin]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Недостаточно прав для просмотра аналитики курса"
-        )
-    
     try:
-        # Try cache first
-        cache_key = f"analytics:course:{course_id}:overview:v1"
-        if cached := await analytics_cache.get_json(cache_key):
-            return cached
-        # Получаем курс
-        course_result = await db.execute(
-            select(Course).where(Course.id == course_id)
-        )
-        course = course_result.scalar_one_or_none()
-        
-        if not course:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Курс не найден"
-            )
-        
-        # Проверяем, что пользователь - владелец курса или админ
-        if current_user.role != UserRole.admin and course.owner_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Недостаточно прав для просмотра аналитики этого курса"
-            )
-        
-        # Подсчитываем количество заданий
-        assignments_count_result = await db.execute(
-            select(func.count(Assignment.id)).where(Assignment.course_id == course_id)
-        )
-        assignments_count = assignments_count_result.scalar()
-        
-        # Подсчитываем количество активных студентов через enrollments
-        students_count_result = await db.execute(
-            select(func.count(Enrollment.id))
-            .where(
-                and_(
-                    Enrollment.course_id == course_id,
-                    Enrollment.role == EnrollmentRole.student,
-                    Enrollment.status == EnrollmentStatus.active
-                )
-            )
-        )
-        students_count = students_count_result.scalar()
-        
-        # Подсчитываем количество сдач
-        submissions_count_result = await db.execute(
-            select(func.count(Submission.id))
-            .select_from(Submission)
-            .join(Assignment, Submission.assignment_id == Assignment.id)
-            .where(Assignment.course_id == course_id)
-        )
-        submissions_count = submissions_count_result.scalar()
-        
-        # Подсчитываем среднюю оценку
-        avg_grade_result = await db.execute(
-            select(func.avg(Grade.score))
-            .select_from(Grade)
-            .join(Submission, Grade.submission_id == Submission.id)
-            .join(Assignment, Submission.assignment_id == Assignment.id)
-            .where(Assignment.course_id == course_id)
-        )
-        avg_grade = avg_grade_result.scalar() or 0.0
-        
-        # Подсчитываем процент вовремя сданных заданий
-        on_time_submissions_result = await db.execute(
-            select(func.count(Submission.id))
-            .select_from(Submission)
-            .join(Assignment, Submission.assignment_id == Assignment.id)
-            .where(
-                and_(
-                    Assignment.course_id == course_id,
-                    Submission.status == SubmissionStatus.submitted,
-                    Submission.submitted_at <= Assignment.due_date
-                )
-            )
-        )
-        on_time_submissions = on_time_submissions_result.scalar()
-        
-        completion_rate = 0.0
-        if assignments_count > 0 and students_count > 0:
-            total_possible_submissions = assignments_count * students_count
-            completion_rate = (submissions_count / total_possible_submissions) * 100 if total_possible_submissions > 0 else 0.0
-        
-        on_time_rate = 0.0
-        if submissions_count > 0:
-            on_time_rate = (on_time_submissions / submissions_count) * 100
-        
-        response = {
-            "course_id": course_id,
-            "course_title": course.title,
-            "overview": {
-                "students_count": students_count,
-                "assignments_count": assignments_count,
-                "submissions_count": submissions_count,
-                "average_grade": round(avg_grade, 2),
-                "completion_rate": round(completion_rate, 2),
-                "on_time_submission_rate": round(on_time_rate, 2)
-            },
-            "period": {
-                "start_date": course.start_date,
-                "end_date": course.end_date,
-                "duration_days": (course.end_date - course.start_date).days
-            }
-        }
-        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_medium)
-        return response
-        
+        return await course_analytics_service.course_overview(db, course_id, current_user)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting course overview for course {course_id}: {str(e)}")
         raise HTTPException(
@@ -171,104 +63,10 @@ async def get_course_assignments_analytics(
     current_user: User = Depends(get_current_user)
 ):
     """Получить аналитику по заданиям конкретного курса."""
-    
-    # Проверяем права доступа
-    if current_user.role not in [UserRole.teacher, UserRole.admin]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Недостаточно прав для просмотра аналитики"
-        )
-    
     try:
-        cache_key = f"analytics:course:{course_id}:assignments:v1"
-        if cached := await analytics_cache.get_json(cache_key):
-            return cached
-        # Подсчитываем количество активных студентов курса
-        students_count_result = await db.execute(
-            select(func.count(Enrollment.id))
-            .where(
-                and_(
-                    Enrollment.course_id == course_id,
-                    Enrollment.role == EnrollmentRole.student,
-                    Enrollment.status == EnrollmentStatus.active
-                )
-            )
-        )
-        students_count = students_count_result.scalar()
-        
-        # Получаем все задания курса с аналитикой
-        assignments_result = await db.execute(
-            select(Assignment).where(Assignment.course_id == course_id)
-        )
-        assignments = assignments_result.scalars().all()
-        
-        assignments_analytics = []
-        
-        for assignment in assignments:
-            # Подсчитываем количество сдач для задания
-            submissions_count_result = await db.execute(
-                select(func.count(Submission.id)).where(Submission.assignment_id == assignment.id)
-            )
-            submissions_count = submissions_count_result.scalar()
-            
-            # Подсчитываем среднюю оценку
-            avg_grade_result = await db.execute(
-                select(func.avg(Grade.score))
-                .select_from(Grade)
-                .join(Submission, Grade.submission_id == Submission.id)
-                .where(Submission.assignment_id == assignment.id)
-            )
-            avg_grade = avg_grade_result.scalar() or 0.0
-            
-            # Подсчитываем количество вовремя сданных
-            on_time_count_result = await db.execute(
-                select(func.count(Submission.id))
-                .select_from(Submission)
-                .where(
-                    and_(
-                        Submission.assignment_id == assignment.id,
-                        Submission.status == SubmissionStatus.submitted,
-                        Submission.submitted_at <= assignment.due_date
-                    )
-                )
-            )
-            on_time_count = on_time_count_result.scalar()
-            
-            # Подсчитываем количество опоздавших
-            late_count_result = await db.execute(
-                select(func.count(Submission.id))
-                .select_from(Submission)
-                .where(
-                    and_(
-                        Submission.assignment_id == assignment.id,
-                        Submission.status == SubmissionStatus.submitted,
-                        Submission.submitted_at > assignment.due_date
-                    )
-                )
-            )
-            late_count = late_count_result.scalar()
-            
-            assignments_analytics.append({
-                "assignment_id": assignment.id,
-                "title": assignment.title,
-                "due_date": assignment.due_date,
-                "statistics": {
-                    "total_submissions": submissions_count,
-                    "average_grade": round(avg_grade, 2),
-                    "on_time_submissions": on_time_count,
-                    "late_submissions": late_count,
-                    "submission_rate": round((submissions_count / students_count) * 100, 2) if students_count > 0 else 0.0
-                }
-            })
-        
-        response = {
-            "course_id": course_id,
-            "total_students": students_count,
-            "assignments_analytics": assignments_analytics
-        }
-        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_medium)
-        return response
-        
+        return await course_analytics_service.course_assignments(db, course_id, current_user)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting assignments analytics for course {course_id}: {str(e)}")
         raise HTTPException(
@@ -474,106 +272,10 @@ async def get_student_performance(
     current_user: User = Depends(get_current_user)
 ):
     """Получить аналитику успеваемости студента."""
-    
-    # Проверяем права доступа
-    if current_user.role not in [UserRole.teacher, UserRole.admin]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Недостаточно прав для просмотра аналитики студента"
-        )
-    
     try:
-        # Получаем пользователя и проверяем что он студент
-        user_result = await db.execute(
-            select(User).where(User.id == student_id)
-        )
-        user = user_result.scalar_one_or_none()
-        
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Пользователь не найден"
-            )
-        
-        # Проверяем что у пользователя есть активные enrollments как студент
-        enrollment_check = await db.execute(
-            select(func.count(Enrollment.id))
-            .where(
-                and_(
-                    Enrollment.user_id == student_id,
-                    Enrollment.role == EnrollmentRole.student,
-                    Enrollment.status == EnrollmentStatus.active
-                )
-            )
-        )
-        if enrollment_check.scalar() == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Пользователь не является активным студентом"
-            )
-        
-        # Получаем все сдачи студента с оценками
-        submissions_result = await db.execute(
-            select(Submission, Assignment, Course, Grade)
-            .select_from(Submission)
-            .join(Assignment, Submission.assignment_id == Assignment.id)
-            .join(Course, Assignment.course_id == Course.id)
-            .outerjoin(Grade, Submission.id == Grade.submission_id)
-            .where(Submission.student_id == student_id)
-        )
-        
-        submissions_data = submissions_result.all()
-        
-        # Группируем по курсам
-        courses_performance = {}
-        
-        for submission, assignment, course, grade in submissions_data:
-            if course.id not in courses_performance:
-                courses_performance[course.id] = {
-                    "course_id": course.id,
-                    "course_title": course.title,
-                    "assignments_count": 0,
-                    "submissions_count": 0,
-                    "grades": [],
-                    "average_grade": 0.0,
-                    "on_time_rate": 0.0
-                }
-            
-            course_data = courses_performance[course.id]
-            course_data["assignments_count"] += 1
-            course_data["submissions_count"] += 1
-            
-            if grade:
-                course_data["grades"].append(grade.score)
-            
-            # Проверяем, вовремя ли сдано
-            if submission.submitted_at <= assignment.due_date:
-                course_data["on_time_rate"] += 1
-        
-        # Вычисляем средние значения
-        for course_data in courses_performance.values():
-            if course_data["grades"]:
-                course_data["average_grade"] = round(sum(course_data["grades"]) / len(course_data["grades"]), 2)
-            
-            if course_data["submissions_count"] > 0:
-                course_data["on_time_rate"] = round((course_data["on_time_rate"] / course_data["submissions_count"]) * 100, 2)
-        
-        # Общая статистика
-        all_grades = [grade.score for _, _, _, grade in submissions_data if grade]
-        overall_average = round(sum(all_grades) / len(all_grades), 2) if all_grades else 0.0
-        
-        return {
-            "student_id": student_id,
-            "student_name": user.full_name,
-            "overall_performance": {
-                "total_submissions": len(submissions_data),
-                "total_assignments": sum(course["assignments_count"] for course in courses_performance.values()),
-                "overall_average_grade": overall_average,
-                "courses_count": len(courses_performance)
-            },
-            "courses_performance": list(courses_performance.values())
-        }
-        
+        return await course_analytics_service.student_performance(db, student_id, current_user)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting student performance for student {student_id}: {str(e)}")
         raise HTTPException(
@@ -774,155 +476,6 @@ async def get_teacher_overview(
 
 # ------------------------- Advanced Analytics -------------------------
 
-def _bucket_start(date_value: datetime, bucket: Literal["day", "week", "month"]) -> datetime:
-    """Normalize datetime to the beginning of the bucket (day/week/month)."""
-    naive = date_value.replace(tzinfo=None)
-    if bucket == "day":
-        return datetime(naive.year, naive.month, naive.day)
-    if bucket == "week":
-        monday = naive - timedelta(days=naive.weekday())
-        return datetime(monday.year, monday.month, monday.day)
-    return datetime(naive.year, naive.month, 1)
-
-
-async def _course_trend_series(
-    db: AsyncSession,
-    course_id: int,
-    days: int,
-    bucket: Literal["day", "week", "month"],
-) -> List[Dict]:
-    window_start = datetime.now().replace(tzinfo=None) - timedelta(days=days)
-    result = await db.execute(
-        select(Submission, Assignment, Grade)
-        .select_from(Submission)
-        .join(Assignment, Submission.assignment_id == Assignment.id)
-        .outerjoin(Grade, Grade.submission_id == Submission.id)
-        .where(
-            and_(
-                Assignment.course_id == course_id,
-                Submission.submitted_at.isnot(None),
-                Submission.submitted_at >= window_start,
-            )
-        )
-    )
-    rows = result.all()
-
-    buckets: Dict[datetime, Dict[str, float]] = {}
-    submissions_seen: Dict[datetime, set] = {}
-
-    for submission, assignment, grade in rows:
-        if not submission.submitted_at:
-            continue
-        bstart = _bucket_start(submission.submitted_at, bucket)
-        if bstart not in buckets:
-            buckets[bstart] = {
-                "submissions": 0,
-                "grades_sum": 0.0,
-                "grades_count": 0,
-                "on_time_count": 0,
-                "late_count": 0,
-            }
-            submissions_seen[bstart] = set()
-
-        bucket_data = buckets[bstart]
-        if submission.id not in submissions_seen[bstart]:
-            submissions_seen[bstart].add(submission.id)
-            bucket_data["submissions"] += 1
-            if assignment and submission.submitted_at and assignment.due_date:
-                if submission.submitted_at <= assignment.due_date:
-                    bucket_data["on_time_count"] += 1
-                else:
-                    bucket_data["late_count"] += 1
-
-        if grade is not None and grade.score is not None:
-            bucket_data["grades_sum"] += float(grade.score)
-            bucket_data["grades_count"] += 1
-
-    series = []
-    for key in sorted(buckets.keys()):
-        data = buckets[key]
-        avg_grade = (data["grades_sum"] / data["grades_count"]) if data["grades_count"] > 0 else 0.0
-        on_time_rate = (data["on_time_count"] / data["submissions"]) * 100 if data["submissions"] > 0 else 0.0
-        series.append({
-            "bucket_start": key.isoformat(),
-            "submissions": int(data["submissions"]),
-            "average_grade": round(avg_grade, 2),
-            "on_time_rate": round(on_time_rate, 2),
-            "late_submissions": int(data["late_count"]),
-        })
-
-    return series
-
-
-async def _student_trend_series(
-    db: AsyncSession,
-    student_id: int,
-    days: int,
-    bucket: Literal["day", "week", "month"],
-) -> List[Dict]:
-    window_start = datetime.now().replace(tzinfo=None) - timedelta(days=days)
-    result = await db.execute(
-        select(Submission, Assignment, Grade)
-        .select_from(Submission)
-        .join(Assignment, Submission.assignment_id == Assignment.id)
-        .outerjoin(Grade, Grade.submission_id == Submission.id)
-        .where(
-            and_(
-                Submission.student_id == student_id,
-                Submission.submitted_at.isnot(None),
-                Submission.submitted_at >= window_start,
-            )
-        )
-    )
-    rows = result.all()
-
-    buckets: Dict[datetime, Dict[str, float]] = {}
-    submissions_seen: Dict[datetime, set] = {}
-
-    for submission, assignment, grade in rows:
-        if not submission.submitted_at:
-            continue
-        bstart = _bucket_start(submission.submitted_at, bucket)
-        if bstart not in buckets:
-            buckets[bstart] = {
-                "submissions": 0,
-                "grades_sum": 0.0,
-                "grades_count": 0,
-                "on_time_count": 0,
-                "late_count": 0,
-            }
-            submissions_seen[bstart] = set()
-
-        bucket_data = buckets[bstart]
-        if submission.id not in submissions_seen[bstart]:
-            submissions_seen[bstart].add(submission.id)
-            bucket_data["submissions"] += 1
-            if assignment and submission.submitted_at and assignment.due_date:
-                if submission.submitted_at <= assignment.due_date:
-                    bucket_data["on_time_count"] += 1
-                else:
-                    bucket_data["late_count"] += 1
-
-        if grade is not None and grade.score is not None:
-            bucket_data["grades_sum"] += float(grade.score)
-            bucket_data["grades_count"] += 1
-
-    series = []
-    for key in sorted(buckets.keys()):
-        data = buckets[key]
-        avg_grade = (data["grades_sum"] / data["grades_count"]) if data["grades_count"] > 0 else 0.0
-        on_time_rate = (data["on_time_count"] / data["submissions"]) * 100 if data["submissions"] > 0 else 0.0
-        series.append({
-            "bucket_start": key.isoformat(),
-            "submissions": int(data["submissions"]),
-            "average_grade": round(avg_grade, 2),
-            "on_time_rate": round(on_time_rate, 2),
-            "late_submissions": int(data["late_count"]),
-        })
-
-    return series
-
-
 @router.get(
     "/courses/{course_id}/trends",
     summary="Тренды по курсу",
@@ -935,30 +488,10 @@ async def get_course_trends(
     db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
-    if current_user.role not in [UserRole.teacher, UserRole.admin]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
-
-    course_result = await db.execute(select(Course).where(Course.id == course_id))
-    course = course_result.scalar_one_or_none()
-    if not course:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
-    if current_user.role != UserRole.admin and course.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нет доступа к курсу")
-
     try:
-        cache_key = f"analytics:course:{course_id}:trends:{bucket}:{days}:v1"
-        if cached := await analytics_cache.get_json(cache_key):
-            return cached
-        series = await _course_trend_series(db, course_id, days, bucket)
-        response = {
-            "course_id": course_id,
-            "bucket": bucket,
-            "days": days,
-            "series": series,
-            "generated_at": datetime.now(timezone.utc)
-        }
-        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_short)
-        return response
+        return await course_analytics_service.course_trends(db, course_id, current_user, days=days, bucket=bucket)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting course trends for {course_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ошибка при получении трендов курса")
@@ -976,37 +509,10 @@ async def get_student_trends(
     db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
-    if current_user.role not in [UserRole.teacher, UserRole.admin]:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
-
-    # Проверяем что пользователь является активным студентом
-    enrollment_check = await db.execute(
-        select(func.count(Enrollment.id))
-        .where(
-            and_(
-                Enrollment.user_id == student_id,
-                Enrollment.role == EnrollmentRole.student,
-                Enrollment.status == EnrollmentStatus.active
-            )
-        )
-    )
-    if enrollment_check.scalar() == 0:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не является активным студентом")
-
     try:
-        cache_key = f"analytics:student:{student_id}:trends:{bucket}:{days}:v1"
-        if cached := await analytics_cache.get_json(cache_key):
-            return cached
-        series = await _student_trend_series(db, student_id, days, bucket)
-        response = {
-            "student_id": student_id,
-            "bucket": bucket,
-            "days": days,
-            "series": series,
-            "generated_at": datetime.now(timezone.utc)
-        }
-        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_short)
-        return response
+        return await course_analytics_service.student_trends(db, student_id, current_user, days=days, bucket=bucket)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting student trends for {student_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Ошибка при получении трендов студента")
@@ -1036,7 +542,7 @@ async def predict_performance(
     current_user: User = Depends(get_current_user)
 ):
     # Rate limiting for analytics endpoints
-    await rate_limiter.allow_request(f"analytics_predict:{request.client.host}", limit=20, period=60)
+    await rate_limiter.check("analytics:predict", client_ip(request), limit=20, window_seconds=60, request=request)
     
     if current_user.role not in [UserRole.teacher, UserRole.admin]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
@@ -1053,7 +559,7 @@ async def predict_performance(
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
             if current_user.role != UserRole.admin and course.owner_id != current_user.id:
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Нет доступа к курсу")
-            series = await _course_trend_series(db, target_id, days_history, bucket)
+            series = await course_analytics_service.course_trend_series(db, target_id, days_history, bucket)
         else:
             # Проверяем что пользователь является активным студентом
             enrollment_check = await db.execute(
@@ -1068,7 +574,7 @@ async def predict_performance(
             )
             if enrollment_check.scalar() == 0:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не является активным студентом")
-            series = await _student_trend_series(db, target_id, days_history, bucket)
+            series = await course_analytics_service.student_trend_series(db, target_id, days_history, bucket)
 
         submissions_series = [point["submissions"] for point in series]
         avg_grade_series = [point["average_grade"] for point in series]
@@ -1226,7 +732,7 @@ async def get_course_risk_analysis(
             # Добавляем тренды если запрошены
             if include_trends:
                 try:
-                    trend_data = await _student_trend_series(db, user.id, 30, "week")
+                    trend_data = await course_analytics_service.student_trend_series(db, user.id, 30, "week")
                     student_data['trend_data'] = trend_data
                 except Exception as e:
                     logger.warning(f"Could not get trends for student {user.id}: {e}")
@@ -1414,7 +920,7 @@ async def get_student_risk_analysis(
             trend_data = None
             if include_trends:
                 try:
-                    trend_data = await _student_trend_series(db, student_id, 30, "week")
+                    trend_data = await course_analytics_service.student_trend_series(db, student_id, 30, "week")
                 except Exception as e:
                     logger.warning(f"Could not get trends for student {student_id}: {e}")
             
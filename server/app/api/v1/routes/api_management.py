@@ -1,6 +1,6 @@
 """API management routes for versioning, metrics, and idempotency."""
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Header, Query
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
 from datetime import datetime
@@ -9,7 +9,8 @@ from app.core.security import get_current_user, require_role
 from app.models.user import User, UserRole
 from app.core.api_pagination import APIVersioning, APIParams, paginated_query, PaginatedResponse
 from app.core.idempotency import idempotency_manager, require_idempotency_key_dependency
-from app.middleware.api_versioning import get_api_metrics
+from app.middleware.api_versioning import get_api_metrics, get_cluster_api_metrics
+from app.services.redis_service import redis_service
 
 router = APIRouter(prefix="/api-management", tags=["API Management"])
 
@@ -74,11 +75,15 @@ async def get_api_version_info() -> APIVersionInfo:
 
 @router.get("/metrics", response_model=APIMetricsResponse, summary="Get API metrics")
 async def get_api_metrics_endpoint(
+    scope: str = Query("worker", pattern="^(worker|cluster)$", description="This worker or all workers (via Redis)"),
     current_user: User = Depends(require_role(UserRole.admin))
 ) -> APIMetricsResponse:
-    """Get API usage metrics."""
+    """Get API usage metrics (request counts, errors, p50/p95/p99 latency)."""
     try:
-        metrics = get_api_metrics()
+        if scope == "cluster":
+            metrics = await get_cluster_api_metrics(redis_service.get_client())
+        else:
+            metrics = get_api_metrics()
         
         if not metrics:
             raise HTTPException(
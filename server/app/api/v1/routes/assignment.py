@@ -11,6 +11,7 @@ from app.models.user import User, UserRole
 from app.schemas.assignment import AssignmentCreate, AssignmentRead, AssignmentUpdate, AssignmentList
 from app.crud import assignment as crud_assignment
 from app.services.cache import analytics_cache
+from app.services.rag_indexer import rag_indexer
 
 router = APIRouter(
 
@@ -102,6 +103,7 @@ async def create_assignment(
     )
     # Invalidate analytics for the course
     await analytics_cache.invalidate_course(assignment.course_id)
+    rag_indexer.schedule_reindex(assignment.course_id)
     return created
 
 
@@ -137,6 +139,7 @@ async def update_assignment(
         )
     # Invalidate analytics for the course
     await analytics_cache.invalidate_course(assignment.course_id)
+    rag_indexer.schedule_reindex(assignment.course_id)
     return assignment
 
 
@@ -171,4 +174,5 @@ async def delete_assignment(
         )
     # Invalidate analytics for the course
     if success and existing:
-        await analytics_cache.invalidate_course(existing.course_id)
\ No newline at end of file
+        await analytics_cache.invalidate_course(existing.course_id)
+        rag_indexer.schedule_reindex(existing.course_id)
\ No newline at end of file
@@ -9,7 +9,7 @@ import uuid
 from app.core.security import get_current_user, require_role
 from app.models.user import User, UserRole
 from app.services.attendance_analytics import (
-    attendance_service, pageview_service, 
+    attendance_service, pageview_service, pageview_buffer,
     AttendanceStatus, PageViewType
 )
 
@@ -570,6 +570,7 @@ async def get_attendance_status(
                     "attendance_summary": bool(table_status["summary_table_exists"])
                 },
                 "record_counts": counts,
+                "page_view_buffer": pageview_buffer.get_stats(),
                 "timestamp": datetime.utcnow().isoformat()
             }
         
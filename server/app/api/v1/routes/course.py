@@ -29,6 +29,7 @@ async def get_courses(
     skip: int = Query(0, ge=0, description="Количество курсов для пропуска"),
     limit: int = Query(100, ge=1, le=1000, description="Максимальное количество курсов"),
     owner_id: Optional[int] = Query(None, description="ID владельца для фильтрации"),
+    search: Optional[str] = Query(None, description="Поиск по названию и описанию"),
     db: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -37,7 +38,8 @@ async def get_courses(
         db=db, 
         skip=skip, 
         limit=limit, 
-        owner_id=owner_id
+        owner_id=owner_id,
+        search=search
     )
     
     return CourseList(
@@ -12,6 +12,7 @@ from app.schemas.discussion import (
     DiscussionEntryRead,
 )
 from app.crud import discussion as crud_discussion
+from app.services.rag_indexer import rag_indexer
 
 
 router = APIRouter(prefix="/discussions", tags=["Discussions"])
@@ -24,7 +25,9 @@ async def list_topics(course_id: int, db: AsyncSession = Depends(get_async_sessi
 
 @router.post("/", response_model=DiscussionTopicRead, status_code=status.HTTP_201_CREATED)
 async def create_topic(topic: DiscussionTopicCreate, db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
-    return await crud_discussion.create_topic(db, topic, author_id=current_user.id)
+    created = await crud_discussion.create_topic(db, topic, author_id=current_user.id)
+    rag_indexer.schedule_reindex(created.course_id)
+    return created
 
 
 @router.post("/{topic_id}/entries", response_model=DiscussionEntryRead, status_code=status.HTTP_201_CREATED)
@@ -1,6 +1,9 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, status, Query, UploadFile
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
+import csv
+import io
 import logging
 
 from app.db.session import get_async_session
@@ -13,10 +16,12 @@ from app.schemas.gradebook import (
     GradebookEntryRead,
     GradebookHistoryRead,
     GradebookEntryList,
+    GradebookBulkImport,
+    GradebookBulkResult,
     GradebookStats
 )
 
-
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/gradebook", tags=["Gradebook"])
 
@@ -58,7 +63,7 @@ async def list_entries(
                 detail="Недостаточно прав для просмотра журнала"
             )
         
-        entries = gradebook.get_entries(
+        entries = await gradebook.get_entries(
             db,
             course_id=course_id,
             student_id=student_id,
@@ -73,7 +78,7 @@ async def list_entries(
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error retrieving gradebook entries: {str(e)}")
+        logger.error(f"Error retrieving gradebook entries: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при получении записей журнала"
@@ -98,7 +103,7 @@ async def get_entry(
 ):
     """Получить запись журнала по ID."""
     try:
-        entry = gradebook.get_entry(db, entry_id=entry_id)
+        entry = await gradebook.get_entry(db, entry_id=entry_id)
         if not entry:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -117,13 +122,13 @@ async def get_entry(
                 detail="Недостаточно прав для просмотра журнала"
             )
         
-        logging.info(f"Retrieved gradebook entry {entry_id} for user {current_user.id}")
+        logger.info(f"Retrieved gradebook entry {entry_id} for user {current_user.id}")
         return entry
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error retrieving gradebook entry {entry_id}: {str(e)}")
+        logger.error(f"Error retrieving gradebook entry {entry_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при получении записи журнала"
@@ -149,24 +154,26 @@ async def get_entry(
 )
 async def create_entry(
     entry_in: GradebookEntryCreate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_role("teacher", "admin")),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Создать новую запись в журнале."""
     try:
-        entry = gradebook.create_entry(
+        entry = await gradebook.create_entry(
             db,
             entry_in=entry_in,
-            current_user=current_user
+            current_user=current_user,
+            background_tasks=background_tasks
         )
         
-        logging.info(f"Created gradebook entry {entry.id} by user {current_user.id}")
+        logger.info(f"Created gradebook entry {entry.id} by user {current_user.id}")
         return entry
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error creating gradebook entry: {str(e)}")
+        logger.error(f"Error creating gradebook entry: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при создании записи в журнале"
@@ -191,31 +198,152 @@ async def create_entry(
 async def update_entry(
     entry_id: int,
     entry_in: GradebookEntryUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(require_role("teacher", "admin")),
     db: AsyncSession = Depends(get_async_session)
 ):
     """Обновить запись в журнале."""
     try:
-        entry = gradebook.update_entry(
+        entry = await gradebook.update_entry(
             db,
             entry_id=entry_id,
             entry_in=entry_in,
-            current_user=current_user
+            current_user=current_user,
+            background_tasks=background_tasks
         )
         
-        logging.info(f"Updated gradebook entry {entry_id} by user {current_user.id}")
+        logger.info(f"Updated gradebook entry {entry_id} by user {current_user.id}")
         return entry
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error updating gradebook entry {entry_id}: {str(e)}")
+        logger.error(f"Error updating gradebook entry {entry_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при обновлении записи в журнале"
         )
 
 
+def _parse_grades_csv(content: bytes, course_id: int, assignment_id: Optional[int]) -> GradebookBulkImport:
+    """Разобрать CSV (student_id, grade_value|grade, comment) в схему пакетной загрузки."""
+    try:
+        text_content = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="CSV должен быть в кодировке UTF-8")
+
+    reader = csv.DictReader(io.StringIO(text_content))
+    fields = {name.strip().lower() for name in (reader.fieldnames or [])}
+    grade_column = "grade_value" if "grade_value" in fields else "grade"
+    if "student_id" not in fields or grade_column not in fields:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="CSV должен содержать колонки student_id и grade_value (или grade)"
+        )
+
+    grades = []
+    # Номер строки файла для каждой оценки (заголовок — строка 1, пустые строки пропускаются)
+    row_numbers = []
+    try:
+        for row in reader:
+            if None in row:
+                # DictReader складывает лишние ячейки под ключ None
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=[{"row": reader.line_num, "field": None,
+                             "message": "Ячеек в строке больше, чем колонок в заголовке"}]
+                )
+            row = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+            if not any(row.values()):
+                continue
+            grades.append({
+                "student_id": row["student_id"],
+                "grade_value": row[grade_column].replace(",", "."),
+                "comment": row.get("comment") or None
+            })
+            row_numbers.append(reader.line_num)
+    except csv.Error as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[{"row": reader.line_num, "field": None, "message": f"Некорректный CSV: {e}"}]
+        )
+
+    try:
+        return GradebookBulkImport(course_id=course_id, assignment_id=assignment_id, grades=grades)
+    except ValidationError as e:
+        errors = [
+            {
+                "row": row_numbers[error["loc"][1]] if len(error["loc"]) > 1 and isinstance(error["loc"][1], int) else None,
+                "field": error["loc"][-1],
+                "message": error["msg"]
+            }
+            for error in e.errors()
+        ]
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+
+
+@router.post(
+    "/bulk",
+    response_model=GradebookBulkResult,
+    summary="Пакетная загрузка оценок по заданию",
+    description="""Создать или обновить оценки всех студентов по заданию одной транзакцией.
+    
+    **Права доступа:** только учителя и администраторы
+    
+    **Поведение:**
+    - Новые оценки создаются, изменённые обновляются, совпадающие пропускаются
+    - Если хотя бы один студент не найден, ничего не сохраняется (422)
+    - История изменений пишется одной вставкой
+    - Отправляется одно агрегированное уведомление (grades_imported)
+    """
+)
+async def bulk_import(
+    import_in: GradebookBulkImport,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(require_role("teacher", "admin")),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Пакетная загрузка оценок (JSON)."""
+    try:
+        return await gradebook.bulk_upsert(
+            db,
+            import_in=import_in,
+            current_user=current_user,
+            background_tasks=background_tasks
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing gradebook entries: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при загрузке оценок"
+        )
+
+
+@router.post(
+    "/bulk/csv",
+    response_model=GradebookBulkResult,
+    summary="Пакетная загрузка оценок из CSV",
+    description="""То же, что и /gradebook/bulk, но оценки передаются CSV-файлом.
+    
+    **Формат:** заголовок `student_id,grade_value,comment` (`grade` вместо `grade_value` тоже допускается),
+    кодировка UTF-8, десятичный разделитель — точка или запятая.
+    """
+)
+async def bulk_import_csv(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(..., description="CSV с оценками"),
+    course_id: int = Form(..., description="ID курса"),
+    assignment_id: Optional[int] = Form(None, description="ID задания"),
+    current_user: User = Depends(require_role("teacher", "admin")),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """Пакетная загрузка оценок (CSV)."""
+    import_in = _parse_grades_csv(await file.read(), course_id, assignment_id)
+    return await bulk_import(import_in, background_tasks, current_user=current_user, db=db)
+
+
 @router.delete(
     "/{entry_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -236,18 +364,18 @@ async def delete_entry(
 ):
     """Удалить запись из журнала."""
     try:
-        gradebook.delete_entry(
+        await gradebook.delete_entry(
             db,
             entry_id=entry_id,
             current_user=current_user
         )
         
-        logging.info(f"Deleted gradebook entry {entry_id} by user {current_user.id}")
+        logger.info(f"Deleted gradebook entry {entry_id} by user {current_user.id}")
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error deleting gradebook entry {entry_id}: {str(e)}")
+        logger.error(f"Error deleting gradebook entry {entry_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при удалении записи из журнала"
@@ -280,7 +408,7 @@ async def get_entry_history(
     """Получить историю изменений записи."""
     try:
         # Сначала проверяем существование записи и права доступа
-        entry = gradebook.get_entry(db, entry_id=entry_id)
+        entry = await gradebook.get_entry(db, entry_id=entry_id)
         if not entry:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -299,20 +427,20 @@ async def get_entry_history(
                 detail="Недостаточно прав для просмотра истории журнала"
             )
         
-        history = gradebook.get_entry_history(
+        history = await gradebook.get_entry_history(
             db,
             entry_id=entry_id,
             skip=skip,
             limit=limit
         )
         
-        logging.info(f"Retrieved history for gradebook entry {entry_id} by user {current_user.id}")
+        logger.info(f"Retrieved history for gradebook entry {entry_id} by user {current_user.id}")
         return history
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error retrieving history for gradebook entry {entry_id}: {str(e)}")
+        logger.error(f"Error retrieving history for gradebook entry {entry_id}: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при получении истории записи"
@@ -347,26 +475,26 @@ async def get_stats(
         # Для студентов ограничиваем доступ только к их статистике
         if current_user.role == "student":
             student_id = current_user.id
-            logging.info(f"Student {current_user.id} accessing their grade statistics")
+            logger.info(f"Student {current_user.id} accessing their grade statistics")
         elif current_user.role not in ["teacher", "admin"]:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Недостаточно прав для просмотра статистики"
             )
         
-        stats = gradebook.get_stats(
+        stats = await gradebook.get_stats(
             db,
             course_id=course_id,
             student_id=student_id
         )
         
-        logging.info(f"Retrieved grade statistics for user {current_user.id}")
+        logger.info(f"Retrieved grade statistics for user {current_user.id}")
         return stats
         
     except HTTPException:
         raise
     except Exception as e:
-        logging.error(f"Error retrieving grade statistics: {str(e)}")
+        logger.error(f"Error retrieving grade statistics: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при получении статистики по оценкам"
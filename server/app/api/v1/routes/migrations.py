@@ -253,6 +253,28 @@ async def restore_backup(
         )
 
 
+@router.post("/partitions", summary="Create upcoming time partitions")
+async def ensure_time_partitions(
+    months_ahead: int = Query(3, ge=0, le=24, description="Number of future monthly partitions"),
+    current_user: User = Depends(require_role(UserRole.admin))
+) -> Dict[str, Any]:
+    """Create partitioned tables and their monthly partitions ahead of time."""
+    try:
+        results = await migration_manager.ensure_time_partitions(months_ahead=months_ahead)
+        
+        return {
+            "success": True,
+            "months_ahead": months_ahead,
+            "tables": results
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create partitions: {str(e)}"
+        )
+
+
 @router.get("/history", summary="Get migration history")
 async def get_migration_history(
     limit: int = Query(50, description="Maximum number of entries to return"),
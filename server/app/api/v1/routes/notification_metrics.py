@@ -135,6 +135,7 @@ async def get_metrics_overview(
             FROM notification_delivery_attempts nda
             JOIN notification_log nl ON nda.message_id = nl.id
             WHERE nl.created_at >= :since_time
+            AND nda.attempted_at >= :since_time
             AND nda.status = 'sent'
             AND nda.latency_ms IS NOT NULL
             """
@@ -395,6 +396,7 @@ async def get_channel_metrics(
             JOIN notification_log nl ON nda.message_id = nl.id
             WHERE nl.channel = :channel
             AND nl.created_at >= :since_time
+            AND nda.attempted_at >= :since_time
             AND nda.status = 'sent'
             AND nda.latency_ms IS NOT NULL
             """
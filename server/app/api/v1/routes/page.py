@@ -7,6 +7,7 @@ from app.core.security import get_current_user
 from app.models.user import User
 from app.schemas.page import PageCreate, PageUpdate, PageRead
 from app.crud import page as crud_page
+from app.services.rag_indexer import rag_indexer
 
 
 router = APIRouter(prefix="/pages", tags=["Pages"])
@@ -19,7 +20,9 @@ async def list_pages(course_id: int, db: AsyncSession = Depends(get_async_sessio
 
 @router.post("/", response_model=PageRead, status_code=status.HTTP_201_CREATED)
 async def create_page(page: PageCreate, db: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
-    return await crud_page.create_page(db, page, author_id=current_user.id)
+    created = await crud_page.create_page(db, page, author_id=current_user.id)
+    rag_indexer.schedule_reindex(created.course_id)
+    return created
 
 
 @router.put("/{page_id}", response_model=PageRead)
@@ -27,6 +30,7 @@ async def update_page(page_id: int, page: PageUpdate, db: AsyncSession = Depends
     updated = await crud_page.update_page(db, page_id, page)
     if not updated:
         raise HTTPException(status_code=404, detail="Page not found")
+    rag_indexer.schedule_reindex(updated.course_id)
     return updated
 
 
@@ -2,9 +2,10 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import Optional, Dict, Any, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime, date
 
+from app.core.api_pagination import InvalidCursorError
 from app.core.security import get_current_user, require_role
 from app.models.user import User, UserRole
 from app.services.quiz_bank_service import question_bank_service, item_analysis_service
@@ -65,11 +66,27 @@ class QuestionSearchRequest(BaseModel):
     tags: Optional[List[str]] = None
     text_search: Optional[str] = None
     point_range: Optional[Dict[str, float]] = None
+    limit: int = Field(50, ge=1, le=200)
+    cursor: Optional[str] = None  # next_cursor from the previous page
+
+
+class QuestionSampleRequest(BaseModel):
+    """Request model for drawing random questions for a quiz."""
+    count: int = Field(..., ge=1, le=200)
+    course_id: Optional[int] = None
+    question_bank_id: Optional[int] = None
+    question_type: Optional[str] = None
+    difficulty_level: Optional[str] = None
+    tags: Optional[List[str]] = None
+    point_range: Optional[Dict[str, float]] = None
 
 
 class ItemAnalysisRequest(BaseModel):
-    """Request model for item analysis."""
-    question_ids: List[int]
+    """Request model for item analysis.
+
+    With ``quiz_id`` and no ``question_ids`` every item of the quiz is analyzed.
+    """
+    question_ids: List[int] = []
     quiz_id: Optional[int] = None
 
 
@@ -304,14 +321,17 @@ async def search_questions(
 ) -> Dict[str, Any]:
     """Search questions in banks based on criteria."""
     try:
-        search_criteria = {k: v for k, v in request.dict().items() if v is not None}
+        search_criteria = request.dict(exclude={"limit", "cursor"}, exclude_none=True)
         
-        questions = await question_bank_service.search_questions(search_criteria)
+        questions, next_cursor = await question_bank_service.search_questions(
+            search_criteria, limit=request.limit, cursor=request.cursor
+        )
         
         return {
             "success": True,
             "search_criteria": search_criteria,
             "total_results": len(questions),
+            "next_cursor": next_cursor,
             "questions": [
                 {
                     "id": q.id,
@@ -333,6 +353,11 @@ async def search_questions(
             ]
         }
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -340,6 +365,42 @@ async def search_questions(
         )
 
 
+@router.post("/questions/sample", summary="Sample random questions")
+async def sample_questions(
+    request: QuestionSampleRequest,
+    current_user: User = Depends(require_role(UserRole.teacher, UserRole.admin))
+) -> Dict[str, Any]:
+    """Draw random questions matching criteria, e.g. for quiz generation."""
+    try:
+        criteria = request.dict(exclude={"count"}, exclude_none=True)
+        questions = await question_bank_service.sample_questions(criteria, request.count)
+        
+        return {
+            "success": True,
+            "requested": request.count,
+            "total_results": len(questions),
+            "questions": [
+                {
+                    "id": q.id,
+                    "question_bank_id": q.question_bank_id,
+                    "question_text": q.question_text,
+                    "question_type": q.question_type,
+                    "points": q.points,
+                    "difficulty_level": q.difficulty_level,
+                    "tags": q.tags,
+                    "options": q.options
+                }
+                for q in questions
+            ]
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to sample questions: {str(e)}"
+        )
+
+
 @router.get("/questions/{question_id}/statistics", summary="Get question statistics")
 async def get_question_statistics(
     question_id: int,
@@ -374,14 +435,17 @@ async def perform_item_analysis(
 ) -> Dict[str, Any]:
     """Perform item analysis on selected questions."""
     try:
-        analyses = await item_analysis_service.bulk_analyze_questions(
-            request.question_ids, request.quiz_id
+        result = await item_analysis_service.analyze_quiz(
+            quiz_id=request.quiz_id, question_ids=request.question_ids
         )
+        analyses = result["analyses"]
         
         return {
             "success": True,
             "message": f"Item analysis completed for {len(analyses)} questions",
             "quiz_id": request.quiz_id,
+            "submissions": result["submissions"],
+            "reliability": result["reliability"],
             "analyses": [
                 {
                     "question_id": analysis.question_id,
@@ -398,6 +462,11 @@ async def perform_item_analysis(
             ]
         }
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from app.db.session import get_async_session
 from app.schemas.user import UserCreate, UserUpdate, UserRead
 from app.crud.user import get_user_by_id, get_all_users, create_user, update_user, delete_user
@@ -11,8 +11,12 @@ from sqlalchemy.exc import IntegrityError
 router = APIRouter()
 
 @router.get("/", response_model=List[UserRead], summary="Получить всех пользователей", status_code=200)
-async def read_users(db: AsyncSession = Depends(get_async_session), current_user = Depends(require_role(UserRole.admin))):
-    return await get_all_users(db)
+async def read_users(
+    search: Optional[str] = Query(None, description="Поиск по логину"),
+    db: AsyncSession = Depends(get_async_session),
+    current_user = Depends(require_role(UserRole.admin))
+):
+    return await get_all_users(db, search=search)
 
 @router.get("/me", response_model=UserRead, summary="Get current user", description="Returns the current authenticated user.")
 async def read_current_user(current_user = Depends(get_current_user)):
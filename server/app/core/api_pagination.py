@@ -5,17 +5,25 @@ Provides consistent pagination, filtering, sorting, and versioning
 across all API endpoints.
 """
 
+import base64
+import json
 import logging
 import math
 from typing import Dict, Any, List, Optional, Union, Type, Generic, TypeVar
-from datetime import datetime, date
+from datetime import datetime, date, time
+from decimal import Decimal
+from uuid import UUID
 from dataclasses import dataclass
 from enum import Enum
+from fastapi import HTTPException
 from pydantic import BaseModel, Field, validator
-from sqlalchemy import select, func, desc, asc, text, and_, or_
+from sqlalchemy import select, func, desc, asc, text, and_, or_, literal
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 
+from app.core.config import settings
+from app.core.search import build_search, session_dialect
+
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
@@ -44,6 +52,17 @@ class FilterOperator(str, Enum):
     BETWEEN = "between"    # between two values
 
 
+class CountMode(str, Enum):
+    """How the total number of items is computed."""
+    EXACT = "exact"        # count(*) over the filtered query
+    ESTIMATE = "estimate"  # planner statistics or a capped count
+    NONE = "none"          # no total, only has_next
+
+
+class InvalidCursorError(ValueError):
+    """Cursor is malformed or was issued for a different sort order."""
+
+
 @dataclass
 class FilterSpec:
     """Filter specification."""
@@ -65,6 +84,7 @@ class PaginationParams(BaseModel):
     """Pagination parameters."""
     page: int = Field(default=1, ge=1, description="Page number (1-based)")
     per_page: int = Field(default=20, ge=1, le=100, description="Items per page")
+    cursor: Optional[str] = Field(None, description="Opaque cursor from next_cursor (keyset mode, page is ignored)")
     
     @property
     def offset(self) -> int:
@@ -116,6 +136,8 @@ class APIParams(BaseModel):
     # Pagination
     page: int = Field(default=1, ge=1, description="Page number (1-based)")
     per_page: int = Field(default=20, ge=1, le=100, description="Items per page")
+    cursor: Optional[str] = Field(None, description="Opaque cursor from next_cursor (keyset mode, page is ignored)")
+    count: CountMode = Field(CountMode.EXACT, description="Total count mode: exact, estimate or none")
     
     # Sorting
     sort_by: Optional[str] = Field(None, description="Field to sort by")
@@ -135,7 +157,7 @@ class APIParams(BaseModel):
     @property
     def pagination(self) -> PaginationParams:
         """Get pagination parameters."""
-        return PaginationParams(page=self.page, per_page=self.per_page)
+        return PaginationParams(page=self.page, per_page=self.per_page, cursor=self.cursor)
     
     @property
     def sorting(self) -> Optional[SortSpec]:
@@ -180,43 +202,143 @@ class APIParams(BaseModel):
 class PaginatedResponse(BaseModel, Generic[T]):
     """Paginated response model."""
     items: List[T] = Field(description="List of items")
-    total: int = Field(description="Total number of items")
+    total: Optional[int] = Field(description="Total number of items (None when not counted)")
+    total_estimated: bool = Field(False, description="Whether total is an estimate or a lower bound")
     page: int = Field(description="Current page number")
     per_page: int = Field(description="Items per page")
-    pages: int = Field(description="Total number of pages")
+    pages: Optional[int] = Field(description="Total number of pages")
     has_next: bool = Field(description="Whether there is a next page")
     has_prev: bool = Field(description="Whether there is a previous page")
     next_page: Optional[int] = Field(None, description="Next page number")
     prev_page: Optional[int] = Field(None, description="Previous page number")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page (keyset mode)")
     
     @classmethod
-    def create(cls, items: List[T], total: int, pagination: PaginationParams) -> "PaginatedResponse[T]":
+    def create(cls, items: List[T], total: Optional[int], pagination: PaginationParams,
+               has_next: Optional[bool] = None, next_cursor: Optional[str] = None,
+               total_estimated: bool = False) -> "PaginatedResponse[T]":
         """Create paginated response."""
-        pages = math.ceil(total / pagination.per_page) if total > 0 else 1
-        has_next = pagination.page < pages
-        has_prev = pagination.page > 1
+        if total is not None:
+            pages = math.ceil(total / pagination.per_page) if total > 0 else 1
+        else:
+            pages = None
+        if has_next is None:
+            has_next = pages is not None and pagination.page < pages
+        
+        if pagination.cursor:
+            # Keyset mode: no page numbers, only forward navigation
+            return cls(
+                items=items,
+                total=total,
+                total_estimated=total_estimated,
+                page=pagination.page,
+                per_page=pagination.per_page,
+                pages=pages,
+                has_next=has_next,
+                has_prev=True,
+                next_cursor=next_cursor if has_next else None
+            )
         
+        has_prev = pagination.page > 1
         return cls(
             items=items,
             total=total,
+            total_estimated=total_estimated,
             page=pagination.page,
             per_page=pagination.per_page,
             pages=pages,
             has_next=has_next,
             has_prev=has_prev,
             next_page=pagination.page + 1 if has_next else None,
-            prev_page=pagination.page - 1 if has_prev else None
+            prev_page=pagination.page - 1 if has_prev else None,
+            next_cursor=next_cursor if has_next else None
         )
 
 
+def _encode_cursor_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, time):
+        return {"t": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    if isinstance(value, UUID):
+        return {"uuid": str(value)}
+    if isinstance(value, Enum):
+        return _encode_cursor_value(value.value)
+    raise TypeError(f"Cannot encode {type(value).__name__} sort value in a cursor")
+
+
+def _decode_cursor_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "t" in value:
+            return time.fromisoformat(value["t"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+        if "uuid" in value:
+            return UUID(value["uuid"])
+        raise ValueError(f"unknown cursor value {value}")
+    return value
+
+
+def encode_cursor(sort_field: str, direction: SortDirection, sort_value: Any, row_id: Any) -> str:
+    """Build an opaque cursor pointing just after (sort_value, row_id)."""
+    payload = {
+        "f": sort_field,
+        "d": direction.value,
+        "v": _encode_cursor_value(sort_value),
+        "id": _encode_cursor_value(row_id)
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not {"f", "d", "v", "id"} <= payload.keys():
+            raise ValueError("missing keys")
+        payload["v"] = _decode_cursor_value(payload["v"])
+        payload["id"] = _decode_cursor_value(payload["id"])
+        payload["d"] = SortDirection(payload["d"])
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+    return payload
+
+
 class QueryBuilder:
     """SQL query builder with pagination, filtering, and sorting."""
     
-    def __init__(self, model_class: Type[DeclarativeBase], session: AsyncSession):
+    def __init__(self, model_class: Type[DeclarativeBase], session: AsyncSession,
+                 count_cap: int = 10000):
         self.model_class = model_class
         self.session = session
         self.query = select(model_class)
         self.count_query = select(func.count()).select_from(model_class)
+        self.count_cap = count_cap
+        
+        # Filter conditions (for capped counts) and the effective sort key (for cursors)
+        self._conditions: List[Any] = []
+        self._sort_field: Optional[str] = None
+        self._sort_direction = SortDirection.ASC
+        self._search_rank = None
+        self._per_page: Optional[int] = None
+        self._keyset = False
+        
+        # Filled in by execute()
+        self.has_next: Optional[bool] = None
+        self.next_cursor: Optional[str] = None
+        self.total_estimated = False
     
     def apply_filters(self, filters: List[FilterSpec], search_fields: Optional[List[str]] = None) -> "QueryBuilder":
         """Apply filters to the query."""
@@ -231,58 +353,175 @@ class QueryBuilder:
             filter_condition = and_(*conditions)
             self.query = self.query.where(filter_condition)
             self.count_query = self.count_query.where(filter_condition)
+            self._conditions.append(filter_condition)
         
         return self
     
     def apply_search(self, search_term: str, search_fields: List[str]) -> "QueryBuilder":
-        """Apply global search across specified fields."""
+        """
+        Apply global search across specified fields.
+        
+        Uses the indexed backend from app.core.search on PostgreSQL (trigram or
+        full-text, with a relevance rank) and ILIKE elsewhere.
+        """
         if not search_term or not search_fields:
             return self
         
-        search_conditions = []
-        for field in search_fields:
-            if hasattr(self.model_class, field):
-                column = getattr(self.model_class, field)
-                search_conditions.append(column.ilike(f"%{search_term}%"))
-        
-        if search_conditions:
-            search_condition = or_(*search_conditions)
+        search_condition, rank = build_search(
+            self.model_class, search_term, search_fields, session_dialect(self.session)
+        )
+        if search_condition is not None:
             self.query = self.query.where(search_condition)
             self.count_query = self.count_query.where(search_condition)
+            self._conditions.append(search_condition)
+            self._search_rank = rank
         
         return self
     
     def apply_sorting(self, sort_spec: Optional[SortSpec], default_sort: Optional[str] = "id") -> "QueryBuilder":
         """Apply sorting to the query."""
+        if not sort_spec and self._search_rank is not None:
+            # Relevance order; pages are offset-based (no cursor over a computed rank)
+            self.query = self.query.order_by(desc(self._search_rank))
+            if hasattr(self.model_class, "id"):
+                self.query = self.query.order_by(desc(self.model_class.id))
+            return self
+        
         if sort_spec and hasattr(self.model_class, sort_spec.field):
-            column = getattr(self.model_class, sort_spec.field)
-            if sort_spec.direction == SortDirection.DESC:
-                self.query = self.query.order_by(desc(column))
-            else:
-                self.query = self.query.order_by(asc(column))
+            self._sort_field = sort_spec.field
+            self._sort_direction = sort_spec.direction
         elif default_sort and hasattr(self.model_class, default_sort):
             # Apply default sorting
-            column = getattr(self.model_class, default_sort)
-            self.query = self.query.order_by(desc(column))
+            self._sort_field = default_sort
+            self._sort_direction = SortDirection.DESC
+        else:
+            return self
+        
+        order = desc if self._sort_direction == SortDirection.DESC else asc
+        sort_column = order(getattr(self.model_class, self._sort_field))
+        if self._sort_nullable():
+            # NULLs last in both directions, whatever the dialect default (keyset relies on it)
+            sort_column = sort_column.nulls_last()
+        self.query = self.query.order_by(sort_column)
+        # Tie-break on id so the order is total (stable pages, valid cursors)
+        if self._sort_field != "id" and hasattr(self.model_class, "id"):
+            self.query = self.query.order_by(order(self.model_class.id))
         
         return self
     
     def apply_pagination(self, pagination: PaginationParams) -> "QueryBuilder":
-        """Apply pagination to the query."""
-        self.query = self.query.offset(pagination.offset).limit(pagination.per_page)
+        """
+        Apply pagination to the query.
+        
+        With a cursor the page is selected by a keyset condition on
+        (sort key, id) instead of OFFSET, so deep pages cost the same as the
+        first one. One extra row is fetched to know whether there is a next page.
+        """
+        self._per_page = pagination.per_page
+        # Cursors are issued on keyset pages and on the first page (the entry point),
+        # never on deeper offset pages
+        self._keyset = bool(pagination.cursor) or pagination.page == 1
+        if pagination.cursor:
+            self.query = self.query.where(self._cursor_condition(decode_cursor(pagination.cursor)))
+        else:
+            self.query = self.query.offset(pagination.offset)
+        self.query = self.query.limit(pagination.per_page + 1)
         return self
     
-    async def execute(self) -> tuple[List[Any], int]:
-        """Execute the query and return results with total count."""
-        # Execute count query
-        count_result = await self.session.execute(self.count_query)
-        total = count_result.scalar() or 0
-        
+    def _cursor_condition(self, cursor: Dict[str, Any]):
+        if not hasattr(self.model_class, "id"):
+            raise InvalidCursorError(f"{self.model_class.__name__} has no id column for keyset pagination")
+        if cursor["f"] != self._sort_field or cursor["d"] != self._sort_direction:
+            raise InvalidCursorError("Cursor was issued for a different sort order")
+        
+        column = getattr(self.model_class, self._sort_field)
+        id_column = self.model_class.id
+        descending = self._sort_direction == SortDirection.DESC
+        
+        after_id = id_column < cursor["id"] if descending else id_column > cursor["id"]
+        if self._sort_field == "id":
+            return after_id
+        if cursor["v"] is None:
+            # NULLs sort last: only the remaining NULL rows follow
+            return and_(column.is_(None), after_id)
+        after_value = column < cursor["v"] if descending else column > cursor["v"]
+        condition = or_(after_value, and_(column == cursor["v"], after_id))
+        if self._sort_nullable():
+            condition = or_(condition, column.is_(None))
+        return condition
+    
+    def _sort_nullable(self) -> bool:
+        try:
+            return bool(getattr(self.model_class, self._sort_field).property.columns[0].nullable)
+        except (AttributeError, IndexError):
+            return self._sort_field != "id"
+    
+    async def execute(self, count_mode: CountMode = CountMode.EXACT) -> tuple[List[Any], Optional[int]]:
+        """Execute the query and return results with total count (None for CountMode.NONE)."""
         # Execute main query
         result = await self.session.execute(self.query)
-        items = result.scalars().all()
+        items = list(result.scalars().all())
+        
+        if self._per_page is not None:
+            self.has_next = len(items) > self._per_page
+            items = items[:self._per_page]
+            if self._keyset and self.has_next and items and self._sort_field and hasattr(self.model_class, "id"):
+                last = items[-1]
+                try:
+                    self.next_cursor = encode_cursor(
+                        self._sort_field, self._sort_direction, getattr(last, self._sort_field), last.id
+                    )
+                except TypeError as e:
+                    # Page is still served; clients fall back to page numbers
+                    logger.warning(f"No cursor for {self.model_class.__name__}.{self._sort_field}: {e}")
+        
+        total = await self._count(count_mode)
+        return items, total
+    
+    async def _count(self, count_mode: CountMode) -> Optional[int]:
+        if count_mode == CountMode.NONE:
+            return None
         
-        return list(items), total
+        if count_mode == CountMode.ESTIMATE:
+            if not self._conditions:
+                estimate = await self._table_estimate()
+                if estimate is not None:
+                    self.total_estimated = True
+                    return estimate
+            return await self._capped_count()
+        
+        # Execute count query
+        count_result = await self.session.execute(self.count_query)
+        return count_result.scalar() or 0
+    
+    async def _table_estimate(self) -> Optional[int]:
+        """Row estimate from planner statistics (PostgreSQL only)."""
+        if self.session.bind is None or self.session.bind.dialect.name != "postgresql":
+            return None
+        try:
+            result = await self.session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": self.model_class.__tablename__}
+            )
+            estimate = result.scalar()
+            # -1 / 0: table never analyzed
+            if estimate is not None and estimate > 0:
+                return int(estimate)
+        except Exception as e:
+            logger.warning(f"Could not read row estimate for {self.model_class.__tablename__}: {e}")
+        return None
+    
+    async def _capped_count(self) -> int:
+        """count(*) that stops after count_cap rows; reaching the cap marks the total as estimated."""
+        limited = select(literal(1)).select_from(self.model_class)
+        if self._conditions:
+            limited = limited.where(*self._conditions)
+        limited = limited.limit(self.count_cap).subquery()
+        
+        result = await self.session.execute(select(func.count()).select_from(limited))
+        total = result.scalar() or 0
+        self.total_estimated = total >= self.count_cap
+        return total
     
     def _build_filter_condition(self, filter_spec: FilterSpec):
         """Build filter condition for a single filter specification."""
@@ -444,9 +683,15 @@ async def paginated_query(
     additional_filters: Optional[List[FilterSpec]] = None,
     default_sort: Optional[str] = "id"
 ) -> PaginatedResponse:
-    """Execute a paginated query with filtering and sorting."""
+    """
+    Execute a paginated query with filtering and sorting.
     
-    builder = QueryBuilder(model_class, session)
+    ``params.cursor`` switches to keyset pagination and ``params.count``
+    selects how the total is computed, so routes taking APIParams get both
+    without changes.
+    """
+    
+    builder = QueryBuilder(model_class, session, count_cap=settings.PAGINATION_COUNT_CAP)
     
     # Apply filters
     filters = params.filters
@@ -463,10 +708,18 @@ async def paginated_query(
     # Apply sorting
     builder.apply_sorting(params.sorting, default_sort)
     
-    # Apply pagination
-    builder.apply_pagination(params.pagination)
+    try:
+        # Apply pagination
+        builder.apply_pagination(params.pagination)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Execute query
-    items, total = await builder.execute()
-    
-    return PaginatedResponse.create(items, total, params.pagination)
+    items, total = await builder.execute(params.count)
+    
+    return PaginatedResponse.create(
+        items, total, params.pagination,
+        has_next=builder.has_next,
+        next_cursor=builder.next_cursor,
+        total_estimated=builder.total_estimated
+    )
@@ -0,0 +1,128 @@
+"""
+Bounded in-memory queue drained in batches by a background task.
+
+Shared by write-heavy side channels (page views, RBAC audit log): callers
+only append, a flusher hands batches to ``write_batch`` every
+``flush_interval`` seconds or as soon as ``batch_size`` items are queued.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Generic, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BatchBuffer(Generic[T]):
+    """
+    Non-blocking batch writer with drop-on-overflow backpressure.
+
+    ``write_batch`` receives up to ``batch_size`` items and must persist them
+    (open and commit its own session); if it raises, the batch is counted as
+    failed and dropped. When the queue is full new items are dropped and
+    counted instead of blocking the caller.
+    """
+
+    def __init__(self, write_batch: Callable[[List[T]], Awaitable[None]], name: str = "Batch",
+                 max_size: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.write_batch = write_batch
+        self.name = name
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Deque[T] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, item: T) -> bool:
+        """Queue an item without blocking; returns False if it was dropped."""
+        if len(self._queue) >= self.max_size:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"{self.name} buffer full ({self.max_size}), dropped {self.dropped} items so far")
+            return False
+
+        self._queue.append(item)
+        self.enqueued += 1
+        if len(self._queue) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        """Start the background flusher (idempotent)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info(
+            f"{self.name} buffer started (max_size={self.max_size}, batch_size={self.batch_size}, "
+            f"interval={self.flush_interval}s)"
+        )
+
+    async def stop(self):
+        """Stop the flusher and write out whatever is still buffered."""
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"{self.name} flusher stopped with error: {e}")
+            self._task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing {self.name} buffer: {e}")
+
+    async def flush(self) -> int:
+        """Drain the buffer in batches; returns number of items written."""
+        written = 0
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                await self.write_batch(batch)
+                written += len(batch)
+                self.flushed += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"{self.name} buffer: error writing {len(batch)} items: {e}")
+        return written
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer counters for monitoring."""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "queued": len(self._queue),
+            "max_size": self.max_size,
+            "batch_size": self.batch_size,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches
+        }
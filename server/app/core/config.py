@@ -65,7 +65,23 @@ class Settings(BaseSettings):
     CANVAS_CLIENT_SECRET: str = Field(default="")
     CANVAS_REDIRECT_URI: str = Field(default="")
     CANVAS_RATE_LIMIT: int = Field(default=300)
+    # LTI AGS: параллельная отправка оценок и кэш OAuth2-токенов платформы
+    LTI_AGS_CONCURRENCY: int = Field(default=8)
+    LTI_AGS_MAX_RETRIES: int = Field(default=5)
+    LTI_TOKEN_REFRESH_MARGIN: int = Field(default=60)
+    # LTI JWKS платформ: срок без Cache-Control, минимум между обновлениями
+    # по неизвестному kid и сколько отдавать старые ключи при недоступной платформе
+    LTI_JWKS_DEFAULT_TTL: int = Field(default=3600)
+    LTI_JWKS_REFRESH_INTERVAL: int = Field(default=30)
+    LTI_JWKS_STALE_TTL: int = Field(default=86400)
+    # LTI nonce и записи запусков: Redis с TTL (секунды), таблицы — запасной путь
+    LTI_NONCE_TTL: int = Field(default=300)
+    LTI_LAUNCH_TTL: int = Field(default=86400)
+    LTI_STATE_REDIS_ENABLED: bool = Field(default=True)
     REDIS_URL: str = Field(default="redis://cache:6379/0")
+    # Rate limiting: доля остатка лимита, выдаваемая воркеру без обращения к Redis
+    RATE_LIMIT_LOCAL_FRACTION: float = Field(default=0.25)
+    RATE_LIMIT_LOCAL_MAX_AGE: float = Field(default=1.0)
     CANVAS_LIVE_EVENTS_SECRET: str = Field(default="")
     CANVAS_EVENTS_STREAM: str = Field(default="canvas:events")
     CANVAS_EVENTS_DLQ: str = Field(default="canvas:events:dlq")
@@ -80,12 +96,71 @@ class Settings(BaseSettings):
     ANTHROPIC_API_KEY: str = Field(default="")
     OLLAMA_API_BASE: str = Field(default="http://localhost:11434")
     OLLAMA_MODEL: str = Field(default="tinyllama")
+    # LLM-провайдеры: таймаут запроса (сек) и лимит параллельных запросов на воркер
+    LLM_TIMEOUT: float = Field(default=60.0)
+    LLM_MAX_CONCURRENCY: int = Field(default=16)
+    OLLAMA_MAX_CONCURRENCY: int = Field(default=2)
+    # Семантический кэш ответов AI-чата (по умолчанию выключен)
+    AI_SEMANTIC_CACHE_ENABLED: bool = Field(default=False)
+    AI_SEMANTIC_CACHE_THRESHOLD: float = Field(default=0.92)
+    AI_SEMANTIC_CACHE_TTL: int = Field(default=600)
+    AI_SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=5000)
+    # Вызов функций AI: таймаут одной функции (сек), лимит размера результата, кэш результатов (сек)
+    AI_TOOL_TIMEOUT: float = Field(default=10.0)
+    AI_TOOL_RESULT_MAX_CHARS: int = Field(default=4000)
+    AI_TOOL_CACHE_TTL: int = Field(default=30)
+    # Память AI-чата: срок жизни истории (сек), предел сообщений, сжатие в краткое содержание,
+    # бюджет токенов истории в промпте
+    AI_MEMORY_TTL: int = Field(default=604800)
+    AI_MEMORY_MAX_MESSAGES: int = Field(default=50)
+    AI_MEMORY_COMPACT_AFTER: int = Field(default=30)
+    AI_MEMORY_KEEP_RECENT: int = Field(default=10)
+    AI_MEMORY_SUMMARY_TOKENS: int = Field(default=200)
+    AI_HISTORY_TOKEN_BUDGET: int = Field(default=400)
+    # RAG-индекс: размер пакета эмбеддингов, нарезка длинных документов (символы),
+    # задержка переиндексации курса после изменений (сек)
+    RAG_EMBED_BATCH_SIZE: int = Field(default=64)
+    RAG_CHUNK_SIZE: int = Field(default=2000)
+    RAG_CHUNK_OVERLAP: int = Field(default=200)
+    RAG_REINDEX_DELAY: float = Field(default=2.0)
+    # Эмбеддинги: потоки модели, окно сбора запросов в пакет (мс), кэш (записей в памяти, каталог на диске),
+    # файл обученного TF-IDF для запуска без sentence-transformers
+    RAG_EMBEDDING_WORKERS: int = Field(default=1)
+    RAG_EMBEDDING_BATCH_WINDOW_MS: float = Field(default=5.0)
+    RAG_EMBEDDING_CACHE_SIZE: int = Field(default=10000)
+    RAG_EMBEDDING_CACHE_DIR: str = Field(default="")
+    RAG_TFIDF_PATH: str = Field(default="rag_tfidf.pkl")
     SUPABASE_URL: str = Field(default="")
     SUPABASE_KEY: str = Field(default="")
     ENABLE_NOTIFICATIONS: bool = Field(default=True)
     DEADLINE_CHECK_ENABLED: bool = Field(default=False)
     DEADLINE_CHECK_INTERVAL: int = Field(default=3600)
     DEADLINE_NOTIFICATION_DAYS: str = Field(default="[7,3,1]")
+    # Обработка напоминаний
+    REMINDER_BATCH_SIZE: int = Field(default=100)
+    REMINDER_DISPATCH_CONCURRENCY: int = Field(default=10)
+    # Партиционирование notification_log / notification_delivery_attempts
+    NOTIFICATION_LOG_RETENTION_DAYS: int = Field(default=30)
+    NOTIFICATION_PARTITIONS_AHEAD: int = Field(default=3)
+    # Поиск: auto (pg_trgm / tsvector на PostgreSQL) или ilike
+    SEARCH_BACKEND: str = Field(default="auto")
+    # Пагинация: потолок для count=estimate
+    PAGINATION_COUNT_CAP: int = Field(default=10000)
+    # Буферизация просмотров страниц
+    PAGE_VIEW_BUFFER_SIZE: int = Field(default=10000)
+    PAGE_VIEW_FLUSH_BATCH_SIZE: int = Field(default=500)
+    PAGE_VIEW_FLUSH_INTERVAL_MS: int = Field(default=1000)
+    # Публикация API-метрик воркера в Redis (секунды)
+    API_METRICS_PUBLISH_INTERVAL: int = Field(default=15)
+    # Кэш аутентифицированных пользователей (секунды)
+    USER_CACHE_TTL: int = Field(default=30)
+    USER_CACHE_REDIS_TTL: int = Field(default=300)
+    USER_CACHE_REDIS_ENABLED: bool = Field(default=True)
+    USER_CACHE_MAX_SIZE: int = Field(default=10000)
+    # RBAC: кэш записей на курсы и пакетная запись аудита
+    RBAC_ENROLLMENT_CACHE_TTL: int = Field(default=60)
+    RBAC_AUDIT_BATCH_SIZE: int = Field(default=500)
+    RBAC_AUDIT_FLUSH_INTERVAL: float = Field(default=1.0)
     # Canvas REST sync runner
     CANVAS_REST_SYNC_ENABLED: bool = Field(default=False)
     CANVAS_REST_SYNC_INTERVAL: int = Field(default=3600)
@@ -7,6 +7,8 @@ for all API endpoints and system resources.
 
 import logging
 import json
+import time
+import uuid
 from typing import Dict, Any, List, Optional, Set, Tuple, Union
 from datetime import datetime
 from dataclasses import dataclass, asdict
@@ -17,6 +19,8 @@ from fastapi import HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert, update, delete, text, and_, or_
 
+from app.core.batch_buffer import BatchBuffer
+from app.core.config import settings
 from app.models.user import User, UserRole
 from app.db.session import AsyncSessionLocal
 
@@ -113,6 +117,30 @@ class RBACMatrix:
     
     def __init__(self):
         self.permissions_matrix = self._build_permissions_matrix()
+        self._compile()
+    
+    def _compile(self):
+        """Precompile the matrix into dicts for O(1) decisions."""
+        # (role, resource, action, context) -> first matching permission
+        self._decisions: Dict[Tuple[UserRole, ResourceType, Action, ContextType], Permission] = {}
+        # (role, resource, action) -> first permission regardless of context
+        self._first_match: Dict[Tuple[UserRole, ResourceType, Action], Permission] = {}
+        for role, permissions in self.permissions_matrix.items():
+            for permission in permissions:
+                self._decisions.setdefault(
+                    (role, permission.resource_type, permission.action, permission.context_type), permission
+                )
+                self._first_match.setdefault((role, permission.resource_type, permission.action), permission)
+    
+    @staticmethod
+    def normalize_role(role: Union[UserRole, str]) -> Optional[UserRole]:
+        """User.role is stored as a plain string; accept both."""
+        if isinstance(role, UserRole):
+            return role
+        try:
+            return UserRole(role)
+        except ValueError:
+            return None
     
     def _build_permissions_matrix(self) -> Dict[UserRole, List[Permission]]:
         """Build comprehensive permissions matrix for all roles."""
@@ -289,20 +317,17 @@ class RBACMatrix:
     
     def get_role_permissions(self, role: UserRole) -> List[Permission]:
         """Get all permissions for a specific role."""
-        return self.permissions_matrix.get(role, [])
+        return self.permissions_matrix.get(self.normalize_role(role), [])
     
     def has_permission(self, role: UserRole, resource_type: ResourceType, action: Action, 
                       context_type: ContextType = ContextType.GLOBAL) -> bool:
         """Check if a role has a specific permission."""
-        permissions = self.get_role_permissions(role)
-        
-        for permission in permissions:
-            if (permission.resource_type == resource_type and 
-                permission.action == action and 
-                permission.context_type == context_type):
-                return True
-        
-        return False
+        return (self.normalize_role(role), resource_type, action, context_type) in self._decisions
+    
+    def find_permission(self, role: UserRole, resource_type: ResourceType,
+                        action: Action) -> Optional[Permission]:
+        """First permission of the role for (resource, action), any context."""
+        return self._first_match.get((self.normalize_role(role), resource_type, action))
     
     def get_permission_matrix_report(self) -> Dict[str, Any]:
         """Generate a comprehensive permission matrix report."""
@@ -335,6 +360,109 @@ class RBACMatrix:
         return report
 
 
+class EnrollmentCache:
+    """
+    Per-user set of active course enrollments with a short TTL.
+    
+    One query loads all of a user's active course ids; subsequent course
+    checks are set lookups. ``app.crud.enrollment`` invalidates the user on
+    create/update/delete, other workers pick changes up within ``ttl``.
+    """
+    
+    def __init__(self, ttl: int = 60, max_users: int = 10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: Dict[int, Tuple[float, Set[int]]] = {}
+    
+    async def get_course_ids(self, user_id: int) -> Set[int]:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(text("""
+                SELECT course_id FROM enrollments
+                WHERE user_id = :user_id AND status = 'active'
+            """), {"user_id": user_id})
+            course_ids = {row.course_id for row in result.fetchall()}
+        
+        if len(self._entries) >= self.max_users:
+            self._evict_expired()
+        self._entries[user_id] = (time.monotonic() + self.ttl, course_ids)
+        return course_ids
+    
+    async def is_enrolled(self, user_id: int, course_id: int) -> bool:
+        return course_id in await self.get_course_ids(user_id)
+    
+    def invalidate(self, user_id: Optional[int] = None):
+        """Forget one user's enrollments (or everything when user_id is None)."""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+    
+    def _evict_expired(self):
+        now = time.monotonic()
+        for user_id in [u for u, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[user_id]
+        # Still full: drop the oldest half rather than grow without bound
+        if len(self._entries) >= self.max_users:
+            for user_id in list(self._entries)[: len(self._entries) // 2]:
+                del self._entries[user_id]
+
+
+class AuditLogBuffer(BatchBuffer[AuditLogEntry]):
+    """
+    Bounded buffer for RBAC audit entries, flushed in multi-row INSERTs.
+    
+    Permission checks only append here; a background task writes batches every
+    ``flush_interval`` seconds or once ``batch_size`` entries are queued.
+    """
+    
+    def __init__(self, max_size: int = 10000, batch_size: int = 500, flush_interval: float = 1.0):
+        super().__init__(self._store_batch, name="RBAC audit", max_size=max_size,
+                         batch_size=batch_size, flush_interval=flush_interval)
+        self._table_ready = False
+    
+    async def _store_batch(self, batch: List[AuditLogEntry]):
+        async with AsyncSessionLocal() as db:
+            if not self._table_ready:
+                await rbac_service._create_audit_table(db)
+                self._table_ready = True
+            await self._write_batch(db, batch)
+            await db.commit()
+    
+    async def _write_batch(self, db: AsyncSession, batch: List[AuditLogEntry]):
+        columns = (
+            "entry_id", "user_id", "user_role", "resource_type", "resource_id",
+            "action", "access_granted", "reason", "ip_address", "user_agent",
+            "timestamp", "additional_context"
+        )
+        params: Dict[str, Any] = {}
+        rows = []
+        for i, entry in enumerate(batch):
+            rows.append("(" + ", ".join(f":{column}_{i}" for column in columns) + ")")
+            values = asdict(entry)
+            values["additional_context"] = (
+                json.dumps(entry.additional_context) if entry.additional_context else None
+            )
+            for column in columns:
+                params[f"{column}_{i}"] = values[column]
+        
+        await db.execute(text(f"""
+            INSERT INTO rbac_audit_log ({", ".join(columns)})
+            VALUES {", ".join(rows)}
+        """), params)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "written": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
 class RBACService:
     """Service for RBAC enforcement and audit logging."""
     
@@ -344,9 +472,11 @@ class RBACService:
     async def check_permission(self, context: AccessContext) -> Tuple[bool, str]:
         """Check if user has permission for the requested action."""
         try:
+            role = RBACMatrix.normalize_role(context.user.role)
+            
             # Basic role-based check
             has_basic_permission = self.rbac_matrix.has_permission(
-                context.user.role,
+                role,
                 context.resource_type,
                 context.action,
                 ContextType.GLOBAL
@@ -364,7 +494,8 @@ class RBACService:
                     if context.resource_id == str(context.user.id):
                         return True, "Self-access permission granted"
                 
-                return False, f"Permission denied: {context.user.role.value} cannot {context.action.value} {context.resource_type.value}"
+                role_name = role.value if role else str(context.user.role)
+                return False, f"Permission denied: {role_name} cannot {context.action.value} {context.resource_type.value}"
             
             # Check additional conditions
             permission = self._find_matching_permission(context)
@@ -384,37 +515,17 @@ class RBACService:
         if not context.course_id:
             return False
         
+        # Cheap matrix check first: no enrollment lookup if the role can't act here anyway
+        role = RBACMatrix.normalize_role(context.user.role)
+        if not (
+            self.rbac_matrix.has_permission(role, context.resource_type, context.action, ContextType.COURSE) or
+            self.rbac_matrix.has_permission(role, context.resource_type, context.action, ContextType.ENROLLMENT)
+        ):
+            return False
+        
         try:
-            async with AsyncSessionLocal() as db:
-                # Check if user is enrolled in the course
-                enrollment_query = """
-                SELECT 1 FROM enrollments 
-                WHERE user_id = :user_id AND course_id = :course_id 
-                AND status = 'active'
-                """
-                
-                result = await db.execute(text(enrollment_query), {
-                    "user_id": context.user.id,
-                    "course_id": context.course_id
-                })
-                
-                is_enrolled = result.fetchone() is not None
-                
-                if is_enrolled:
-                    # Check if user has course-level permissions
-                    return self.rbac_matrix.has_permission(
-                        context.user.role,
-                        context.resource_type,
-                        context.action,
-                        ContextType.COURSE
-                    ) or self.rbac_matrix.has_permission(
-                        context.user.role,
-                        context.resource_type,
-                        context.action,
-                        ContextType.ENROLLMENT
-                    )
-                
-                return False
+            # Check if user is enrolled in the course (cached per user)
+            return await enrollment_cache.is_enrolled(context.user.id, int(context.course_id))
                 
         except Exception as e:
             logger.error(f"Error checking course permission: {e}")
@@ -422,14 +533,7 @@ class RBACService:
     
     def _find_matching_permission(self, context: AccessContext) -> Optional[Permission]:
         """Find the matching permission for the context."""
-        permissions = self.rbac_matrix.get_role_permissions(context.user.role)
-        
-        for permission in permissions:
-            if (permission.resource_type == context.resource_type and 
-                permission.action == context.action):
-                return permission
-        
-        return None
+        return self.rbac_matrix.find_permission(context.user.role, context.resource_type, context.action)
     
     async def _check_conditions(self, context: AccessContext, conditions: Dict[str, Any]) -> Tuple[bool, str]:
         """Check if permission conditions are met."""
@@ -508,9 +612,9 @@ class RBACService:
                                request: Optional[Request] = None) -> str:
         """Log access attempt for audit purposes."""
         try:
-            import uuid
-            
             entry_id = str(uuid.uuid4())
+            role = RBACMatrix.normalize_role(context.user.role)
+            role_name = role.value if role else str(context.user.role)
             
             # Extract request information
             ip_address = None
@@ -526,7 +630,7 @@ class RBACService:
             audit_entry = AuditLogEntry(
                 entry_id=entry_id,
                 user_id=context.user.id,
-                user_role=context.user.role.value,
+                user_role=role_name,
                 resource_type=context.resource_type.value,
                 resource_id=context.resource_id,
                 action=context.action.value,
@@ -538,14 +642,14 @@ class RBACService:
                 additional_context=context.additional_context
             )
             
-            # Store in database
-            await self._store_audit_log(audit_entry)
+            # Queue for the batched writer (no DB round-trip per decision)
+            audit_log_buffer.enqueue(audit_entry)
             
             # Log to application logger
             log_level = logging.INFO if granted else logging.WARNING
             logger.log(log_level, 
                       f"Access {'granted' if granted else 'denied'}: "
-                      f"user={context.user.id}({context.user.role.value}) "
+                      f"user={context.user.id}({role_name}) "
                       f"action={context.action.value} "
                       f"resource={context.resource_type.value}({context.resource_id}) "
                       f"reason={reason}")
@@ -556,45 +660,6 @@ class RBACService:
             logger.error(f"Error logging access attempt: {e}")
             return ""
     
-    async def _store_audit_log(self, entry: AuditLogEntry):
-        """Store audit log entry in database."""
-        try:
-            async with AsyncSessionLocal() as db:
-                # Create audit table if not exists
-                await self._create_audit_table(db)
-                
-                insert_sql = """
-                INSERT INTO rbac_audit_log (
-                    entry_id, user_id, user_role, resource_type, resource_id,
-                    action, access_granted, reason, ip_address, user_agent,
-                    timestamp, additional_context
-                ) VALUES (
-                    :entry_id, :user_id, :user_role, :resource_type, :resource_id,
-                    :action, :access_granted, :reason, :ip_address, :user_agent,
-                    :timestamp, :additional_context
-                )
-                """
-                
-                await db.execute(text(insert_sql), {
-                    "entry_id": entry.entry_id,
-                    "user_id": entry.user_id,
-                    "user_role": entry.user_role,
-                    "resource_type": entry.resource_type,
-                    "resource_id": entry.resource_id,
-                    "action": entry.action,
-                    "access_granted": entry.access_granted,
-                    "reason": entry.reason,
-                    "ip_address": entry.ip_address,
-                    "user_agent": entry.user_agent,
-                    "timestamp": entry.timestamp,
-                    "additional_context": json.dumps(entry.additional_context) if entry.additional_context else None
-                })
-                
-                await db.commit()
-                
-        except Exception as e:
-            logger.error(f"Error storing audit log: {e}")
-    
     async def _create_audit_table(self, db: AsyncSession):
         """Create RBAC audit log table."""
         create_table_sql = """
@@ -620,7 +685,10 @@ class RBACService:
         CREATE INDEX IF NOT EXISTS idx_rbac_audit_access_granted ON rbac_audit_log(access_granted);
         """
         
-        await db.execute(text(create_table_sql))
+        # asyncpg не принимает несколько команд в одном запросе
+        for statement in create_table_sql.split(";"):
+            if statement.strip():
+                await db.execute(text(statement))
     
     async def get_audit_logs(self, 
                            user_id: Optional[int] = None,
@@ -630,6 +698,9 @@ class RBACService:
                            limit: int = 1000) -> List[Dict[str, Any]]:
         """Retrieve audit logs with filtering."""
         try:
+            # Make entries still sitting in the buffer visible
+            await audit_log_buffer.flush()
+            
             async with AsyncSessionLocal() as db:
                 conditions = ["timestamp >= NOW() - INTERVAL '%s hours'" % hours]
                 params = {}
@@ -728,7 +799,6 @@ def require_permission(resource_type: ResourceType, action: Action,
             )
             
             # Check permission
-            rbac_service = RBACService()
             has_permission, reason = await rbac_service.check_permission(context)
             
             # Log access attempt
@@ -747,5 +817,10 @@ def require_permission(resource_type: ResourceType, action: Action,
     return decorator
 
 
-# Global RBAC service instance
+# Global RBAC service instances
 rbac_service = RBACService()
+enrollment_cache = EnrollmentCache(ttl=settings.RBAC_ENROLLMENT_CACHE_TTL)
+audit_log_buffer = AuditLogBuffer(
+    batch_size=settings.RBAC_AUDIT_BATCH_SIZE,
+    flush_interval=settings.RBAC_AUDIT_FLUSH_INTERVAL
+)
@@ -0,0 +1,142 @@
+"""
+Pluggable text search for list endpoints.
+
+On PostgreSQL each searchable table has a backend matching the indexes created
+by migration ``search_indexes_0001``:
+
+  trigram   - pg_trgm GIN indexes on short text columns (users, courses);
+              substring ILIKE and word similarity both use the index,
+              results are ranked by word_similarity
+  fulltext  - a generated ``search_vector`` tsvector column (assignments,
+              pages, bank_questions: title/text weighted above body/answers),
+              ranked by ts_rank_cd
+
+Anything else (SQLite in tests, unknown tables, SEARCH_BACKEND=ilike) falls
+back to the plain ``ILIKE '%term%'`` OR across fields.
+"""
+
+import logging
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import String, Text, cast, func, literal, literal_column, or_
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration of the generated columns (mixed ru/en content, no stemming)
+FULLTEXT_CONFIG = "simple"
+# pg_trgm needs at least one full trigram for similarity to be meaningful
+MIN_SIMILARITY_TERM_LENGTH = 3
+
+
+class SearchBackendType(str, Enum):
+    """Search backend kinds."""
+    ILIKE = "ilike"
+    TRIGRAM = "trigram"
+    FULLTEXT = "fulltext"
+
+
+@dataclass
+class SearchSpec:
+    """Indexed search configuration of one table."""
+    backend: SearchBackendType
+    fields: List[str]
+    vector_column: str = "search_vector"
+
+
+# Must stay in sync with migrations/versions/*_search_indexes.py
+SEARCH_SPECS: Dict[str, SearchSpec] = {
+    "users": SearchSpec(SearchBackendType.TRIGRAM, ["username"]),
+    "courses": SearchSpec(SearchBackendType.TRIGRAM, ["title", "description"]),
+    "assignments": SearchSpec(SearchBackendType.FULLTEXT, ["title", "description"]),
+    "pages": SearchSpec(SearchBackendType.FULLTEXT, ["title", "body"]),
+    # search_vector also covers options / correct_answers (string values, weight B)
+    "bank_questions": SearchSpec(SearchBackendType.FULLTEXT, ["question_text"]),
+}
+
+
+def session_dialect(session: AsyncSession) -> str:
+    """Dialect name of the session's engine ('' when unbound)."""
+    bind = session.bind
+    return bind.dialect.name if bind is not None else ""
+
+
+def resolve_backend(model_class: Any, dialect_name: str) -> SearchBackendType:
+    """Backend to use for a model on the given dialect."""
+    if settings.SEARCH_BACKEND == SearchBackendType.ILIKE.value or dialect_name != "postgresql":
+        return SearchBackendType.ILIKE
+    spec = SEARCH_SPECS.get(getattr(model_class, "__tablename__", ""))
+    return spec.backend if spec else SearchBackendType.ILIKE
+
+
+def build_search(
+    model_class: Any,
+    term: str,
+    fields: Optional[List[str]],
+    dialect_name: str
+) -> Tuple[Optional[Any], Optional[Any]]:
+    """
+    Build (condition, rank) for a search term.
+
+    ``fields`` defaults to the table's SEARCH_SPECS fields; rank is None for the
+    ILIKE fallback. Returns (None, None) when there is nothing to search.
+    """
+    term = (term or "").strip()
+    spec = SEARCH_SPECS.get(getattr(model_class, "__tablename__", ""))
+    if fields is None:
+        fields = spec.fields if spec else []
+    columns = [getattr(model_class, field) for field in fields if hasattr(model_class, field)]
+    if not term or not columns:
+        return None, None
+
+    backend = resolve_backend(model_class, dialect_name)
+
+    if backend == SearchBackendType.FULLTEXT:
+        vector = literal_column(f"{model_class.__tablename__}.{spec.vector_column}")
+        query = func.websearch_to_tsquery(FULLTEXT_CONFIG, term)
+        return vector.op("@@")(query), func.ts_rank_cd(vector, query)
+
+    pattern = f"%{term}%"
+    if backend == SearchBackendType.TRIGRAM:
+        conditions = [column.ilike(pattern) for column in columns]
+        if len(term) >= MIN_SIMILARITY_TERM_LENGTH:
+            # term <% column: typo-tolerant word match, served by the same GIN index
+            conditions.extend(literal(term).op("<%")(column) for column in columns)
+        similarities = [func.word_similarity(term, column) for column in columns]
+        rank = similarities[0] if len(similarities) == 1 else func.greatest(*similarities)
+        return or_(*conditions), rank
+
+    return or_(*(column.ilike(pattern) for column in columns)), None
+
+
+def apply_search(query, model_class: Any, term: str, dialect_name: str,
+                 fields: Optional[List[str]] = None, order_by_rank: bool = True):
+    """Filter a select() by a search term and, if ranked, order by relevance."""
+    condition, rank = build_search(model_class, term, fields, dialect_name)
+    if condition is None:
+        return query
+    query = query.where(condition)
+    if rank is not None and order_by_rank:
+        query = query.order_by(rank.desc())
+    return query
+
+
+def json_array_contains_any(column: Any, values: List[str], dialect_name: str):
+    """Match rows whose JSON array ``column`` contains any of ``values``.
+
+    On PostgreSQL this is ``column::jsonb ?| array[...]``, which is served by a
+    GIN index on the same ``(column::jsonb)`` expression. Elsewhere the JSON
+    text is matched with LIKE on the quoted value.
+    """
+    values = [str(value) for value in values if value is not None and str(value) != ""]
+    if not values:
+        return None
+    if dialect_name == "postgresql":
+        return cast(column, JSONB).op("?|")(literal(values, ARRAY(Text)))
+    text_column = cast(column, String)
+    return or_(*(text_column.like(f'%"{value}"%') for value in values))
@@ -5,13 +5,14 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_async_session
+from app.db.session import AsyncSessionLocal, get_async_session
 from app.models.user import User, UserRole
 from sqlalchemy.future import select
 import os
 
 # Используем единый источник секрета из настроек, с безопасным fallback
 from app.core.config import settings as app_settings
+from app.core.user_cache import user_identity_cache
 SECRET_KEY = os.getenv("SECRET_KEY", getattr(app_settings, "JWT_SECRET", "supersecretkey"))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 15
@@ -41,25 +42,53 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_session)) -> User:
-    credentials_exception = HTTPException(
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT; raises JWTError if it is invalid or expired."""
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _token_subject(token: str) -> tuple:
+    """Return (username, token version) from a valid token."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    return username, payload.get("ver", 0)
+
+async def _load_user(db: AsyncSession, username: str, version: int) -> User:
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalars().first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    await user_identity_cache.set(username, version, user)
     return user
 
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_session)) -> User:
+    username, version = _token_subject(token)
+    # Кэш идентичности: сессия открыта, но соединение из пула не берётся, пока нет запроса
+    identity = await user_identity_cache.get(username, version)
+    if identity is not None:
+        return user_identity_cache.to_user(identity)
+    return await _load_user(db, username, version)
+
+async def get_current_user_cached(token: str = Depends(oauth2_scheme)) -> User:
+    """Like get_current_user, but opens a DB session only on a cache miss."""
+    username, version = _token_subject(token)
+    identity = await user_identity_cache.get(username, version)
+    if identity is not None:
+        return user_identity_cache.to_user(identity)
+    async with AsyncSessionLocal() as db:
+        return await _load_user(db, username, version)
+
 def require_role(*allowed_roles: UserRole):
     def role_checker(user = Depends(get_current_user)):
         if user.role not in allowed_roles:
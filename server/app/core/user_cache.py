@@ -0,0 +1,149 @@
+"""
+Short-TTL cache of authenticated user identities.
+
+Dashboard pages fan out into many API calls that all resolve the same bearer
+token to the same user. ``get_current_user`` checks this cache before touching
+the database: an in-process LRU first, then (optionally) Redis so that workers
+share warm entries. Entries are keyed by token subject and token version
+(``ver`` claim, 0 when absent) and hold only id / username / role, never
+password hashes.
+
+Role changes and deletions go through ``app.crud.user``, which calls
+``invalidate``: Redis entries are removed immediately, other workers' local
+entries expire within ``local_ttl`` seconds.
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserIdentityCache:
+    """In-process LRU with optional Redis second level."""
+
+    def __init__(self, max_size: int = 10000, local_ttl: int = 30,
+                 redis_ttl: int = 300, use_redis: bool = True,
+                 redis_retry_after: int = 30):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.use_redis = use_redis
+        self.redis_retry_after = redis_retry_after
+        self.key_prefix = "auth:user:"
+        self._local: "OrderedDict[Tuple[str, int], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._redis_disabled_until = 0.0
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _redis(self):
+        if not self.use_redis or time.monotonic() < self._redis_disabled_until:
+            return None
+        from app.services.redis_service import redis_service
+        return redis_service.get_client()
+
+    def _redis_failed(self, e: Exception):
+        # Не дёргаем недоступный Redis на каждом запросе
+        self._redis_disabled_until = time.monotonic() + self.redis_retry_after
+        logger.warning(f"User cache: Redis unavailable, using local cache only: {e}")
+
+    def get_local(self, subject: str, version: int = 0) -> Optional[Dict[str, Any]]:
+        """Local lookup only (no I/O)."""
+        key = (subject, version)
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, identity = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return identity
+
+    def _set_local(self, subject: str, version: int, identity: Dict[str, Any]):
+        key = (subject, version)
+        self._local[key] = (time.monotonic() + self.local_ttl, identity)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def get(self, subject: str, version: int = 0) -> Optional[Dict[str, Any]]:
+        """Look up an identity: local LRU, then Redis."""
+        identity = self.get_local(subject, version)
+        if identity is not None:
+            self.hits += 1
+            return identity
+
+        client = self._redis()
+        if client is not None:
+            try:
+                raw = await client.hget(f"{self.key_prefix}{subject}", str(version))
+                if raw:
+                    identity = json.loads(raw)
+                    self._set_local(subject, version, identity)
+                    self.redis_hits += 1
+                    return identity
+            except Exception as e:
+                self._redis_failed(e)
+
+        self.misses += 1
+        return None
+
+    async def set(self, subject: str, version: int, user: User):
+        """Cache the identity of a user loaded from the database."""
+        identity = {"id": user.id, "username": user.username, "role": user.role}
+        self._set_local(subject, version, identity)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                key = f"{self.key_prefix}{subject}"
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.hset(key, str(version), json.dumps(identity))
+                    pipe.expire(key, self.redis_ttl)
+                    await pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+
+    async def invalidate(self, subject: str):
+        """Drop all cached versions of a subject (role change, deletion)."""
+        for key in [k for k in self._local if k[0] == subject]:
+            del self._local[key]
+
+        client = self._redis()
+        if client is not None:
+            try:
+                await client.delete(f"{self.key_prefix}{subject}")
+            except Exception as e:
+                self._redis_failed(e)
+
+    @staticmethod
+    def to_user(identity: Dict[str, Any]) -> User:
+        """Build a detached User carrying the cached identity fields."""
+        return User(id=identity["id"], username=identity["username"], role=identity["role"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "local_entries": len(self._local),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_enabled": self.use_redis and time.monotonic() >= self._redis_disabled_until
+        }
+
+
+# Global cache instance
+user_identity_cache = UserIdentityCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    local_ttl=settings.USER_CACHE_TTL,
+    redis_ttl=settings.USER_CACHE_REDIS_TTL,
+    use_redis=settings.USER_CACHE_REDIS_ENABLED
+)
@@ -6,6 +6,7 @@ from sqlalchemy import and_, select, func
 from fastapi import HTTPException, status
 import logging
 
+from app.core.search import build_search, session_dialect
 from app.models.course import Course
 from app.models.user import User, UserRole
 from app.schemas.course import CourseCreate, CourseUpdate
@@ -28,9 +29,10 @@ async def get_courses(
     db: AsyncSession, 
     skip: int = 0, 
     limit: int = 100,
-    owner_id: Optional[int] = None
+    owner_id: Optional[int] = None,
+    search: Optional[str] = None
 ) -> Tuple[List[Course], int]:
-    """Получить список курсов с пагинацией и фильтрацией."""
+    """Получить список курсов с пагинацией, фильтрацией и поиском по названию/описанию."""
     
     # Базовый запрос
     query = select(Course).options(selectinload(Course.owner))
@@ -41,6 +43,15 @@ async def get_courses(
         query = query.where(Course.owner_id == owner_id)
         count_query = count_query.where(Course.owner_id == owner_id)
     
+    # Поиск: pg_trgm-индексы на PostgreSQL, сортировка по релевантности
+    if search:
+        condition, rank = build_search(Course, search, None, session_dialect(db))
+        if condition is not None:
+            query = query.where(condition)
+            count_query = count_query.where(condition)
+            if rank is not None:
+                query = query.order_by(rank.desc(), Course.id)
+    
     # Получаем общее количество
     total_result = await db.execute(count_query)
     total = total_result.scalar()
@@ -4,6 +4,7 @@ from sqlalchemy.orm import selectinload
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
+from app.core.rbac import enrollment_cache
 from app.models.enrollment import Enrollment, EnrollmentRole, EnrollmentStatus
 from app.models.user import User
 from app.models.course import Course
@@ -37,6 +38,7 @@ class CRUDEnrollment:
         db.add(db_obj)
         await db.commit()
         await db.refresh(db_obj)
+        enrollment_cache.invalidate(db_obj.user_id)
         return db_obj
 
     async def get(self, db: AsyncSession, id: int) -> Optional[Enrollment]:
@@ -176,11 +178,15 @@ class CRUDEnrollment:
             elif update_data["status"] == EnrollmentStatus.dropped:
                 update_data["dropped_at"] = datetime.utcnow()
         
+        previous_user_id = db_obj.user_id
         for field, value in update_data.items():
             setattr(db_obj, field, value)
         
         await db.commit()
         await db.refresh(db_obj)
+        # Статус/курс влияют на курсовые права RBAC
+        enrollment_cache.invalidate(previous_user_id)
+        enrollment_cache.invalidate(db_obj.user_id)
         return db_obj
 
     async def delete(self, db: AsyncSession, *, id: int) -> bool:
@@ -189,8 +195,10 @@ class CRUDEnrollment:
         obj = result.scalar_one_or_none()
         
         if obj:
+            user_id = obj.user_id
             await db.delete(obj)
             await db.commit()
+            enrollment_cache.invalidate(user_id)
             return True
         return False
 
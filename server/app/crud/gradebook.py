@@ -1,7 +1,7 @@
-from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc
-from fastapi import HTTPException, status
+from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, desc, select, insert, update, text, null
+from fastapi import BackgroundTasks, HTTPException, status
 import logging
 
 from app.models.gradebook import GradebookEntry, GradebookHistory, OperationType
@@ -12,6 +12,8 @@ from app.models.student import Student
 from app.schemas.gradebook import (
     GradebookEntryCreate,
     GradebookEntryUpdate,
+    GradebookBulkImport,
+    GradebookBulkResult,
     GradebookStats
 )
 from app.services.notification import NotificationService
@@ -19,12 +21,20 @@ from app.services.notification import NotificationService
 logger = logging.getLogger(__name__)
 
 
+async def send_grade_notification(payload: Dict[str, Any]) -> None:
+    """Отправить подготовленное уведомление об оценках (одна оценка или пакет)."""
+    try:
+        await NotificationService().send_webhook(payload)
+    except Exception as e:
+        logger.error(f"Ошибка отправки уведомления об оценках: {str(e)}")
+
+
 class CRUDGradebook:
-    """CRUD операции для электронного журнала."""
+    """CRUD операции для электронного журнала (AsyncSession)."""
 
-    def get_entries(
+    async def get_entries(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         course_id: Optional[int] = None,
         student_id: Optional[int] = None,
@@ -33,7 +43,7 @@ class CRUDGradebook:
         limit: int = 100
     ) -> List[GradebookEntry]:
         """Получить список записей журнала с фильтрацией.
-        
+
         Args:
             db: Сессия базы данных
             course_id: ID курса для фильтрации
@@ -41,101 +51,104 @@ class CRUDGradebook:
             assignment_id: ID задания для фильтрации
             skip: Количество записей для пропуска
             limit: Максимальное количество записей
-            
+
         Returns:
             Список записей журнала
         """
-        query = db.query(GradebookEntry)
-        
+        query = select(GradebookEntry)
+
         # Применяем фильтры
         if course_id is not None:
-            query = query.filter(GradebookEntry.course_id == course_id)
+            query = query.where(GradebookEntry.course_id == course_id)
         if student_id is not None:
-            query = query.filter(GradebookEntry.student_id == student_id)
+            query = query.where(GradebookEntry.student_id == student_id)
         if assignment_id is not None:
-            query = query.filter(GradebookEntry.assignment_id == assignment_id)
-            
-        return query.order_by(desc(GradebookEntry.created_at)).offset(skip).limit(limit).all()
+            query = query.where(GradebookEntry.assignment_id == assignment_id)
 
-    def get_entry(self, db: Session, *, entry_id: int) -> Optional[GradebookEntry]:
+        result = await db.execute(
+            query.order_by(desc(GradebookEntry.created_at)).offset(skip).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def get_entry(self, db: AsyncSession, *, entry_id: int) -> Optional[GradebookEntry]:
         """Получить запись журнала по ID.
-        
+
         Args:
             db: Сессия базы данных
             entry_id: ID записи
-            
+
         Returns:
             Запись журнала или None
         """
-        return db.query(GradebookEntry).filter(GradebookEntry.id == entry_id).first()
+        result = await db.execute(select(GradebookEntry).where(GradebookEntry.id == entry_id))
+        return result.scalar_one_or_none()
 
-    def get_entry_by_unique_key(
+    async def get_entry_by_unique_key(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         course_id: int,
         student_id: int,
         assignment_id: Optional[int] = None
     ) -> Optional[GradebookEntry]:
         """Получить запись по уникальному ключу (курс + студент + задание).
-        
+
         Args:
             db: Сессия базы данных
             course_id: ID курса
             student_id: ID студента
             assignment_id: ID задания (может быть None для общих оценок)
-            
+
         Returns:
             Запись журнала или None
         """
-        query = db.query(GradebookEntry).filter(
-            and_(
-                GradebookEntry.course_id == course_id,
-                GradebookEntry.student_id == student_id,
-                GradebookEntry.assignment_id == assignment_id
-            )
+        result = await db.execute(
+            select(GradebookEntry).where(
+                and_(
+                    GradebookEntry.course_id == course_id,
+                    GradebookEntry.student_id == student_id,
+                    GradebookEntry.assignment_id == assignment_id
+                )
+            ).limit(1)
         )
-        return query.first()
+        return result.scalars().first()
 
-    def create_entry(
+    async def create_entry(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         entry_in: GradebookEntryCreate,
-        current_user: User
+        current_user: User,
+        background_tasks: Optional[BackgroundTasks] = None
     ) -> GradebookEntry:
         """Создать новую запись в журнале.
-        
+
         Args:
             db: Сессия базы данных
             entry_in: Данные для создания записи
             current_user: Текущий пользователь
-            
+            background_tasks: Если передан, уведомление уходит после ответа
+
         Returns:
             Созданная запись
-            
+
         Raises:
             HTTPException: При конфликте или ошибке валидации
         """
         # Проверяем права доступа
-        if current_user.role not in ["teacher", "admin"]:
-            logger.warning(f"User {current_user.id} attempted to create gradebook entry without permission")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Недостаточно прав для создания записи в журнале"
-            )
+        self._check_write_permission(current_user, "создания записи в журнале")
 
         # Проверяем существование связанных объектов
-        self._validate_related_objects(db, entry_in)
+        course_title, assignment_title = await self._validate_related_objects(db, entry_in)
 
         # Проверяем на дублирование
-        existing_entry = self.get_entry_by_unique_key(
+        existing_entry = await self.get_entry_by_unique_key(
             db,
             course_id=entry_in.course_id,
             student_id=entry_in.student_id,
             assignment_id=entry_in.assignment_id
         )
-        
+
         if existing_entry:
             logger.warning(f"Duplicate gradebook entry attempted: course={entry_in.course_id}, student={entry_in.student_id}, assignment={entry_in.assignment_id}")
             raise HTTPException(
@@ -143,65 +156,55 @@ class CRUDGradebook:
                 detail="Запись для данного студента и задания уже существует"
             )
 
-        # Создаем запись
+        # Создаем запись и историю в одной транзакции
         db_entry = GradebookEntry(
             **entry_in.model_dump(),
             created_by=current_user.id
         )
-        
         db.add(db_entry)
-        db.commit()
-        db.refresh(db_entry)
-        
-        # Создаем запись в истории
-        self._create_history_entry(
-            db,
-            entry=db_entry,
-            operation=OperationType.create,
-            changed_by=current_user.id
-        )
-        
+        await db.flush()
+        db.add(self._history_entry(db_entry, OperationType.create, current_user.id))
+        await db.commit()
+        await db.refresh(db_entry)
+
         # Отправляем уведомление о новой оценке
-        try:
-            self._send_grade_notification(db, db_entry, current_user, is_new=True)
-        except Exception as e:
-            logger.error(f"Ошибка отправки уведомления о новой оценке {db_entry.id}: {str(e)}")
-        
+        await self._notify(
+            db, [db_entry], current_user, "grade_created",
+            course_title, assignment_title, background_tasks
+        )
+
         logger.info(f"Created gradebook entry {db_entry.id} by user {current_user.id}")
         return db_entry
 
-    def update_entry(
+    async def update_entry(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         entry_id: int,
         entry_in: GradebookEntryUpdate,
-        current_user: User
+        current_user: User,
+        background_tasks: Optional[BackgroundTasks] = None
     ) -> GradebookEntry:
         """Обновить запись в журнале.
-        
+
         Args:
             db: Сессия базы данных
             entry_id: ID записи для обновления
             entry_in: Новые данные
             current_user: Текущий пользователь
-            
+            background_tasks: Если передан, уведомление уходит после ответа
+
         Returns:
             Обновленная запись
-            
+
         Raises:
             HTTPException: При отсутствии записи или недостатке прав
         """
         # Проверяем права доступа
-        if current_user.role not in ["teacher", "admin"]:
-            logger.warning(f"User {current_user.id} attempted to update gradebook entry without permission")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Недостаточно прав для обновления записи в журнале"
-            )
+        self._check_write_permission(current_user, "обновления записи в журнале")
 
         # Получаем существующую запись
-        db_entry = self.get_entry(db, entry_id=entry_id)
+        db_entry = await self.get_entry(db, entry_id=entry_id)
         if not db_entry:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -209,60 +212,46 @@ class CRUDGradebook:
             )
 
         # Обновляем только переданные поля
-        update_data = entry_in.dict(exclude_unset=True)
+        update_data = entry_in.model_dump(exclude_unset=True)
         if not update_data:
             return db_entry
 
         for field, value in update_data.items():
             setattr(db_entry, field, value)
-        
-        db.commit()
-        db.refresh(db_entry)
-        
-        # Создаем запись в истории
-        self._create_history_entry(
-            db,
-            entry=db_entry,
-            operation=OperationType.update,
-            changed_by=current_user.id
-        )
-        
+
+        await db.flush()
+        db.add(self._history_entry(db_entry, OperationType.update, current_user.id))
+        await db.commit()
+        await db.refresh(db_entry)
+
         # Отправляем уведомление об обновлении оценки
-        try:
-            self._send_grade_notification(db, db_entry, current_user, is_new=False)
-        except Exception as e:
-            logger.error(f"Ошибка отправки уведомления об обновлении оценки {db_entry.id}: {str(e)}")
-        
+        await self._notify(db, [db_entry], current_user, "grade_updated", background_tasks=background_tasks)
+
         logger.info(f"Updated gradebook entry {entry_id} by user {current_user.id}")
         return db_entry
 
-    def delete_entry(
+    async def delete_entry(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         entry_id: int,
         current_user: User
     ) -> None:
         """Удалить запись из журнала.
-        
+
         Args:
             db: Сессия базы данных
             entry_id: ID записи для удаления
             current_user: Текущий пользователь
-            
+
         Raises:
             HTTPException: При отсутствии записи или недостатке прав
         """
         # Проверяем права доступа
-        if current_user.role not in ["teacher", "admin"]:
-            logger.warning(f"User {current_user.id} attempted to delete gradebook entry without permission")
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Недостаточно прав для удаления записи из журнала"
-            )
+        self._check_write_permission(current_user, "удаления записи из журнала")
 
         # Получаем существующую запись
-        db_entry = self.get_entry(db, entry_id=entry_id)
+        db_entry = await self.get_entry(db, entry_id=entry_id)
         if not db_entry:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -270,79 +259,212 @@ class CRUDGradebook:
             )
 
         # Создаем запись в истории перед удалением
-        self._create_history_entry(
-            db,
-            entry=db_entry,
-            operation=OperationType.delete,
-            changed_by=current_user.id
-        )
-        
-        db.delete(db_entry)
-        db.commit()
-        
+        db.add(self._history_entry(db_entry, OperationType.delete, current_user.id))
+        await db.flush()
+
+        await db.delete(db_entry)
+        await db.commit()
+
         logger.info(f"Deleted gradebook entry {entry_id} by user {current_user.id}")
 
-    def get_entry_history(
+    async def bulk_upsert(
+        self,
+        db: AsyncSession,
+        *,
+        import_in: GradebookBulkImport,
+        current_user: User,
+        background_tasks: Optional[BackgroundTasks] = None
+    ) -> GradebookBulkResult:
+        """Загрузить оценки целого задания одной транзакцией.
+
+        Число запросов не зависит от числа студентов: проверка курса/задания,
+        проверка студентов, чтение существующих записей, multi-row INSERT
+        новых записей, пакетный UPDATE изменённых, multi-row INSERT истории
+        и одно агрегированное уведомление.
+
+        Args:
+            db: Сессия базы данных
+            import_in: Курс, задание и оценки студентов
+            current_user: Текущий пользователь
+            background_tasks: Если передан, уведомление уходит после ответа
+
+        Returns:
+            Количество созданных, обновлённых и неизменённых записей
+
+        Raises:
+            HTTPException: 403/404 или 422 со списком неизвестных студентов
+        """
+        self._check_write_permission(current_user, "загрузки оценок")
+
+        course_id = import_in.course_id
+        assignment_id = import_in.assignment_id
+        grades = {row.student_id: row for row in import_in.grades}
+
+        course_title, assignment_title = await self._validate_course_and_assignment(db, course_id, assignment_id)
+
+        result = await db.execute(
+            select(User.id).where(and_(User.id.in_(grades.keys()), User.role == "student"))
+        )
+        unknown = sorted(set(grades) - set(result.scalars().all()))
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"message": "Студенты не найдены", "student_ids": unknown}
+            )
+
+        # Параллельные загрузки одного задания выполняются по очереди
+        if db.bind is not None and db.bind.dialect.name == "postgresql":
+            await db.execute(
+                text("SELECT pg_advisory_xact_lock(hashtext('gradebook'), hashtext(:key))"),
+                {"key": f"{course_id}:{assignment_id}"}
+            )
+
+        result = await db.execute(
+            select(GradebookEntry).where(
+                and_(
+                    GradebookEntry.course_id == course_id,
+                    GradebookEntry.assignment_id == assignment_id,
+                    GradebookEntry.student_id.in_(grades.keys())
+                )
+            )
+        )
+        existing = {entry.student_id: entry for entry in result.scalars().all()}
+
+        new_rows = []
+        updated_rows = []
+        updated_students = []
+        history_rows = []
+        unchanged = 0
+        for student_id, row in grades.items():
+            entry = existing.get(student_id)
+            if entry is None:
+                new_rows.append({
+                    "course_id": course_id,
+                    "student_id": student_id,
+                    "assignment_id": assignment_id,
+                    "grade_value": row.grade_value,
+                    "comment": row.comment,
+                    "created_by": current_user.id
+                })
+            elif entry.grade_value != row.grade_value or entry.comment != row.comment:
+                updated_rows.append({"id": entry.id, "grade_value": row.grade_value, "comment": row.comment})
+                updated_students.append(student_id)
+                history_rows.append(self._history_row(
+                    entry.id, course_id, student_id, assignment_id, row.grade_value, row.comment,
+                    OperationType.update, current_user.id
+                ))
+            else:
+                unchanged += 1
+
+        created_ids: Dict[int, int] = {}
+        if new_rows:
+            result = await db.execute(
+                insert(GradebookEntry).returning(GradebookEntry.id, GradebookEntry.student_id),
+                new_rows
+            )
+            created_ids = {row.student_id: row.id for row in result}
+            for student_id, entry_id in created_ids.items():
+                row = grades[student_id]
+                history_rows.append(self._history_row(
+                    entry_id, course_id, student_id, assignment_id, row.grade_value, row.comment,
+                    OperationType.create, current_user.id
+                ))
+
+        if updated_rows:
+            await db.execute(update(GradebookEntry), updated_rows)
+
+        if history_rows:
+            await db.execute(insert(GradebookHistory), history_rows)
+
+        await db.commit()
+
+        changed = [
+            {"entry_id": created_ids[student_id], "student_id": student_id, "operation": "create"}
+            for student_id in created_ids
+        ] + [
+            {"entry_id": row["id"], "student_id": student_id, "operation": "update"}
+            for row, student_id in zip(updated_rows, updated_students)
+        ]
+        if changed:
+            payload = await self._batch_payload(
+                db, changed, grades, import_in, current_user, course_title, assignment_title
+            )
+            await self._dispatch(payload, background_tasks)
+
+        logger.info(
+            f"Bulk gradebook import for course {course_id}, assignment {assignment_id} by user {current_user.id}: "
+            f"{len(created_ids)} created, {len(updated_rows)} updated, {unchanged} unchanged"
+        )
+        return GradebookBulkResult(
+            course_id=course_id,
+            assignment_id=assignment_id,
+            created=len(created_ids),
+            updated=len(updated_rows),
+            unchanged=unchanged,
+            entry_ids=sorted(list(created_ids.values()) + [row["id"] for row in updated_rows])
+        )
+
+    async def get_entry_history(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         entry_id: int,
         skip: int = 0,
         limit: int = 100
     ) -> List[GradebookHistory]:
         """Получить историю изменений записи.
-        
+
         Args:
             db: Сессия базы данных
             entry_id: ID записи
             skip: Количество записей для пропуска
             limit: Максимальное количество записей
-            
+
         Returns:
             Список записей истории
         """
-        return (
-            db.query(GradebookHistory)
-            .filter(GradebookHistory.entry_id == entry_id)
+        result = await db.execute(
+            select(GradebookHistory)
+            .where(GradebookHistory.entry_id == entry_id)
             .order_by(desc(GradebookHistory.changed_at))
             .offset(skip)
             .limit(limit)
-            .all()
         )
+        return list(result.scalars().all())
 
-    def get_stats(
+    async def get_stats(
         self,
-        db: Session,
+        db: AsyncSession,
         *,
         course_id: Optional[int] = None,
         student_id: Optional[int] = None
     ) -> GradebookStats:
         """Получить статистику по оценкам.
-        
+
         Args:
             db: Сессия базы данных
             course_id: ID курса для фильтрации
             student_id: ID студента для фильтрации
-            
+
         Returns:
             Статистика по оценкам
         """
-        query = db.query(GradebookEntry)
-        
-        if course_id is not None:
-            query = query.filter(GradebookEntry.course_id == course_id)
-        if student_id is not None:
-            query = query.filter(GradebookEntry.student_id == student_id)
-        
         # Получаем агрегированные данные
-        stats_query = query.with_entities(
+        query = select(
             func.avg(GradebookEntry.grade_value).label('avg_grade'),
             func.min(GradebookEntry.grade_value).label('min_grade'),
             func.max(GradebookEntry.grade_value).label('max_grade'),
             func.count(GradebookEntry.id).label('total_entries'),
             func.count(GradebookEntry.assignment_id).label('graded_assignments')
-        ).first()
-        
+        )
+
+        if course_id is not None:
+            query = query.where(GradebookEntry.course_id == course_id)
+        if student_id is not None:
+            query = query.where(GradebookEntry.student_id == student_id)
+
+        stats_query = (await db.execute(query)).first()
+
         return GradebookStats(
             average_grade=round(stats_query.avg_grade or 0, 2),
             min_grade=stats_query.min_grade or 0,
@@ -351,134 +473,223 @@ class CRUDGradebook:
             graded_assignments=stats_query.graded_assignments or 0
         )
 
-    def _validate_related_objects(self, db: Session, entry_in: GradebookEntryCreate) -> None:
+    @staticmethod
+    def _check_write_permission(current_user: User, action: str) -> None:
+        if current_user.role not in ["teacher", "admin"]:
+            logger.warning(f"User {current_user.id} attempted gradebook write without permission")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Недостаточно прав для {action}"
+            )
+
+    async def _validate_course_and_assignment(
+        self,
+        db: AsyncSession,
+        course_id: int,
+        assignment_id: Optional[int]
+    ) -> Tuple[str, Optional[str]]:
+        """Проверить курс и задание одним запросом; вернуть их названия."""
+        if assignment_id is not None:
+            query = select(Course.title, Assignment.title.label("assignment_title")).outerjoin(
+                Assignment, and_(Assignment.id == assignment_id, Assignment.course_id == Course.id)
+            )
+        else:
+            query = select(Course.title, null().label("assignment_title"))
+        row = (await db.execute(query.where(Course.id == course_id))).first()
+
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Курс не найден"
+            )
+        if assignment_id is not None and row.assignment_title is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Задание не найдено или не принадлежит указанному курсу"
+            )
+        return row.title, row.assignment_title
+
+    async def _validate_related_objects(
+        self,
+        db: AsyncSession,
+        entry_in: GradebookEntryCreate
+    ) -> Tuple[str, Optional[str]]:
         """Валидация связанных объектов.
-        
+
         Args:
             db: Сессия базы данных
             entry_in: Данные записи для валидации
-            
+
+        Returns:
+            Названия курса и задания (для уведомления)
+
         Raises:
             HTTPException: При отсутствии связанных объектов
         """
-        # Проверяем курс
-        course = db.query(Course).filter(Course.id == entry_in.course_id).first()
-        if not course:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Курс не найден"
-            )
-        
+        # Проверяем курс и задание (если указано)
+        titles = await self._validate_course_and_assignment(db, entry_in.course_id, entry_in.assignment_id)
+
         # Проверяем студента
-        student = db.query(User).filter(
-            and_(User.id == entry_in.student_id, User.role == "student")
-        ).first()
-        if not student:
+        result = await db.execute(
+            select(User.id).where(and_(User.id == entry_in.student_id, User.role == "student"))
+        )
+        if result.scalar_one_or_none() is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Студент не найден"
             )
-        
-        # Проверяем задание (если указано)
-        if entry_in.assignment_id is not None:
-            assignment = db.query(Assignment).filter(
-                and_(
-                    Assignment.id == entry_in.assignment_id,
-                    Assignment.course_id == entry_in.course_id
-                )
-            ).first()
-            if not assignment:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Задание не найдено или не принадлежит указанному курсу"
-                )
+        return titles
+
+    @staticmethod
+    def _history_row(
+        entry_id: int,
+        course_id: int,
+        student_id: int,
+        assignment_id: Optional[int],
+        grade_value: float,
+        comment: Optional[str],
+        operation: OperationType,
+        changed_by: int
+    ) -> Dict[str, Any]:
+        return {
+            "entry_id": entry_id,
+            "course_id": course_id,
+            "student_id": student_id,
+            "assignment_id": assignment_id,
+            "grade_value": grade_value,
+            "comment": comment,
+            "operation": operation,
+            "changed_by": changed_by
+        }
 
-    def _create_history_entry(
+    def _history_entry(
         self,
-        db: Session,
-        *,
         entry: GradebookEntry,
         operation: OperationType,
         changed_by: int
-    ) -> None:
-        """Создать запись в истории изменений.
-        
+    ) -> GradebookHistory:
+        """Создать запись в истории изменений (добавляется в текущую транзакцию).
+
         Args:
-            db: Сессия базы данных
             entry: Запись журнала
             operation: Тип операции
             changed_by: ID пользователя, внесшего изменение
         """
-        history_entry = GradebookHistory(
-            entry_id=entry.id,
-            course_id=entry.course_id,
-            student_id=entry.student_id,
-            assignment_id=entry.assignment_id,
-            grade_value=entry.grade_value,
-            comment=entry.comment,
-            operation=operation,
-            changed_by=changed_by
+        return GradebookHistory(**self._history_row(
+            entry.id, entry.course_id, entry.student_id, entry.assignment_id,
+            entry.grade_value, entry.comment, operation, changed_by
+        ))
+
+    async def _student_contacts(self, db: AsyncSession, student_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Имена и логины студентов одним запросом."""
+        result = await db.execute(
+            select(User.id, User.username, Student.full_name)
+            .outerjoin(Student, Student.user_id == User.id)
+            .where(User.id.in_(student_ids))
         )
-        
-        db.add(history_entry)
-        db.commit()
+        return {
+            row.id: {"student_name": row.full_name or row.username, "student_email": row.username}
+            for row in result
+        }
 
-    def _send_grade_notification(
+    async def _notify(
         self,
-        db: Session,
-        entry: GradebookEntry,
+        db: AsyncSession,
+        entries: List[GradebookEntry],
         current_user: User,
-        is_new: bool = True
+        event_type: str,
+        course_title: Optional[str] = None,
+        assignment_title: Optional[str] = None,
+        background_tasks: Optional[BackgroundTasks] = None
     ) -> None:
-        """Отправить уведомление о новой или обновленной оценке.
-        
-        Args:
-            db: Сессия базы данных
-            entry: Запись оценки
-            current_user: Пользователь, создавший/обновивший оценку
-            is_new: True для новой оценки, False для обновления
-        """
+        """Уведомление об одной оценке (формат webhook grade_created / grade_updated)."""
         try:
-            # Получаем информацию о студенте
-            student = db.query(Student).filter(Student.id == entry.student_id).first()
-            if not student:
-                logger.warning(f"Student {entry.student_id} not found for grade notification")
-                return
-            
-            student_user = db.query(User).filter(User.id == student.user_id).first()
-            if not student_user:
-                logger.warning(f"User for student {entry.student_id} not found for grade notification")
-                return
-            
-            # Получаем информацию о курсе и задании
-            course = db.query(Course).filter(Course.id == entry.course_id).first()
-            assignment = db.query(Assignment).filter(Assignment.id == entry.assignment_id).first()
-            
-            # Формируем данные для webhook
-            notification_service = NotificationService()
-            
-            webhook_data = {
-                "event_type": "grade_created" if is_new else "grade_updated",
-                "grade_id": entry.id,
-                "student_name": f"{student.first_name} {student.last_name}",
-                "student_id": student.id,
-                "student_email": student_user.username,
-                "course_name": course.name if course else None,
-                "course_id": entry.course_id,
-                "assignment_title": assignment.title if assignment else None,
-                "assignment_id": entry.assignment_id,
-                "grade_value": entry.grade_value,
-                "comment": entry.comment,
-                "teacher_name": current_user.username,
-                "teacher_id": current_user.id,
-                "channels": ["email"]
-            }
-            
-            notification_service.send_webhook(webhook_data)
-            
+            payload = await self._send_grade_notification_payload(
+                db, entries[0], current_user, event_type, course_title, assignment_title
+            )
+            if payload:
+                await self._dispatch(payload, background_tasks)
         except Exception as e:
-            logger.error(f"Ошибка отправки уведомления о оценке: {str(e)}")
+            logger.error(f"Ошибка отправки уведомления об оценке {entries[0].id}: {str(e)}")
+
+    async def _send_grade_notification_payload(
+        self,
+        db: AsyncSession,
+        entry: GradebookEntry,
+        current_user: User,
+        event_type: str,
+        course_title: Optional[str],
+        assignment_title: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        contacts = await self._student_contacts(db, [entry.student_id])
+        contact = contacts.get(entry.student_id)
+        if not contact:
+            logger.warning(f"Student {entry.student_id} not found for grade notification")
+            return None
+
+        if course_title is None:
+            course_title, assignment_title = await self._validate_course_and_assignment(
+                db, entry.course_id, entry.assignment_id
+            )
+
+        return {
+            "event_type": event_type,
+            "grade_id": entry.id,
+            "student_name": contact["student_name"],
+            "student_id": entry.student_id,
+            "student_email": contact["student_email"],
+            "course_name": course_title,
+            "course_id": entry.course_id,
+            "assignment_title": assignment_title,
+            "assignment_id": entry.assignment_id,
+            "grade_value": entry.grade_value,
+            "comment": entry.comment,
+            "teacher_name": current_user.username,
+            "teacher_id": current_user.id,
+            "channels": ["email"]
+        }
+
+    async def _batch_payload(
+        self,
+        db: AsyncSession,
+        changed: List[Dict[str, Any]],
+        grades: Dict[int, Any],
+        import_in: GradebookBulkImport,
+        current_user: User,
+        course_title: str,
+        assignment_title: Optional[str]
+    ) -> Dict[str, Any]:
+        """Одно агрегированное уведомление на всю загрузку."""
+        contacts = await self._student_contacts(db, [item["student_id"] for item in changed])
+        return {
+            "event_type": "grades_imported",
+            "course_name": course_title,
+            "course_id": import_in.course_id,
+            "assignment_title": assignment_title,
+            "assignment_id": import_in.assignment_id,
+            "teacher_name": current_user.username,
+            "teacher_id": current_user.id,
+            "channels": ["email"],
+            "grades": [
+                {
+                    "grade_id": item["entry_id"],
+                    "operation": item["operation"],
+                    "student_id": item["student_id"],
+                    "grade_value": grades[item["student_id"]].grade_value,
+                    "comment": grades[item["student_id"]].comment,
+                    **contacts.get(item["student_id"], {})
+                }
+                for item in changed
+            ]
+        }
+
+    @staticmethod
+    async def _dispatch(payload: Dict[str, Any], background_tasks: Optional[BackgroundTasks]) -> None:
+        if background_tasks is not None:
+            background_tasks.add_task(send_grade_notification, payload)
+        else:
+            await send_grade_notification(payload)
 
 
 # Создаем экземпляр для использования в роутерах
-gradebook = CRUDGradebook()
\ No newline at end of file
+gradebook = CRUDGradebook()
@@ -1,7 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, update, and_, or_
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from datetime import datetime, timedelta
 import logging
 
@@ -160,6 +160,63 @@ class CRUDReminder:
             return True
         return False
 
+    async def claim_pending_reminders(
+        self,
+        db: AsyncSession,
+        limit: int = 100,
+        exclude_ids: Optional[Iterable[int]] = None
+    ) -> List[ScheduledReminder]:
+        """Захватить пачку готовых напоминаний через SELECT ... FOR UPDATE SKIP LOCKED.
+
+        Строки остаются заблокированными до commit/rollback текущей транзакции,
+        поэтому другие реплики пропускают их и берут следующую пачку.
+        На SQLite блокировка не рендерится и запрос работает как обычный SELECT.
+        """
+        current_time = datetime.now().replace(tzinfo=None)
+        query = (
+            select(ScheduledReminder)
+            .options(selectinload(ScheduledReminder.user))
+            .options(selectinload(ScheduledReminder.schedule))
+            .options(selectinload(ScheduledReminder.assignment))
+            .filter(
+                and_(
+                    ScheduledReminder.is_sent == False,
+                    ScheduledReminder.send_at <= current_time
+                )
+            )
+            .order_by(ScheduledReminder.send_at, ScheduledReminder.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True, of=ScheduledReminder)
+        )
+        excluded = list(exclude_ids or [])
+        if excluded:
+            query = query.filter(ScheduledReminder.id.notin_(excluded))
+
+        result = await db.execute(query)
+        return result.scalars().all()
+
+    async def mark_reminders_sent(
+        self,
+        db: AsyncSession,
+        reminder_ids: List[int],
+        commit: bool = True
+    ) -> int:
+        """Отметить пачку напоминаний как отправленные одним UPDATE"""
+        if not reminder_ids:
+            if commit:
+                await db.commit()
+            return 0
+
+        result = await db.execute(
+            update(ScheduledReminder)
+            .where(ScheduledReminder.id.in_(reminder_ids))
+            .values(is_sent=True, sent_at=datetime.now().replace(tzinfo=None))
+            .execution_options(synchronize_session=False)
+        )
+        if commit:
+            await db.commit()
+        return result.rowcount or 0
+
     def _calculate_send_time(self, target_time: datetime, interval: ReminderInterval) -> datetime:
         """Рассчитать время отправки напоминания"""
         if interval == ReminderInterval.MINUTES_15:
@@ -6,6 +6,8 @@ from sqlalchemy.future import select
 from sqlalchemy import update as sqlalchemy_update, delete as sqlalchemy_delete
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
+from app.core.user_cache import user_identity_cache
+from app.core.search import apply_search, session_dialect
 from typing import List, Optional
 from passlib.context import CryptContext
 
@@ -19,13 +21,17 @@ async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
     result = await db.execute(select(User).where(User.id == user_id))
     return result.scalar_one_or_none()
 
-async def get_all_users(db: AsyncSession) -> List[User]:
+async def get_all_users(db: AsyncSession, search: Optional[str] = None) -> List[User]:
     """
     Получить список всех пользователей.
     :param db: Асинхронная сессия БД
+    :param search: Поиск по логину (pg_trgm на PostgreSQL), результаты по релевантности
     :return: Список объектов User
     """
-    result = await db.execute(select(User))
+    query = select(User)
+    if search:
+        query = apply_search(query, User, search, session_dialect(db))
+    result = await db.execute(query)
     return result.scalars().all()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -63,12 +69,17 @@ async def update_user(db: AsyncSession, user_id: int, user_in: UserUpdate) -> Op
     user = result.scalar_one_or_none()
     if not user:
         return None
+    previous_username = user.username
     update_data = user_in.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(user, key, value)
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    # Роль/логин могли измениться — сбрасываем кэш идентичности
+    await user_identity_cache.invalidate(previous_username)
+    if user.username != previous_username:
+        await user_identity_cache.invalidate(user.username)
     return user
 
 async def delete_user(db: AsyncSession, user_id: int) -> bool:
@@ -82,6 +93,8 @@ async def delete_user(db: AsyncSession, user_id: int) -> bool:
     user = result.scalar_one_or_none()
     if not user:
         return False
+    username = user.username
     await db.delete(user)
     await db.commit()
+    await user_identity_cache.invalidate(username)
     return True
\ No newline at end of file
@@ -5,13 +5,15 @@ Automatically enforces AI usage quotas on relevant endpoints.
 """
 
 import logging
-from typing import Callable, Optional
-from fastapi import Request, Response, HTTPException, status
+from typing import Optional
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
 
+from app.middleware.asgi_utils import buffer_request_body
 from app.services.ai_quota_manager import ai_quota_manager
-from app.models.user import User
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +21,7 @@ logger = logging.getLogger(__name__)
 class AIQuotaMiddleware:
     """Middleware to enforce AI quotas on API endpoints."""
     
-    def __init__(self, app):
+    def __init__(self, app: ASGIApp):
         self.app = app
         # Define which endpoints require quota checking
         self.ai_endpoints = {
@@ -30,26 +32,34 @@ class AIQuotaMiddleware:
             "/api/v1/analytics/predict": "analytics"
         }
     
-    async def __call__(self, request: Request, call_next: Callable):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Process request with quota enforcement."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
         
         # Check if this is an AI endpoint
-        ai_service = self._get_ai_service(request.url.path)
+        ai_service = self._get_ai_service(scope["path"])
         if not ai_service:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
         
         # Get user from request state (set by auth middleware)
+        request = Request(scope)
         user = getattr(request.state, 'user', None)
         if not user:
             # No user context, let auth middleware handle it
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
         
-        # Estimate tokens for the request
+        # Estimate tokens for the request (the body is replayed to the endpoint)
+        receive = await self._cache_request_body(request, receive)
         estimated_tokens = await self._estimate_tokens(request, ai_service)
         
-        # Check quota
-        allowed, usage_stats = await ai_quota_manager.check_quota(
+        # Check quota and reserve this request atomically
+        allowed, usage_stats, reservation = await ai_quota_manager.reserve(
             user_id=user.id,
             user_role=user.role,
             service=ai_service,
@@ -57,37 +67,47 @@ class AIQuotaMiddleware:
         )
         
         if not allowed:
-            return await self._create_quota_exceeded_response(usage_stats)
+            response = await self._create_quota_exceeded_response(usage_stats)
+            await response(scope, receive, send)
+            return
+        
+        response_headers = Headers()
+        body_size = 0
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_headers, body_size
+            if message["type"] == "http.response.start":
+                # Add quota info to response headers
+                headers = MutableHeaders(scope=message)
+                if usage_stats:
+                    headers["X-AI-Quota-Remaining"] = str(usage_stats.remaining_requests)
+                    headers["X-AI-Quota-Reset"] = usage_stats.period_end.isoformat()
+                    if usage_stats.remaining_tokens is not None:
+                        headers["X-AI-Token-Quota-Remaining"] = str(usage_stats.remaining_tokens)
+                response_headers = Headers(raw=message["headers"])
+            elif message["type"] == "http.response.body":
+                # Count streamed bytes instead of buffering the body
+                body_size += len(message.get("body", b""))
+            await send(message)
         
         # Process the request
         try:
-            response = await call_next(request)
-            
-            # Record usage after successful request
-            duration = time.time() - start_time
-            actual_tokens = await self._extract_token_usage(response, ai_service)
-            
-            await ai_quota_manager.record_usage(
-                user_id=user.id,
-                user_role=user.role,
-                service=ai_service,
-                actual_tokens=actual_tokens or estimated_tokens,
-                request_duration=duration
-            )
-            
-            # Add quota info to response headers
-            if usage_stats:
-                response.headers["X-AI-Quota-Remaining"] = str(usage_stats.remaining_requests)
-                response.headers["X-AI-Quota-Reset"] = usage_stats.period_end.isoformat()
-                if usage_stats.remaining_tokens is not None:
-                    response.headers["X-AI-Token-Quota-Remaining"] = str(usage_stats.remaining_tokens)
-            
-            return response
-            
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             # Don't record usage for failed requests
-            logger.error(f"Error in AI endpoint {request.url.path}: {e}")
+            logger.error(f"Error in AI endpoint {scope['path']}: {e}")
+            await ai_quota_manager.release(reservation)
             raise
+        
+        # Reconcile the reservation with actual usage
+        duration = time.time() - start_time
+        actual_tokens = self._extract_token_usage(response_headers, body_size, ai_service)
+        
+        await ai_quota_manager.commit(
+            reservation,
+            actual_tokens=actual_tokens or estimated_tokens,
+            request_duration=duration
+        )
     
     def _get_ai_service(self, path: str) -> Optional[str]:
         """Determine if path is an AI endpoint and return service name."""
@@ -136,34 +156,30 @@ class AIQuotaMiddleware:
             logger.error(f"Error estimating tokens: {e}")
             return 500  # Default fallback
     
-    async def _get_request_body(self, request: Request) -> Optional[str]:
-        """Safely get request body."""
+    async def _cache_request_body(self, request: Request, receive: Receive) -> Receive:
+        """Read the request body into request.state and return a replaying receive."""
         try:
-            # Check if body has already been read
-            if hasattr(request.state, 'body'):
-                return request.state.body
-            
-            # Read and cache body
-            body = await request.body()
+            body, receive = await buffer_request_body(receive)
             request.state.body = body.decode('utf-8') if body else ""
-            return request.state.body
-            
         except Exception as e:
             logger.error(f"Error reading request body: {e}")
-            return None
+        return receive
+    
+    async def _get_request_body(self, request: Request) -> Optional[str]:
+        """Safely get request body."""
+        return getattr(request.state, 'body', None)
     
-    async def _extract_token_usage(self, response: Response, service: str) -> Optional[int]:
+    def _extract_token_usage(self, headers: Headers, body_size: int, service: str) -> Optional[int]:
         """Extract actual token usage from response."""
         try:
             # Check if response has token usage info in headers
-            token_header = response.headers.get("X-AI-Tokens-Used")
+            token_header = headers.get("X-AI-Tokens-Used")
             if token_header:
                 return int(token_header)
             
-            # If no header, estimate from response body
-            if hasattr(response, 'body'):
-                body_length = len(response.body) if response.body else 0
-                return max(50, body_length // 4)  # Rough estimation
+            # If no header, estimate from response body size
+            if body_size:
+                return max(50, body_size // 4)  # Rough estimation
             
             return None
             
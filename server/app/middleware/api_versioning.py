@@ -4,35 +4,46 @@ API versioning and standardization middleware.
 Handles API versioning, response standardization, and request/response logging.
 """
 
+import asyncio
 import logging
 import json
+import os
+import socket
 import time
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 import uuid
 
-from fastapi import Request, Response, HTTPException, status
+from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.core.api_pagination import APIVersioning, APIResponseBuilder
+from app.core.config import settings
+from app.middleware.asgi_utils import buffer_request_body
+from app.observability.histogram import LatencyHistogram
 
 logger = logging.getLogger(__name__)
 
 
-class APIVersioningMiddleware(BaseHTTPMiddleware):
+class APIVersioningMiddleware:
     """Middleware for API versioning and standardization."""
     
     def __init__(self, app: ASGIApp, default_version: str = "v1"):
-        super().__init__(app)
+        self.app = app
         self.default_version = default_version
         self.api_versioning = APIVersioning()
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Process request and response with versioning and standardization."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
         request_id = str(uuid.uuid4())
+        request = Request(scope)
         
         # Add request ID to request state
         request.state.request_id = request_id
@@ -43,7 +54,7 @@ class APIVersioningMiddleware(BaseHTTPMiddleware):
         
         # Validate API version
         if not self.api_versioning.is_supported_version(api_version):
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content=APIResponseBuilder.error(
                     message=f"Unsupported API version: {api_version}",
@@ -54,26 +65,42 @@ class APIVersioningMiddleware(BaseHTTPMiddleware):
                     }
                 )
             )
+            await response(scope, receive, send)
+            return
+        
+        # Log request (JSON bodies are read once and replayed to the app)
+        body = None
+        if logger.isEnabledFor(logging.INFO) and self._should_log_body(request):
+            body, receive = await buffer_request_body(receive)
+        self._log_request(request, request_id, body)
         
-        # Log request
-        await self._log_request(request, request_id)
+        response_started = False
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                # Process response headers before they go out
+                self._process_response(request, message, start_time, request_id)
+            await send(message)
         
         try:
             # Process request
-            response = await call_next(request)
-            
-            # Process response
-            response = await self._process_response(request, response, start_time, request_id)
-            
-            return response
+            await self.app(scope, receive, send_wrapper)
             
         except HTTPException as e:
+            if response_started:
+                raise
             # Handle HTTP exceptions
-            return await self._handle_http_exception(e, request_id)
+            response = await self._handle_http_exception(e, request_id)
+            await response(scope, receive, send)
             
         except Exception as e:
+            if response_started:
+                raise
             # Handle unexpected exceptions
-            return await self._handle_unexpected_exception(e, request_id)
+            response = await self._handle_unexpected_exception(e, request_id)
+            await response(scope, receive, send)
     
     def _extract_version(self, request: Request) -> str:
         """Extract API version from request."""
@@ -94,8 +121,17 @@ class APIVersioningMiddleware(BaseHTTPMiddleware):
         
         return self.default_version
     
-    async def _log_request(self, request: Request, request_id: str):
+    def _should_log_body(self, request: Request) -> bool:
+        """Only JSON bodies of write requests are logged."""
+        return (
+            request.method in ["POST", "PUT", "PATCH"] and
+            "application/json" in request.headers.get("content-type", "")
+        )
+    
+    def _log_request(self, request: Request, request_id: str, body: Optional[bytes] = None):
         """Log incoming request."""
+        if not logger.isEnabledFor(logging.INFO):
+            return
         try:
             log_data = {
                 "request_id": request_id,
@@ -108,73 +144,60 @@ class APIVersioningMiddleware(BaseHTTPMiddleware):
             }
             
             # Log request body for POST/PUT/PATCH (be careful with sensitive data)
-            if request.method in ["POST", "PUT", "PATCH"]:
-                content_type = request.headers.get("content-type", "")
-                if "application/json" in content_type:
-                    try:
-                        body = await request.body()
-                        if body:
-                            # Don't log sensitive endpoints
-                            sensitive_paths = ["/auth/login", "/auth/register", "/users/password"]
-                            is_sensitive = any(path in request.url.path for path in sensitive_paths)
-                            
-                            if not is_sensitive:
-                                log_data["body"] = json.loads(body.decode())
-                            else:
-                                log_data["body"] = "[REDACTED - SENSITIVE]"
-                    except:
-                        log_data["body"] = "[INVALID JSON]"
+            if body:
+                try:
+                    # Don't log sensitive endpoints
+                    sensitive_paths = ["/auth/login", "/auth/register", "/users/password"]
+                    is_sensitive = any(path in request.url.path for path in sensitive_paths)
+                    
+                    if not is_sensitive:
+                        log_data["body"] = json.loads(body.decode())
+                    else:
+                        log_data["body"] = "[REDACTED - SENSITIVE]"
+                except:
+                    log_data["body"] = "[INVALID JSON]"
             
             logger.info(f"API Request: {json.dumps(log_data)}")
             
         except Exception as e:
             logger.error(f"Error logging request: {e}")
     
-    async def _process_response(self, request: Request, response: Response, 
-                              start_time: float, request_id: str) -> Response:
-        """Process and standardize response."""
+    def _process_response(self, request: Request, message: Message,
+                          start_time: float, request_id: str):
+        """Add standard headers to the response start message and log it."""
         try:
             processing_time = time.time() - start_time
             
             # Add standard headers
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-API-Version"] = request.state.api_version
-            response.headers["X-Processing-Time"] = f"{processing_time:.4f}s"
-            response.headers["X-Timestamp"] = datetime.utcnow().isoformat()
+            headers = MutableHeaders(scope=message)
+            headers["X-Request-ID"] = request_id
+            headers["X-API-Version"] = request.state.api_version
+            headers["X-Processing-Time"] = f"{processing_time:.4f}s"
+            headers["X-Timestamp"] = datetime.utcnow().isoformat()
             
             # Log response
-            await self._log_response(request, response, processing_time, request_id)
-            
-            return response
+            self._log_response(request, message["status"], processing_time, request_id)
             
         except Exception as e:
             logger.error(f"Error processing response: {e}")
-            return response
     
-    async def _log_response(self, request: Request, response: Response, 
-                          processing_time: float, request_id: str):
-        """Log outgoing response."""
+    def _log_response(self, request: Request, status_code: int,
+                      processing_time: float, request_id: str):
+        """Log outgoing response (status and timing; bodies are streamed, not logged)."""
+        log_level = logging.WARNING if status_code >= 400 else logging.INFO
+        if not logger.isEnabledFor(log_level):
+            return
         try:
             log_data = {
                 "request_id": request_id,
                 "method": request.method,
                 "path": request.url.path,
-                "status_code": response.status_code,
+                "status_code": status_code,
                 "processing_time": processing_time,
                 "api_version": request.state.api_version,
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            # Log response body for errors or if explicitly requested
-            if response.status_code >= 400 or request.query_params.get("log_response") == "true":
-                try:
-                    if hasattr(response, 'body') and response.body:
-                        body_text = response.body.decode() if isinstance(response.body, bytes) else str(response.body)
-                        log_data["response_body"] = body_text[:1000]  # Limit size
-                except:
-                    log_data["response_body"] = "[UNABLE TO READ]"
-            
-            log_level = logging.WARNING if response.status_code >= 400 else logging.INFO
             logger.log(log_level, f"API Response: {json.dumps(log_data)}")
             
         except Exception as e:
@@ -239,80 +262,162 @@ class APIVersioningMiddleware(BaseHTTPMiddleware):
             )
 
 
-class ResponseStandardizationMiddleware(BaseHTTPMiddleware):
-    """Middleware for standardizing API responses."""
+class ResponseStandardizationMiddleware:
+    """
+    Middleware for standardizing API responses.
+    
+    Only complete JSON bodies (sent as a single message, i.e. JSONResponse) are
+    rewritten; streamed responses pass through untouched.
+    """
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Standardize API responses."""
-        response = await call_next(request)
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
         
-        # Only process JSON responses from API endpoints
-        if (request.url.path.startswith("/api/") and 
-            isinstance(response, JSONResponse) and 
-            response.status_code < 400):
+        start_message: Optional[Message] = None
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                # Only process JSON responses from API endpoints
+                if (message["status"] < 400 and
+                        headers.get("content-type", "").startswith("application/json")):
+                    start_message = message
+                    return
+                await send(message)
+                return
             
-            try:
-                # Get original response content
-                original_content = json.loads(response.body.decode())
-                
-                # Check if already standardized
-                if not isinstance(original_content, dict) or "success" not in original_content:
-                    # Standardize the response
-                    standardized_content = APIResponseBuilder.success(
-                        data=original_content,
-                        message="Request completed successfully"
-                    )
-                    
-                    # Create new response with standardized content
-                    response = JSONResponse(
-                        content=standardized_content,
-                        status_code=response.status_code,
-                        headers=dict(response.headers)
-                    )
+            if start_message is None:
+                await send(message)
+                return
             
-            except Exception as e:
-                logger.error(f"Error standardizing response: {e}")
+            pending, start_message = start_message, None
+            body = message.get("body", b"")
+            if not message.get("more_body", False):
+                body = self._standardize_body(body)
+                headers = MutableHeaders(scope=pending)
+                headers["content-length"] = str(len(body))
+                message = {**message, "body": body}
+            await send(pending)
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_wrapper)
+    
+    def _standardize_body(self, body: bytes) -> bytes:
+        try:
+            # Get original response content
+            original_content = json.loads(body.decode())
+            
+            # Check if already standardized
+            if isinstance(original_content, dict) and "success" in original_content:
+                return body
+            
+            # Standardize the response
+            standardized_content = APIResponseBuilder.success(
+                data=original_content,
+                message="Request completed successfully"
+            )
+            return JSONResponse(content=standardized_content).body
+        
+        except Exception as e:
+            logger.error(f"Error standardizing response: {e}")
+            return body
+
+
+# Одинаковая раскладка бакетов во всех воркерах — иначе гистограммы не сливаются
+API_LATENCY_HISTOGRAM = {"relative_accuracy": 0.02, "min_value": 0.1, "max_value": 600_000.0}
+API_METRICS_REDIS_PREFIX = "api_metrics:worker:"
+
 
+def _new_latency_histogram() -> LatencyHistogram:
+    return LatencyHistogram(**API_LATENCY_HISTOGRAM)
 
-class APIMetricsMiddleware(BaseHTTPMiddleware):
-    """Middleware for collecting API metrics."""
+
+def _summarize_endpoints(request_count: Dict[str, int], error_count: Dict[str, int],
+                         response_times: Dict[str, LatencyHistogram]) -> Dict[str, Any]:
+    """Build the metrics summary from counters and per-endpoint histograms (ms)."""
+    summary = {
+        "endpoints": {},
+        "total_requests": sum(request_count.values()),
+        "total_errors": sum(error_count.values()),
+        "generated_at": datetime.utcnow().isoformat()
+    }
+    
+    for endpoint, count in request_count.items():
+        histogram = response_times.get(endpoint) or _new_latency_histogram()
+        latency = histogram.summary()
+        
+        def seconds(value: Optional[float]) -> float:
+            return round(value / 1000, 4) if value is not None else 0
+        
+        summary["endpoints"][endpoint] = {
+            "request_count": count,
+            "error_count": error_count.get(endpoint, 0),
+            "avg_response_time": seconds(latency["mean"]),
+            "p50_response_time": seconds(latency["p50"]),
+            "p95_response_time": seconds(latency["p95"]),
+            "p99_response_time": seconds(latency["p99"]),
+            "max_response_time": seconds(latency["max"]),
+            "error_rate": (error_count.get(endpoint, 0) / (count or 1)) * 100
+        }
+    
+    return summary
+
+
+class APIMetricsMiddleware:
+    """
+    Middleware for collecting API metrics.
+    
+    Latencies go into fixed-memory log-bucketed histograms per normalized
+    endpoint (O(1) per request, ~2% relative error on p50/p95/p99). Each
+    worker periodically publishes its snapshot to Redis; see
+    ``get_cluster_api_metrics`` for the merged view.
+    """
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
-        self.request_count = {}
-        self.response_times = {}
-        self.error_count = {}
+        global api_metrics_middleware
+        self.app = app
+        self.request_count: Dict[str, int] = {}
+        self.response_times: Dict[str, LatencyHistogram] = {}
+        self.error_count: Dict[str, int] = {}
+        self.source = f"{socket.gethostname()}:{os.getpid()}"
+        api_metrics_middleware = self
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Collect API metrics."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
         
         # Extract endpoint info
-        endpoint = self._get_endpoint_key(request)
+        endpoint = self._get_endpoint_key(scope["method"], scope["path"])
+        status_code = 500
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
         try:
-            response = await call_next(request)
-            processing_time = time.time() - start_time
-            
+            await self.app(scope, receive, send_wrapper)
+        finally:
             # Update metrics
-            self._update_metrics(endpoint, response.status_code, processing_time)
-            
-            return response
-            
-        except Exception as e:
             processing_time = time.time() - start_time
-            self._update_metrics(endpoint, 500, processing_time)
-            raise
+            self._update_metrics(endpoint, status_code, processing_time)
     
-    def _get_endpoint_key(self, request: Request) -> str:
+    def _get_endpoint_key(self, method: str, path: str) -> str:
         """Generate endpoint key for metrics."""
         # Normalize path by removing IDs
-        path_parts = request.url.path.strip("/").split("/")
+        path_parts = path.strip("/").split("/")
         normalized_parts = []
         
         for part in path_parts:
@@ -322,64 +427,116 @@ class APIMetricsMiddleware(BaseHTTPMiddleware):
                 normalized_parts.append(part)
         
         normalized_path = "/" + "/".join(normalized_parts)
-        return f"{request.method} {normalized_path}"
+        return f"{method} {normalized_path}"
     
     def _update_metrics(self, endpoint: str, status_code: int, processing_time: float):
         """Update endpoint metrics."""
         try:
             # Request count
-            if endpoint not in self.request_count:
-                self.request_count[endpoint] = 0
-            self.request_count[endpoint] += 1
-            
-            # Response times
-            if endpoint not in self.response_times:
-                self.response_times[endpoint] = []
-            self.response_times[endpoint].append(processing_time)
+            self.request_count[endpoint] = self.request_count.get(endpoint, 0) + 1
             
-            # Keep only last 1000 response times
-            if len(self.response_times[endpoint]) > 1000:
-                self.response_times[endpoint] = self.response_times[endpoint][-1000:]
+            # Response times (ms)
+            histogram = self.response_times.get(endpoint)
+            if histogram is None:
+                histogram = self.response_times[endpoint] = _new_latency_histogram()
+            histogram.record(processing_time * 1000)
             
             # Error count
             if status_code >= 400:
-                if endpoint not in self.error_count:
-                    self.error_count[endpoint] = 0
-                self.error_count[endpoint] += 1
+                self.error_count[endpoint] = self.error_count.get(endpoint, 0) + 1
             
         except Exception as e:
             logger.error(f"Error updating metrics: {e}")
     
     def get_metrics_summary(self) -> Dict[str, Any]:
-        """Get metrics summary."""
+        """Get metrics summary for this worker."""
         try:
-            summary = {
-                "endpoints": {},
-                "total_requests": sum(self.request_count.values()),
-                "total_errors": sum(self.error_count.values()),
-                "generated_at": datetime.utcnow().isoformat()
-            }
-            
-            for endpoint in self.request_count.keys():
-                response_times = self.response_times.get(endpoint, [])
-                avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-                
-                summary["endpoints"][endpoint] = {
-                    "request_count": self.request_count.get(endpoint, 0),
-                    "error_count": self.error_count.get(endpoint, 0),
-                    "avg_response_time": round(avg_response_time, 4),
-                    "error_rate": (self.error_count.get(endpoint, 0) / self.request_count.get(endpoint, 1)) * 100
-                }
-            
-            return summary
-            
+            return _summarize_endpoints(self.request_count, self.error_count, self.response_times)
         except Exception as e:
             logger.error(f"Error generating metrics summary: {e}")
             return {"error": str(e)}
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Serializable cumulative snapshot of this worker's metrics."""
+        return {
+            "source": self.source,
+            "endpoints": {
+                endpoint: {
+                    "request_count": count,
+                    "error_count": self.error_count.get(endpoint, 0),
+                    "latency": self.response_times[endpoint].to_dict()
+                }
+                for endpoint, count in self.request_count.items()
+                if endpoint in self.response_times
+            }
+        }
+    
+    async def publish(self, redis_client, ttl: int) -> None:
+        """Write this worker's snapshot to Redis (expires if the worker dies)."""
+        await redis_client.set(
+            f"{API_METRICS_REDIS_PREFIX}{self.source}",
+            json.dumps(self.snapshot()),
+            ex=ttl
+        )
+
+
+def merge_api_metrics_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge worker snapshots into one summary (counters summed, histograms merged)."""
+    request_count: Dict[str, int] = {}
+    error_count: Dict[str, int] = {}
+    response_times: Dict[str, LatencyHistogram] = {}
+    
+    for snapshot in snapshots:
+        for endpoint, data in snapshot.get("endpoints", {}).items():
+            request_count[endpoint] = request_count.get(endpoint, 0) + data.get("request_count", 0)
+            error_count[endpoint] = error_count.get(endpoint, 0) + data.get("error_count", 0)
+            histogram = LatencyHistogram.from_dict(data.get("latency") or {})
+            if endpoint in response_times:
+                response_times[endpoint].merge(histogram)
+            else:
+                response_times[endpoint] = histogram
+    
+    summary = _summarize_endpoints(request_count, error_count, response_times)
+    summary["workers"] = len(snapshots)
+    return summary
+
+
+class APIMetricsPublisher:
+    """Background task publishing this worker's API metrics to Redis."""
+    
+    def __init__(self, interval: int = 15):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        from app.services.redis_service import redis_service
+        
+        while True:
+            await asyncio.sleep(self.interval)
+            if api_metrics_middleware is None:
+                continue
+            try:
+                await api_metrics_middleware.publish(redis_service.get_client(), ttl=self.interval * 3)
+            except Exception as e:
+                logger.error(f"Error publishing API metrics: {e}")
 
 
 # Global middleware instances for metrics access
-api_metrics_middleware = None
+api_metrics_middleware: Optional[APIMetricsMiddleware] = None
+api_metrics_publisher = APIMetricsPublisher(interval=settings.API_METRICS_PUBLISH_INTERVAL)
 
 def get_api_metrics() -> Optional[Dict[str, Any]]:
     """Get current API metrics."""
@@ -387,3 +544,21 @@ def get_api_metrics() -> Optional[Dict[str, Any]]:
     if api_metrics_middleware:
         return api_metrics_middleware.get_metrics_summary()
     return None
+
+
+async def get_cluster_api_metrics(redis_client) -> Optional[Dict[str, Any]]:
+    """Get API metrics merged across all workers that published to Redis."""
+    snapshots = []
+    async for key in redis_client.scan_iter(match=f"{API_METRICS_REDIS_PREFIX}*", count=100):
+        raw = await redis_client.get(key)
+        if raw:
+            snapshots.append(json.loads(raw))
+    
+    # This worker's latest numbers rather than its last published snapshot
+    if api_metrics_middleware is not None:
+        snapshots = [s for s in snapshots if s.get("source") != api_metrics_middleware.source]
+        snapshots.append(api_metrics_middleware.snapshot())
+    
+    if not snapshots:
+        return None
+    return merge_api_metrics_snapshots(snapshots)
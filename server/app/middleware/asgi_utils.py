@@ -0,0 +1,45 @@
+"""
+Helpers for pure ASGI middleware.
+
+BaseHTTPMiddleware runs every layer in its own task and re-streams the response
+through an in-memory channel. The middleware in this package wrap ``send``
+instead, so responses (including StreamingResponse / SSE) pass through as they
+are produced and each layer costs a couple of function calls.
+"""
+
+from typing import Tuple
+
+from starlette.types import Message, Receive
+
+
+async def buffer_request_body(receive: Receive) -> Tuple[bytes, Receive]:
+    """
+    Read the whole request body and return it with a ``receive`` that replays it.
+
+    Only for middleware that really needs the request body (quota estimation,
+    request logging); the downstream app gets the same messages it would have.
+    """
+    chunks = []
+    disconnect: Message = None
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            disconnect = message
+            break
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay() -> Message:
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if disconnect is not None:
+            return disconnect
+        return await receive()
+
+    return body, replay
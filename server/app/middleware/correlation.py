@@ -0,0 +1,46 @@
+"""
+Correlation ID middleware.
+
+Propagates ``X-Request-ID`` (or a generated UUID) through a context variable
+used by the JSON log formatter, the Sentry scope and ``request.state``.
+"""
+
+import contextvars
+import uuid
+
+import sentry_sdk
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+correlation_id_var = contextvars.ContextVar("correlation_id", default=None)
+
+
+class CorrelationIdMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        correlation_id = Headers(scope=scope).get("X-Request-ID") or str(uuid.uuid4())
+        token = correlation_id_var.set(correlation_id)
+        # bind to Sentry scope if available
+        try:
+            with sentry_sdk.configure_scope() as sentry_scope:
+                sentry_scope.set_tag("correlation_id", correlation_id)
+        except Exception:
+            pass
+        # Attach to request state
+        scope.setdefault("state", {})["correlation_id"] = correlation_id
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = correlation_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            correlation_id_var.reset(token)
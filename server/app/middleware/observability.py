@@ -6,10 +6,9 @@ Integrates OpenTelemetry tracing and metrics into the request/response cycle.
 
 import time
 import logging
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.observability.tracing import get_tracer, add_span_attributes
 from app.observability.metrics import get_metrics
@@ -17,20 +16,24 @@ from app.observability.metrics import get_metrics
 logger = logging.getLogger(__name__)
 
 
-class ObservabilityMiddleware(BaseHTTPMiddleware):
+class ObservabilityMiddleware:
     """Middleware for adding observability to all HTTP requests."""
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
         self.tracer = get_tracer()
         self.metrics = get_metrics()
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Process request with observability instrumentation."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
         # Extract request information
-        method = request.method
-        path = request.url.path
+        request = Request(scope)
+        method = scope["method"]
+        path = scope["path"]
         user_agent = request.headers.get("user-agent", "")
         
         # Start timing
@@ -38,7 +41,19 @@ class ObservabilityMiddleware(BaseHTTPMiddleware):
         
         # Initialize response variables
         status_code = 500
-        response = None
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                
+                # Add response attributes to span
+                if self.tracer:
+                    add_span_attributes(
+                        http_status_code=status_code,
+                        http_response_size=Headers(raw=message.get("headers", [])).get("content-length", 0)
+                    )
+            await send(message)
         
         try:
             # Add request attributes to current span
@@ -53,17 +68,7 @@ class ObservabilityMiddleware(BaseHTTPMiddleware):
                 )
             
             # Process request
-            response = await call_next(request)
-            status_code = response.status_code
-            
-            # Add response attributes to span
-            if self.tracer:
-                add_span_attributes(
-                    http_status_code=status_code,
-                    http_response_size=response.headers.get("content-length", 0)
-                )
-            
-            return response
+            await self.app(scope, receive, send_wrapper)
             
         except Exception as e:
             # Record exception in span
@@ -125,33 +130,47 @@ class ObservabilityMiddleware(BaseHTTPMiddleware):
             )
 
 
-class AuthenticationMetricsMiddleware(BaseHTTPMiddleware):
+class AuthenticationMetricsMiddleware:
     """Middleware specifically for tracking authentication metrics."""
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
         self.metrics = get_metrics()
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Track authentication-related metrics."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        path = scope["path"]
         
         # Check if this is an authentication endpoint
         is_auth_endpoint = (
-            request.url.path.startswith("/api/auth/") or
-            request.url.path.startswith("/api/login/") or
-            request.url.path.startswith("/api/logout/")
+            path.startswith("/api/auth/") or
+            path.startswith("/api/login/") or
+            path.startswith("/api/logout/")
         )
         
         if not is_auth_endpoint or not self.metrics:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
         # Process authentication request
-        response = await call_next(request)
+        await self.app(scope, receive, send_wrapper)
         
         # Track authentication metrics
-        if request.url.path.endswith("/token"):
+        if path.endswith("/token"):
             # Login attempt
-            if response.status_code == 200:
+            if status_code == 200:
                 # Successful authentication
                 self.metrics.increment_auth_attempts("success")
                 
@@ -163,17 +182,15 @@ class AuthenticationMetricsMiddleware(BaseHTTPMiddleware):
                 # Failed authentication
                 self.metrics.increment_auth_attempts("failure")
                 self.metrics.auth_failures_total.add(1, {
-                    "reason": "invalid_credentials" if response.status_code == 401 else "other"
+                    "reason": "invalid_credentials" if status_code == 401 else "other"
                 })
         
-        elif request.url.path.endswith("/refresh"):
+        elif path.endswith("/refresh"):
             # Token refresh attempt
-            if response.status_code == 200:
+            if status_code == 200:
                 self.metrics.increment_auth_attempts("refresh_success")
             else:
                 self.metrics.increment_auth_attempts("refresh_failure")
-        
-        return response
 
 
 class DatabaseMetricsMiddleware:
@@ -6,27 +6,26 @@ comprehensive engagement analytics.
 """
 
 import logging
-import asyncio
 import uuid
 from typing import Optional
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from fastapi import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from app.services.attendance_analytics import pageview_service, PageViewType
+from app.services.attendance_analytics import pageview_buffer, PageViewType
 from app.core.security import decode_access_token
+from app.core.user_cache import user_identity_cache
 
 logger = logging.getLogger(__name__)
 
 
-class PageViewTrackingMiddleware(BaseHTTPMiddleware):
+class PageViewTrackingMiddleware:
     """Middleware to automatically track page views for analytics."""
     
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
+        self.app = app
         self.excluded_paths = {
             "/docs", "/redoc", "/openapi.json", "/favicon.ico",
             "/health", "/metrics", "/api/health", "/api/attendance/page-views"
@@ -35,22 +34,30 @@ class PageViewTrackingMiddleware(BaseHTTPMiddleware):
             "/static/", "/assets/", "/api/auth/", "/_next/", "/api/webhooks/"
         }
     
-    async def dispatch(self, request: Request, call_next) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """Process request and track page view if applicable."""
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = datetime.utcnow()
+        status_code = None
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
         # Get response
-        response = await call_next(request)
+        await self.app(scope, receive, send_wrapper)
         
         # Only track successful GET requests
-        if (request.method == "GET" and 
-            response.status_code == 200 and 
-            self._should_track_request(request)):
-            
-            # Track page view asynchronously (don't block response)
-            asyncio.create_task(self._track_page_view(request, start_time))
-        
-        return response
+        if status_code == 200:
+            request = Request(scope)
+            if self._should_track_request(request):
+                # Enqueue into the page view buffer (no DB work on the request path)
+                self._track_page_view(request, start_time)
     
     def _should_track_request(self, request: Request) -> bool:
         """Determine if this request should be tracked."""
@@ -80,11 +87,11 @@ class PageViewTrackingMiddleware(BaseHTTPMiddleware):
         
         return any(path.startswith(prefix) for prefix in user_facing_api_prefixes)
     
-    async def _track_page_view(self, request: Request, start_time: datetime):
-        """Track the page view asynchronously."""
+    def _track_page_view(self, request: Request, start_time: datetime):
+        """Queue the page view for the background flusher."""
         try:
-            # Get user ID from token
-            user_id = await self._get_user_id_from_request(request)
+            # Get user ID from token (decoded once, here)
+            user_id = self._get_user_id_from_request(request)
             if not user_id:
                 return
             
@@ -98,8 +105,8 @@ class PageViewTrackingMiddleware(BaseHTTPMiddleware):
             # Get or generate session ID
             session_id = self._get_session_id(request)
             
-            # Record page view
-            await pageview_service.record_page_view(
+            # Buffer page view; dropped (and counted) if the buffer is full
+            pageview_buffer.enqueue(
                 user_id=user_id,
                 course_id=page_info["course_id"],
                 page_type=page_info["page_type"],
@@ -117,7 +124,7 @@ class PageViewTrackingMiddleware(BaseHTTPMiddleware):
             # Log error but don't fail the request
             logger.error(f"Error tracking page view: {e}")
     
-    async def _get_user_id_from_request(self, request: Request) -> Optional[int]:
+    def _get_user_id_from_request(self, request: Request) -> Optional[int]:
         """Extract user ID from JWT token in request."""
         try:
             # Get token from Authorization header
@@ -127,7 +134,11 @@ class PageViewTrackingMiddleware(BaseHTTPMiddleware):
             
             token = auth_header.replace("Bearer ", "")
             payload = decode_access_token(token)
-            return payload.get("sub")  # user ID
+            
+            # Token subject is the username; the endpoint has just resolved it
+            # through get_current_user, so the identity cache is warm (no I/O here)
+            identity = user_identity_cache.get_local(payload.get("sub"), payload.get("ver", 0))
+            return identity["id"] if identity else None
             
         except Exception:
             return None
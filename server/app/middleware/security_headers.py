@@ -1,11 +1,11 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from typing import Optional
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     def __init__(self, app: ASGIApp, csp: Optional[str] = None) -> None:
-        super().__init__(app)
+        self.app = app
         self.csp = csp or (
             "default-src 'self'; "
             "img-src 'self' data:; "
@@ -15,19 +15,29 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             "connect-src 'self' http://localhost:8000 http://127.0.0.1:8000 http://localhost:5173 http://127.0.0.1:5173; "
             "frame-ancestors 'none'"
         )
-
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
         # Basic security headers
-        response.headers.setdefault('X-Content-Type-Options', 'nosniff')
-        response.headers.setdefault('X-Frame-Options', 'DENY')
-        response.headers.setdefault('Referrer-Policy', 'no-referrer')
-        response.headers.setdefault('Permissions-Policy', 'geolocation=(), microphone=(), camera=()')
-        response.headers.setdefault('Cross-Origin-Opener-Policy', 'same-origin')
-        response.headers.setdefault('Cross-Origin-Resource-Policy', 'same-site')
-        response.headers.setdefault('Cross-Origin-Embedder-Policy', 'require-corp')
+        self.headers = [
+            ('X-Content-Type-Options', 'nosniff'),
+            ('X-Frame-Options', 'DENY'),
+            ('Referrer-Policy', 'no-referrer'),
+            ('Permissions-Policy', 'geolocation=(), microphone=(), camera=()'),
+            ('Cross-Origin-Opener-Policy', 'same-origin'),
+            ('Cross-Origin-Resource-Policy', 'same-site'),
+            ('Cross-Origin-Embedder-Policy', 'require-corp'),
+        ]
         if self.csp:
-            response.headers.setdefault('Content-Security-Policy', self.csp)
-        return response
+            self.headers.append(('Content-Security-Policy', self.csp))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for name, value in self.headers:
+                    headers.setdefault(name, value)
+            await send(message)
 
+        await self.app(scope, receive, send_wrapper)
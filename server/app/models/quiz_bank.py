@@ -9,6 +9,7 @@ from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Foreign
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from enum import Enum
+import random
 
 from app.db.base_class import Base
 
@@ -100,6 +101,9 @@ class BankQuestion(Base):
     learning_objective = Column(String(255))
     bloom_taxonomy_level = Column(String(50))  # remembering, understanding, applying, etc.
     
+    # Position in a random permutation of the bank, for index-based sampling
+    random_key = Column(Float, default=random.random)
+    
     # Question statistics (calculated from item analysis)
     usage_count = Column(Integer, default=0)
     average_score = Column(Float)
@@ -0,0 +1,144 @@
+"""
+Fixed-memory latency histograms.
+
+Log-bucketed histogram with bounded relative error (DDSketch-style). Recording
+is O(1), memory is fixed by the configured value range, and histograms with the
+same parameters can be merged by adding bucket counts, which makes them safe to
+aggregate across workers, minutes or processes.
+"""
+
+import math
+from typing import Any, Dict, Optional
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of positive values (e.g. latencies in ms)."""
+
+    __slots__ = (
+        "relative_accuracy", "min_value", "max_value",
+        "_gamma", "_log_gamma", "_offset", "counts",
+        "count", "total", "min_seen", "max_seen",
+    )
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.02,
+        min_value: float = 1.0,
+        max_value: float = 3_600_000.0
+    ):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        if not 0 < min_value < max_value:
+            raise ValueError("min_value must be positive and below max_value")
+
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        num_buckets = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.counts = [0] * num_buckets
+
+        self.count = 0
+        self.total = 0.0
+        self.min_seen: Optional[float] = None
+        self.max_seen: Optional[float] = None
+
+    def _bucket_index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = math.ceil(math.log(value) / self._log_gamma) - self._offset
+        return min(index, len(self.counts) - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        # Midpoint of (gamma^(i-1), gamma^i], within relative_accuracy of any value in it
+        upper = self._gamma ** (index + self._offset)
+        return 2 * upper / (self._gamma + 1)
+
+    def record(self, value: float, count: int = 1) -> None:
+        """Record a value (O(1))."""
+        if value is None or count <= 0:
+            return
+        value = float(value)
+        self.counts[self._bucket_index(value)] += count
+        self.count += count
+        self.total += value * count
+        if self.min_seen is None or value < self.min_seen:
+            self.min_seen = value
+        if self.max_seen is None or value > self.max_seen:
+            self.max_seen = value
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Merge another histogram with the same parameters into this one."""
+        if len(other.counts) != len(self.counts) or other._offset != self._offset:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total += other.total
+        if other.min_seen is not None and (self.min_seen is None or other.min_seen < self.min_seen):
+            self.min_seen = other.min_seen
+        if other.max_seen is not None and (self.max_seen is None or other.max_seen > self.max_seen):
+            self.max_seen = other.max_seen
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile (0 <= q <= 1); None when empty."""
+        if self.count == 0:
+            return None
+        q = min(max(q, 0.0), 1.0)
+        rank = q * (self.count - 1)
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative > rank:
+                value = self._bucket_value(index)
+                return min(max(value, self.min_seen), self.max_seen)
+        return self.max_seen
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, min/max and p50/p95/p99."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min_seen,
+            "max": self.max_seen,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Sparse serializable representation (JSON/Redis friendly)."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "count": self.count,
+            "total": self.total,
+            "min_seen": self.min_seen,
+            "max_seen": self.max_seen,
+            "buckets": {str(i): c for i, c in enumerate(self.counts) if c},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls(
+            relative_accuracy=data.get("relative_accuracy", 0.02),
+            min_value=data.get("min_value", 1.0),
+            max_value=data.get("max_value", 3_600_000.0),
+        )
+        for index, bucket_count in (data.get("buckets") or {}).items():
+            histogram.counts[int(index)] += int(bucket_count)
+        histogram.count = int(data.get("count", 0))
+        histogram.total = float(data.get("total", 0.0))
+        histogram.min_seen = data.get("min_seen")
+        histogram.max_seen = data.get("max_seen")
+        return histogram
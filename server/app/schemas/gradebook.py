@@ -155,4 +155,62 @@ class GradebookStats(BaseModel):
                 "total_entries": 25,
                 "graded_assignments": 15
             }
-        })
\ No newline at end of file
+        })
+
+class GradebookBulkGrade(BaseModel):
+    """Оценка одного студента в пакетной загрузке."""
+    student_id: int = Field(..., description="ID студента")
+    grade_value: float = Field(..., ge=0, le=100, description="Оценка (0-100)")
+    comment: Optional[str] = Field(None, max_length=1000, description="Комментарий к оценке")
+
+    @field_validator('grade_value')
+    def validate_grade_value(cls, v):
+        """Валидация оценки."""
+        return round(v, 2)
+
+    @field_validator('comment')
+    def validate_comment(cls, v):
+        """Валидация комментария."""
+        if v is not None and len(v.strip()) == 0:
+            return None
+        return v
+
+
+class GradebookBulkImport(BaseModel):
+    """Схема пакетной загрузки оценок по заданию (upsert одной транзакцией)."""
+    course_id: int = Field(..., description="ID курса")
+    assignment_id: Optional[int] = Field(None, description="ID задания (None для общих оценок по курсу)")
+    grades: List[GradebookBulkGrade] = Field(..., min_length=1, max_length=5000, description="Оценки студентов")
+
+    @field_validator('grades')
+    def validate_unique_students(cls, v):
+        """Один студент — одна оценка."""
+        seen, duplicates = set(), set()
+        for grade in v:
+            if grade.student_id in seen:
+                duplicates.add(grade.student_id)
+            seen.add(grade.student_id)
+        if duplicates:
+            raise ValueError(f'Повторяющиеся студенты: {sorted(duplicates)}')
+        return v
+
+    model_config = ConfigDict(json_schema_extra = {
+            "example": {
+                "course_id": 1,
+                "assignment_id": 3,
+                "grades": [
+                    {"student_id": 2, "grade_value": 85.5, "comment": "Хорошо"},
+                    {"student_id": 4, "grade_value": 92.0}
+                ]
+            }
+        })
+
+
+class GradebookBulkResult(BaseModel):
+    """Результат пакетной загрузки оценок."""
+    course_id: int = Field(..., description="ID курса")
+    assignment_id: Optional[int] = Field(None, description="ID задания")
+    created: int = Field(..., description="Создано записей")
+    updated: int = Field(..., description="Обновлено записей")
+    unchanged: int = Field(..., description="Записей без изменений")
+    entry_ids: List[int] = Field(default_factory=list, description="ID созданных и обновлённых записей")
@@ -1,8 +1,15 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, AsyncGenerator
+import asyncio
+import copy
 import json
+import logging
 import re
+import time
+from app.core.config import settings
 from app.services.ai_service import AIService
 
+logger = logging.getLogger(__name__)
+
 
 class FunctionRegistry:
     """
@@ -10,9 +17,16 @@ class FunctionRegistry:
     Implements a simple function calling pattern for Ollama models.
     """
     
-    def __init__(self):
+    def __init__(self, timeout: float = 10.0, max_result_chars: int = 4000,
+                 cache_ttl: int = 30, max_cache_entries: int = 1000):
         self.functions: Dict[str, Dict[str, Any]] = {}
         self.implementations: Dict[str, callable] = {}
+        self.timeout = timeout
+        self.max_result_chars = max_result_chars
+        self.cache_ttl = cache_ttl
+        self.max_cache_entries = max_cache_entries
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.cache_hits = 0
     
     def register(self, name: str, description: str, parameters: Dict[str, Any], implementation: callable):
         """Register a function that can be called by the LLM"""
@@ -59,7 +73,7 @@ class FunctionRegistry:
     
     def extract_function_calls(self, text: str) -> List[Dict[str, Any]]:
         """Extract function calls from LLM response"""
-        pattern = r"```function_call\s*({[^`]*})```"
+        pattern = r"```function_call\s*({[^`]*})\s*```"
         matches = re.findall(pattern, text, re.DOTALL)
         
         calls = []
@@ -73,75 +87,144 @@ class FunctionRegistry:
         
         return calls
     
-    async def execute_function_calls(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Execute the extracted function calls"""
-        results = []
-        
+    def _cache_key(self, name: str, args: Dict[str, Any], scope: Any) -> str:
+        return f"{name}:{json.dumps(args, sort_keys=True, ensure_ascii=False, default=str)}:{scope!r}"
+
+    def _cap(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Limit the serialized size of a tool result so it fits the prompt."""
+        if "result" not in entry:
+            return entry
+        serialized = json.dumps(entry["result"], ensure_ascii=False, default=str)
+        if len(serialized) <= self.max_result_chars:
+            return entry
+        return {**entry, "result": serialized[:self.max_result_chars] + "…", "truncated": True}
+
+    async def _execute_one(self, name: str, args: Dict[str, Any], scope: Any) -> Dict[str, Any]:
+        if name not in self.implementations:
+            return {"name": name, "error": f"Function {name} not found"}
+        if not isinstance(args, dict):
+            return {"name": name, "error": "Arguments must be an object"}
+
+        key = self._cache_key(name, args, scope)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.cache_hits += 1
+            return cached[1]
+
+        try:
+            result = await asyncio.wait_for(self.implementations[name](**args), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"AI tool {name} timed out after {self.timeout}s")
+            return {"name": name, "error": f"Function {name} timed out"}
+        except Exception as e:
+            return {"name": name, "error": str(e)}
+
+        entry = self._cap({"name": name, "result": result})
+        if self.cache_ttl > 0:
+            if len(self._cache) >= self.max_cache_entries:
+                now = time.monotonic()
+                for stale_key in [k for k, (expires_at, _) in self._cache.items() if expires_at <= now]:
+                    del self._cache[stale_key]
+                if len(self._cache) >= self.max_cache_entries:
+                    self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = (time.monotonic() + self.cache_ttl, entry)
+        return entry
+
+    async def execute_function_calls(self, calls: List[Dict[str, Any]], scope: Any = None) -> List[Dict[str, Any]]:
+        """Execute the extracted function calls concurrently.
+
+        Each call is bounded by ``timeout`` and its result by ``max_result_chars``;
+        successful results are memoized per (function, arguments, scope) for
+        ``cache_ttl`` seconds. Identical calls in one batch run once. Callers
+        get their own copies, so mutating a result never touches the cache.
+        """
+        pending: Dict[str, asyncio.Future] = {}
+        tasks = []
         for call in calls:
             name = call.get("name")
             args = call.get("arguments", {})
-            
-            if name in self.implementations:
-                try:
-                    result = await self.implementations[name](**args)
-                    results.append({
-                        "name": name,
-                        "result": result
-                    })
-                except Exception as e:
-                    results.append({
-                        "name": name,
-                        "error": str(e)
-                    })
-            else:
-                results.append({
-                    "name": name,
-                    "error": f"Function {name} not found"
-                })
-        
-        return results
+            key = self._cache_key(name, args, scope) if isinstance(args, dict) else None
+            if key is not None and key in pending:
+                tasks.append(pending[key])
+                continue
+            task = asyncio.ensure_future(self._execute_one(name, args, scope))
+            if key is not None:
+                pending[key] = task
+            tasks.append(task)
+
+        return [copy.deepcopy(entry) for entry in await asyncio.gather(*tasks)]
 
 
 # Создаем глобальный реестр функций
-function_registry = FunctionRegistry()
+function_registry = FunctionRegistry(
+    timeout=settings.AI_TOOL_TIMEOUT,
+    max_result_chars=settings.AI_TOOL_RESULT_MAX_CHARS,
+    cache_ttl=settings.AI_TOOL_CACHE_TTL
+)
 
 
-async def process_function_calls(user_message: str, system_context: str = "") -> str:
+async def _plan_function_calls(service: AIService, user_message: str, system_context: str,
+                               scope: Any = None) -> Tuple[Optional[str], Optional[str]]:
     """
-    Process a user message, extract and execute function calls, and return the final response
+    First pass: ask the model which functions to call and run them.
+
+    Returns (direct_reply, None) when the model answered without function calls,
+    otherwise (None, final_prompt) with the function results for the second pass.
     """
-    service = AIService()
-    
-    # Первый проход: получаем ответ от модели с возможными вызовами функций
     functions_prompt = function_registry.get_functions_prompt()
     prompt = f"{system_context}\n\n{functions_prompt}\n\nВопрос пользователя: {user_message}\n\nОтвет:"
-    
-    response = service.generate_reply(user_message=prompt, user_context="")
-    
+
+    response = await service.generate_reply(user_message=prompt, user_context="")
+
     # Извлекаем вызовы функций
     function_calls = function_registry.extract_function_calls(response)
-    
+
     if not function_calls:
         # Если нет вызовов функций, возвращаем исходный ответ
         # Очищаем от возможных остатков разметки
-        return response.replace("```function_call", "").replace("```", "")
-    
-    # Выполняем вызовы функций
-    results = await function_registry.execute_function_calls(function_calls)
-    
+        return response.replace("```function_call", "").replace("```", ""), None
+
+    # Выполняем вызовы функций (параллельно)
+    results = await function_registry.execute_function_calls(function_calls, scope=scope)
+
     # Формируем контекст с результатами выполнения функций
     results_context = "Результаты выполнения функций:\n"
     for result in results:
         results_context += f"Функция: {result['name']}\n"
         if "result" in result:
-            results_context += f"Результат: {json.dumps(result['result'], ensure_ascii=False)}\n"
+            value = result["result"]
+            if not isinstance(value, str):
+                value = json.dumps(value, ensure_ascii=False, default=str)
+            results_context += f"Результат: {value}\n"
         else:
             results_context += f"Ошибка: {result.get('error', 'Неизвестная ошибка')}\n"
         results_context += "\n"
-    
-    # Второй проход: получаем финальный ответ с учетом результатов выполнения функций
+
     final_prompt = f"{system_context}\n\n{results_context}\n\nИсходный вопрос пользователя: {user_message}\n\nОтвет:"
-    final_response = service.generate_reply(user_message=final_prompt, user_context="")
-    
-    return final_response
+    return None, final_prompt
+
+
+async def process_function_calls(user_message: str, system_context: str = "", scope: Any = None) -> str:
+    """
+    Process a user message, extract and execute function calls, and return the final response
+    """
+    service = AIService()
+    direct_reply, final_prompt = await _plan_function_calls(service, user_message, system_context, scope)
+    if final_prompt is None:
+        return direct_reply
+
+    # Второй проход: получаем финальный ответ с учетом результатов выполнения функций
+    return await service.generate_reply(user_message=final_prompt, user_context="")
+
+
+async def stream_function_calls(user_message: str, system_context: str = "",
+                                scope: Any = None) -> AsyncGenerator[str, None]:
+    """Same as process_function_calls, but the second pass is streamed as it is generated."""
+    service = AIService()
+    direct_reply, final_prompt = await _plan_function_calls(service, user_message, system_context, scope)
+    if final_prompt is None:
+        yield direct_reply
+        return
 
+    async for chunk in service.generate_stream(user_message=final_prompt, user_context=""):
+        yield chunk
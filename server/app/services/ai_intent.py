@@ -80,10 +80,10 @@ def build_intent_prompt(user_message: str) -> str:
     return f"{INTENT_SYSTEM}\n\n{guidance}\n\nТекст запроса:\n{user_message}\n\nОтвет (только JSON):" 
 
 
-def extract_intent(user_message: str) -> Dict[str, Any]:
+async def extract_intent(user_message: str) -> Dict[str, Any]:
     service = AIService()
     prompt = build_intent_prompt(user_message)
-    reply = service.generate_reply(user_message=prompt, user_context="")
+    reply = await service.generate_reply(user_message=prompt, user_context="")
     
     # Очистка ответа от лишнего текста для поиска JSON
     # Ollama иногда добавляет текст до или после JSON
@@ -1,58 +1,225 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import List, Dict, Any
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import redis.asyncio as redis
 
 from app.core.config import settings
+from app.services.ai_service import AIService
 
 
+logger = logging.getLogger(__name__)
+
 _redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 
-class ChatMemoryRepository:
-    """Хранение истории диалога в Redis по пользователю."""
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (~3 символа на токен, как в AIQuotaMiddleware)."""
+    return max(1, (len(text or "") + 2) // 3)
+
+
+def _encode(role: str, content: str) -> str:
+    # Компактная запись: [роль, текст, токены] — токены не пересчитываются при чтении
+    return json.dumps([role, content, estimate_tokens(content)], ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(raw: Any) -> Optional[Dict[str, Any]]:
+    try:
+        item = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(item, list) and len(item) == 3:
+        role, content, tokens = item
+        return {"role": role, "content": content, "tokens": tokens}
+    if isinstance(item, dict):
+        # Старый формат {"role": ..., "content": ...}
+        content = str(item.get("content", ""))
+        return {"role": item.get("role", "user"), "content": content, "tokens": estimate_tokens(content)}
+    return None
+
+
+def _fit_lines(lines: List[Tuple[str, int]], max_tokens: int) -> List[str]:
+    """Строки целиком, от последних к первым, пока помещаются в бюджет."""
+    kept: List[str] = []
+    remaining = max_tokens
+    for line, tokens in reversed(lines):
+        if tokens > remaining:
+            break
+        kept.append(line)
+        remaining -= tokens
+    kept.reverse()
+    return kept
+
+
+def _message_line(message: Dict[str, Any]) -> Tuple[str, int]:
+    role = message.get("role", "user")
+    content = " ".join(str(message.get("content", "")).split())
+    # +2 токена на роль и разделитель
+    return f"{role}: {content}", (message.get("tokens") or estimate_tokens(content)) + 2
+
+
+def build_history_stub(messages: List[Dict[str, Any]], max_tokens: int = 400, summary: str = "") -> str:
+    """Готовит компактный текст истории для промпта в пределах бюджета токенов.
+
+    Сначала краткое содержание (если помещается), затем последние сообщения
+    целиком — сообщения не обрезаются посередине.
+    """
+    budget = max_tokens
+    parts: List[str] = []
+    if summary:
+        summary_line = f"summary: {' '.join(summary.split())}"
+        summary_tokens = estimate_tokens(summary_line)
+        if summary_tokens <= budget:
+            parts.append(summary_line)
+            budget -= summary_tokens
+    parts += _fit_lines([_message_line(m) for m in messages], budget)
+    return "\n".join(parts)
+
+
+async def summarize_messages(previous: str, messages: List[Dict[str, Any]]) -> Optional[str]:
+    """Обновляет краткое содержание диалога через LLM; без LLM — последние реплики в пределах бюджета."""
+    budget = settings.AI_MEMORY_SUMMARY_TOKENS
+    transcript = "\n".join(_message_line(m)[0] for m in messages)
+    service = AIService()
+    if service._not_configured() is None:
+        prompt = (
+            "Обнови краткое содержание диалога пользователя с учебным ассистентом. "
+            "Сохрани факты о пользователе, его цели, вопросы и договорённости; "
+            f"не больше {budget * 3} символов, без вступлений.\n\n"
+            f"Текущее содержание:\n{previous or '—'}\n\nНовые сообщения:\n{transcript}"
+        )
+        try:
+            summary = await service.llm.complete([{"role": "user", "content": prompt}])
+            kept: List[str] = []
+            remaining = budget
+            for line in (summary or "").strip().splitlines():
+                # Модель могла не уложиться в лимит — берём начало целыми строками
+                if estimate_tokens(line) > remaining:
+                    break
+                kept.append(line)
+                remaining -= estimate_tokens(line)
+            if kept:
+                return "\n".join(kept)
+        except Exception as e:
+            logger.warning(f"Chat memory summary failed, keeping recent lines instead: {e}")
+
+    lines = ([(previous, estimate_tokens(previous))] if previous else []) + [_message_line(m) for m in messages]
+    return "\n".join(_fit_lines(lines, budget)) or None
+
+
+Summarizer = Callable[[str, List[Dict[str, Any]]], Awaitable[Optional[str]]]
 
-    def __init__(self, max_messages_per_user: int = 50) -> None:
-        self.max_messages_per_user = max_messages_per_user
+
+class ChatMemoryRepository:
+    """Хранение истории диалога в Redis по пользователю.
+
+    Запись хода — один конвейер RPUSH + LTRIM + EXPIRE; ключи живут ``ttl``
+    секунд с последнего сообщения. Когда сообщений больше ``compact_after``,
+    старые в фоне сворачиваются в краткое содержание, в списке остаются
+    ``keep_recent`` последних — объём работы с Redis на ход не растёт.
+    """
+
+    def __init__(
+        self,
+        max_messages_per_user: Optional[int] = None,
+        ttl: Optional[int] = None,
+        compact_after: Optional[int] = None,
+        keep_recent: Optional[int] = None,
+        client: Optional[redis.Redis] = None,
+        summarizer: Optional[Summarizer] = None,
+    ) -> None:
+        self.max_messages_per_user = max_messages_per_user or settings.AI_MEMORY_MAX_MESSAGES
+        self.ttl = settings.AI_MEMORY_TTL if ttl is None else ttl
+        self.compact_after = compact_after or settings.AI_MEMORY_COMPACT_AFTER
+        self.keep_recent = settings.AI_MEMORY_KEEP_RECENT if keep_recent is None else keep_recent
+        self.client = client or _redis_client
+        self.summarizer = summarizer or summarize_messages
+        self._compacting: Dict[int, asyncio.Task] = {}
 
     @staticmethod
     def _history_key(user_id: int) -> str:
         return f"ai:history:{user_id}"
 
-    async def append_message(self, user_id: int, role: str, content: str) -> None:
-        message_entry = {"role": role, "content": content}
-        key = self._history_key(user_id)
-        await _redis_client.rpush(key, json.dumps(message_entry, ensure_ascii=False))
-        # Обрезаем историю до лимита
-        await _redis_client.ltrim(key, -self.max_messages_per_user, -1)
+    @staticmethod
+    def _summary_key(user_id: int) -> str:
+        return f"ai:history:{user_id}:summary"
 
-    async def get_recent_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+    async def append_messages(self, user_id: int, messages: List[Tuple[str, str]]) -> None:
+        if not messages:
+            return
         key = self._history_key(user_id)
-        raw_items = await _redis_client.lrange(key, -limit, -1)
-        messages: List[Dict[str, Any]] = []
-        for raw in raw_items:
-            try:
-                messages.append(json.loads(raw))
-            except Exception:
-                continue
-        return messages
-
-    async def clear(self, user_id: int) -> None:
-        await _redis_client.delete(self._history_key(user_id))
+        pipe = self.client.pipeline(transaction=False)
+        pipe.rpush(key, *(_encode(role, content) for role, content in messages))
+        # Жёсткий предел на случай, если сжатие не успевает
+        pipe.ltrim(key, -self.max_messages_per_user, -1)
+        if self.ttl:
+            pipe.expire(key, self.ttl)
+            pipe.expire(self._summary_key(user_id), self.ttl)
+        length = (await pipe.execute())[0]
+        if length > self.compact_after:
+            self._schedule_compaction(user_id)
 
+    async def append_message(self, user_id: int, role: str, content: str) -> None:
+        await self.append_messages(user_id, [(role, content)])
 
-def build_history_stub(messages: List[Dict[str, Any]], max_chars: int = 1000) -> str:
-    """Готовит компактный текст истории для промпта с ограничением длины."""
-    parts: List[str] = []
-    for m in messages:
-        role = m.get("role", "user")
-        content = str(m.get("content", "")).replace("\n", " ")
-        parts.append(f"{role}: {content}")
-    text = "\n".join(parts)
-    if len(text) > max_chars:
-        return text[-max_chars:]
-    return text
+    async def append_turn(self, user_id: int, question: str, answer: str) -> None:
+        """Вопрос и ответ одного хода — за один запрос к Redis."""
+        await self.append_messages(user_id, [("user", question), ("assistant", answer)])
 
+    async def get_recent_messages(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
+        raw_items = await self.client.lrange(self._history_key(user_id), -limit, -1)
+        return [m for m in map(_decode, raw_items) if m]
+
+    async def get_history(self, user_id: int, max_tokens: Optional[int] = None) -> str:
+        """Краткое содержание и последние сообщения в пределах бюджета токенов (один запрос к Redis)."""
+        if max_tokens is None:
+            max_tokens = settings.AI_HISTORY_TOKEN_BUDGET
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self._summary_key(user_id))
+        pipe.lrange(self._history_key(user_id), -self.compact_after, -1)
+        summary, raw_items = await pipe.execute()
+        messages = [m for m in map(_decode, raw_items) if m]
+        return build_history_stub(messages, max_tokens=max_tokens, summary=summary or "")
 
+    async def clear(self, user_id: int) -> None:
+        await self.client.delete(self._history_key(user_id), self._summary_key(user_id))
+
+    def _schedule_compaction(self, user_id: int) -> None:
+        task = self._compacting.get(user_id)
+        if task is not None and not task.done():
+            return
+        task = asyncio.create_task(self._compact_safely(user_id))
+        self._compacting[user_id] = task
+        task.add_done_callback(lambda _: self._compacting.pop(user_id, None))
+
+    async def _compact_safely(self, user_id: int) -> None:
+        try:
+            await self.compact(user_id)
+        except Exception as e:
+            logger.error(f"Error compacting chat memory for user {user_id}: {e}")
+
+    async def compact(self, user_id: int) -> bool:
+        """Сворачивает все сообщения, кроме ``keep_recent`` последних, в краткое содержание."""
+        key = self._history_key(user_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self._summary_key(user_id))
+        pipe.lrange(key, 0, -1)
+        summary, raw_items = await pipe.execute()
+
+        count = len(raw_items) - self.keep_recent
+        if count <= 0:
+            return False
+        old_messages = [m for m in map(_decode, raw_items[:count]) if m]
+        new_summary = await self.summarizer(summary or "", old_messages)
+        if not new_summary:
+            return False
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(self._summary_key(user_id), new_summary, ex=self.ttl or None)
+        # Индекс от начала списка: сообщения, добавленные во время сжатия, сохраняются
+        pipe.ltrim(key, count, -1)
+        await pipe.execute()
+        return True
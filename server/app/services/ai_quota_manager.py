@@ -19,6 +19,85 @@ from app.services.redis_service import redis_client
 logger = logging.getLogger(__name__)
 
 
+# Aggregates for get_system_usage_stats live one day past the day they describe
+SYSTEM_STATS_TTL = 2 * 86400
+
+# KEYS[1] = requests key, KEYS[2] = tokens key, KEYS[3] = daily system counters (hash),
+# KEYS[4] = daily set of users with usage
+# ARGV = request limit, token limit (0 = no token quota), estimated tokens,
+# period TTL s, system stats TTL s, service, user id
+# Returns {allowed, requests, tokens}; when allowed the request and the
+# estimated tokens are already counted
+RESERVE_SCRIPT = """
+local request_limit = tonumber(ARGV[1])
+local token_limit = tonumber(ARGV[2])
+local estimated = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local stats_ttl = tonumber(ARGV[5])
+
+local requests = tonumber(redis.call('GET', KEYS[1]) or '0')
+local tokens = tonumber(redis.call('GET', KEYS[2]) or '0')
+
+if requests >= request_limit or (token_limit > 0 and estimated > 0 and tokens + estimated > token_limit) then
+    redis.call('HINCRBY', KEYS[3], 'violations', 1)
+    redis.call('EXPIRE', KEYS[3], stats_ttl)
+    return {0, requests, tokens}
+end
+
+requests = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ttl)
+if estimated > 0 then
+    tokens = redis.call('INCRBY', KEYS[2], estimated)
+    redis.call('EXPIRE', KEYS[2], ttl)
+end
+
+redis.call('HINCRBY', KEYS[3], 'requests', 1)
+redis.call('HINCRBY', KEYS[3], 'service:' .. ARGV[6], 1)
+if estimated > 0 then
+    redis.call('HINCRBY', KEYS[3], 'tokens', estimated)
+end
+redis.call('EXPIRE', KEYS[3], stats_ttl)
+redis.call('SADD', KEYS[4], ARGV[7])
+redis.call('EXPIRE', KEYS[4], stats_ttl)
+return {1, requests, tokens}
+"""
+
+# KEYS[1] = requests key, KEYS[2] = tokens key, KEYS[3] = stats list, KEYS[4] = daily system counters
+# ARGV = request delta (0 on commit, -1 on release), token delta (actual - reserved),
+# period TTL s, stats entry ('' = none), service
+# Counters never go below zero (e.g. after an admin reset between reserve and commit)
+COMMIT_SCRIPT = """
+local request_delta = tonumber(ARGV[1])
+local token_delta = tonumber(ARGV[2])
+local ttl = tonumber(ARGV[3])
+
+local function adjust(key, delta)
+    if delta == 0 then return end
+    local value = tonumber(redis.call('GET', key) or '0') + delta
+    if value < 0 then value = 0 end
+    redis.call('SET', key, value, 'EX', ttl)
+end
+
+adjust(KEYS[1], request_delta)
+adjust(KEYS[2], token_delta)
+
+if request_delta ~= 0 then
+    redis.call('HINCRBY', KEYS[4], 'requests', request_delta)
+    redis.call('HINCRBY', KEYS[4], 'service:' .. ARGV[5], request_delta)
+end
+if token_delta ~= 0 then
+    redis.call('HINCRBY', KEYS[4], 'tokens', token_delta)
+end
+
+if ARGV[4] ~= '' then
+    redis.call('LPUSH', KEYS[3], ARGV[4])
+    redis.call('LTRIM', KEYS[3], 0, 99)
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+return 1
+"""
+
+
 class QuotaPeriod(Enum):
     """Time periods for quota enforcement."""
     HOUR = "hour"
@@ -47,11 +126,26 @@ class UsageStats:
     remaining_tokens: Optional[int] = None
 
 
+@dataclass
+class QuotaReservation:
+    """Request and tokens reserved by ``AIQuotaManager.reserve``, settled after the response."""
+    user_id: int
+    service: str
+    requests_key: str
+    tokens_key: str
+    stats_key: str
+    system_key: str
+    reserved_tokens: int
+    period_end: datetime
+
+
 class AIQuotaManager:
     """Manager for AI service quotas and rate limiting."""
     
     def __init__(self):
         self.redis = redis_client
+        self._reserve_script = self.redis.register_script(RESERVE_SCRIPT)
+        self._commit_script = self.redis.register_script(COMMIT_SCRIPT)
         self.quota_configs = self._load_quota_configs()
         
     def _load_quota_configs(self) -> Dict[UserRole, Dict[str, QuotaConfig]]:
@@ -174,15 +268,33 @@ class AIQuotaManager:
         
         return start, end
     
-    async def check_quota(
+    def _get_quota_config(self, user_role: UserRole, service: str) -> Optional[QuotaConfig]:
+        if user_role not in self.quota_configs:
+            logger.warning(f"No quota config for role {user_role}")
+            return None
+        if service not in self.quota_configs[user_role]:
+            logger.warning(f"No quota config for service {service} and role {user_role}")
+            return None
+        return self.quota_configs[user_role][service]
+    
+    @staticmethod
+    def _system_key(timestamp: datetime) -> str:
+        return f"ai_quota:system:{timestamp.strftime('%Y-%m-%d')}"
+    
+    async def reserve(
         self,
         user_id: int,
         user_role: UserRole,
         service: str,
         estimated_tokens: Optional[int] = None
-    ) -> tuple[bool, Optional[UsageStats]]:
+    ) -> tuple[bool, Optional[UsageStats], Optional[QuotaReservation]]:
         """
-        Check if user can make an AI request within their quota.
+        Atomically check the quota and reserve one request plus estimated tokens.
+        
+        Check and increment happen in one Lua call, so concurrent requests
+        cannot all pass the check before any of them is counted. The
+        reservation must be settled with ``commit`` (actual usage) or
+        ``release`` (request failed).
         
         Args:
             user_id: User ID
@@ -191,138 +303,97 @@ class AIQuotaManager:
             estimated_tokens: Estimated token usage for this request
             
         Returns:
-            Tuple of (allowed, current_usage_stats)
+            Tuple of (allowed, usage_stats, reservation)
         """
+        quota_config = self._get_quota_config(user_role, service)
+        if quota_config is None:
+            return False, None, None
+        
         try:
-            # Get quota config for this role and service
-            if user_role not in self.quota_configs:
-                logger.warning(f"No quota config for role {user_role}")
-                return False, None
-            
-            if service not in self.quota_configs[user_role]:
-                logger.warning(f"No quota config for service {service} and role {user_role}")
-                return False, None
-            
-            quota_config = self.quota_configs[user_role][service]
             now = datetime.utcnow()
             period_key = self._get_period_key(quota_config.period, now)
-            
-            # Redis keys for tracking usage
-            requests_key = f"ai_quota:requests:{user_id}:{service}:{period_key}"
-            tokens_key = f"ai_quota:tokens:{user_id}:{service}:{period_key}"
-            burst_key = f"ai_quota:burst:{user_id}:{service}"
-            
-            # Get current usage
-            pipe = self.redis.pipeline()
-            pipe.get(requests_key)
-            pipe.get(tokens_key)
-            pipe.get(burst_key)
-            results = await pipe.execute()
-            
-            current_requests = int(results[0] or 0)
-            current_tokens = int(results[1] or 0)
-            burst_used = int(results[2] or 0)
-            
-            # Calculate effective limits (including burst allowance)
+            _, period_end = self._get_period_bounds(quota_config.period, now)
+            ttl = max(1, int((period_end - now).total_seconds()))
+            system_key = self._system_key(now)
+            
+            reservation = QuotaReservation(
+                user_id=user_id,
+                service=service,
+                requests_key=f"ai_quota:requests:{user_id}:{service}:{period_key}",
+                tokens_key=f"ai_quota:tokens:{user_id}:{service}:{period_key}",
+                stats_key=f"ai_quota:stats:{user_id}:{service}:{period_key}",
+                system_key=system_key,
+                reserved_tokens=estimated_tokens or 0,
+                period_end=period_end
+            )
+            
+            # Effective limits (including burst allowance)
             effective_request_limit = quota_config.requests_per_period + quota_config.burst_allowance
-            effective_token_limit = (quota_config.tokens_per_period or 0) + (quota_config.burst_allowance * 100)  # Assume 100 tokens per burst request
+            effective_token_limit = 0
+            if quota_config.tokens_per_period:
+                effective_token_limit = quota_config.tokens_per_period + quota_config.burst_allowance * 100  # Assume 100 tokens per burst request
             
-            # Check request quota
-            if current_requests >= effective_request_limit:
-                logger.info(f"Request quota exceeded for user {user_id}, service {service}")
-                return False, self._get_usage_stats(quota_config, now, current_requests, current_tokens)
+            allowed, current_requests, current_tokens = await self._reserve_script(
+                keys=[reservation.requests_key, reservation.tokens_key, system_key, f"{system_key}:users"],
+                args=[effective_request_limit, effective_token_limit, reservation.reserved_tokens,
+                      ttl, SYSTEM_STATS_TTL, service, user_id]
+            )
+            usage_stats = self._get_usage_stats(quota_config, now, int(current_requests), int(current_tokens))
             
-            # Check token quota if specified
-            if quota_config.tokens_per_period and estimated_tokens:
-                if current_tokens + estimated_tokens > effective_token_limit:
-                    logger.info(f"Token quota would be exceeded for user {user_id}, service {service}")
-                    return False, self._get_usage_stats(quota_config, now, current_requests, current_tokens)
+            if not int(allowed):
+                logger.info(f"AI quota exceeded for user {user_id}, service {service}")
+                return False, usage_stats, None
             
-            return True, self._get_usage_stats(quota_config, now, current_requests, current_tokens)
+            return True, usage_stats, reservation
             
         except Exception as e:
-            logger.error(f"Error checking AI quota: {e}")
+            logger.error(f"Error reserving AI quota: {e}")
             # Fail open for availability, but log the error
-            return True, None
+            return True, None, None
     
-    async def record_usage(
+    async def commit(
         self,
-        user_id: int,
-        user_role: UserRole,
-        service: str,
+        reservation: Optional[QuotaReservation],
         actual_tokens: Optional[int] = None,
         request_duration: Optional[float] = None
     ) -> bool:
         """
-        Record actual usage after a successful AI request.
+        Reconcile a reservation with the actual usage of a successful request.
         
-        Args:
-            user_id: User ID
-            user_role: User's role
-            service: AI service name
-            actual_tokens: Actual tokens used
-            request_duration: Request duration in seconds
-            
-        Returns:
-            True if usage recorded successfully
+        The token counter is corrected by ``actual_tokens - reserved_tokens``;
+        the request itself was already counted by ``reserve``.
         """
+        if reservation is None:
+            return False
+        
+        tokens = actual_tokens if actual_tokens is not None else reservation.reserved_tokens
+        stats = json.dumps({
+            "timestamp": datetime.utcnow().isoformat(),
+            "tokens": tokens,
+            "duration": request_duration or 0,
+            "service": reservation.service
+        })
+        return await self._settle(reservation, 0, tokens - reservation.reserved_tokens, stats)
+    
+    async def release(self, reservation: Optional[QuotaReservation]) -> bool:
+        """Give back a reservation of a failed request (usage is not recorded)."""
+        if reservation is None:
+            return False
+        return await self._settle(reservation, -1, -reservation.reserved_tokens, "")
+    
+    async def _settle(self, reservation: QuotaReservation, request_delta: int, token_delta: int, stats: str) -> bool:
         try:
-            if user_role not in self.quota_configs:
-                return False
-            
-            if service not in self.quota_configs[user_role]:
-                return False
-            
-            quota_config = self.quota_configs[user_role][service]
-            now = datetime.utcnow()
-            period_key = self._get_period_key(quota_config.period, now)
-            
-            # Redis keys
-            requests_key = f"ai_quota:requests:{user_id}:{service}:{period_key}"
-            tokens_key = f"ai_quota:tokens:{user_id}:{service}:{period_key}"
-            stats_key = f"ai_quota:stats:{user_id}:{service}:{period_key}"
-            
-            # Calculate TTL for the period
-            _, period_end = self._get_period_bounds(quota_config.period, now)
-            ttl = int((period_end - now).total_seconds())
-            
-            # Update usage counters
-            pipe = self.redis.pipeline()
-            pipe.incr(requests_key)
-            pipe.expire(requests_key, ttl)
-            
-            if actual_tokens:
-                pipe.incrby(tokens_key, actual_tokens)
-                pipe.expire(tokens_key, ttl)
-            
-            # Store detailed stats
-            stats = {
-                "timestamp": now.isoformat(),
-                "tokens": actual_tokens or 0,
-                "duration": request_duration or 0,
-                "service": service
-            }
-            pipe.lpush(stats_key, json.dumps(stats))
-            pipe.ltrim(stats_key, 0, 99)  # Keep last 100 requests
-            pipe.expire(stats_key, ttl)
-            
-            await pipe.execute()
-            
-            # Update burst usage if over normal quota
-            normal_requests_key = f"ai_quota:requests:{user_id}:{service}:{period_key}"
-            current_requests = int(await self.redis.get(normal_requests_key) or 0)
-            
-            if current_requests > quota_config.requests_per_period:
-                burst_key = f"ai_quota:burst:{user_id}:{service}"
-                burst_used = current_requests - quota_config.requests_per_period
-                await self.redis.setex(burst_key, ttl, burst_used)
-            
+            ttl = max(1, int((reservation.period_end - datetime.utcnow()).total_seconds()))
+            await self._commit_script(
+                keys=[reservation.requests_key, reservation.tokens_key, reservation.stats_key, reservation.system_key],
+                args=[request_delta, token_delta, ttl, stats, reservation.service]
+            )
             return True
-            
         except Exception as e:
             logger.error(f"Error recording AI usage: {e}")
             return False
     
+    
     def _get_usage_stats(
         self,
         quota_config: QuotaConfig,
@@ -445,35 +516,37 @@ class AIQuotaManager:
         return config
     
     async def get_system_usage_stats(self) -> Dict[str, Any]:
-        """Get system-wide usage statistics."""
+        """Get system-wide usage statistics for today.
+        
+        Read from the daily counters maintained by ``reserve``/``commit``
+        (two round trips worth of data regardless of the number of users).
+        """
         try:
-            # This would typically aggregate usage across all users
-            # For now, return basic system info
-            stats = {
-                "total_users_with_usage": 0,
-                "total_requests_today": 0,
-                "total_tokens_today": 0,
-                "top_services": [],
-                "quota_violations_today": 0
-            }
-            
-            # Get all quota keys for today
-            now = datetime.utcnow()
-            today_key = now.strftime("%Y-%m-%d")
-            
-            # Scan for quota keys
-            pattern = f"ai_quota:requests:*:*:{today_key}"
-            keys = []
-            async for key in self.redis.scan_iter(match=pattern):
-                keys.append(key)
+            system_key = self._system_key(datetime.utcnow())
             
-            # Aggregate stats
-            if keys:
-                values = await self.redis.mget(keys)
-                stats["total_requests_today"] = sum(int(v or 0) for v in values)
-                stats["total_users_with_usage"] = len([v for v in values if int(v or 0) > 0])
+            pipe = self.redis.pipeline()
+            pipe.hgetall(system_key)
+            pipe.scard(f"{system_key}:users")
+            raw_counters, users = await pipe.execute()
             
-            return stats
+            counters = {
+                (k.decode() if isinstance(k, bytes) else k): int(v)
+                for k, v in (raw_counters or {}).items()
+            }
+            services = sorted(
+                ((name[len("service:"):], value) for name, value in counters.items()
+                 if name.startswith("service:") and value > 0),
+                key=lambda item: item[1],
+                reverse=True
+            )
+            
+            return {
+                "total_users_with_usage": int(users or 0),
+                "total_requests_today": max(0, counters.get("requests", 0)),
+                "total_tokens_today": max(0, counters.get("tokens", 0)),
+                "top_services": [{"service": name, "requests": value} for name, value in services[:5]],
+                "quota_violations_today": counters.get("violations", 0)
+            }
             
         except Exception as e:
             logger.error(f"Error getting system usage stats: {e}")
@@ -0,0 +1,216 @@
+"""
+Semantic response cache for the AI assistant (opt-in, AI_SEMANTIC_CACHE_ENABLED).
+
+Students of one course keep asking the same things in different words. A
+reply is reused when a new question is close enough to a cached one:
+
+- questions are normalized (case, punctuation, whitespace) and embedded with
+  the RAG ``EmbeddingService``; cosine similarity must reach ``threshold``;
+- entries are scoped (role, course, student, scope, language) and shared by
+  users of that scope, so callers must only cache prompts without personal
+  parts (no chat history, username or FrontendContext);
+- every entry remembers the version of the context it was generated from
+  (hash of the gathered analytics summary); when grades or deadlines change,
+  the old answer is dropped instead of served;
+- entries expire after ``ttl`` seconds, the least recently used are evicted
+  beyond ``max_entries``.
+
+Embedding runs in the embedding worker pool; zero vectors (embedding unavailable) are
+never cached or matched.
+"""
+
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+")
+
+Scope = Tuple[Any, ...]
+
+
+def normalize_question(text: str) -> str:
+    text = _PUNCTUATION_RE.sub(" ", (text or "").lower())
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def context_version(context: str) -> str:
+    return hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    scope: Scope
+    question: str
+    embedding: np.ndarray
+    answer: str
+    context_version: str
+    expires_at: float
+
+
+class SemanticResponseCache:
+    """In-process LRU of assistant replies matched by question embedding."""
+
+    def __init__(self, enabled: bool = False, threshold: float = 0.92, ttl: int = 600,
+                 max_entries: int = 5000, embedding_service=None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._embedding_service = embedding_service
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_scope: Dict[Scope, Dict[int, _Entry]] = {}
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def scope(role: Optional[str], course_id: Optional[int] = None, student_id: Optional[int] = None,
+              scope: Optional[str] = None, language: str = "ru") -> Scope:
+        return (str(getattr(role, "value", role)), course_id, student_id, scope, language)
+
+    def _embedder(self):
+        if self._embedding_service is None:
+            from app.services.rag_indexer import rag_indexer
+            self._embedding_service = rag_indexer.embedding_service
+        return self._embedding_service
+
+    async def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            vector = await self._embedder().aembed_text(question)
+        except Exception as e:
+            logger.warning(f"Semantic cache: embedding failed: {e}")
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if not norm:
+            return None
+        return vector / norm
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        scoped = self._by_scope.get(entry.scope)
+        if scoped is not None:
+            scoped.pop(entry_id, None)
+            if not scoped:
+                del self._by_scope[entry.scope]
+
+    async def lookup(self, question: str, scope: Scope, context: str) -> Optional[str]:
+        """Cached answer for a similar question in the same scope and context version."""
+        if not self.enabled:
+            return None
+        scoped = self._by_scope.get(scope)
+        if not scoped:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        for entry_id in [i for i, e in scoped.items() if e.expires_at <= now]:
+            self._remove(entry_id)
+        scoped = self._by_scope.get(scope)
+        if not scoped:
+            self.misses += 1
+            return None
+
+        vector = await self._embed(normalize_question(question))
+        if vector is None:
+            self.misses += 1
+            return None
+
+        # Пока считался эмбеддинг, store/lookup могли вытеснить записи этой области
+        now = time.monotonic()
+        scoped = self._by_scope.get(scope) or {}
+        ids = [i for i, e in scoped.items() if i in self._entries and e.expires_at > now]
+        if not ids:
+            self.misses += 1
+            return None
+        similarities = np.stack([scoped[i].embedding for i in ids]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        entry_id = ids[best]
+        entry = scoped[entry_id]
+        if entry.context_version != context_version(context):
+            # Данные (оценки, дедлайны) изменились — ответ устарел
+            self._remove(entry_id)
+            self.stale += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(entry_id)
+        self.hits += 1
+        return entry.answer
+
+    async def store(self, question: str, scope: Scope, context: str, answer: str):
+        """Remember an answer generated for ``question`` with ``context``."""
+        if not self.enabled or not answer:
+            return
+        normalized = normalize_question(question)
+        vector = await self._embed(normalized)
+        if vector is None:
+            return
+
+        version = context_version(context)
+        scoped = self._by_scope.setdefault(scope, {})
+        # Тот же вопрос в той же области — заменяем, а не копим дубликаты
+        for entry_id in [i for i, e in scoped.items() if e.question == normalized]:
+            self._remove(entry_id)
+        scoped = self._by_scope.setdefault(scope, {})
+
+        entry = _Entry(scope, normalized, vector, answer, version, time.monotonic() + self.ttl)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        scoped[entry_id] = entry
+        self.stores += 1
+
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_scope.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "scopes": len(self._by_scope),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold
+        }
+
+
+# Global cache instance
+semantic_response_cache = SemanticResponseCache(
+    enabled=settings.AI_SEMANTIC_CACHE_ENABLED,
+    threshold=settings.AI_SEMANTIC_CACHE_THRESHOLD,
+    ttl=settings.AI_SEMANTIC_CACHE_TTL,
+    max_entries=settings.AI_SEMANTIC_CACHE_MAX_ENTRIES
+)
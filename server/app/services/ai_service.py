@@ -1,76 +1,58 @@
-from typing import Optional, AsyncGenerator
-import json
-import httpx
-import asyncio
-import google.generativeai as genai
+from typing import Optional, AsyncGenerator, Dict, List
+import logging
 from app.core.config import settings
+from app.services.llm_providers import LLMProviderError, get_llm_provider
+
+logger = logging.getLogger(__name__)
 
 
 class AIService:
     def __init__(self) -> None:
         self.provider = (settings.AI_PROVIDER or "gemini").lower()
         self.model = settings.AI_MODEL or settings.GEMINI_MODEL
+        # Общий для воркера провайдер: пул соединений и лимит параллельных запросов
+        self.llm = get_llm_provider(self.provider)
+        # Ответ последнего вызова получен от модели (а не текст ошибки) — его можно кэшировать
+        self.last_call_ok = False
 
-        # configure SDKs if needed
+    def _messages(self, prompt: str, role: Optional[str], language: str) -> List[Dict[str, str]]:
+        # Gemini получает промпт целиком (системная часть уже внутри), остальные — отдельным system
         if self.provider == "gemini":
-            api_key = settings.GEMINI_API_KEY or settings.AI_API_KEY
-            if api_key:
-                genai.configure(api_key=api_key)
+            return [{"role": "user", "content": prompt}]
+        return [
+            {"role": "system", "content": self._system_message(role=role, language=language)},
+            {"role": "user", "content": prompt},
+        ]
+
+    def _not_configured(self) -> Optional[str]:
+        if self.llm is None:
+            return "AI провайдер не настроен"
+        if self.provider == "openrouter" and not self.llm.api_key:
+            return "AI не настроен: отсутствует OPENROUTER_API_KEY"
+        return None
 
-    def generate_reply(self, user_message: str, user_context: str = "", role: Optional[str] = None, language: str = "ru") -> str:
+    async def generate_reply(self, user_message: str, user_context: str = "", role: Optional[str] = None, language: str = "ru") -> str:
         prompt = self._build_prompt(user_message=user_message, user_context=user_context, role=role, language=language)
+        problem = self._not_configured()
+        if problem:
+            return problem
+        messages = self._messages(prompt, role, language)
+        self.last_call_ok = False
         try:
-            if self.provider == "gemini":
-                model = genai.GenerativeModel(self.model)
-                try:
-                    resp = model.generate_content(prompt)
-                except Exception as e:
-                    # Friendly retry once
-                    resp = model.generate_content(prompt)
-                return getattr(resp, "text", "").strip() or "Пустой ответ от AI"
-            elif self.provider == "openrouter":
-                api_key = settings.OPENROUTER_API_KEY or settings.AI_API_KEY
-                if not api_key:
-                    return "AI не настроен: отсутствует OPENROUTER_API_KEY"
-                headers = {
-                    "Authorization": f"Bearer {api_key}",
-                    "HTTP-Referer": "https://eduanalytics.local",
-                    "X-Title": "EduAnalytics",
-                    "Content-Type": "application/json",
-                }
-                body = {
-                    "model": self.model or "openrouter/auto",
-                    "messages": [
-                        {"role": "system", "content": self._system_message(role=role, language=language)},
-                        {"role": "user", "content": prompt},
-                    ],
-                }
-                r = httpx.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=body, timeout=60.0)
-                data = r.json()
-                return (data.get("choices", [{}])[0].get("message", {}).get("content") or "").strip() or "Пустой ответ от AI"
-            elif self.provider == "ollama":
-                base = settings.OLLAMA_API_BASE.rstrip("/")
-                model = "tinyllama"  # Force using tinyllama model
-                try:
-                    body = {
-                        "model": model,
-                        "messages": [
-                            {"role": "system", "content": self._system_message(role=role, language=language)},
-                            {"role": "user", "content": prompt},
-                        ],
-                        "stream": False,
-                    }
-                    r = httpx.post(f"{base}/api/chat", json=body, timeout=60.0)
-                    if r.status_code == 200:
-                        data = r.json()
-                        return (data.get("message", {}).get("content") or "").strip() or "Пустой ответ от AI"
-                    else:
-                        return f"Ошибка API: {r.status_code} - {r.text}"
-                except Exception as e:
-                    return f"Ошибка при запросе к Ollama: {e}"
-            else:
-                return "AI провайдер не настроен"
+            try:
+                reply = await self.llm.complete(messages)
+            except LLMProviderError as e:
+                # Retry once, only transient failures (timeout, connection, 5xx/429)
+                if not e.retryable:
+                    raise
+                logger.warning(f"LLM request failed, retrying: {e}")
+                reply = await self.llm.complete(messages)
+            if not reply:
+                return "Пустой ответ от AI"
+            self.last_call_ok = True
+            return reply
         except Exception as exc:  # noqa: BLE001
+            logger.error(f"LLM request failed: {exc}")
             return "Произошла ошибка при обработке запроса AI. Попробуйте еще раз позже."
 
     def _system_message(self, role: Optional[str] = None, language: str = "ru") -> str:
@@ -144,50 +126,17 @@ class AIService:
         return f"{self._system_message(role=role, language=language)}\n\n{context_block}{q_label}:\n{user_message}\n{a_label}:"
     
     async def generate_stream(self, user_message: str, user_context: str = "", role: Optional[str] = None, language: str = "ru") -> AsyncGenerator[str, None]:
-        """Генерирует ответ в режиме потока (для SSE)"""
+        """Генерирует ответ в режиме потока (для SSE): фрагменты по мере генерации моделью"""
         prompt = self._build_prompt(user_message=user_message, user_context=user_context, role=role, language=language)
+        problem = self._not_configured()
+        if problem:
+            yield problem
+            return
+        self.last_call_ok = False
         try:
-            if self.provider == "ollama":
-                base = settings.OLLAMA_API_BASE.rstrip("/")
-                model = "tinyllama"  # Force using tinyllama model
-                body = {
-                    "model": model,
-                    "messages": [
-                        {"role": "system", "content": self._system_message(role=role, language=language)},
-                        {"role": "user", "content": prompt},
-                    ],
-                    "stream": True,
-                }
-                
-                try:
-                    async with httpx.AsyncClient() as client:
-                        async with client.stream("POST", f"{base}/api/chat", json=body, timeout=60.0) as response:
-                            if response.status_code != 200:
-                                yield f"Ошибка API: {response.status_code}"
-                                return
-                                
-                            buffer = ""
-                            async for chunk in response.aiter_text():
-                                if not chunk.strip():
-                                    continue
-                                try:
-                                    data = json.loads(chunk)
-                                    if content := data.get("message", {}).get("content", ""):
-                                        buffer += content
-                                        yield content
-                                except json.JSONDecodeError:
-                                    # Некорректный JSON, пропускаем
-                                    continue
-                except Exception as e:
-                    yield f"Ошибка при стриминге от Ollama: {e}"
-            else:
-                # Для других провайдеров используем обычный генератор и эмулируем стриминг
-                full_response = self.generate_reply(user_message, user_context, role=role, language=language)
-                chunk_size = 10  # символов в чанке
-                for i in range(0, len(full_response), chunk_size):
-                    yield full_response[i:i+chunk_size]
-                    await asyncio.sleep(0.05)  # небольшая задержка для эмуляции стриминга
+            async for chunk in self.llm.stream(self._messages(prompt, role, language)):
+                yield chunk
+            self.last_call_ok = True
         except Exception as exc:
+            logger.error(f"LLM stream failed: {exc}")
             yield f"Ошибка AI: {exc}"
-
-
@@ -1,143 +1,129 @@
 from __future__ import annotations
 
-from datetime import date
-from typing import Optional, Dict, Any, List
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, List, Any
+
+from fastapi import HTTPException
 
-import httpx
+from app.crud.schedule import schedule_crud
+from app.services.course_analytics import course_analytics_service
+from app.db.session import AsyncSessionLocal
 from app.services.ai_authorization import is_allowed
-import asyncio
+
+logger = logging.getLogger(__name__)
+
+
+def _trend_bullet(label: str, data: dict) -> Optional[str]:
+    series = (data or {}).get("series", [])
+    if len(series) < 2:
+        return None
+    first = series[0].get("average_grade") or 0
+    last = series[-1].get("average_grade") or 0
+    delta = round((last - first), 2)
+    return f"{label}: средняя {last} ({'+' if delta >= 0 else ''}{delta} за период)"
 
 
 class AiToolRegistry:
-    """Сбор краткого контекста из существующих API по переданному scope/ids."""
+    """Сбор краткого контекста по переданному scope/ids напрямую из сервисного слоя.
 
-    def __init__(self, api_base: str = "http://localhost:8000") -> None:
-        self.api_base = api_base.rstrip("/")
+    Аналитика берётся из course_analytics_service — того же сервиса, что стоит
+    за /api/analytics (с его проверками прав и кэшем analytics_cache).
+    Независимые запросы выполняются параллельно, каждый в своей сессии БД.
+    """
+
+    def __init__(self, timeout: float = 15.0, session_factory=AsyncSessionLocal) -> None:
+        self.timeout = timeout
+        self.session_factory = session_factory
+
+    async def _run(self, name: str, lookup) -> Optional[str]:
+        try:
+            async with self.session_factory() as db:
+                return await asyncio.wait_for(lookup(db), timeout=self.timeout)
+        except HTTPException:
+            # Нет прав / не найдено — как 4xx от API, просто без этого пункта
+            return None
+        except Exception as e:
+            logger.warning(f"AI context lookup {name} failed: {e}")
+            return None
 
     async def gather_context(
         self,
-        auth_header: Optional[str],
+        user: Any,
         role: Optional[str] = None,
         scope: Optional[str] = None,
         student_id: Optional[int] = None,
         course_id: Optional[int] = None,
     ) -> str:
-        headers = {}
-        if auth_header:
-            headers["Authorization"] = auth_header
-
-        bullets: List[str] = []
-
-        async def _get(client: httpx.AsyncClient, url: str, *, headers: Dict[str, str], params: Dict[str, Any] | None = None) -> httpx.Response | None:
-            # простой backoff: до 2 повторов
-            delays = [0.0, 0.3]
-            last_exc: Exception | None = None
-            for d in delays:
-                if d:
-                    await asyncio.sleep(d)
-                try:
-                    return await client.get(url, headers=headers, params=params)
-                except Exception as e:
-                    last_exc = e
-            return None
+        lookups = []
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            # Курс
-            if course_id and is_allowed(role, "read_course_analytics"):
-                try:
-                    r = await _get(client, f"{self.api_base}/api/analytics/courses/{course_id}/overview", headers=headers)
-                    if r and r.status_code == 200:
-                        data = r.json() or {}
-                        ov = data.get("overview", data)
-                        total_assignments = ov.get("total_assignments")
-                        avg_grade = ov.get("average_grade")
-                        bullets.append(f"Курс #{course_id}: заданий={total_assignments}, средняя={avg_grade}")
-                except Exception:
-                    pass
-                # Тренды по курсу (краткая динамика)
-                try:
-                    r = await _get(client, f"{self.api_base}/api/analytics/courses/{course_id}/trends", headers=headers, params={"days": 30, "bucket": "week"})
-                    if r and r.status_code == 200:
-                        data = r.json() or {}
-                        series = data.get("series", [])
-                        if len(series) >= 2:
-                            first = series[0].get("average_grade") or 0
-                            last = series[-1].get("average_grade") or 0
-                            delta = round((last - first), 2)
-                            bullets.append(f"Тренд курса: средняя {last} ({'+' if delta>=0 else ''}{delta} за период)")
-                except Exception:
-                    pass
-
-            # Студент
-            if student_id and is_allowed(role, "read_student_analytics"):
-                try:
-                    r = await _get(client, f"{self.api_base}/api/analytics/students/{student_id}/performance", headers=headers)
-                    if r and r.status_code == 200:
-                        data = r.json() or {}
-                        perf = data.get("overall_performance", {})
-                        courses_count = perf.get("courses_count")
-                        total_submissions = perf.get("total_submissions")
-                        avg_grade = perf.get("overall_average_grade")
-                        bullets.append(
-                            f"Студент #{student_id}: курсов={courses_count}, сдач={total_submissions}, средняя={avg_grade}"
-                        )
-                except Exception:
-                    pass
-                # Тренды по студенту
-                try:
-                    r = await _get(client, f"{self.api_base}/api/analytics/students/{student_id}/trends", headers=headers, params={"days": 30, "bucket": "week"})
-                    if r and r.status_code == 200:
-                        data = r.json() or {}
-                        series = data.get("series", [])
-                        if len(series) >= 2:
-                            first = series[0].get("average_grade") or 0
-                            last = series[-1].get("average_grade") or 0
-                            delta = round((last - first), 2)
-                            bullets.append(f"Тренд студента: средняя {last} ({'+' if delta>=0 else ''}{delta} за период)")
-                except Exception:
-                    pass
-
-            # Расписание — ближайшие 5
-            if (scope == "schedule" and is_allowed(role, "read_schedule")) or not (student_id or course_id):
-                try:
-                    today = date.today().isoformat()
-                    r = await _get(client, f"{self.api_base}/api/schedule", headers=headers, params={"date_from": today, "limit": 5})
-                    if r and r.status_code == 200:
-                        data = r.json() or {}
-                        schedules = data.get("schedules", [])
-                        bullets.append(f"Ближайшие занятия: {len(schedules)} (начиная с {today})")
-                except Exception:
-                    pass
-
-            # Дедлайны (если указан курс)
-            if course_id and is_allowed(role, "read_course_analytics"):
-                try:
-                    r = await _get(client, f"{self.api_base}/api/analytics/courses/{course_id}/assignments", headers=headers)
-                    if r and r.status_code == 200:
-                        data = r.json() or {}
-                        assignments = data.get("assignments_analytics", [])
-                        # посчитаем ближайшие дедлайны в 14 дней
-                        from datetime import datetime, timedelta
-                        now = datetime.utcnow()
-                        horizon = now + timedelta(days=14)
-                        upcoming = 0
-                        for a in assignments:
-                            due = a.get("due_date")
-                            if not due:
-                                continue
-                            try:
-                                dt = datetime.fromisoformat(str(due))
-                            except Exception:
-                                continue
-                            if now <= dt <= horizon:
-                                upcoming += 1
-                        if upcoming:
-                            bullets.append(f"Ближайшие дедлайны (≤14д): {upcoming}")
-                except Exception:
-                    pass
+        # Курс
+        if course_id and is_allowed(role, "read_course_analytics"):
+            async def course_overview(db):
+                data = await course_analytics_service.course_overview(db, course_id, user) or {}
+                ov = data.get("overview", data)
+                return f"Курс #{course_id}: заданий={ov.get('assignments_count')}, средняя={ov.get('average_grade')}"
 
+            # Тренды по курсу (краткая динамика)
+            async def course_trend(db):
+                data = await course_analytics_service.course_trends(db, course_id, user, days=30, bucket="week")
+                return _trend_bullet("Тренд курса", data)
+
+            lookups += [("course_overview", course_overview), ("course_trends", course_trend)]
+
+        # Студент
+        if student_id and is_allowed(role, "read_student_analytics"):
+            async def student_performance(db):
+                data = await course_analytics_service.student_performance(db, student_id, user) or {}
+                perf = data.get("overall_performance", {})
+                return (
+                    f"Студент #{student_id}: курсов={perf.get('courses_count')}, "
+                    f"сдач={perf.get('total_submissions')}, средняя={perf.get('overall_average_grade')}"
+                )
+
+            # Тренды по студенту
+            async def student_trend(db):
+                data = await course_analytics_service.student_trends(db, student_id, user, days=30, bucket="week")
+                return _trend_bullet("Тренд студента", data)
+
+            lookups += [("student_performance", student_performance), ("student_trends", student_trend)]
+
+        # Расписание — ближайшие 5
+        if (scope == "schedule" and is_allowed(role, "read_schedule")) or not (student_id or course_id):
+            async def upcoming_schedule(db):
+                today = date.today()
+                schedules, _ = await schedule_crud.get_schedules(db=db, limit=5, date_from=today)
+                return f"Ближайшие занятия: {len(schedules)} (начиная с {today.isoformat()})"
+
+            lookups.append(("schedule", upcoming_schedule))
+
+        # Дедлайны (если указан курс)
+        if course_id and is_allowed(role, "read_course_analytics"):
+            async def upcoming_deadlines(db):
+                data = await course_analytics_service.course_assignments(db, course_id, user) or {}
+                # посчитаем ближайшие дедлайны в 14 дней
+                now = datetime.utcnow()
+                horizon = now + timedelta(days=14)
+                upcoming = 0
+                for a in data.get("assignments_analytics", []):
+                    due = a.get("due_date")
+                    if not due:
+                        continue
+                    try:
+                        dt = due if isinstance(due, datetime) else datetime.fromisoformat(str(due))
+                    except ValueError:
+                        continue
+                    if dt.tzinfo is not None:
+                        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+                    if now <= dt <= horizon:
+                        upcoming += 1
+                return f"Ближайшие дедлайны (≤14д): {upcoming}" if upcoming else None
+
+            lookups.append(("deadlines", upcoming_deadlines))
+
+        results = await asyncio.gather(*(self._run(name, lookup) for name, lookup in lookups))
+        bullets: List[str] = [b for b in results if b]
         if not bullets:
             return ""
         return "\n".join(f"- {b}" for b in bullets)
-
-
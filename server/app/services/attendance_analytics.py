@@ -15,6 +15,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, insert, update, delete, text, and_, or_, func, desc
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from app.core.batch_buffer import BatchBuffer
+from app.core.config import settings
 from app.db.session import AsyncSessionLocal
 from app.models.user import User
 from app.models.course import Course
@@ -754,6 +756,129 @@ class PageViewAnalyticsService:
             raise
 
 
+class PageViewBuffer(BatchBuffer[Dict[str, Any]]):
+    """
+    Bounded in-memory buffer for page views with a background flusher.
+
+    The request path only appends to the buffer (no DB round-trip, no task per
+    request). The flusher drains it every ``flush_interval_ms`` or as soon as
+    ``batch_size`` rows are queued, writing page views with one multi-row INSERT
+    and session activity with one aggregated upsert per batch. When the buffer
+    is full new views are dropped and counted instead of blocking requests.
+    """
+
+    PAGE_VIEW_COLUMNS = (
+        "user_id", "course_id", "page_type", "page_id", "page_title", "page_url",
+        "session_id", "view_time", "time_on_page", "referrer", "user_agent", "ip_address"
+    )
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 500,
+                 flush_interval_ms: int = 1000):
+        super().__init__(self._store_batch, name="Page view", max_size=max_size,
+                         batch_size=batch_size, flush_interval=flush_interval_ms / 1000)
+        self.flush_interval_ms = flush_interval_ms
+
+    def enqueue(self, user_id: int, course_id: Optional[int], page_type: PageViewType,
+                page_url: str, session_id: str, page_id: Optional[str] = None,
+                page_title: Optional[str] = None, time_on_page: Optional[int] = None,
+                referrer: Optional[str] = None, user_agent: Optional[str] = None,
+                ip_address: Optional[str] = None,
+                view_time: Optional[datetime] = None) -> bool:
+        """Queue a page view without blocking; returns False if it was dropped."""
+        return super().enqueue({
+            "user_id": user_id,
+            "course_id": course_id,
+            "page_type": page_type.value,
+            "page_id": page_id,
+            "page_title": page_title,
+            "page_url": page_url,
+            "session_id": session_id,
+            "view_time": view_time or datetime.utcnow(),
+            "time_on_page": time_on_page,
+            "referrer": referrer,
+            "user_agent": user_agent,
+            "ip_address": ip_address
+        })
+
+    async def _store_batch(self, batch: List[Dict[str, Any]]):
+        async with AsyncSessionLocal() as db:
+            await self._write_batch(db, batch)
+            await db.commit()
+
+    async def _write_batch(self, db: AsyncSession, batch: List[Dict[str, Any]]):
+        """Write a batch of page views and their aggregated session activity."""
+        params: Dict[str, Any] = {}
+        rows = []
+        for i, view in enumerate(batch):
+            rows.append("(" + ", ".join(f":{column}_{i}" for column in self.PAGE_VIEW_COLUMNS) + ")")
+            for column in self.PAGE_VIEW_COLUMNS:
+                params[f"{column}_{i}"] = view[column]
+
+        insert_sql = f"""
+        INSERT INTO page_views ({", ".join(self.PAGE_VIEW_COLUMNS)})
+        VALUES {", ".join(rows)}
+        """
+        await db.execute(text(insert_sql), params)
+
+        # One row per session: ON CONFLICT must not hit the same row twice within a statement
+        sessions: Dict[str, Dict[str, Any]] = {}
+        for view in batch:
+            session = sessions.get(view["session_id"])
+            if session is None:
+                sessions[view["session_id"]] = {
+                    "user_id": view["user_id"],
+                    "course_id": view["course_id"],
+                    "start_time": view["view_time"],
+                    "last_activity": view["view_time"],
+                    "views": 1,
+                    "ip_address": view["ip_address"],
+                    "user_agent": view["user_agent"]
+                }
+            else:
+                session["views"] += 1
+                session["start_time"] = min(session["start_time"], view["view_time"])
+                session["last_activity"] = max(session["last_activity"], view["view_time"])
+
+        params = {}
+        rows = []
+        for i, (session_id, session) in enumerate(sessions.items()):
+            rows.append(
+                f"(:user_id_{i}, :session_id_{i}, :course_id_{i}, :start_time_{i}, "
+                f":last_activity_{i}, :views_{i}, :ip_address_{i}, :user_agent_{i})"
+            )
+            params.update({
+                f"user_id_{i}": session["user_id"],
+                f"session_id_{i}": session_id,
+                f"course_id_{i}": session["course_id"],
+                f"start_time_{i}": session["start_time"],
+                f"last_activity_{i}": session["last_activity"],
+                f"views_{i}": session["views"],
+                f"ip_address_{i}": session["ip_address"],
+                f"user_agent_{i}": session["user_agent"]
+            })
+
+        upsert_sql = f"""
+        INSERT INTO user_sessions (
+            user_id, session_id, course_id, start_time, last_activity,
+            page_views_count, ip_address, user_agent
+        ) VALUES {", ".join(rows)}
+        ON CONFLICT (session_id) DO UPDATE SET
+            last_activity = EXCLUDED.last_activity,
+            page_views_count = user_sessions.page_views_count + EXCLUDED.page_views_count,
+            updated_at = NOW()
+        """
+        await db.execute(text(upsert_sql), params)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer counters for monitoring."""
+        return {**super().get_stats(), "flush_interval_ms": self.flush_interval_ms}
+
+
 # Global service instances
 attendance_service = AttendanceAnalyticsService()
 pageview_service = PageViewAnalyticsService()
+pageview_buffer = PageViewBuffer(
+    max_size=settings.PAGE_VIEW_BUFFER_SIZE,
+    batch_size=settings.PAGE_VIEW_FLUSH_BATCH_SIZE,
+    flush_interval_ms=settings.PAGE_VIEW_FLUSH_INTERVAL_MS
+)
@@ -0,0 +1,422 @@
+"""
+Аналитика курсов и студентов: обзор, задания, успеваемость, тренды.
+
+Общий сервисный слой для /api/analytics и AI-инструментов (AiToolRegistry):
+проверки прав, запросы и кэш analytics_cache живут здесь, маршруты только
+передают параметры. Нет прав / не найдено — HTTPException, как в app.crud.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.assignment import Assignment
+from app.models.course import Course
+from app.models.enrollment import Enrollment, EnrollmentRole, EnrollmentStatus
+from app.models.grade import Grade
+from app.models.submission import Submission, SubmissionStatus
+from app.models.user import User, UserRole
+from app.services.cache import analytics_cache
+
+logger = logging.getLogger(__name__)
+
+Bucket = Literal["day", "week", "month"]
+
+
+def bucket_start(date_value: datetime, bucket: Bucket) -> datetime:
+    """Normalize datetime to the beginning of the bucket (day/week/month)."""
+    naive = date_value.replace(tzinfo=None)
+    if bucket == "day":
+        return datetime(naive.year, naive.month, naive.day)
+    if bucket == "week":
+        monday = naive - timedelta(days=naive.weekday())
+        return datetime(monday.year, monday.month, monday.day)
+    return datetime(naive.year, naive.month, 1)
+
+
+def _require_staff(user: User, detail: str) -> None:
+    if user.role not in [UserRole.teacher, UserRole.admin]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+async def _active_student_count(db: AsyncSession, **filters) -> int:
+    conditions = [
+        Enrollment.role == EnrollmentRole.student,
+        Enrollment.status == EnrollmentStatus.active,
+    ]
+    conditions += [getattr(Enrollment, column) == value for column, value in filters.items()]
+    result = await db.execute(select(func.count(Enrollment.id)).where(and_(*conditions)))
+    return result.scalar()
+
+
+class CourseAnalyticsService:
+    """Запросы аналитики курсов/студентов с проверкой прав пользователя."""
+
+    async def _owned_course(self, db: AsyncSession, course_id: int, user: User, detail: str) -> Course:
+        course_result = await db.execute(select(Course).where(Course.id == course_id))
+        course = course_result.scalar_one_or_none()
+        if not course:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Курс не найден")
+        # Владелец курса или админ
+        if user.role != UserRole.admin and course.owner_id != user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+        return course
+
+    async def _require_active_student(self, db: AsyncSession, student_id: int) -> None:
+        if await _active_student_count(db, user_id=student_id) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пользователь не является активным студентом"
+            )
+
+    async def course_overview(self, db: AsyncSession, course_id: int, user: User) -> Dict[str, Any]:
+        """Общий обзор курса с ключевыми метриками."""
+        _require_staff(user, "Недостаточно прав для просмотра аналитики курса")
+
+        # Права проверяются до кэша: кэш общий для всех пользователей
+        course = await self._owned_course(db, course_id, user, "Недостаточно прав для просмотра аналитики этого курса")
+        cache_key = f"analytics:course:{course_id}:overview:v1"
+        if cached := await analytics_cache.get_json(cache_key):
+            return cached
+
+        # Подсчитываем количество заданий
+        assignments_count_result = await db.execute(
+            select(func.count(Assignment.id)).where(Assignment.course_id == course_id)
+        )
+        assignments_count = assignments_count_result.scalar()
+
+        # Количество активных студентов через enrollments
+        students_count = await _active_student_count(db, course_id=course_id)
+
+        # Подсчитываем количество сдач
+        submissions_count_result = await db.execute(
+            select(func.count(Submission.id))
+            .select_from(Submission)
+            .join(Assignment, Submission.assignment_id == Assignment.id)
+            .where(Assignment.course_id == course_id)
+        )
+        submissions_count = submissions_count_result.scalar()
+
+        # Подсчитываем среднюю оценку
+        avg_grade_result = await db.execute(
+            select(func.avg(Grade.score))
+            .select_from(Grade)
+            .join(Submission, Grade.submission_id == Submission.id)
+            .join(Assignment, Submission.assignment_id == Assignment.id)
+            .where(Assignment.course_id == course_id)
+        )
+        avg_grade = avg_grade_result.scalar() or 0.0
+
+        # Подсчитываем процент вовремя сданных заданий
+        on_time_submissions_result = await db.execute(
+            select(func.count(Submission.id))
+            .select_from(Submission)
+            .join(Assignment, Submission.assignment_id == Assignment.id)
+            .where(
+                and_(
+                    Assignment.course_id == course_id,
+                    Submission.status == SubmissionStatus.submitted,
+                    Submission.submitted_at <= Assignment.due_date
+                )
+            )
+        )
+        on_time_submissions = on_time_submissions_result.scalar()
+
+        completion_rate = 0.0
+        if assignments_count > 0 and students_count > 0:
+            total_possible_submissions = assignments_count * students_count
+            completion_rate = (submissions_count / total_possible_submissions) * 100 if total_possible_submissions > 0 else 0.0
+
+        on_time_rate = 0.0
+        if submissions_count > 0:
+            on_time_rate = (on_time_submissions / submissions_count) * 100
+
+        response = {
+            "course_id": course_id,
+            "course_title": course.title,
+            "overview": {
+                "students_count": students_count,
+                "assignments_count": assignments_count,
+                "submissions_count": submissions_count,
+                "average_grade": round(avg_grade, 2),
+                "completion_rate": round(completion_rate, 2),
+                "on_time_submission_rate": round(on_time_rate, 2)
+            },
+            "period": {
+                "start_date": course.start_date,
+                "end_date": course.end_date,
+                "duration_days": (course.end_date - course.start_date).days
+            }
+        }
+        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_medium)
+        return response
+
+    async def course_assignments(self, db: AsyncSession, course_id: int, user: User) -> Dict[str, Any]:
+        """Аналитика по заданиям курса."""
+        _require_staff(user, "Недостаточно прав для просмотра аналитики")
+
+        cache_key = f"analytics:course:{course_id}:assignments:v1"
+        if cached := await analytics_cache.get_json(cache_key):
+            return cached
+        students_count = await _active_student_count(db, course_id=course_id)
+
+        assignments_result = await db.execute(
+            select(Assignment).where(Assignment.course_id == course_id)
+        )
+        assignments = assignments_result.scalars().all()
+
+        assignments_analytics = []
+
+        for assignment in assignments:
+            # Подсчитываем количество сдач для задания
+            submissions_count_result = await db.execute(
+                select(func.count(Submission.id)).where(Submission.assignment_id == assignment.id)
+            )
+            submissions_count = submissions_count_result.scalar()
+
+            # Подсчитываем среднюю оценку
+            avg_grade_result = await db.execute(
+                select(func.avg(Grade.score))
+                .select_from(Grade)
+                .join(Submission, Grade.submission_id == Submission.id)
+                .where(Submission.assignment_id == assignment.id)
+            )
+            avg_grade = avg_grade_result.scalar() or 0.0
+
+            # Подсчитываем количество вовремя сданных
+            on_time_count_result = await db.execute(
+                select(func.count(Submission.id))
+                .select_from(Submission)
+                .where(
+                    and_(
+                        Submission.assignment_id == assignment.id,
+                        Submission.status == SubmissionStatus.submitted,
+                        Submission.submitted_at <= assignment.due_date
+                    )
+                )
+            )
+            on_time_count = on_time_count_result.scalar()
+
+            # Подсчитываем количество опоздавших
+            late_count_result = await db.execute(
+                select(func.count(Submission.id))
+                .select_from(Submission)
+                .where(
+                    and_(
+                        Submission.assignment_id == assignment.id,
+                        Submission.status == SubmissionStatus.submitted,
+                        Submission.submitted_at > assignment.due_date
+                    )
+                )
+            )
+            late_count = late_count_result.scalar()
+
+            assignments_analytics.append({
+                "assignment_id": assignment.id,
+                "title": assignment.title,
+                "due_date": assignment.due_date,
+                "statistics": {
+                    "total_submissions": submissions_count,
+                    "average_grade": round(avg_grade, 2),
+                    "on_time_submissions": on_time_count,
+                    "late_submissions": late_count,
+                    "submission_rate": round((submissions_count / students_count) * 100, 2) if students_count > 0 else 0.0
+                }
+            })
+
+        response = {
+            "course_id": course_id,
+            "total_students": students_count,
+            "assignments_analytics": assignments_analytics
+        }
+        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_medium)
+        return response
+
+    async def student_performance(self, db: AsyncSession, student_id: int, user: User) -> Dict[str, Any]:
+        """Успеваемость студента по всем курсам."""
+        _require_staff(user, "Недостаточно прав для просмотра аналитики студента")
+
+        user_result = await db.execute(select(User).where(User.id == student_id))
+        student = user_result.scalar_one_or_none()
+        if not student:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден")
+        await self._require_active_student(db, student_id)
+
+        # Все сдачи студента с оценками
+        submissions_result = await db.execute(
+            select(Submission, Assignment, Course, Grade)
+            .select_from(Submission)
+            .join(Assignment, Submission.assignment_id == Assignment.id)
+            .join(Course, Assignment.course_id == Course.id)
+            .outerjoin(Grade, Submission.id == Grade.submission_id)
+            .where(Submission.student_id == student_id)
+        )
+
+        submissions_data = submissions_result.all()
+
+        # Группируем по курсам
+        courses_performance = {}
+
+        for submission, assignment, course, grade in submissions_data:
+            if course.id not in courses_performance:
+                courses_performance[course.id] = {
+                    "course_id": course.id,
+                    "course_title": course.title,
+                    "assignments_count": 0,
+                    "submissions_count": 0,
+                    "grades": [],
+                    "average_grade": 0.0,
+                    "on_time_rate": 0.0
+                }
+
+            course_data = courses_performance[course.id]
+            course_data["assignments_count"] += 1
+            course_data["submissions_count"] += 1
+
+            if grade:
+                course_data["grades"].append(grade.score)
+
+            # Проверяем, вовремя ли сдано
+            if submission.submitted_at <= assignment.due_date:
+                course_data["on_time_rate"] += 1
+
+        # Вычисляем средние значения
+        for course_data in courses_performance.values():
+            if course_data["grades"]:
+                course_data["average_grade"] = round(sum(course_data["grades"]) / len(course_data["grades"]), 2)
+
+            if course_data["submissions_count"] > 0:
+                course_data["on_time_rate"] = round((course_data["on_time_rate"] / course_data["submissions_count"]) * 100, 2)
+
+        # Общая статистика
+        all_grades = [grade.score for _, _, _, grade in submissions_data if grade]
+        overall_average = round(sum(all_grades) / len(all_grades), 2) if all_grades else 0.0
+
+        return {
+            "student_id": student_id,
+            "student_name": student.full_name,
+            "overall_performance": {
+                "total_submissions": len(submissions_data),
+                "total_assignments": sum(course["assignments_count"] for course in courses_performance.values()),
+                "overall_average_grade": overall_average,
+                "courses_count": len(courses_performance)
+            },
+            "courses_performance": list(courses_performance.values())
+        }
+
+    async def trend_series(self, db: AsyncSession, condition, days: int, bucket: Bucket) -> List[Dict]:
+        """Временной ряд сдач/оценок/своевременности для сдач, отобранных ``condition``."""
+        window_start = datetime.now().replace(tzinfo=None) - timedelta(days=days)
+        result = await db.execute(
+            select(Submission, Assignment, Grade)
+            .select_from(Submission)
+            .join(Assignment, Submission.assignment_id == Assignment.id)
+            .outerjoin(Grade, Grade.submission_id == Submission.id)
+            .where(
+                and_(
+                    condition,
+                    Submission.submitted_at.isnot(None),
+                    Submission.submitted_at >= window_start,
+                )
+            )
+        )
+        rows = result.all()
+
+        buckets: Dict[datetime, Dict[str, float]] = {}
+        submissions_seen: Dict[datetime, set] = {}
+
+        for submission, assignment, grade in rows:
+            if not submission.submitted_at:
+                continue
+            bstart = bucket_start(submission.submitted_at, bucket)
+            if bstart not in buckets:
+                buckets[bstart] = {
+                    "submissions": 0,
+                    "grades_sum": 0.0,
+                    "grades_count": 0,
+                    "on_time_count": 0,
+                    "late_count": 0,
+                }
+                submissions_seen[bstart] = set()
+
+            bucket_data = buckets[bstart]
+            if submission.id not in submissions_seen[bstart]:
+                submissions_seen[bstart].add(submission.id)
+                bucket_data["submissions"] += 1
+                if assignment and submission.submitted_at and assignment.due_date:
+                    if submission.submitted_at <= assignment.due_date:
+                        bucket_data["on_time_count"] += 1
+                    else:
+                        bucket_data["late_count"] += 1
+
+            if grade is not None and grade.score is not None:
+                bucket_data["grades_sum"] += float(grade.score)
+                bucket_data["grades_count"] += 1
+
+        series = []
+        for key in sorted(buckets.keys()):
+            data = buckets[key]
+            avg_grade = (data["grades_sum"] / data["grades_count"]) if data["grades_count"] > 0 else 0.0
+            on_time_rate = (data["on_time_count"] / data["submissions"]) * 100 if data["submissions"] > 0 else 0.0
+            series.append({
+                "bucket_start": key.isoformat(),
+                "submissions": int(data["submissions"]),
+                "average_grade": round(avg_grade, 2),
+                "on_time_rate": round(on_time_rate, 2),
+                "late_submissions": int(data["late_count"]),
+            })
+
+        return series
+
+    async def course_trend_series(self, db: AsyncSession, course_id: int, days: int, bucket: Bucket) -> List[Dict]:
+        return await self.trend_series(db, Assignment.course_id == course_id, days, bucket)
+
+    async def student_trend_series(self, db: AsyncSession, student_id: int, days: int, bucket: Bucket) -> List[Dict]:
+        return await self.trend_series(db, Submission.student_id == student_id, days, bucket)
+
+    async def course_trends(
+        self, db: AsyncSession, course_id: int, user: User, days: int = 30, bucket: Bucket = "week"
+    ) -> Dict[str, Any]:
+        """Тренды по курсу (владелец курса или админ)."""
+        _require_staff(user, "Недостаточно прав")
+        await self._owned_course(db, course_id, user, "Нет доступа к курсу")
+
+        cache_key = f"analytics:course:{course_id}:trends:{bucket}:{days}:v1"
+        if cached := await analytics_cache.get_json(cache_key):
+            return cached
+        response = {
+            "course_id": course_id,
+            "bucket": bucket,
+            "days": days,
+            "series": await self.course_trend_series(db, course_id, days, bucket),
+            "generated_at": datetime.now(timezone.utc)
+        }
+        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_short)
+        return response
+
+    async def student_trends(
+        self, db: AsyncSession, student_id: int, user: User, days: int = 30, bucket: Bucket = "week"
+    ) -> Dict[str, Any]:
+        """Тренды по активному студенту."""
+        _require_staff(user, "Недостаточно прав")
+        await self._require_active_student(db, student_id)
+
+        cache_key = f"analytics:student:{student_id}:trends:{bucket}:{days}:v1"
+        if cached := await analytics_cache.get_json(cache_key):
+            return cached
+        response = {
+            "student_id": student_id,
+            "bucket": bucket,
+            "days": days,
+            "series": await self.student_trend_series(db, student_id, days, bucket),
+            "generated_at": datetime.now(timezone.utc)
+        }
+        await analytics_cache.set_json(cache_key, response, ex=analytics_cache.ttl_short)
+        return response
+
+
+course_analytics_service = CourseAnalyticsService()
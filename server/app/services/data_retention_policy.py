@@ -73,6 +73,14 @@ class RetentionRule:
     exceptions: Optional[List[str]] = None
 
 
+@dataclass
+class PartitionRetentionRule:
+    """Retention rule for a time-partitioned table (enforced by dropping partitions)."""
+    table_name: str
+    retention_days: int
+    data_category: DataCategory
+
+
 @dataclass
 class PIIField:
     """Personally Identifiable Information field definition."""
@@ -88,6 +96,7 @@ class DataRetentionPolicyManager:
     
     def __init__(self):
         self.retention_rules = self._load_retention_rules()
+        self.partition_rules = self._load_partition_rules()
         self.pii_fields = self._define_pii_fields()
         self.pseudonym_cache = {}  # For consistent pseudonymization
     
@@ -153,6 +162,73 @@ class DataRetentionPolicyManager:
             )
         ]
     
+    def _load_partition_rules(self) -> List[PartitionRetentionRule]:
+        """Load retention rules for time-partitioned tables."""
+        # SLA metrics live in notification_metric_rollups, so raw delivery
+        # records only need to be kept for troubleshooting
+        return [
+            PartitionRetentionRule(
+                table_name="notification_log",
+                retention_days=settings.NOTIFICATION_LOG_RETENTION_DAYS,
+                data_category=DataCategory.COMMUNICATION
+            ),
+            PartitionRetentionRule(
+                table_name="notification_delivery_attempts",
+                retention_days=settings.NOTIFICATION_LOG_RETENTION_DAYS,
+                data_category=DataCategory.COMMUNICATION
+            ),
+        ]
+    
+    async def manage_partitions(self, dry_run: bool = True) -> Dict[str, Any]:
+        """
+        Manage the lifecycle of time-partitioned tables.
+        
+        Makes sure upcoming monthly partitions exist and drops partitions whose
+        whole range is older than the retention period - an instant metadata
+        operation instead of row-by-row deletes. Partitions that still hold
+        undelivered notifications are kept until those finish.
+        """
+        from app.services.migration_manager import migration_manager
+        
+        results = {
+            "dry_run": dry_run,
+            "ensured": {},
+            "dropped_partitions": {},
+            "errors": []
+        }
+        
+        try:
+            if not dry_run:
+                results["ensured"] = await migration_manager.ensure_time_partitions(
+                    months_ahead=settings.NOTIFICATION_PARTITIONS_AHEAD
+                )
+            
+            partition_manager = migration_manager.partition_manager
+            async with AsyncSessionLocal() as db:
+                if db.bind.dialect.name != "postgresql":
+                    results["skipped"] = "time partitioning requires PostgreSQL"
+                    return results
+                
+                for rule in self.partition_rules:
+                    cutoff_date = datetime.utcnow() - timedelta(days=rule.retention_days)
+                    try:
+                        dropped = await partition_manager.drop_partitions_before(
+                            db, rule.table_name, cutoff_date, dry_run=dry_run
+                        )
+                        results["dropped_partitions"][rule.table_name] = dropped
+                    except Exception as e:
+                        results["errors"].append({"table": rule.table_name, "error": str(e)})
+                        logger.error(f"Error dropping partitions of {rule.table_name}: {e}")
+                
+                if not dry_run:
+                    await db.commit()
+        
+        except Exception as e:
+            results["errors"].append({"error": str(e)})
+            logger.error(f"Error managing partitions: {e}")
+        
+        return results
+    
     def _define_pii_fields(self) -> List[PIIField]:
         """Define PII fields across the application."""
         return [
@@ -252,6 +328,8 @@ class DataRetentionPolicyManager:
             if not dry_run:
                 await db.commit()
         
+        results["partitions"] = await self.manage_partitions(dry_run)
+        
         results["completed_at"] = datetime.utcnow().isoformat()
         return results
     
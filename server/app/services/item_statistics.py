@@ -0,0 +1,267 @@
+"""
+Vectorized classical test theory statistics for a whole quiz.
+
+The quiz is loaded once as a students x items response matrix (one row per
+quiz submission, NaN where the submission has no response to the item) and
+every statistic is computed column-wise with NumPy:
+
+- difficulty index (share of correct answers among those who answered);
+- upper/lower 27% discrimination, groups formed on the *total quiz score*;
+- corrected point-biserial correlation (item vs. rest score, so the item
+  does not correlate with itself);
+- KR-20 / Cronbach's alpha for the test and alpha-if-item-deleted;
+- distractor statistics with per-option upper/lower selection rates.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GROUP_FRACTION = 0.27
+
+
+def _parse_options(selected: Any) -> List[str]:
+    if selected is None or selected == "":
+        return []
+    if isinstance(selected, str):
+        try:
+            selected = json.loads(selected)
+        except (json.JSONDecodeError, TypeError):
+            return []
+    if isinstance(selected, (list, tuple)):
+        return [str(option) for option in selected]
+    return [str(selected)]
+
+
+def _masked_mean(values: np.ndarray, mask: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Column means over ``mask``; NaN where a column has no observations."""
+    counts = mask.sum(axis=axis)
+    sums = np.where(mask, values, 0.0).sum(axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _to_optional(value: float, digits: int = 4) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+class ResponseMatrix:
+    """Students x items matrix built from flat response rows."""
+
+    def __init__(self, submission_ids: np.ndarray, item_ids: np.ndarray,
+                 scores: np.ndarray, correct: np.ndarray, answered: np.ndarray,
+                 selections: Dict[Tuple[int, int], List[str]]):
+        self.submission_ids = submission_ids
+        self.item_ids = item_ids
+        self.scores = scores
+        self.correct = correct
+        self.answered = answered
+        # (row, column) -> selected options; choice answers only
+        self.selections = selections
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]]) -> "ResponseMatrix":
+        """Build the matrix from ``(submission_id, question_id, is_correct,
+        points_earned, selected_options)`` rows.
+
+        Repeated responses of a submission to the same item keep the last row.
+        """
+        rows = list(rows)
+        if not rows:
+            empty = np.zeros((0, 0))
+            return cls(np.array([], dtype=np.int64), np.array([], dtype=np.int64),
+                       empty, empty, empty.astype(bool), {})
+
+        subs = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        items = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+        is_correct = np.fromiter((bool(r[2]) for r in rows), dtype=np.float64, count=len(rows))
+        points = np.fromiter((r[3] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+
+        submission_ids, row_idx = np.unique(subs, return_inverse=True)
+        item_ids, col_idx = np.unique(items, return_inverse=True)
+        shape = (len(submission_ids), len(item_ids))
+
+        scores = np.full(shape, np.nan)
+        correct = np.full(shape, np.nan)
+        scores[row_idx, col_idx] = points
+        correct[row_idx, col_idx] = is_correct
+
+        selections = {}
+        for r, c, row in zip(row_idx.tolist(), col_idx.tolist(), rows):
+            options = _parse_options(row[4])
+            if options:
+                selections[(r, c)] = options
+
+        return cls(submission_ids, item_ids, scores, correct, ~np.isnan(scores), selections)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.scores.shape
+
+    def column(self, item_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.item_ids, item_id))
+        if pos < len(self.item_ids) and self.item_ids[pos] == item_id:
+            return pos
+        return None
+
+
+def upper_lower_groups(totals: np.ndarray, fraction: float = GROUP_FRACTION) -> Tuple[np.ndarray, np.ndarray]:
+    """Row indices of the top and bottom ``fraction`` of examinees by total score."""
+    n = len(totals)
+    if n == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty
+    size = max(1, int(round(n * fraction)))
+    # Stable sort: ties in score keep a deterministic order
+    order = np.argsort(-totals, kind="stable")
+    return order[:size], order[-size:]
+
+
+def reliability(matrix: ResponseMatrix) -> Dict[str, Any]:
+    """KR-20 (on correctness) and Cronbach's alpha (on points) for the test.
+
+    Only submissions that answered every item take part: with questions drawn
+    at random from banks a missing response is not a zero.
+    """
+    n_rows, k = matrix.shape
+    complete = matrix.answered.all(axis=1) if k else np.zeros(n_rows, dtype=bool)
+    n_complete = int(complete.sum())
+    result: Dict[str, Any] = {
+        "items": k,
+        "complete_submissions": n_complete,
+        "kr20": None,
+        "cronbach_alpha": None,
+        "alpha_if_deleted": {}
+    }
+    if k < 2 or n_complete < 2:
+        return result
+
+    scores = matrix.scores[complete]
+    correct = matrix.correct[complete]
+
+    totals = scores.sum(axis=1)
+    total_var = totals.var(ddof=1)
+    item_vars = scores.var(axis=0, ddof=1)
+    if total_var > 0:
+        result["cronbach_alpha"] = _to_optional(k / (k - 1) * (1 - item_vars.sum() / total_var))
+
+    p = correct.mean(axis=0)
+    correct_var = correct.sum(axis=1).var(ddof=1)
+    if correct_var > 0:
+        # KR-20 uses the population variance for p*q;
+        # bring the variance of the total to the same denominator
+        correct_var_pop = correct_var * (n_complete - 1) / n_complete
+        result["kr20"] = _to_optional(k / (k - 1) * (1 - (p * (1 - p)).sum() / correct_var_pop))
+
+    if k > 2:
+        rest_vars = (totals[:, None] - scores).var(axis=0, ddof=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            alpha_deleted = (k - 1) / (k - 2) * (1 - (item_vars.sum() - item_vars) / rest_vars)
+        result["alpha_if_deleted"] = {
+            int(item_id): _to_optional(value)
+            for item_id, value in zip(matrix.item_ids.tolist(), alpha_deleted)
+        }
+    return result
+
+
+def item_statistics(matrix: ResponseMatrix, fraction: float = GROUP_FRACTION) -> Dict[int, Dict[str, Any]]:
+    """Per-item difficulty, discrimination, point-biserial and distractors."""
+    n_rows, k = matrix.shape
+    if k == 0:
+        return {}
+
+    answered = matrix.answered
+    scores = np.where(answered, matrix.scores, 0.0)
+    correct = np.where(answered, matrix.correct, 0.0)
+    totals = scores.sum(axis=1)
+
+    sample_sizes = answered.sum(axis=0)
+    difficulty = _masked_mean(correct, answered)
+
+    upper, lower = upper_lower_groups(totals, fraction)
+    upper_p = _masked_mean(correct[upper], answered[upper])
+    lower_p = _masked_mean(correct[lower], answered[lower])
+    discrimination = upper_p - lower_p
+
+    # Corrected point-biserial: item score against the sum of the
+    # remaining items
+    rest = totals[:, None] - scores
+    rest_mean = _masked_mean(rest, answered)
+    dx = np.where(answered, correct - difficulty, 0.0)
+    dr = np.where(answered, rest - rest_mean, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denom = np.sqrt((dx ** 2).sum(axis=0) * (dr ** 2).sum(axis=0))
+        point_biserial = np.where(denom > 0, (dx * dr).sum(axis=0) / denom, 0.0)
+
+    distractors = _distractor_statistics(matrix, upper, lower, sample_sizes)
+
+    group_size = len(upper)
+    results = {}
+    for col, item_id in enumerate(matrix.item_ids.tolist()):
+        n = int(sample_sizes[col])
+        results[int(item_id)] = {
+            "sample_size": n,
+            "difficulty_index": _to_optional(difficulty[col]) if n else None,
+            "discrimination_index": _to_optional(discrimination[col]) if n else None,
+            "point_biserial_correlation": _to_optional(point_biserial[col]) if n else None,
+            "distractor_analysis": distractors.get(col, {"option_statistics": {}, "total_responses": n}),
+            "group_performance": {
+                "group_fraction": fraction,
+                "group_size": group_size,
+                "upper_difficulty": _to_optional(upper_p[col]),
+                "lower_difficulty": _to_optional(lower_p[col])
+            }
+        }
+    return results
+
+
+def _distractor_statistics(matrix: ResponseMatrix, upper: np.ndarray, lower: np.ndarray,
+                           sample_sizes: np.ndarray) -> Dict[int, Dict[str, Any]]:
+    if not matrix.selections:
+        return {}
+
+    # Flat (row, column, option) arrays -> counts in a single np.unique
+    cells = [(r, c, option) for (r, c), options in matrix.selections.items() for option in options]
+    rows = np.fromiter((cell[0] for cell in cells), dtype=np.int64, count=len(cells))
+    cols = np.fromiter((cell[1] for cell in cells), dtype=np.int64, count=len(cells))
+    option_labels, option_idx = np.unique(np.array([cell[2] for cell in cells], dtype=object).astype(str),
+                                          return_inverse=True)
+
+    n_rows, k = matrix.shape
+    n_options = len(option_labels)
+    in_upper = np.zeros(n_rows, dtype=bool)
+    in_upper[upper] = True
+    in_lower = np.zeros(n_rows, dtype=bool)
+    in_lower[lower] = True
+
+    counts = np.zeros((k, n_options), dtype=np.int64)
+    upper_counts = np.zeros((k, n_options), dtype=np.int64)
+    lower_counts = np.zeros((k, n_options), dtype=np.int64)
+    np.add.at(counts, (cols, option_idx), 1)
+    np.add.at(upper_counts, (cols, option_idx), in_upper[rows].astype(np.int64))
+    np.add.at(lower_counts, (cols, option_idx), in_lower[rows].astype(np.int64))
+
+    upper_sizes = matrix.answered[upper].sum(axis=0)
+    lower_sizes = matrix.answered[lower].sum(axis=0)
+
+    results = {}
+    for col in np.unique(cols).tolist():
+        total = int(sample_sizes[col])
+        stats = {}
+        for opt in np.nonzero(counts[col])[0].tolist():
+            count = int(counts[col, opt])
+            percentage = count / total * 100 if total else 0.0
+            upper_rate = upper_counts[col, opt] / upper_sizes[col] if upper_sizes[col] else 0.0
+            lower_rate = lower_counts[col, opt] / lower_sizes[col] if lower_sizes[col] else 0.0
+            stats[str(option_labels[opt])] = {
+                "count": count,
+                "percentage": round(percentage, 1),
+                "is_effective": 5 <= percentage <= 25,  # Good distractors attract 5-25% of responses
+                "upper_rate": round(float(upper_rate), 4),
+                "lower_rate": round(float(lower_rate), 4),
+                # A working distractor is negative: the lower group picks it more often
+                "discrimination": round(float(upper_rate - lower_rate), 4)
+            }
+        results[col] = {"option_statistics": stats, "total_responses": total}
+    return results
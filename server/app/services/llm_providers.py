@@ -0,0 +1,295 @@
+"""
+Async LLM providers used by AIService.
+
+Each provider owns one pooled ``httpx.AsyncClient`` (created lazily, shared by
+all requests of the worker) and a semaphore capping concurrent calls, so a
+slow model never blocks the event loop and a burst of chat requests queues
+per provider instead of opening unbounded connections. Waiting for a slot is
+bounded by the request timeout.
+
+Providers take OpenAI-style ``messages`` and expose ``complete`` (full reply)
+and ``stream`` (text deltas as the model produces them):
+
+- OpenRouter: /chat/completions, SSE with ``stream: true``;
+- Gemini: generateContent / streamGenerateContent?alt=sse (REST);
+- Ollama: /api/chat, newline-delimited JSON.
+"""
+
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+
+class LLMProviderError(Exception):
+    """LLM request failed (HTTP error, timeout, provider busy, misconfiguration).
+
+    ``retryable`` is set for transient failures worth one more attempt:
+    timeouts, connection errors, HTTP 5xx and 429.
+    """
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMProvider(ABC):
+    """Base provider: pooled client, concurrency cap, timeouts."""
+
+    name = "base"
+
+    def __init__(self, model: str, api_key: str = "", base_url: str = "",
+                 timeout: float = 60.0, max_concurrency: int = 16):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.requests = 0
+        self.errors = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 10.0)),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency)
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _slot(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise LLMProviderError(f"{self.name}: too many concurrent requests")
+        self.requests += 1
+        try:
+            yield
+        except LLMProviderError:
+            self.errors += 1
+            raise
+        except httpx.HTTPStatusError as e:
+            self.errors += 1
+            code = e.response.status_code
+            raise LLMProviderError(f"{self.name}: HTTP {code}", retryable=code >= 500 or code == 429) from e
+        except httpx.TransportError as e:
+            # Timeouts and dropped connections
+            self.errors += 1
+            raise LLMProviderError(f"{self.name}: {e}", retryable=True) from e
+        except (httpx.HTTPError, ValueError) as e:
+            self.errors += 1
+            raise LLMProviderError(f"{self.name}: {e}") from e
+        finally:
+            self._semaphore.release()
+
+    async def complete(self, messages: Messages) -> str:
+        async with self._slot():
+            response = await self._get_client().post(self._path(stream=False), json=self._body(messages, stream=False),
+                                                     headers=self._headers())
+            response.raise_for_status()
+            return self._parse_reply(response.json()).strip()
+
+    async def stream(self, messages: Messages) -> AsyncIterator[str]:
+        async with self._slot():
+            async with self._get_client().stream("POST", self._path(stream=True),
+                                                 json=self._body(messages, stream=True),
+                                                 headers=self._headers()) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                async for line in response.aiter_lines():
+                    delta = self._parse_stream_line(line)
+                    if delta:
+                        yield delta
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "requests": self.requests,
+            "errors": self.errors,
+            "max_concurrency": self.max_concurrency
+        }
+
+    # Provider-specific protocol
+    @abstractmethod
+    def _path(self, stream: bool) -> str:
+        ...
+
+    def _headers(self) -> Dict[str, str]:
+        return {}
+
+    @abstractmethod
+    def _body(self, messages: Messages, stream: bool) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def _parse_reply(self, data: Dict[str, Any]) -> str:
+        ...
+
+    @abstractmethod
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        ...
+
+
+def _sse_data(line: str) -> Optional[Dict[str, Any]]:
+    """JSON payload of an SSE ``data:`` line (None for comments, keep-alives, [DONE])."""
+    if not line.startswith("data:"):
+        return None
+    payload = line[5:].strip()
+    if not payload or payload == "[DONE]":
+        return None
+    try:
+        return json.loads(payload)
+    except json.JSONDecodeError:
+        return None
+
+
+class OpenRouterProvider(LLMProvider):
+    name = "openrouter"
+
+    def _path(self, stream: bool) -> str:
+        return "/chat/completions"
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "HTTP-Referer": "https://eduanalytics.local",
+            "X-Title": "EduAnalytics",
+        }
+
+    def _body(self, messages: Messages, stream: bool) -> Dict[str, Any]:
+        return {"model": self.model or "openrouter/auto", "messages": messages, "stream": stream}
+
+    def _parse_reply(self, data: Dict[str, Any]) -> str:
+        return data.get("choices", [{}])[0].get("message", {}).get("content") or ""
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        data = _sse_data(line)
+        if not data:
+            return None
+        return (data.get("choices") or [{}])[0].get("delta", {}).get("content")
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def _path(self, stream: bool) -> str:
+        if stream:
+            return f"/models/{self.model}:streamGenerateContent?alt=sse"
+        return f"/models/{self.model}:generateContent"
+
+    def _headers(self) -> Dict[str, str]:
+        return {"x-goog-api-key": self.api_key}
+
+    def _body(self, messages: Messages, stream: bool) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "contents": [
+                {"role": "model" if m["role"] == "assistant" else "user", "parts": [{"text": m["content"]}]}
+                for m in messages if m["role"] != "system"
+            ]
+        }
+        system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        if system:
+            body["systemInstruction"] = {"parts": [{"text": system}]}
+        return body
+
+    @staticmethod
+    def _candidate_text(data: Dict[str, Any]) -> str:
+        candidates = data.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    def _parse_reply(self, data: Dict[str, Any]) -> str:
+        return self._candidate_text(data)
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        data = _sse_data(line)
+        return self._candidate_text(data) if data else None
+
+
+class OllamaProvider(LLMProvider):
+    name = "ollama"
+
+    def _path(self, stream: bool) -> str:
+        return "/api/chat"
+
+    def _body(self, messages: Messages, stream: bool) -> Dict[str, Any]:
+        return {"model": self.model, "messages": messages, "stream": stream}
+
+    def _parse_reply(self, data: Dict[str, Any]) -> str:
+        return data.get("message", {}).get("content") or ""
+
+    def _parse_stream_line(self, line: str) -> Optional[str]:
+        if not line.strip():
+            return None
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        return data.get("message", {}).get("content")
+
+
+_providers: Dict[str, LLMProvider] = {}
+
+
+def _create_provider(name: str) -> Optional[LLMProvider]:
+    common = {"timeout": settings.LLM_TIMEOUT, "max_concurrency": settings.LLM_MAX_CONCURRENCY}
+    if name == "gemini":
+        return GeminiProvider(
+            model=settings.AI_MODEL or settings.GEMINI_MODEL,
+            api_key=settings.GEMINI_API_KEY or settings.AI_API_KEY,
+            base_url="https://generativelanguage.googleapis.com/v1beta",
+            **common
+        )
+    if name == "openrouter":
+        return OpenRouterProvider(
+            model=settings.AI_MODEL,
+            api_key=settings.OPENROUTER_API_KEY or settings.AI_API_KEY,
+            base_url="https://openrouter.ai/api/v1",
+            **common
+        )
+    if name == "ollama":
+        return OllamaProvider(
+            model=settings.OLLAMA_MODEL,
+            base_url=settings.OLLAMA_API_BASE,
+            timeout=settings.LLM_TIMEOUT,
+            max_concurrency=settings.OLLAMA_MAX_CONCURRENCY
+        )
+    return None
+
+
+def get_llm_provider(name: str) -> Optional[LLMProvider]:
+    """Shared provider instance for ``name`` (None if the provider is not supported)."""
+    name = (name or "").lower()
+    if name not in _providers:
+        provider = _create_provider(name)
+        if provider is None:
+            return None
+        _providers[name] = provider
+    return _providers[name]
+
+
+async def close_llm_providers():
+    """Close pooled clients of all created providers."""
+    for provider in _providers.values():
+        await provider.close()
@@ -4,15 +4,18 @@ LTI Assignment and Grade Services (AGS) implementation.
 Handles grade passback to LTI platforms (Canvas) according to LTI 1.3 AGS specification.
 """
 
+import asyncio
 import logging
 import json
 import jwt
+import random
 import time
 import uuid
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from decimal import Decimal
+from urllib.parse import urlsplit, urlunsplit
 
 import httpx
 from fastapi import HTTPException, status
@@ -69,15 +72,111 @@ class AGSEndpoints:
     lineitem: Optional[str] = None
 
 
+SCORE_SCOPE = 'https://purl.imsglobal.org/spec/lti-ags/scope/score'
+
+# Platform responses after which sending the grade is worth retrying
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_RETRY_DELAY = 30.0
+
+
+class PlatformTokenCache:
+    """OAuth2 access tokens per (platform, scope set), reused until shortly before expiry.
+
+    Each key has its own lock, so concurrent callers with a cold cache make a
+    single token request.
+    """
+    
+    def __init__(self, refresh_margin: int = 60):
+        self.refresh_margin = refresh_margin
+        self._tokens: Dict[Tuple[str, Tuple[str, ...]], Tuple[str, float]] = {}
+        self._locks: Dict[Tuple[str, Tuple[str, ...]], asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(platform_id: str, scopes: List[str]) -> Tuple[str, Tuple[str, ...]]:
+        return platform_id, tuple(sorted(set(scopes)))
+    
+    def get(self, key: Tuple[str, Tuple[str, ...]]) -> Optional[str]:
+        entry = self._tokens.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+    
+    def set(self, key: Tuple[str, Tuple[str, ...]], token: str, expires_in: float):
+        # Treat the token as expired refresh_margin seconds before the platform's expiry
+        ttl = max(0.0, float(expires_in) - self.refresh_margin)
+        self._tokens[key] = (token, time.monotonic() + ttl)
+    
+    def invalidate(self, key: Tuple[str, Tuple[str, ...]], token: Optional[str] = None):
+        """Drop a token (only if it is still ``token``, when given)."""
+        entry = self._tokens.get(key)
+        if entry and (token is None or entry[0] == token):
+            del self._tokens[key]
+    
+    def lock(self, key: Tuple[str, Tuple[str, ...]]) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {"tokens": len(self._tokens), "hits": self.hits, "misses": self.misses}
+
+
 class LTIAGSService:
     """LTI Assignment and Grade Services implementation."""
     
-    def __init__(self, lti_service):
+    def __init__(self, lti_service, concurrency: int = 8, max_retries: int = 5,
+                 token_refresh_margin: int = 60):
         self.lti_service = lti_service
         self.client_timeout = 30.0
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.token_cache = PlatformTokenCache(refresh_margin=token_refresh_margin)
+        self._client: Optional[httpx.AsyncClient] = None
+        # platform_id -> monotonic time until which the platform asked us to back off
+        self._paused_until: Dict[str, float] = {}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Shared pooled client (keep-alive connections to the platform are reused)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.client_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.concurrency * 2,
+                    max_keepalive_connections=self.concurrency
+                )
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def get_access_token(self, platform_id: str, scopes: List[str]) -> str:
-        """Get access token for AGS operations."""
+        """Get access token for AGS operations (cached until shortly before expiry)."""
+        key = self.token_cache.key(platform_id, scopes)
+        token = self.token_cache.get(key)
+        if token:
+            self.token_cache.hits += 1
+            return token
+        
+        async with self.token_cache.lock(key):
+            # Another request may have fetched the token while we waited for the lock
+            token = self.token_cache.get(key)
+            if token:
+                self.token_cache.hits += 1
+                return token
+            
+            self.token_cache.misses += 1
+            token, expires_in = await self._request_access_token(platform_id, scopes)
+            self.token_cache.set(key, token, expires_in)
+            return token
+    
+    async def _request_access_token(self, platform_id: str, scopes: List[str]) -> Tuple[str, float]:
+        """Client-credentials grant with a signed JWT assertion; returns (token, expires_in)."""
         try:
             platform = self.lti_service.platforms.get(platform_id)
             if not platform:
@@ -106,24 +205,26 @@ class LTIAGSService:
             )
             
             # Request access token
-            async with httpx.AsyncClient(timeout=self.client_timeout) as client:
-                token_data = {
-                    'grant_type': 'client_credentials',
-                    'client_assertion_type': 'urn:ietf:params:oauth:client-assertion-type:jwt-bearer',
-                    'client_assertion': client_assertion,
-                    'scope': ' '.join(scopes)
-                }
-                
-                response = await client.post(
-                    platform.auth_token_url,
-                    data=token_data,
-                    headers={'Content-Type': 'application/x-www-form-urlencoded'}
-                )
-                response.raise_for_status()
-                
-                token_response = response.json()
-                return token_response.get('access_token')
-                
+            client = self._get_client()
+            token_data = {
+                'grant_type': 'client_credentials',
+                'client_assertion_type': 'urn:ietf:params:oauth:client-assertion-type:jwt-bearer',
+                'client_assertion': client_assertion,
+                'scope': ' '.join(scopes)
+            }
+            
+            response = await client.post(
+                platform.auth_token_url,
+                data=token_data,
+                headers={'Content-Type': 'application/x-www-form-urlencoded'}
+            )
+            response.raise_for_status()
+            
+            token_response = response.json()
+            return token_response.get('access_token'), token_response.get('expires_in', 3600)
+            
+        except HTTPException:
+            raise
         except httpx.HTTPError as e:
             logger.error(f"HTTP error getting access token: {e}")
             raise HTTPException(
@@ -154,33 +255,33 @@ class LTIAGSService:
             if resource_link_id:
                 params['resource_link_id'] = resource_link_id
             
-            async with httpx.AsyncClient(timeout=self.client_timeout) as client:
-                response = await client.get(
-                    lineitems_url,
-                    params=params,
-                    headers={'Authorization': f'Bearer {access_token}'}
+            client = self._get_client()
+            response = await client.get(
+                lineitems_url,
+                params=params,
+                headers={'Authorization': f'Bearer {access_token}'}
+            )
+            response.raise_for_status()
+            
+            line_items_data = response.json()
+            
+            line_items = []
+            for item_data in line_items_data:
+                line_item = LineItem(
+                    id=item_data.get('id', ''),
+                    scoreMaximum=float(item_data.get('scoreMaximum', 100)),
+                    label=item_data.get('label', ''),
+                    resourceId=item_data.get('resourceId'),
+                    resourceLinkId=item_data.get('resourceLinkId'),
+                    tag=item_data.get('tag'),
+                    startDateTime=item_data.get('startDateTime'),
+                    endDateTime=item_data.get('endDateTime'),
+                    submissionReview=item_data.get('submissionReview')
                 )
-                response.raise_for_status()
-                
-                line_items_data = response.json()
-                
-                line_items = []
-                for item_data in line_items_data:
-                    line_item = LineItem(
-                        id=item_data.get('id', ''),
-                        scoreMaximum=float(item_data.get('scoreMaximum', 100)),
-                        label=item_data.get('label', ''),
-                        resourceId=item_data.get('resourceId'),
-                        resourceLinkId=item_data.get('resourceLinkId'),
-                        tag=item_data.get('tag'),
-                        startDateTime=item_data.get('startDateTime'),
-                        endDateTime=item_data.get('endDateTime'),
-                        submissionReview=item_data.get('submissionReview')
-                    )
-                    line_items.append(line_item)
-                
-                return line_items
-                
+                line_items.append(line_item)
+            
+            return line_items
+            
         except httpx.HTTPError as e:
             logger.error(f"HTTP error getting line items: {e}")
             raise HTTPException(
@@ -226,31 +327,31 @@ class LTIAGSService:
             if line_item.submissionReview:
                 line_item_data['submissionReview'] = line_item.submissionReview
             
-            async with httpx.AsyncClient(timeout=self.client_timeout) as client:
-                response = await client.post(
-                    lineitems_url,
-                    json=line_item_data,
-                    headers={
-                        'Authorization': f'Bearer {access_token}',
-                        'Content-Type': 'application/vnd.ims.lis.v2.lineitem+json'
-                    }
-                )
-                response.raise_for_status()
-                
-                created_item_data = response.json()
-                
-                return LineItem(
-                    id=created_item_data.get('id', ''),
-                    scoreMaximum=float(created_item_data.get('scoreMaximum', line_item.scoreMaximum)),
-                    label=created_item_data.get('label', line_item.label),
-                    resourceId=created_item_data.get('resourceId'),
-                    resourceLinkId=created_item_data.get('resourceLinkId'),
-                    tag=created_item_data.get('tag'),
-                    startDateTime=created_item_data.get('startDateTime'),
-                    endDateTime=created_item_data.get('endDateTime'),
-                    submissionReview=created_item_data.get('submissionReview')
-                )
-                
+            client = self._get_client()
+            response = await client.post(
+                lineitems_url,
+                json=line_item_data,
+                headers={
+                    'Authorization': f'Bearer {access_token}',
+                    'Content-Type': 'application/vnd.ims.lis.v2.lineitem+json'
+                }
+            )
+            response.raise_for_status()
+            
+            created_item_data = response.json()
+            
+            return LineItem(
+                id=created_item_data.get('id', ''),
+                scoreMaximum=float(created_item_data.get('scoreMaximum', line_item.scoreMaximum)),
+                label=created_item_data.get('label', line_item.label),
+                resourceId=created_item_data.get('resourceId'),
+                resourceLinkId=created_item_data.get('resourceLinkId'),
+                tag=created_item_data.get('tag'),
+                startDateTime=created_item_data.get('startDateTime'),
+                endDateTime=created_item_data.get('endDateTime'),
+                submissionReview=created_item_data.get('submissionReview')
+            )
+            
         except httpx.HTTPError as e:
             logger.error(f"HTTP error creating line item: {e}")
             raise HTTPException(
@@ -268,50 +369,21 @@ class LTIAGSService:
                          score: Score) -> bool:
         """Submit a score to the platform."""
         try:
-            # Get access token with score scope
-            access_token = await self.get_access_token(
-                platform_id, 
-                ['https://purl.imsglobal.org/spec/lti-ags/scope/score']
-            )
-            
-            # Build scores URL
-            scores_url = f"{line_item_url}/scores"
-            
-            # Prepare score data
-            score_data = {
-                'userId': score.userId,
-                'timestamp': score.timestamp or datetime.utcnow().isoformat()
-            }
+            await self._post_score(platform_id, line_item_url, score)
+            logger.info(f"Score submitted successfully for user {score.userId}")
+            return True
             
-            if score.scoreGiven is not None:
-                score_data['scoreGiven'] = score.scoreGiven
-            if score.scoreMaximum is not None:
-                score_data['scoreMaximum'] = score.scoreMaximum
-            if score.comment:
-                score_data['comment'] = score.comment
-            if score.activityProgress:
-                score_data['activityProgress'] = score.activityProgress
-            if score.gradingProgress:
-                score_data['gradingProgress'] = score.gradingProgress
-            
-            async with httpx.AsyncClient(timeout=self.client_timeout) as client:
-                response = await client.post(
-                    scores_url,
-                    json=score_data,
-                    headers={
-                        'Authorization': f'Bearer {access_token}',
-                        'Content-Type': 'application/vnd.ims.lis.v1.score+json'
-                    }
-                )
-                response.raise_for_status()
-                
-                logger.info(f"Score submitted successfully for user {score.userId}")
-                return True
-                
+        except HTTPException:
+            raise
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP error submitting score: {e}")
+            logger.error(f"Response content: {e.response.text}")
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Failed to submit score: {str(e)}"
+            )
         except httpx.HTTPError as e:
             logger.error(f"HTTP error submitting score: {e}")
-            if e.response:
-                logger.error(f"Response content: {e.response.text}")
             raise HTTPException(
                 status_code=status.HTTP_502_BAD_GATEWAY,
                 detail=f"Failed to submit score: {str(e)}"
@@ -323,6 +395,96 @@ class LTIAGSService:
                 detail=f"Submit score failed: {str(e)}"
             )
     
+    @staticmethod
+    def _scores_url(line_item_url: str) -> str:
+        """``{line item}/scores``, keeping the line item's query string after the path."""
+        parts = urlsplit(line_item_url)
+        return urlunsplit(parts._replace(path=parts.path.rstrip('/') + '/scores'))
+    
+    @staticmethod
+    def _score_payload(score: Score) -> Dict[str, Any]:
+        score_data = {
+            'userId': score.userId,
+            'timestamp': score.timestamp or datetime.utcnow().isoformat()
+        }
+        
+        if score.scoreGiven is not None:
+            score_data['scoreGiven'] = score.scoreGiven
+        if score.scoreMaximum is not None:
+            score_data['scoreMaximum'] = score.scoreMaximum
+        if score.comment:
+            score_data['comment'] = score.comment
+        if score.activityProgress:
+            score_data['activityProgress'] = score.activityProgress
+        if score.gradingProgress:
+            score_data['gradingProgress'] = score.gradingProgress
+        
+        return score_data
+    
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        """Retry-After from the platform, otherwise exponential backoff with jitter."""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(MAX_RETRY_DELAY, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        return min(MAX_RETRY_DELAY, 0.5 * (2 ** attempt)) * (0.5 + random.random() / 2)
+    
+    async def _wait_for_platform(self, platform_id: str):
+        # A 429 from the platform slows down all concurrent sends, not just the one that got it
+        delay = self._paused_until.get(platform_id, 0.0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    async def _post_score(self, platform_id: str, line_item_url: str, score: Score):
+        """POST one score, retrying on 429/5xx and re-authenticating once on 401.
+
+        Raises httpx errors when the platform keeps rejecting the score.
+        """
+        scopes = [SCORE_SCOPE]
+        key = self.token_cache.key(platform_id, scopes)
+        scores_url = self._scores_url(line_item_url)
+        score_data = self._score_payload(score)
+        client = self._get_client()
+        
+        attempt = 0
+        reauthenticated = False
+        while True:
+            await self._wait_for_platform(platform_id)
+            access_token = await self.get_access_token(platform_id, scopes)
+            response = await client.post(
+                scores_url,
+                json=score_data,
+                headers={
+                    'Authorization': f'Bearer {access_token}',
+                    'Content-Type': 'application/vnd.ims.lis.v1.score+json'
+                }
+            )
+            
+            if response.status_code == 401 and not reauthenticated:
+                # Token revoked before expiry: drop it (unless already refreshed) and retry
+                self.token_cache.invalidate(key, access_token)
+                reauthenticated = True
+                continue
+            
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._retry_delay(response, attempt)
+                if response.status_code == 429:
+                    self._paused_until[platform_id] = max(
+                        self._paused_until.get(platform_id, 0.0), time.monotonic() + delay
+                    )
+                attempt += 1
+                logger.warning(
+                    f"Platform returned {response.status_code} for score of user {score.userId}, "
+                    f"retry {attempt}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            
+            response.raise_for_status()
+            return
+    
     async def get_results(self, platform_id: str, line_item_url: str, 
                         user_id: Optional[str] = None) -> List[Result]:
         """Get results from the platform."""
@@ -340,30 +502,30 @@ class LTIAGSService:
             if user_id:
                 params['user_id'] = user_id
             
-            async with httpx.AsyncClient(timeout=self.client_timeout) as client:
-                response = await client.get(
-                    results_url,
-                    params=params,
-                    headers={'Authorization': f'Bearer {access_token}'}
+            client = self._get_client()
+            response = await client.get(
+                results_url,
+                params=params,
+                headers={'Authorization': f'Bearer {access_token}'}
+            )
+            response.raise_for_status()
+            
+            results_data = response.json()
+            
+            results = []
+            for result_data in results_data:
+                result = Result(
+                    id=result_data.get('id', ''),
+                    userId=result_data.get('userId', ''),
+                    resultScore=result_data.get('resultScore'),
+                    resultMaximum=result_data.get('resultMaximum'),
+                    comment=result_data.get('comment'),
+                    scoreOf=result_data.get('scoreOf')
                 )
-                response.raise_for_status()
-                
-                results_data = response.json()
-                
-                results = []
-                for result_data in results_data:
-                    result = Result(
-                        id=result_data.get('id', ''),
-                        userId=result_data.get('userId', ''),
-                        resultScore=result_data.get('resultScore'),
-                        resultMaximum=result_data.get('resultMaximum'),
-                        comment=result_data.get('comment'),
-                        scoreOf=result_data.get('scoreOf')
-                    )
-                    results.append(result)
-                
-                return results
-                
+                results.append(result)
+            
+            return results
+            
         except httpx.HTTPError as e:
             logger.error(f"HTTP error getting results: {e}")
             raise HTTPException(
@@ -465,6 +627,7 @@ class LTIAGSService:
                         db, platform_id, assignment_id, student_id, 
                         score, max_score, line_item_url, "success"
                     )
+                    await db.commit()
                 
                 return success
                 
@@ -479,6 +642,7 @@ class LTIAGSService:
                         db, platform_id, assignment_id, student_id,
                         score, max_score, "", "failed", str(e)
                     )
+                    await db.commit()
             except:
                 pass
             
@@ -544,46 +708,49 @@ class LTIAGSService:
                     })
                     await db.commit()
                 
-                # Sync each grade
+                # Send grades concurrently (at most self.concurrency requests at once);
+                # the platform token is fetched once and shared by all of them
+                semaphore = asyncio.Semaphore(self.concurrency)
+                
+                async def push(submission) -> Optional[Exception]:
+                    score_obj = Score(
+                        userId=submission.lti_user_id,
+                        scoreGiven=float(submission.score),
+                        scoreMaximum=float(submission.max_score),
+                        activityProgress="Completed",
+                        gradingProgress="FullyGraded",
+                        timestamp=datetime.utcnow().isoformat()
+                    )
+                    async with semaphore:
+                        try:
+                            await self._post_score(platform_id, line_item_url, score_obj)
+                            return None
+                        except Exception as e:
+                            logger.error(f"Failed to sync grade for user {submission.lti_user_id}: {e}")
+                            return e
+                
+                started = time.monotonic()
+                errors = await asyncio.gather(*(push(submission) for submission in submissions))
+                
                 synced_count = 0
                 failed_count = 0
                 failed_users = []
-                
-                for submission in submissions:
-                    try:
-                        score_obj = Score(
-                            userId=submission.lti_user_id,
-                            scoreGiven=float(submission.score),
-                            scoreMaximum=float(submission.max_score),
-                            activityProgress="Completed",
-                            gradingProgress="FullyGraded",
-                            timestamp=datetime.utcnow().isoformat()
-                        )
-                        
-                        success = await self.submit_score(platform_id, line_item_url, score_obj)
-                        
-                        if success:
-                            synced_count += 1
-                            await self._log_grade_sync(
-                                db, platform_id, assignment_id, submission.student_id,
-                                submission.score, submission.max_score, 
-                                line_item_url, "success"
-                            )
-                        else:
-                            failed_count += 1
-                            failed_users.append(submission.lti_user_id)
-                            
-                    except Exception as e:
-                        logger.error(f"Failed to sync grade for user {submission.lti_user_id}: {e}")
+                log_rows = []
+                for submission, error in zip(submissions, errors):
+                    if error is None:
+                        synced_count += 1
+                    else:
                         failed_count += 1
                         failed_users.append(submission.lti_user_id)
-                        
-                        await self._log_grade_sync(
-                            db, platform_id, assignment_id, submission.student_id,
-                            submission.score, submission.max_score,
-                            line_item_url, "failed", str(e)
-                        )
-                
+                    log_rows.append(self._grade_sync_row(
+                        platform_id, assignment_id, submission.student_id,
+                        submission.score, submission.max_score, line_item_url,
+                        "success" if error is None else "failed",
+                        str(error) if error is not None else None
+                    ))
+                
+                # Sync log in one batched INSERT
+                await self._log_grade_syncs(db, log_rows)
                 await db.commit()
                 
                 return {
@@ -592,7 +759,8 @@ class LTIAGSService:
                     "synced_count": synced_count,
                     "failed_count": failed_count,
                     "failed_users": failed_users,
-                    "total_submissions": len(submissions)
+                    "total_submissions": len(submissions),
+                    "duration_seconds": round(time.monotonic() - started, 2)
                 }
                 
         except Exception as e:
@@ -602,69 +770,59 @@ class LTIAGSService:
                 detail=f"Bulk grade sync failed: {str(e)}"
             )
     
+    @staticmethod
+    def _grade_sync_row(platform_id: str, assignment_id: int, student_id: int,
+                        score: float, max_score: float, line_item_url: str,
+                        status: str, error_message: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "sync_id": str(uuid.uuid4()),
+            "platform_id": platform_id,
+            "assignment_id": assignment_id,
+            "student_id": student_id,
+            "score": score,
+            "max_score": max_score,
+            "line_item_url": line_item_url,
+            "status": status,
+            "error_message": error_message,
+            "synced_at": datetime.utcnow()
+        }
+    
     async def _log_grade_sync(self, db: AsyncSession, platform_id: str,
                             assignment_id: int, student_id: int,
                             score: float, max_score: float,
                             line_item_url: str, status: str,
                             error_message: Optional[str] = None):
         """Log grade sync operation."""
-        try:
-            # Create grade sync logs table if not exists
-            await self._create_grade_sync_table(db)
-            
-            insert_sql = """
-            INSERT INTO lti_grade_sync_log (
-                sync_id, platform_id, assignment_id, student_id,
-                score, max_score, line_item_url, status, error_message,
-                synced_at
-            ) VALUES (
-                :sync_id, :platform_id, :assignment_id, :student_id,
-                :score, :max_score, :line_item_url, :status, :error_message,
-                :synced_at
-            )
-            """
-            
-            await db.execute(text(insert_sql), {
-                "sync_id": str(uuid.uuid4()),
-                "platform_id": platform_id,
-                "assignment_id": assignment_id,
-                "student_id": student_id,
-                "score": score,
-                "max_score": max_score,
-                "line_item_url": line_item_url,
-                "status": status,
-                "error_message": error_message,
-                "synced_at": datetime.utcnow()
-            })
-            
-        except Exception as e:
-            logger.error(f"Error logging grade sync: {e}")
+        await self._log_grade_syncs(db, [self._grade_sync_row(
+            platform_id, assignment_id, student_id, score, max_score,
+            line_item_url, status, error_message
+        )])
     
-    async def _create_grade_sync_table(self, db: AsyncSession):
-        """Create grade sync log table."""
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS lti_grade_sync_log (
-            sync_id VARCHAR(36) PRIMARY KEY,
-            platform_id VARCHAR(255) NOT NULL,
-            assignment_id INTEGER NOT NULL,
-            student_id INTEGER NOT NULL,
-            score DECIMAL(10,2) NOT NULL,
-            max_score DECIMAL(10,2) NOT NULL,
-            line_item_url TEXT NOT NULL,
-            status VARCHAR(20) NOT NULL,
-            error_message TEXT,
-            synced_at TIMESTAMP WITH TIME ZONE NOT NULL,
-            FOREIGN KEY (assignment_id) REFERENCES assignments(id) ON DELETE CASCADE,
-            FOREIGN KEY (student_id) REFERENCES users(id) ON DELETE CASCADE
-        );
-        
-        CREATE INDEX IF NOT EXISTS idx_grade_sync_assignment ON lti_grade_sync_log(assignment_id);
-        CREATE INDEX IF NOT EXISTS idx_grade_sync_student ON lti_grade_sync_log(student_id);
-        CREATE INDEX IF NOT EXISTS idx_grade_sync_status ON lti_grade_sync_log(status);
-        CREATE INDEX IF NOT EXISTS idx_grade_sync_synced_at ON lti_grade_sync_log(synced_at);
+    async def _log_grade_syncs(self, db: AsyncSession, rows: List[Dict[str, Any]]):
         """
+        Log many grade sync operations with one executemany INSERT.
         
-        await db.execute(text(create_table_sql))
+        The table comes from migration lti_grade_sync_log_0003. The INSERT runs in
+        a savepoint, so a logging failure never aborts the caller's transaction.
+        """
+        if not rows:
+            return
+        insert_sql = """
+        INSERT INTO lti_grade_sync_log (
+            sync_id, platform_id, assignment_id, student_id,
+            score, max_score, line_item_url, status, error_message,
+            synced_at
+        ) VALUES (
+            :sync_id, :platform_id, :assignment_id, :student_id,
+            :score, :max_score, :line_item_url, :status, :error_message,
+            :synced_at
+        )
+        """
+        try:
+            async with db.begin_nested():
+                await db.execute(text(insert_sql), rows)
+        except Exception as e:
+            logger.error(f"Error logging {len(rows)} grade sync rows: {e}")
     
     async def get_sync_history(self, assignment_id: Optional[int] = None,
                              student_id: Optional[int] = None,
@@ -672,8 +830,6 @@ class LTIAGSService:
         """Get grade sync history."""
         try:
             async with AsyncSessionLocal() as db:
-                await self._create_grade_sync_table(db)
-                
                 conditions = ["synced_at >= NOW() - INTERVAL '%s days'" % days]
                 params = {}
                 
@@ -733,5 +889,16 @@ def get_lti_ags_service():
     global lti_ags_service
     if not lti_ags_service:
         from app.services.lti_service import lti_service
-        lti_ags_service = LTIAGSService(lti_service)
+        lti_ags_service = LTIAGSService(
+            lti_service,
+            concurrency=settings.LTI_AGS_CONCURRENCY,
+            max_retries=settings.LTI_AGS_MAX_RETRIES,
+            token_refresh_margin=settings.LTI_TOKEN_REFRESH_MARGIN
+        )
     return lti_ags_service
+
+
+async def close_lti_ags_service():
+    """Close the shared HTTP client of the AGS service, if it was created."""
+    if lti_ags_service is not None:
+        await lti_ags_service.close()
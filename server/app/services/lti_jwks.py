@@ -0,0 +1,209 @@
+"""
+Per-platform JWKS cache for LTI 1.3 launch validation.
+
+Platform key sets are fetched once and kept as parsed RSA public key objects,
+so verifying an id_token does not touch the network:
+
+- lifetime comes from the response's Cache-Control max-age (clamped to
+  [min_ttl, max_ttl]), default_ttl when absent;
+- an unknown ``kid`` (platform key rotation) triggers a refresh, at most once
+  per ``refresh_interval`` seconds per key set, so forged kids cannot make us
+  hammer the platform;
+- concurrent misses share one request (per-URL lock);
+- if the platform is unreachable, expired keys keep being served for up to
+  ``stale_ttl`` seconds.
+"""
+
+import asyncio
+import base64
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey, RSAPublicNumbers
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*\"?(\d+)", re.IGNORECASE)
+
+
+class JWKSKeyNotFound(LookupError):
+    """No key in the platform's key set matches the token."""
+
+
+@dataclass
+class _KeySet:
+    keys: Dict[str, RSAPublicKey]
+    default_key: Optional[RSAPublicKey]
+    fetched_at: float
+    expires_at: float
+    last_refresh_attempt: float = 0.0
+
+    def find(self, kid: Optional[str]) -> Optional[RSAPublicKey]:
+        if kid:
+            return self.keys.get(kid)
+        return self.default_key
+
+
+def _b64url_int(value: str) -> int:
+    return int.from_bytes(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)), "big")
+
+
+def parse_jwk(jwk: Dict[str, Any]) -> Optional[RSAPublicKey]:
+    """RSA public key object for a signing JWK (None for other key types)."""
+    if jwk.get("kty") != "RSA" or jwk.get("use", "sig") != "sig":
+        return None
+    return RSAPublicNumbers(_b64url_int(jwk["e"]), _b64url_int(jwk["n"])).public_key()
+
+
+class JWKSCache:
+    """Parsed platform key sets keyed by JWKS URL."""
+
+    def __init__(self, default_ttl: int = 3600, min_ttl: int = 60, max_ttl: int = 86400,
+                 refresh_interval: int = 30, stale_ttl: int = 86400, timeout: float = 10.0):
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.refresh_interval = refresh_interval
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self._sets: Dict[str, _KeySet] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.hits = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.stale_served = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _lock(self, url: str) -> asyncio.Lock:
+        if url not in self._locks:
+            self._locks[url] = asyncio.Lock()
+        return self._locks[url]
+
+    def _ttl(self, response: httpx.Response) -> float:
+        cache_control = response.headers.get("Cache-Control", "")
+        if "no-store" in cache_control.lower() or "no-cache" in cache_control.lower():
+            return self.min_ttl
+        match = _MAX_AGE_RE.search(cache_control)
+        ttl = int(match.group(1)) if match else self.default_ttl
+        return min(self.max_ttl, max(self.min_ttl, ttl))
+
+    async def get_key(self, key_set_url: str, kid: Optional[str] = None) -> RSAPublicKey:
+        """Public key for ``kid`` (first key of the set when the token has no kid).
+
+        Raises JWKSKeyNotFound when the key set has no such key, and httpx
+        errors when the key set was never fetched and the platform is down.
+        """
+        now = time.monotonic()
+        key_set = self._sets.get(key_set_url)
+        if key_set is not None:
+            fresh = now < key_set.expires_at
+            # Refresh (unknown kid or expiry) at most once per refresh_interval;
+            # between attempts the expired set is served until stale_ttl passes
+            recently_tried = (
+                now - key_set.last_refresh_attempt < self.refresh_interval
+                and now < key_set.fetched_at + self.stale_ttl
+            )
+            if fresh or recently_tried:
+                key = key_set.find(kid)
+                if key is not None:
+                    self.hits += 1
+                    return key
+                if recently_tried:
+                    raise JWKSKeyNotFound(f"Unknown key id {kid!r} for {key_set_url}")
+
+        key_set = await self._refresh(key_set_url, key_set)
+        key = key_set.find(kid)
+        if key is None:
+            raise JWKSKeyNotFound(f"Unknown key id {kid!r} for {key_set_url}")
+        return key
+
+    async def _refresh(self, url: str, seen: Optional[_KeySet]) -> _KeySet:
+        requested_at = time.monotonic()
+        async with self._lock(url):
+            current = self._sets.get(url)
+            # While we waited for the lock another request refreshed (or tried to)
+            if current is not None and (current is not seen or current.last_refresh_attempt >= requested_at):
+                return current
+
+            now = time.monotonic()
+            if current is not None:
+                current.last_refresh_attempt = now
+            try:
+                response = await self._get_client().get(url)
+                response.raise_for_status()
+                keys = {}
+                default_key = None
+                for jwk in response.json().get("keys", []):
+                    try:
+                        key = parse_jwk(jwk)
+                    except (KeyError, ValueError, TypeError) as e:
+                        logger.warning(f"Skipping malformed JWK {jwk.get('kid')!r} from {url}: {e}")
+                        continue
+                    if key is None:
+                        continue
+                    if default_key is None:
+                        default_key = key
+                    if jwk.get("kid"):
+                        keys[jwk["kid"]] = key
+            except Exception as e:
+                self.fetch_errors += 1
+                if current is not None and now < current.fetched_at + self.stale_ttl:
+                    # Platform unreachable: keep verifying signatures with the old keys
+                    self.stale_served += 1
+                    logger.warning(f"JWKS refresh failed for {url}, serving cached keys: {e}")
+                    return current
+                logger.error(f"Error fetching JWKS from {url}: {e}")
+                raise
+
+            self.fetches += 1
+            key_set = _KeySet(
+                keys=keys,
+                default_key=default_key,
+                fetched_at=now,
+                expires_at=now + self._ttl(response),
+                last_refresh_attempt=now
+            )
+            self._sets[url] = key_set
+            logger.info(f"Fetched JWKS from {url}: {len(keys)} keys")
+            return key_set
+
+    async def prefetch(self, key_set_url: str):
+        """Warm the cache for a platform (errors are logged, not raised)."""
+        try:
+            await self._refresh(key_set_url, self._sets.get(key_set_url))
+        except Exception as e:
+            logger.warning(f"JWKS prefetch failed for {key_set_url}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "key_sets": len(self._sets),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "stale_served": self.stale_served
+        }
+
+
+# Global cache instance
+jwks_cache = JWKSCache(
+    default_ttl=settings.LTI_JWKS_DEFAULT_TTL,
+    refresh_interval=settings.LTI_JWKS_REFRESH_INTERVAL,
+    stale_ttl=settings.LTI_JWKS_STALE_TTL
+)
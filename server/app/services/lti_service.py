@@ -5,15 +5,12 @@ Handles LTI 1.3 OIDC login, Deep Linking, and Assignment and Grade Services (AGS
 """
 
 import logging
-import json
 import jwt
 import time
 import uuid
 from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from urllib.parse import urlencode, parse_qs, urlparse
-import httpx
 
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -24,6 +21,8 @@ from cryptography.hazmat.primitives import serialization
 
 from app.db.session import AsyncSessionLocal
 from app.core.config import settings
+from app.services.lti_jwks import JWKSKeyNotFound, jwks_cache
+from app.services.lti_state_store import lti_state_store
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +94,8 @@ class LTI13Service:
         self.private_key = None
         self.public_key = None
         self.key_id = "eduanalytics-key-1"
+        self.jwks_cache = jwks_cache
+        self.state_store = lti_state_store
         
     async def initialize(self):
         """Initialize LTI service."""
@@ -105,6 +106,10 @@ class LTI13Service:
             # Load platform configurations
             await self._load_platforms()
             
+            # Warm platform key sets so the first launches skip the JWKS round trip
+            for platform in self.platforms.values():
+                await self.jwks_cache.prefetch(platform.key_set_url)
+            
             # Create database tables
             async with AsyncSessionLocal() as db:
                 await self._create_lti_tables(db)
@@ -237,7 +242,9 @@ class LTI13Service:
         CREATE INDEX IF NOT EXISTS idx_lti_line_items_context ON lti_line_items(context_id);
         """
         
-        await db.execute(text(create_tables_sql))
+        for statement in create_tables_sql.split(";"):
+            if statement.strip():
+                await db.execute(text(statement))
         await db.commit()
     
     async def handle_oidc_login(self, request_data: Dict[str, Any]) -> str:
@@ -268,8 +275,8 @@ class LTI13Service:
             state = str(uuid.uuid4())
             nonce = str(uuid.uuid4())
             
-            # Store nonce for verification
-            await self._store_nonce(nonce, iss)
+            # Store nonce (bound to state) for verification
+            await self.state_store.store_nonce(nonce, iss, state)
             
             # Build authorization redirect URL
             auth_params = {
@@ -334,7 +341,7 @@ class LTI13Service:
             
             # Verify nonce
             nonce = payload.get('nonce')
-            if not await self._verify_nonce(nonce, iss):
+            if not await self.state_store.consume_nonce(nonce, iss, state):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Invalid or expired nonce"
@@ -345,7 +352,7 @@ class LTI13Service:
             
             # Store launch for session management
             launch_id = str(uuid.uuid4())
-            await self._store_launch(launch_id, platform.platform_id, launch_data, payload)
+            await self.state_store.store_launch(launch_id, platform.platform_id, launch_data, payload)
             
             logger.info(f"LTI launch successful for user: {launch_data.user_id}")
             return launch_data
@@ -507,36 +514,17 @@ class LTI13Service:
             logger.error(f"Error getting content items: {e}")
             return []
     
-    async def _get_platform_public_key(self, platform: LTIPlatform, kid: Optional[str] = None) -> str:
-        """Get platform's public key from JWKS endpoint."""
+    async def _get_platform_public_key(self, platform: LTIPlatform, kid: Optional[str] = None):
+        """Get platform's public key (parsed, from the JWKS cache)."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(platform.key_set_url)
-                response.raise_for_status()
-                
-                jwks = response.json()
-                keys = jwks.get('keys', [])
-                
-                # Find key by kid or use first available
-                target_key = None
-                if kid:
-                    target_key = next((k for k in keys if k.get('kid') == kid), None)
-                
-                if not target_key and keys:
-                    target_key = keys[0]
-                
-                if not target_key:
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail="No suitable public key found"
-                    )
-                
-                # Convert JWK to PEM format
-                from jwt.algorithms import RSAAlgorithm
-                public_key = RSAAlgorithm.from_jwk(json.dumps(target_key))
-                
-                return public_key
-                
+            return await self.jwks_cache.get_key(platform.key_set_url, kid)
+            
+        except JWKSKeyNotFound as e:
+            logger.error(f"Platform signing key not found: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown platform signing key"
+            )
         except Exception as e:
             logger.error(f"Error getting platform public key: {e}")
             raise HTTPException(
@@ -562,124 +550,19 @@ class LTI13Service:
             launch_presentation=payload.get('https://purl.imsglobal.org/spec/lti/claim/launch_presentation', {})
         )
     
-    async def _store_nonce(self, nonce: str, platform_id: str):
-        """Store nonce for verification."""
-        try:
-            async with AsyncSessionLocal() as db:
-                expires_at = datetime.utcnow() + timedelta(minutes=5)
-                
-                insert_sql = """
-                INSERT INTO lti_nonces (nonce, platform_id, expires_at)
-                VALUES (:nonce, :platform_id, :expires_at)
-                """
-                
-                await db.execute(text(insert_sql), {
-                    "nonce": nonce,
-                    "platform_id": platform_id,
-                    "expires_at": expires_at
-                })
-                
-                await db.commit()
-                
-        except Exception as e:
-            logger.error(f"Error storing nonce: {e}")
-    
-    async def _verify_nonce(self, nonce: str, platform_id: str) -> bool:
-        """Verify and consume nonce."""
-        try:
-            async with AsyncSessionLocal() as db:
-                # Check if nonce exists and is valid
-                select_sql = """
-                SELECT 1 FROM lti_nonces 
-                WHERE nonce = :nonce AND platform_id = :platform_id AND expires_at > NOW()
-                """
-                
-                result = await db.execute(text(select_sql), {
-                    "nonce": nonce,
-                    "platform_id": platform_id
-                })
-                
-                if not result.fetchone():
-                    return False
-                
-                # Delete nonce (one-time use)
-                delete_sql = """
-                DELETE FROM lti_nonces 
-                WHERE nonce = :nonce AND platform_id = :platform_id
-                """
-                
-                await db.execute(text(delete_sql), {
-                    "nonce": nonce,
-                    "platform_id": platform_id
-                })
-                
-                await db.commit()
-                return True
-                
-        except Exception as e:
-            logger.error(f"Error verifying nonce: {e}")
-            return False
-    
-    async def _store_launch(self, launch_id: str, platform_id: str, 
-                          launch_data: LTILaunchData, full_payload: Dict[str, Any]):
-        """Store launch data for session management."""
-        try:
-            async with AsyncSessionLocal() as db:
-                expires_at = datetime.utcnow() + timedelta(hours=24)
-                
-                insert_sql = """
-                INSERT INTO lti_launches (
-                    launch_id, platform_id, deployment_id, user_id, context_id,
-                    resource_link_id, message_type, target_link_uri, launch_data, expires_at
-                ) VALUES (
-                    :launch_id, :platform_id, :deployment_id, :user_id, :context_id,
-                    :resource_link_id, :message_type, :target_link_uri, :launch_data, :expires_at
-                )
-                """
-                
-                await db.execute(text(insert_sql), {
-                    "launch_id": launch_id,
-                    "platform_id": platform_id,
-                    "deployment_id": launch_data.deployment_id,
-                    "user_id": launch_data.user_id,
-                    "context_id": launch_data.context_id,
-                    "resource_link_id": launch_data.resource_link_id,
-                    "message_type": launch_data.message_type,
-                    "target_link_uri": launch_data.target_link_uri,
-                    "launch_data": json.dumps(full_payload),
-                    "expires_at": expires_at
-                })
-                
-                await db.commit()
-                
-        except Exception as e:
-            logger.error(f"Error storing launch: {e}")
-    
     async def cleanup_expired_data(self) -> Dict[str, int]:
-        """Clean up expired LTI data."""
-        try:
-            async with AsyncSessionLocal() as db:
-                cleanup_counts = {}
-                
-                # Clean up expired nonces
-                result = await db.execute(text("DELETE FROM lti_nonces WHERE expires_at <= NOW()"))
-                cleanup_counts["nonces"] = result.rowcount
-                
-                # Clean up expired launches
-                result = await db.execute(text("DELETE FROM lti_launches WHERE expires_at <= NOW()"))
-                cleanup_counts["launches"] = result.rowcount
-                
-                await db.commit()
-                
-                total_cleaned = sum(cleanup_counts.values())
-                if total_cleaned > 0:
-                    logger.info(f"LTI cleanup: {cleanup_counts}")
-                
-                return cleanup_counts
-                
-        except Exception as e:
-            logger.error(f"Error cleaning up LTI data: {e}")
-            return {}
+        """Clean up expired LTI data.
+
+        Nonces and launches normally live in Redis and expire on their own;
+        this only sweeps rows written while Redis was unavailable.
+        """
+        cleanup_counts = await self.state_store.cleanup_expired()
+        
+        total_cleaned = sum(cleanup_counts.values())
+        if total_cleaned > 0:
+            logger.info(f"LTI cleanup: {cleanup_counts}")
+        
+        return cleanup_counts
     
     def get_jwks(self) -> Dict[str, Any]:
         """Get JSON Web Key Set for platform verification."""
@@ -0,0 +1,229 @@
+"""
+Short-lived LTI 1.3 state: OIDC nonces and launch records.
+
+Both live in Redis with a TTL, so the launch path does no database writes and
+nothing needs sweeping:
+
+- ``lti:nonce:{platform}:{nonce}`` is written with SET NX EX at OIDC login
+  (value: the ``state`` sent to the platform) and consumed with GETDEL at
+  launch, so a nonce is accepted exactly once, and only together with the
+  state it was issued with;
+- ``lti:launch:{launch_id}`` holds the launch payload for ``launch_ttl``.
+
+When Redis is unavailable, the original ``lti_nonces`` / ``lti_launches``
+tables are used instead (Redis is skipped for ``redis_retry_after`` seconds);
+``cleanup_expired`` only has to sweep rows written during such outages.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class LTIStateStore:
+    """Redis-first store for nonces and launches with SQL fallback."""
+
+    def __init__(self, nonce_ttl: int = 300, launch_ttl: int = 86400,
+                 use_redis: bool = True, redis_retry_after: int = 30):
+        self.nonce_ttl = nonce_ttl
+        self.launch_ttl = launch_ttl
+        self.use_redis = use_redis
+        self.redis_retry_after = redis_retry_after
+        self.key_prefix = "lti:"
+        self._redis_disabled_until = 0.0
+
+        self.redis_writes = 0
+        self.sql_writes = 0
+        self.replays_rejected = 0
+
+    def _redis(self):
+        if not self.use_redis or time.monotonic() < self._redis_disabled_until:
+            return None
+        from app.services.redis_service import redis_service
+        return redis_service.get_client()
+
+    def _redis_failed(self, e: Exception):
+        self._redis_disabled_until = time.monotonic() + self.redis_retry_after
+        logger.warning(f"LTI state store: Redis unavailable, using database: {e}")
+
+    def _nonce_key(self, nonce: str, platform_id: str) -> str:
+        return f"{self.key_prefix}nonce:{platform_id}:{nonce}"
+
+    def _launch_key(self, launch_id: str) -> str:
+        return f"{self.key_prefix}launch:{launch_id}"
+
+    async def store_nonce(self, nonce: str, platform_id: str, state: Optional[str] = None):
+        """Remember a nonce issued at OIDC login."""
+        client = self._redis()
+        if client is not None:
+            try:
+                created = await client.set(
+                    self._nonce_key(nonce, platform_id), state or "", nx=True, ex=self.nonce_ttl
+                )
+                if not created:
+                    logger.warning(f"LTI nonce collision for platform {platform_id}")
+                self.redis_writes += 1
+                return
+            except Exception as e:
+                self._redis_failed(e)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(text("""
+                INSERT INTO lti_nonces (nonce, platform_id, expires_at)
+                VALUES (:nonce, :platform_id, :expires_at)
+                """), {
+                    "nonce": nonce,
+                    "platform_id": platform_id,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=self.nonce_ttl)
+                })
+                await db.commit()
+                self.sql_writes += 1
+        except Exception as e:
+            logger.error(f"Error storing nonce: {e}")
+
+    async def consume_nonce(self, nonce: Optional[str], platform_id: str,
+                            state: Optional[str] = None) -> bool:
+        """Atomically verify and consume a nonce (one-time use)."""
+        if not nonce:
+            return False
+
+        client = self._redis()
+        if client is not None:
+            try:
+                issued_state = await client.getdel(self._nonce_key(nonce, platform_id))
+                if issued_state is not None:
+                    issued_state = _decode(issued_state)
+                    if state and issued_state and issued_state != state:
+                        logger.warning(f"LTI launch state does not match nonce for platform {platform_id}")
+                        return False
+                    return True
+                # Nonce мог быть выдан, пока Redis был недоступен — проверяем таблицу
+            except Exception as e:
+                self._redis_failed(e)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(text("""
+                DELETE FROM lti_nonces
+                WHERE nonce = :nonce AND platform_id = :platform_id AND expires_at > NOW()
+                RETURNING nonce
+                """), {"nonce": nonce, "platform_id": platform_id})
+                consumed = result.fetchone() is not None
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Error verifying nonce: {e}")
+            return False
+
+        if not consumed:
+            self.replays_rejected += 1
+        return consumed
+
+    async def store_launch(self, launch_id: str, platform_id: str, launch_data,
+                           full_payload: Dict[str, Any]):
+        """Keep launch data for session management (expires after launch_ttl)."""
+        client = self._redis()
+        if client is not None:
+            try:
+                record = {"platform_id": platform_id, "launch_data": full_payload}
+                await client.set(self._launch_key(launch_id), json.dumps(record), ex=self.launch_ttl)
+                self.redis_writes += 1
+                return
+            except Exception as e:
+                self._redis_failed(e)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(text("""
+                INSERT INTO lti_launches (
+                    launch_id, platform_id, deployment_id, user_id, context_id,
+                    resource_link_id, message_type, target_link_uri, launch_data, expires_at
+                ) VALUES (
+                    :launch_id, :platform_id, :deployment_id, :user_id, :context_id,
+                    :resource_link_id, :message_type, :target_link_uri, :launch_data, :expires_at
+                )
+                """), {
+                    "launch_id": launch_id,
+                    "platform_id": platform_id,
+                    "deployment_id": launch_data.deployment_id,
+                    "user_id": launch_data.user_id,
+                    "context_id": launch_data.context_id,
+                    "resource_link_id": launch_data.resource_link_id,
+                    "message_type": launch_data.message_type,
+                    "target_link_uri": launch_data.target_link_uri,
+                    "launch_data": json.dumps(full_payload),
+                    "expires_at": datetime.utcnow() + timedelta(seconds=self.launch_ttl)
+                })
+                await db.commit()
+                self.sql_writes += 1
+        except Exception as e:
+            logger.error(f"Error storing launch: {e}")
+
+    async def get_launch(self, launch_id: str) -> Optional[Dict[str, Any]]:
+        """Stored launch payload, or None if unknown or expired."""
+        client = self._redis()
+        if client is not None:
+            try:
+                raw = await client.get(self._launch_key(launch_id))
+                if raw is not None:
+                    return json.loads(raw)["launch_data"]
+            except Exception as e:
+                self._redis_failed(e)
+
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(text("""
+                SELECT launch_data FROM lti_launches
+                WHERE launch_id = :launch_id AND expires_at > NOW()
+                """), {"launch_id": launch_id})
+                row = result.fetchone()
+        except Exception as e:
+            logger.error(f"Error loading launch: {e}")
+            return None
+        if row is None:
+            return None
+        return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+    async def cleanup_expired(self) -> Dict[str, int]:
+        """Sweep rows written via the SQL fallback (Redis keys expire by TTL)."""
+        try:
+            async with AsyncSessionLocal() as db:
+                cleanup_counts = {}
+                result = await db.execute(text("DELETE FROM lti_nonces WHERE expires_at <= NOW()"))
+                cleanup_counts["nonces"] = result.rowcount
+                result = await db.execute(text("DELETE FROM lti_launches WHERE expires_at <= NOW()"))
+                cleanup_counts["launches"] = result.rowcount
+                await db.commit()
+                return cleanup_counts
+        except Exception as e:
+            logger.error(f"Error cleaning up LTI data: {e}")
+            return {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "redis_writes": self.redis_writes,
+            "sql_writes": self.sql_writes,
+            "replays_rejected": self.replays_rejected,
+            "redis_enabled": self.use_redis and time.monotonic() >= self._redis_disabled_until
+        }
+
+
+# Global store instance
+lti_state_store = LTIStateStore(
+    nonce_ttl=settings.LTI_NONCE_TTL,
+    launch_ttl=settings.LTI_LAUNCH_TTL,
+    use_redis=settings.LTI_STATE_REDIS_ENABLED
+)
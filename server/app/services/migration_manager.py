@@ -9,7 +9,7 @@ import asyncio
 import subprocess
 import json
 from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 from dataclasses import dataclass
 from enum import Enum
@@ -365,14 +365,324 @@ class MigrationAnalyzer:
         return min(duration, 300)  # Cap at 5 minutes
 
 
+@dataclass
+class PartitionedTableSpec:
+    """Monthly range-partitioned table definition."""
+    table_name: str
+    partition_column: str
+    primary_key: List[str]
+    create_sql: str
+    index_sql: List[str]
+    # SELECT EXISTS(...) over ``{partition}``: true while the partition still holds
+    # rows that must outlive retention (a partition is then kept, not dropped)
+    live_rows_sql: Optional[str] = None
+
+
+# Statuses after which a notification is never touched again (as in the old row cleanup)
+TERMINAL_NOTIFICATION_STATUSES = ("sent", "expired", "poisoned")
+_TERMINAL_SQL = ", ".join(f"'{status}'" for status in TERMINAL_NOTIFICATION_STATUSES)
+
+
+PARTITIONED_TABLES: List[PartitionedTableSpec] = [
+    PartitionedTableSpec(
+        table_name="notification_log",
+        partition_column="created_at",
+        primary_key=["id", "created_at"],
+        create_sql="""
+        CREATE TABLE IF NOT EXISTS notification_log (
+            id VARCHAR(36) NOT NULL,
+            idempotency_key VARCHAR(64),
+            recipient_id INTEGER,
+            channel VARCHAR(20) NOT NULL,
+            recipient_address VARCHAR(255),
+            subject TEXT,
+            body TEXT,
+            template_id VARCHAR(100),
+            template_data JSONB,
+            priority INTEGER NOT NULL DEFAULT 3,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            expires_at TIMESTAMP WITH TIME ZONE,
+            retry_count INTEGER NOT NULL DEFAULT 0,
+            max_retries INTEGER NOT NULL DEFAULT 3,
+            retry_strategy VARCHAR(30),
+            status VARCHAR(20) NOT NULL,
+            last_error TEXT,
+            metadata JSONB,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """,
+        index_sql=[
+            "CREATE INDEX IF NOT EXISTS idx_notification_log_channel_created ON notification_log(channel, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_notification_log_status_created ON notification_log(status, created_at)",
+        ],
+        live_rows_sql=f"SELECT EXISTS (SELECT 1 FROM {{partition}} WHERE status NOT IN ({_TERMINAL_SQL}))"
+    ),
+    PartitionedTableSpec(
+        table_name="notification_delivery_attempts",
+        partition_column="attempted_at",
+        primary_key=["attempt_id", "attempted_at"],
+        create_sql="""
+        CREATE TABLE IF NOT EXISTS notification_delivery_attempts (
+            attempt_id VARCHAR(36) NOT NULL,
+            message_id VARCHAR(36) NOT NULL,
+            attempt_number INTEGER NOT NULL,
+            attempted_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            response_code VARCHAR(50),
+            response_message TEXT,
+            latency_ms INTEGER,
+            error_details TEXT,
+            PRIMARY KEY (attempt_id, attempted_at)
+        ) PARTITION BY RANGE (attempted_at)
+        """,
+        index_sql=[
+            "CREATE INDEX IF NOT EXISTS idx_delivery_attempts_message ON notification_delivery_attempts(message_id)",
+            "CREATE INDEX IF NOT EXISTS idx_delivery_attempts_status_attempted ON notification_delivery_attempts(status, attempted_at)",
+        ],
+        # Attempts stay while their notification is still pending/retrying/failed
+        live_rows_sql=(
+            "SELECT EXISTS (SELECT 1 FROM {partition} attempt "
+            "JOIN notification_log n ON n.id = attempt.message_id "
+            f"WHERE n.status NOT IN ({_TERMINAL_SQL}))"
+        )
+    ),
+]
+
+
+class TimePartitionManager:
+    """
+    Manages monthly range partitions (PostgreSQL only).
+    
+    Partitions are named ``<table>_yYYYYmMM``. A pre-existing unpartitioned
+    table is converted once: it is renamed to ``<table>_legacy`` and attached
+    as the partition covering everything up to the month after its newest row
+    (at least through the current month), so old rows age out through the same
+    partition-drop path. Monthly partitions start where the legacy one ends.
+    """
+    
+    def __init__(self, specs: Optional[List[PartitionedTableSpec]] = None):
+        self.specs = {spec.table_name: spec for spec in (specs or PARTITIONED_TABLES)}
+    
+    @staticmethod
+    def month_start(value: datetime) -> datetime:
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    
+    @staticmethod
+    def add_months(value: datetime, months: int) -> datetime:
+        month_index = value.year * 12 + (value.month - 1) + months
+        return value.replace(year=month_index // 12, month=month_index % 12 + 1)
+    
+    @staticmethod
+    def naive_utc(value: datetime) -> datetime:
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    
+    @staticmethod
+    def partition_name(table_name: str, month: datetime) -> str:
+        return f"{table_name}_y{month.year:04d}m{month.month:02d}"
+    
+    @staticmethod
+    def _bound(value: datetime) -> str:
+        return value.strftime("%Y-%m-%d %H:%M:%S+00")
+    
+    async def _relkind(self, db, table_name: str) -> Optional[str]:
+        result = await db.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table_name)"),
+            {"table_name": table_name}
+        )
+        return result.scalar()
+    
+    async def ensure_partitioned(self, db, spec: PartitionedTableSpec) -> str:
+        """Create the partitioned parent or convert a legacy table. Returns the action taken."""
+        relkind = await self._relkind(db, spec.table_name)
+        
+        if relkind == "p":
+            action = "exists"
+        elif relkind is None:
+            await db.execute(text(spec.create_sql))
+            action = "created"
+        else:
+            await self._convert_legacy_table(db, spec)
+            action = "converted"
+        
+        for index_sql in spec.index_sql:
+            await db.execute(text(index_sql))
+        
+        return action
+    
+    async def _convert_legacy_table(self, db, spec: PartitionedTableSpec):
+        """Turn an existing plain table into the first (legacy) partition."""
+        legacy_name = f"{spec.table_name}_legacy"
+        
+        # Partitioned tables cannot be FK targets on a non-key column; drop
+        # constraints pointing at the legacy table so partitions can be dropped
+        fk_result = await db.execute(text("""
+            SELECT conrelid::regclass::text AS table_name, conname
+            FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = to_regclass(:table_name)
+        """), {"table_name": spec.table_name})
+        for row in fk_result.fetchall():
+            await db.execute(text(f'ALTER TABLE {row.table_name} DROP CONSTRAINT "{row.conname}"'))
+        
+        await db.execute(text(f"ALTER TABLE {spec.table_name} RENAME TO {legacy_name}"))
+        
+        # The legacy partition must hold every existing row, current month included
+        newest = (await db.execute(text(
+            f"SELECT max({spec.partition_column}) FROM {legacy_name}"
+        ))).scalar()
+        newest = max(self.naive_utc(newest), datetime.utcnow()) if newest else datetime.utcnow()
+        legacy_bound = self.add_months(self.month_start(newest), 1)
+        
+        await db.execute(text(
+            f"CREATE TABLE {spec.table_name} (LIKE {legacy_name} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({spec.partition_column})"
+        ))
+        await db.execute(text(
+            f"ALTER TABLE {spec.table_name} ADD PRIMARY KEY ({', '.join(spec.primary_key)})"
+        ))
+        await db.execute(text(
+            f"ALTER TABLE {spec.table_name} ATTACH PARTITION {legacy_name} "
+            f"FOR VALUES FROM (MINVALUE) TO ('{self._bound(legacy_bound)}')"
+        ))
+        logger.info(
+            f"Converted {spec.table_name} to a partitioned table "
+            f"({legacy_name} attached up to {legacy_bound:%Y-%m-%d})"
+        )
+    
+    async def create_partitions_ahead(
+        self,
+        db,
+        spec: PartitionedTableSpec,
+        months_ahead: int = 3,
+        start: Optional[datetime] = None
+    ) -> List[str]:
+        """Create monthly partitions from the current month through N months ahead.
+        
+        Months already covered by another partition (e.g. the legacy one) are skipped.
+        """
+        partitions = await self.list_partitions(db, spec.table_name)
+        existing = {p["name"] for p in partitions}
+        month = self.month_start(start or datetime.utcnow())
+        created = []
+        
+        for _ in range(months_ahead + 1):
+            name = self.partition_name(spec.table_name, month)
+            next_month = self.add_months(month, 1)
+            covered = any(
+                (p["lower"] is None or p["lower"] < next_month) and p["upper"] is not None and p["upper"] > month
+                for p in partitions
+            )
+            if name not in existing and not covered:
+                await db.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {spec.table_name} "
+                    f"FOR VALUES FROM ('{self._bound(month)}') TO ('{self._bound(next_month)}')"
+                ))
+                created.append(name)
+            month = self.add_months(month, 1)
+        
+        return created
+    
+    async def list_partitions(self, db, table_name: str) -> List[Dict[str, Any]]:
+        """List partitions of a table with their upper bounds."""
+        result = await db.execute(text("""
+            SELECT child.relname AS name,
+                   pg_get_expr(child.relpartbound, child.oid) AS bound
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.oid = to_regclass(:table_name)
+            ORDER BY child.relname
+        """), {"table_name": table_name})
+        
+        def parse(pattern: str, bound: str) -> Optional[datetime]:
+            # Bounds are rendered in the session time zone; normalize to naive UTC
+            match = re.search(pattern, bound)
+            return self.naive_utc(datetime.fromisoformat(match.group(1))) if match else None
+        
+        partitions = []
+        for row in result.fetchall():
+            bound = row.bound or ""
+            partitions.append({
+                "name": row.name,
+                "bound": row.bound,
+                "lower": parse(r"FROM \('([^']+)'\)", bound),
+                "upper": parse(r"TO \('([^']+)'\)", bound),
+            })
+        
+        return partitions
+    
+    @staticmethod
+    def expired_partitions(partitions: List[Dict[str, Any]], cutoff: datetime) -> List[str]:
+        """Names of partitions whose whole range ends at or before the cutoff."""
+        return [
+            partition["name"] for partition in partitions
+            if partition["upper"] is not None and partition["upper"] <= cutoff
+        ]
+    
+    async def _has_live_rows(self, db, table_name: str, partition_name: str) -> bool:
+        spec = self.specs.get(table_name)
+        if spec is None or not spec.live_rows_sql:
+            return False
+        result = await db.execute(text(spec.live_rows_sql.format(partition=partition_name)))
+        return bool(result.scalar())
+    
+    async def drop_partitions_before(
+        self,
+        db,
+        table_name: str,
+        cutoff: datetime,
+        dry_run: bool = True
+    ) -> List[str]:
+        """
+        Detach and drop partitions whose whole range ends before the cutoff.
+        
+        Partitions that still hold live rows (``live_rows_sql``, e.g. pending or
+        retrying notifications) are kept and retried on the next run; their rows
+        cannot be moved out because the partition key is their creation time.
+        """
+        dropped = []
+        for name in self.expired_partitions(await self.list_partitions(db, table_name), cutoff):
+            if await self._has_live_rows(db, table_name, name):
+                logger.warning(f"Keeping expired partition {name}: it still has undelivered notifications")
+                continue
+            if not dry_run:
+                await db.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+                await db.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+        
+        return dropped
+
+
 class MigrationManager:
     """Main migration manager with safety features."""
     
     def __init__(self):
         self.backup_manager = DatabaseBackupManager()
         self.analyzer = MigrationAnalyzer()
+        self.partition_manager = TimePartitionManager()
         self.alembic_cfg = Config("server/alembic.ini")
     
+    async def ensure_time_partitions(self, months_ahead: int = 3) -> Dict[str, Any]:
+        """Create partitioned tables and their upcoming monthly partitions ahead of time."""
+        results = {}
+        
+        async with AsyncSessionLocal() as db:
+            if db.bind.dialect.name != "postgresql":
+                return {"skipped": "time partitioning requires PostgreSQL"}
+            
+            for spec in self.partition_manager.specs.values():
+                action = await self.partition_manager.ensure_partitioned(db, spec)
+                created = await self.partition_manager.create_partitions_ahead(db, spec, months_ahead)
+                results[spec.table_name] = {"action": action, "created_partitions": created}
+            
+            await db.commit()
+        
+        if any(r["created_partitions"] for r in results.values()):
+            logger.info(f"Ensured time partitions: {results}")
+        return results
+    
     async def get_migration_status(self) -> Dict[str, Any]:
         """Get current migration status."""
         try:
@@ -530,6 +840,13 @@ class MigrationManager:
             # Run actual migration
             command.upgrade(self.alembic_cfg, target_revision)
             
+            # Keep time-partitioned tables provisioned ahead of time; the schema is
+            # already upgraded, and the retention job retries provisioning later
+            try:
+                await self.ensure_time_partitions()
+            except Exception as e:
+                logger.warning(f"Partition provisioning after upgrade failed: {e}")
+
             duration = (datetime.utcnow() - start_time).total_seconds()
             
             return MigrationResult(
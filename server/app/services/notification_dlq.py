@@ -22,6 +22,7 @@ import redis.asyncio as redis
 from app.db.session import AsyncSessionLocal
 from app.core.config import settings
 from app.services.redis_service import redis_service
+from app.services.notification_metrics import delivery_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -247,7 +248,13 @@ class NotificationDLQService:
             )
             
             await self._store_delivery_attempt(attempt)
-            await self._update_notification_status(message.id, NotificationStatus.SENT)
+            await self._update_notification_status(message.id, NotificationStatus.SENT, created_at=message.created_at)
+            delivery_metrics.record(
+                message.channel,
+                message.priority,
+                NotificationStatus.SENT.value,
+                latency_ms=attempt.latency_ms
+            )
             
             logger.info(f"Notification delivered successfully: {message.id}")
             
@@ -302,7 +309,8 @@ class NotificationDLQService:
                 await self._schedule_retry(message)
                 message.status = NotificationStatus.RETRYING
             
-            await self._update_notification_status(message.id, message.status, error)
+            await self._update_notification_status(message.id, message.status, error, created_at=message.created_at)
+            delivery_metrics.record(message.channel, message.priority, message.status.value)
             
             logger.warning(f"Notification failed: {message.id}, retry: {message.retry_count}/{message.max_retries}")
             
@@ -465,7 +473,7 @@ class NotificationDLQService:
                     :subject, :body, :template_id, :template_data, :priority,
                     :created_at, :expires_at, :retry_count, :max_retries,
                     :retry_strategy, :status, :metadata
-                ) ON CONFLICT (id) DO UPDATE SET
+                ) ON CONFLICT (id, created_at) DO UPDATE SET
                     retry_count = EXCLUDED.retry_count,
                     status = EXCLUDED.status,
                     updated_at = NOW()
@@ -527,7 +535,13 @@ class NotificationDLQService:
         except Exception as e:
             logger.error(f"Error storing delivery attempt {attempt.attempt_id}: {e}")
     
-    async def _update_notification_status(self, message_id: str, status: NotificationStatus, error: Optional[str] = None):
+    async def _update_notification_status(
+        self,
+        message_id: str,
+        status: NotificationStatus,
+        error: Optional[str] = None,
+        created_at: Optional[datetime] = None
+    ):
         """Update notification status in database."""
         try:
             async with AsyncSessionLocal() as db:
@@ -536,12 +550,17 @@ class NotificationDLQService:
                 SET status = :status, last_error = :error, updated_at = NOW()
                 WHERE id = :message_id
                 """
-                
-                await db.execute(text(update_sql), {
+                params = {
                     "message_id": message_id,
                     "status": status.value,
                     "error": error
-                })
+                }
+                # created_at is the partition key: lets PostgreSQL touch one partition
+                if created_at is not None:
+                    update_sql += " AND created_at = :created_at"
+                    params["created_at"] = created_at
+                
+                await db.execute(text(update_sql), params)
                 
                 await db.commit()
                 
@@ -12,6 +12,8 @@ from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta, time
 from dataclasses import dataclass, asdict
 from enum import Enum
+import os
+import socket
 import uuid
 from collections import defaultdict
 
@@ -20,6 +22,7 @@ from sqlalchemy import select, insert, update, delete, text, and_, or_, func
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.db.session import AsyncSessionLocal
+from app.observability.histogram import LatencyHistogram
 from app.services.redis_service import redis_service
 from app.core.config import settings
 
@@ -84,6 +87,167 @@ class SLAReport:
     metadata: Optional[Dict[str, Any]] = None
 
 
+@dataclass
+class DeliveryRollup:
+    """Pre-aggregated delivery outcomes for one (minute, channel, priority)."""
+    bucket_start: datetime
+    channel: str
+    priority: int
+    attempts: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    dropped: int = 0
+    latency: Optional[LatencyHistogram] = None
+    flushed_attempts: int = 0
+
+    def __post_init__(self):
+        if self.latency is None:
+            self.latency = LatencyHistogram()
+
+    @property
+    def flushed(self) -> bool:
+        """True when every recorded attempt is in a committed rollup row."""
+        return self.flushed_attempts == self.attempts
+
+
+class DeliveryMetricsAggregator:
+    """
+    In-process sliding-window counters for notification delivery outcomes.
+
+    Workers record every delivery attempt here instead of the metrics layer
+    polling notification_log. Closed minutes are flushed as rollup rows into
+    notification_metric_rollups (one multi-row upsert per flush); recent minutes
+    are kept in memory to answer realtime window queries without touching the DB.
+    """
+
+    def __init__(self, window_minutes: int = 60):
+        self.window_minutes = window_minutes
+        self.source = f"{socket.gethostname()}:{os.getpid()}"
+        self._buckets: Dict[Tuple[datetime, str, int], DeliveryRollup] = {}
+
+    @staticmethod
+    def _minute(ts: datetime) -> datetime:
+        return ts.replace(second=0, microsecond=0)
+
+    def record(
+        self,
+        channel: str,
+        priority: Optional[int],
+        status: str,
+        latency_ms: Optional[float] = None,
+        timestamp: Optional[datetime] = None
+    ) -> None:
+        """Record one delivery attempt outcome (sent, failed, retrying, expired, poisoned)."""
+        bucket_start = self._minute(timestamp or datetime.utcnow())
+        key = (bucket_start, channel, priority or 0)
+        rollup = self._buckets.get(key)
+        if rollup is None:
+            rollup = DeliveryRollup(bucket_start=bucket_start, channel=channel, priority=priority or 0)
+            self._buckets[key] = rollup
+
+        rollup.attempts += 1
+        if status == "sent":
+            rollup.sent += 1
+            if latency_ms is not None:
+                rollup.latency.record(latency_ms)
+        else:
+            rollup.failed += 1
+            if status == "retrying":
+                rollup.retried += 1
+            elif status in ("expired", "poisoned", "failed"):
+                rollup.dropped += 1
+
+    def window_stats(self, channel: str, minutes: int) -> Optional[Dict[str, Any]]:
+        """Aggregate the last N minutes (including the current one) for a channel."""
+        since = self._minute(datetime.utcnow()) - timedelta(minutes=max(minutes - 1, 0))
+        stats = {"attempts": 0, "sent": 0, "failed": 0, "retried": 0, "dropped": 0}
+        latency = LatencyHistogram()
+        for (bucket_start, bucket_channel, _), rollup in self._buckets.items():
+            if bucket_channel != channel or bucket_start < since:
+                continue
+            stats["attempts"] += rollup.attempts
+            stats["sent"] += rollup.sent
+            stats["failed"] += rollup.failed
+            stats["retried"] += rollup.retried
+            stats["dropped"] += rollup.dropped
+            latency.merge(rollup.latency)
+
+        if stats["attempts"] == 0:
+            return None
+        stats["latency"] = latency
+        return stats
+
+    def channels(self) -> List[str]:
+        return sorted({channel for (_, channel, _) in self._buckets})
+
+    async def flush(self, db: AsyncSession) -> List[Tuple[DeliveryRollup, int]]:
+        """
+        Upsert closed minutes with unwritten attempts and evict expired buckets.
+
+        Rows are keyed by (bucket_start, channel, priority, source) and carry this
+        process's cumulative totals, so re-writing a row after a failed commit or a
+        late attempt overwrites it instead of duplicating it. Nothing is marked as
+        written here: pass the result to mark_flushed() once the caller commits.
+        """
+        current_minute = self._minute(datetime.utcnow())
+        evict_before = current_minute - timedelta(minutes=self.window_minutes)
+
+        for key in [k for k, rollup in self._buckets.items() if rollup.flushed and k[0] < evict_before]:
+            del self._buckets[key]
+
+        ready = [
+            rollup for rollup in self._buckets.values()
+            if not rollup.flushed and rollup.bucket_start < current_minute
+        ]
+
+        if ready:
+            upsert_sql = """
+            INSERT INTO notification_metric_rollups (
+                bucket_start, channel, priority, source, attempts, sent, failed,
+                retried, dropped, latency_count, latency_sum, latency_max, latency_histogram
+            ) VALUES (
+                :bucket_start, :channel, :priority, :source, :attempts, :sent, :failed,
+                :retried, :dropped, :latency_count, :latency_sum, :latency_max, :latency_histogram
+            ) ON CONFLICT (bucket_start, channel, priority, source) DO UPDATE SET
+                attempts = EXCLUDED.attempts,
+                sent = EXCLUDED.sent,
+                failed = EXCLUDED.failed,
+                retried = EXCLUDED.retried,
+                dropped = EXCLUDED.dropped,
+                latency_count = EXCLUDED.latency_count,
+                latency_sum = EXCLUDED.latency_sum,
+                latency_max = EXCLUDED.latency_max,
+                latency_histogram = EXCLUDED.latency_histogram
+            """
+            await db.execute(text(upsert_sql), [
+                {
+                    "bucket_start": rollup.bucket_start,
+                    "channel": rollup.channel,
+                    "priority": rollup.priority,
+                    "source": self.source,
+                    "attempts": rollup.attempts,
+                    "sent": rollup.sent,
+                    "failed": rollup.failed,
+                    "retried": rollup.retried,
+                    "dropped": rollup.dropped,
+                    "latency_count": rollup.latency.count,
+                    "latency_sum": rollup.latency.total,
+                    "latency_max": rollup.latency.max_seen,
+                    "latency_histogram": json.dumps(rollup.latency.to_dict())
+                }
+                for rollup in ready
+            ])
+
+        return [(rollup, rollup.attempts) for rollup in ready]
+
+    @staticmethod
+    def mark_flushed(written: List[Tuple[DeliveryRollup, int]]) -> None:
+        """Record rollups from flush() as written, after the transaction committed."""
+        for rollup, attempts in written:
+            rollup.flushed_attempts = max(rollup.flushed_attempts, attempts)
+
+
 class NotificationSLAManager:
     """Manages SLA targets and compliance tracking."""
     
@@ -435,89 +599,80 @@ class NotificationSLAManager:
         start_time: datetime,
         end_time: datetime
     ) -> List[Dict[str, Any]]:
-        """Get metric data from database for specified period."""
+        """Get per-minute metric data from pre-aggregated rollups for specified period."""
+        if metric_type not in (
+            MetricType.DELIVERY_RATE,
+            MetricType.DELIVERY_TIME,
+            MetricType.ERROR_RATE,
+            MetricType.THROUGHPUT
+        ):
+            return []
+
         try:
             async with AsyncSessionLocal() as db:
-                # Build query based on metric type
-                if metric_type == MetricType.DELIVERY_RATE:
-                    query = """
-                    SELECT 
-                        channel,
-                        priority,
-                        COUNT(*) as total,
-                        COUNT(CASE WHEN status = 'sent' THEN 1 END) as successful,
-                        DATE_TRUNC('minute', created_at) as time_bucket
-                    FROM notification_log
-                    WHERE channel = :channel
-                    AND created_at BETWEEN :start_time AND :end_time
-                    """
-                    if priority is not None:
-                        query += " AND priority = :priority"
-                    query += " GROUP BY channel, priority, time_bucket ORDER BY time_bucket"
-                    
-                elif metric_type == MetricType.DELIVERY_TIME:
-                    query = """
-                    SELECT 
-                        AVG(nda.latency_ms) as avg_latency,
-                        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY nda.latency_ms) as median_latency,
-                        PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY nda.latency_ms) as p95_latency,
-                        DATE_TRUNC('minute', nda.attempted_at) as time_bucket
-                    FROM notification_delivery_attempts nda
-                    JOIN notification_log nl ON nda.message_id = nl.id
-                    WHERE nl.channel = :channel
-                    AND nda.status = 'sent'
-                    AND nda.attempted_at BETWEEN :start_time AND :end_time
-                    AND nda.latency_ms IS NOT NULL
-                    """
-                    if priority is not None:
-                        query += " AND nl.priority = :priority"
-                    query += " GROUP BY time_bucket ORDER BY time_bucket"
-                    
-                elif metric_type == MetricType.ERROR_RATE:
-                    query = """
-                    SELECT 
-                        COUNT(*) as total,
-                        COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
-                        DATE_TRUNC('minute', created_at) as time_bucket
-                    FROM notification_log
-                    WHERE channel = :channel
-                    AND created_at BETWEEN :start_time AND :end_time
-                    """
-                    if priority is not None:
-                        query += " AND priority = :priority"
-                    query += " GROUP BY time_bucket ORDER BY time_bucket"
-                    
-                elif metric_type == MetricType.THROUGHPUT:
-                    query = """
-                    SELECT 
-                        COUNT(*) as count,
-                        DATE_TRUNC('minute', created_at) as time_bucket
-                    FROM notification_log
-                    WHERE channel = :channel
-                    AND created_at BETWEEN :start_time AND :end_time
-                    """
-                    if priority is not None:
-                        query += " AND priority = :priority"
-                    query += " GROUP BY time_bucket ORDER BY time_bucket"
-                
-                else:
-                    return []
-                
+                query = """
+                SELECT
+                    bucket_start,
+                    attempts,
+                    sent,
+                    failed,
+                    dropped,
+                    latency_histogram
+                FROM notification_metric_rollups
+                WHERE channel = :channel
+                AND bucket_start BETWEEN :start_time AND :end_time
+                """
                 params = {
                     "channel": channel,
                     "start_time": start_time,
                     "end_time": end_time
                 }
                 if priority is not None:
+                    query += " AND priority = :priority"
                     params["priority"] = priority
-                
+
                 result = await db.execute(text(query), params)
-                return [dict(row._mapping) for row in result.fetchall()]
-                
+                rows = result.fetchall()
+
+            # Rows from different workers/priorities are merged per minute
+            buckets: Dict[datetime, Dict[str, Any]] = {}
+            for row in rows:
+                bucket = buckets.setdefault(row.bucket_start, {
+                    "time_bucket": row.bucket_start,
+                    "total": 0,
+                    "successful": 0,
+                    "failed": 0,
+                    "count": 0,
+                    "latency": LatencyHistogram()
+                })
+                # Delivery rate is measured over final outcomes, error rate over attempts
+                bucket["total"] += row.sent + row.dropped if metric_type == MetricType.DELIVERY_RATE else row.attempts
+                bucket["successful"] += row.sent
+                bucket["failed"] += row.failed
+                bucket["count"] += row.attempts
+                if metric_type == MetricType.DELIVERY_TIME and row.latency_histogram:
+                    histogram_data = row.latency_histogram
+                    if isinstance(histogram_data, str):
+                        histogram_data = json.loads(histogram_data)
+                    bucket["latency"].merge(LatencyHistogram.from_dict(histogram_data))
+
+            metric_data = []
+            for time_bucket in sorted(buckets):
+                bucket = buckets[time_bucket]
+                if metric_type == MetricType.DELIVERY_TIME:
+                    if bucket["latency"].count == 0:
+                        continue
+                    bucket["avg_latency"] = bucket["latency"].mean
+                    bucket["median_latency"] = bucket["latency"].quantile(0.5)
+                    bucket["p95_latency"] = bucket["latency"].quantile(0.95)
+                metric_data.append(bucket)
+
+            return metric_data
+
         except Exception as e:
             logger.error(f"Error getting metric data: {e}")
             return []
-    
+
     def _calculate_metric_value(self, metric_type: MetricType, metric_data: List[Dict[str, Any]]) -> float:
         """Calculate the current metric value from raw data."""
         if not metric_data:
@@ -529,7 +684,13 @@ class NotificationSLAManager:
             return (successful_notifications / total_notifications * 100) if total_notifications > 0 else 0.0
             
         elif metric_type == MetricType.DELIVERY_TIME:
-            # Use P95 latency as the metric value
+            # Use P95 latency over the whole window (histograms are mergeable)
+            window_latency = LatencyHistogram()
+            for row in metric_data:
+                if row.get("latency") is not None:
+                    window_latency.merge(row["latency"])
+            if window_latency.count:
+                return window_latency.quantile(0.95)
             p95_values = [row.get("p95_latency", 0) for row in metric_data if row.get("p95_latency")]
             return sum(p95_values) / len(p95_values) if p95_values else 0.0
             
@@ -705,9 +866,31 @@ class NotificationSLAManager:
         CREATE INDEX IF NOT EXISTS idx_metric_snapshots_channel_type ON notification_metric_snapshots(channel, metric_type);
         """
         
+        create_metric_rollups_table = """
+        CREATE TABLE IF NOT EXISTS notification_metric_rollups (
+            bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+            channel VARCHAR(20) NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            source VARCHAR(100) NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            retried INTEGER NOT NULL DEFAULT 0,
+            dropped INTEGER NOT NULL DEFAULT 0,
+            latency_count INTEGER NOT NULL DEFAULT 0,
+            latency_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            latency_max DOUBLE PRECISION,
+            latency_histogram JSONB,
+            PRIMARY KEY (bucket_start, channel, priority, source)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_metric_rollups_channel_bucket ON notification_metric_rollups(channel, bucket_start);
+        """
+        
         await db.execute(text(create_sla_targets_table))
         await db.execute(text(create_sla_reports_table))
         await db.execute(text(create_metrics_snapshots_table))
+        await db.execute(text(create_metric_rollups_table))
     
     async def _store_sla_target(self, db: AsyncSession, target: SLATarget):
         """Store SLA target in database."""
@@ -818,151 +1001,116 @@ class NotificationMetricsCollector:
             logger.error(f"Error recording metric snapshot: {e}")
     
     async def _collect_realtime_metrics(self):
-        """Collect real-time metrics."""
+        """Flush delivery rollups and record realtime snapshots from in-memory windows."""
         while True:
             try:
                 await asyncio.sleep(60)  # Collect every minute
-                
-                # Collect metrics for each channel
-                channels = ["email", "sms", "telegram", "in_app", "push"]
-                
-                for channel in channels:
-                    await self._collect_channel_metrics(channel)
+                await self.flush_metrics()
                 
             except Exception as e:
                 logger.error(f"Error in realtime metrics collection: {e}")
     
-    async def _collect_channel_metrics(self, channel: str):
-        """Collect metrics for a specific channel."""
-        try:
-            timestamp = datetime.utcnow()
-            
-            # Collect delivery rate
-            delivery_rate = await self._calculate_delivery_rate(channel, 5)  # Last 5 minutes
-            if delivery_rate is not None:
-                await self.record_metric_snapshot(MetricSnapshot(
-                    metric_id=f"{channel}_delivery_rate_{timestamp.strftime('%Y%m%d_%H%M')}",
-                    metric_type=MetricType.DELIVERY_RATE,
-                    channel=channel,
-                    timestamp=timestamp,
-                    value=delivery_rate,
-                    unit="percentage"
-                ))
-            
-            # Collect error rate
-            error_rate = await self._calculate_error_rate(channel, 5)  # Last 5 minutes
-            if error_rate is not None:
-                await self.record_metric_snapshot(MetricSnapshot(
-                    metric_id=f"{channel}_error_rate_{timestamp.strftime('%Y%m%d_%H%M')}",
-                    metric_type=MetricType.ERROR_RATE,
-                    channel=channel,
-                    timestamp=timestamp,
-                    value=error_rate,
-                    unit="percentage"
-                ))
+    async def flush_metrics(self) -> int:
+        """Flush closed rollups and current channel snapshots in a single session."""
+        timestamp = datetime.utcnow()
+        snapshots = []
+        for channel in delivery_metrics.channels():
+            snapshots.extend(self._collect_channel_metrics(channel, timestamp))
+        
+        async with AsyncSessionLocal() as db:
+            written = await delivery_metrics.flush(db)
             
-            # Collect throughput
-            throughput = await self._calculate_throughput(channel, 1)  # Last 1 minute
-            if throughput is not None:
-                await self.record_metric_snapshot(MetricSnapshot(
-                    metric_id=f"{channel}_throughput_{timestamp.strftime('%Y%m%d_%H%M')}",
-                    metric_type=MetricType.THROUGHPUT,
-                    channel=channel,
-                    timestamp=timestamp,
-                    value=throughput,
-                    unit="count_per_minute"
-                ))
+            if snapshots:
+                insert_sql = """
+                INSERT INTO notification_metric_snapshots (
+                    metric_id, metric_type, channel, timestamp, value, unit, metadata
+                ) VALUES (
+                    :metric_id, :metric_type, :channel, :timestamp, :value, :unit, :metadata
+                )
+                """
+                await db.execute(text(insert_sql), [
+                    {
+                        "metric_id": snapshot.metric_id,
+                        "metric_type": snapshot.metric_type.value,
+                        "channel": snapshot.channel,
+                        "timestamp": snapshot.timestamp,
+                        "value": snapshot.value,
+                        "unit": snapshot.unit,
+                        "metadata": json.dumps(snapshot.metadata) if snapshot.metadata else None
+                    }
+                    for snapshot in snapshots
+                ])
             
-        except Exception as e:
-            logger.error(f"Error collecting metrics for {channel}: {e}")
+            await db.commit()
+        
+        # Only after a successful commit: a failed flush is retried next minute
+        delivery_metrics.mark_flushed(written)
+        return len(written)
     
-    async def _calculate_delivery_rate(self, channel: str, minutes: int) -> Optional[float]:
+    def _collect_channel_metrics(self, channel: str, timestamp: datetime) -> List[MetricSnapshot]:
+        """Build metric snapshots for a specific channel from in-memory windows."""
+        snapshots = []
+        suffix = timestamp.strftime('%Y%m%d_%H%M')
+        
+        # Delivery rate over the last 5 minutes
+        delivery_rate = self._calculate_delivery_rate(channel, 5)
+        if delivery_rate is not None:
+            snapshots.append(MetricSnapshot(
+                metric_id=f"{channel}_delivery_rate_{suffix}",
+                metric_type=MetricType.DELIVERY_RATE,
+                channel=channel,
+                timestamp=timestamp,
+                value=delivery_rate,
+                unit="percentage"
+            ))
+        
+        # Error rate over the last 5 minutes
+        error_rate = self._calculate_error_rate(channel, 5)
+        if error_rate is not None:
+            snapshots.append(MetricSnapshot(
+                metric_id=f"{channel}_error_rate_{suffix}",
+                metric_type=MetricType.ERROR_RATE,
+                channel=channel,
+                timestamp=timestamp,
+                value=error_rate,
+                unit="percentage"
+            ))
+        
+        # Throughput over the last minute
+        throughput = self._calculate_throughput(channel, 1)
+        if throughput is not None:
+            snapshots.append(MetricSnapshot(
+                metric_id=f"{channel}_throughput_{suffix}",
+                metric_type=MetricType.THROUGHPUT,
+                channel=channel,
+                timestamp=timestamp,
+                value=throughput,
+                unit="count_per_minute"
+            ))
+        
+        return snapshots
+    
+    def _calculate_delivery_rate(self, channel: str, minutes: int) -> Optional[float]:
         """Calculate delivery rate for the last N minutes."""
-        try:
-            async with AsyncSessionLocal() as db:
-                since_time = datetime.utcnow() - timedelta(minutes=minutes)
-                
-                query = """
-                SELECT 
-                    COUNT(*) as total,
-                    COUNT(CASE WHEN status = 'sent' THEN 1 END) as successful
-                FROM notification_log
-                WHERE channel = :channel
-                AND created_at >= :since_time
-                """
-                
-                result = await db.execute(text(query), {
-                    "channel": channel,
-                    "since_time": since_time
-                })
-                
-                row = result.fetchone()
-                if row and row.total > 0:
-                    return (row.successful / row.total) * 100
-                
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error calculating delivery rate: {e}")
+        stats = delivery_metrics.window_stats(channel, minutes)
+        if not stats:
             return None
+        finished = stats["sent"] + stats["dropped"]
+        return (stats["sent"] / finished) * 100 if finished > 0 else None
     
-    async def _calculate_error_rate(self, channel: str, minutes: int) -> Optional[float]:
+    def _calculate_error_rate(self, channel: str, minutes: int) -> Optional[float]:
         """Calculate error rate for the last N minutes."""
-        try:
-            async with AsyncSessionLocal() as db:
-                since_time = datetime.utcnow() - timedelta(minutes=minutes)
-                
-                query = """
-                SELECT 
-                    COUNT(*) as total,
-                    COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed
-                FROM notification_log
-                WHERE channel = :channel
-                AND created_at >= :since_time
-                """
-                
-                result = await db.execute(text(query), {
-                    "channel": channel,
-                    "since_time": since_time
-                })
-                
-                row = result.fetchone()
-                if row and row.total > 0:
-                    return (row.failed / row.total) * 100
-                
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error calculating error rate: {e}")
+        stats = delivery_metrics.window_stats(channel, minutes)
+        if not stats:
             return None
+        return (stats["failed"] / stats["attempts"]) * 100
     
-    async def _calculate_throughput(self, channel: str, minutes: int) -> Optional[float]:
+    def _calculate_throughput(self, channel: str, minutes: int) -> Optional[float]:
         """Calculate throughput for the last N minutes."""
-        try:
-            async with AsyncSessionLocal() as db:
-                since_time = datetime.utcnow() - timedelta(minutes=minutes)
-                
-                query = """
-                SELECT COUNT(*) as count
-                FROM notification_log
-                WHERE channel = :channel
-                AND created_at >= :since_time
-                """
-                
-                result = await db.execute(text(query), {
-                    "channel": channel,
-                    "since_time": since_time
-                })
-                
-                row = result.fetchone()
-                if row:
-                    return row.count / minutes  # notifications per minute
-                
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error calculating throughput: {e}")
+        stats = delivery_metrics.window_stats(channel, minutes)
+        if not stats:
             return None
+        return stats["attempts"] / minutes  # attempts per minute
     
     async def _generate_periodic_reports(self):
         """Generate periodic SLA reports."""
@@ -997,15 +1145,24 @@ class NotificationMetricsCollector:
                     """
                     
                     result = await db.execute(text(cleanup_sql), {"cleanup_date": cleanup_date})
+                    
+                    # Keep rollups for 30 days (SLA reports never look further back)
+                    rollups_result = await db.execute(
+                        text("DELETE FROM notification_metric_rollups WHERE bucket_start < :cleanup_date"),
+                        {"cleanup_date": datetime.utcnow() - timedelta(days=30)}
+                    )
                     await db.commit()
                     
                     if result.rowcount > 0:
                         logger.info(f"Cleaned up {result.rowcount} old metric snapshots")
+                    if rollups_result.rowcount > 0:
+                        logger.info(f"Cleaned up {rollups_result.rowcount} old metric rollups")
                         
             except Exception as e:
                 logger.error(f"Error cleaning up old snapshots: {e}")
 
 
 # Global instances
+delivery_metrics = DeliveryMetricsAggregator()
 notification_sla_manager = NotificationSLAManager()
 notification_metrics_collector = NotificationMetricsCollector()
@@ -57,7 +57,7 @@ class PermissionAwareSearchService:
             # If user has access to specific courses, search within those
             if user_permissions['accessible_course_ids']:
                 for course_id in user_permissions['accessible_course_ids']:
-                    course_results = self.rag_indexer.search(
+                    course_results = await self.rag_indexer.asearch(
                         query=query,
                         top_k=top_k * 2,  # Get more to allow for filtering
                         course_id=course_id,
@@ -67,7 +67,7 @@ class PermissionAwareSearchService:
             
             # If user is admin/teacher, also search global content
             if user_permissions['is_admin'] or user_permissions['is_global_teacher']:
-                global_results = self.rag_indexer.search(
+                global_results = await self.rag_indexer.asearch(
                     query=query,
                     top_k=top_k * 2
                 )
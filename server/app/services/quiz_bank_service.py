@@ -6,6 +6,7 @@ and question quality assessment for educational assessments.
 """
 
 import logging
+import random
 import statistics
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
@@ -13,17 +14,25 @@ from collections import defaultdict
 import json
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update, delete, text, and_, or_, func, desc
+from sqlalchemy import select, insert, update, delete, text, and_, or_, func, desc, table, column, cast, Float
 from sqlalchemy.orm import selectinload
 
+from app.core.api_pagination import InvalidCursorError, SortDirection, decode_cursor, encode_cursor
+from app.core.search import build_search, json_array_contains_any, session_dialect
 from app.db.session import AsyncSessionLocal
 from app.models.quiz_bank import (
     QuestionBank, BankQuestion, QuizQuestionSelection, QuestionResponse,
     ItemAnalysis, QuestionTag, QuestionUsageLog, QuestionType, DifficultyLevel
 )
+from app.services.item_statistics import ResponseMatrix, item_statistics, reliability
 
 logger = logging.getLogger(__name__)
 
+# Rows read per requested question when sampling (see sample_questions)
+SAMPLE_OVERSAMPLING = 3
+# quiz_submissions has no ORM model here; only the columns needed to scope responses to a quiz
+quiz_submissions = table("quiz_submissions", column("id"), column("quiz_id"))
+
 
 class QuestionBankService:
     """Service for managing question banks."""
@@ -180,56 +189,141 @@ class QuestionBankService:
             logger.error(f"Error updating question: {e}")
             raise
     
-    async def search_questions(self, search_criteria: Dict[str, Any]) -> List[BankQuestion]:
-        """Search questions in banks based on criteria."""
+    def _question_conditions(self, search_criteria: Dict[str, Any], dialect_name: str) -> List[Any]:
+        """WHERE conditions shared by search and random sampling."""
+        conditions = []
+        
+        if "course_id" in search_criteria:
+            conditions.append(BankQuestion.question_bank_id.in_(
+                select(QuestionBank.id).where(QuestionBank.course_id == search_criteria["course_id"])
+            ))
+        
+        if "question_bank_id" in search_criteria:
+            conditions.append(BankQuestion.question_bank_id == search_criteria["question_bank_id"])
+        
+        if "question_type" in search_criteria:
+            conditions.append(BankQuestion.question_type == search_criteria["question_type"])
+        
+        if "difficulty_level" in search_criteria:
+            conditions.append(BankQuestion.difficulty_level == search_criteria["difficulty_level"])
+        
+        if search_criteria.get("tags"):
+            # Questions that have any of the specified tags (GIN index on tags::jsonb)
+            tag_condition = json_array_contains_any(BankQuestion.tags, search_criteria["tags"], dialect_name)
+            if tag_condition is not None:
+                conditions.append(tag_condition)
+        
+        if "point_range" in search_criteria:
+            point_range = search_criteria["point_range"]
+            if "min" in point_range:
+                conditions.append(BankQuestion.points >= point_range["min"])
+            if "max" in point_range:
+                conditions.append(BankQuestion.points <= point_range["max"])
+        
+        return conditions
+    
+    async def search_questions(self, search_criteria: Dict[str, Any], limit: int = 50,
+                               cursor: Optional[str] = None) -> Tuple[List[BankQuestion], Optional[str]]:
+        """Search questions in banks based on criteria.
+        
+        With ``text_search`` results are ranked by full-text relevance over the
+        question text and answers, otherwise by usage. Pages are keyset-based:
+        pass the returned cursor to get the next page (None on the last one).
+        Raises InvalidCursorError for a foreign or malformed cursor; database
+        errors are logged and propagated.
+        """
         try:
             async with AsyncSessionLocal() as db:
-                query = select(BankQuestion)
-                
-                # Apply filters
-                if "course_id" in search_criteria:
-                    query = query.join(QuestionBank).where(QuestionBank.course_id == search_criteria["course_id"])
-                
-                if "question_bank_id" in search_criteria:
-                    query = query.where(BankQuestion.question_bank_id == search_criteria["question_bank_id"])
-                
-                if "question_type" in search_criteria:
-                    query = query.where(BankQuestion.question_type == search_criteria["question_type"])
-                
-                if "difficulty_level" in search_criteria:
-                    query = query.where(BankQuestion.difficulty_level == search_criteria["difficulty_level"])
-                
-                if "tags" in search_criteria and search_criteria["tags"]:
-                    # Search for questions that have any of the specified tags
-                    tag_conditions = [
-                        BankQuestion.tags.op('?')('$[*]')(tag) for tag in search_criteria["tags"]
-                    ]
-                    query = query.where(or_(*tag_conditions))
-                
-                if "text_search" in search_criteria and search_criteria["text_search"]:
-                    search_text = f"%{search_criteria['text_search']}%"
-                    query = query.where(BankQuestion.question_text.ilike(search_text))
-                
-                if "point_range" in search_criteria:
-                    point_range = search_criteria["point_range"]
-                    if "min" in point_range:
-                        query = query.where(BankQuestion.points >= point_range["min"])
-                    if "max" in point_range:
-                        query = query.where(BankQuestion.points <= point_range["max"])
-                
-                # Order by relevance (usage count, quality, recency)
-                query = query.order_by(
-                    desc(BankQuestion.usage_count),
-                    desc(BankQuestion.quality_score),
-                    desc(BankQuestion.created_at)
-                ).limit(100)
+                dialect_name = session_dialect(db)
+                conditions = self._question_conditions(search_criteria, dialect_name)
+                
+                rank = None
+                text_search = (search_criteria.get("text_search") or "").strip()
+                if text_search:
+                    text_condition, rank = build_search(BankQuestion, text_search, None, dialect_name)
+                    conditions.append(text_condition)
+                
+                if rank is not None:
+                    # float8, so the value round-trips through the cursor exactly
+                    sort_field, sort_key = "relevance", cast(rank, Float)
+                else:
+                    sort_field, sort_key = "usage_count", func.coalesce(BankQuestion.usage_count, 0)
+                
+                if cursor:
+                    position = decode_cursor(cursor)
+                    if position["f"] != sort_field or position["d"] != SortDirection.DESC:
+                        raise InvalidCursorError("Cursor was issued for a different search")
+                    conditions.append(or_(
+                        sort_key < position["v"],
+                        and_(sort_key == position["v"], BankQuestion.id < position["id"])
+                    ))
                 
-                result = await db.execute(query)
-                return result.scalars().all()
+                query = (
+                    select(BankQuestion, sort_key.label("sort_key"))
+                    .where(*conditions)
+                    .order_by(desc(sort_key), desc(BankQuestion.id))
+                    .limit(limit + 1)
+                )
+                rows = (await db.execute(query)).all()
                 
+                next_cursor = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    last_question, last_key = rows[-1]
+                    next_cursor = encode_cursor(sort_field, SortDirection.DESC, last_key, last_question.id)
+                
+                return [question for question, _ in rows], next_cursor
+                
+        except InvalidCursorError:
+            raise
         except Exception as e:
+            # Сбой БД — не «пустой результат»: пусть вызывающий вернёт ошибку
             logger.error(f"Error searching questions: {e}")
+            raise
+    
+    async def sample_questions(self, search_criteria: Dict[str, Any], count: int) -> List[BankQuestion]:
+        """Pick ``count`` random questions matching the criteria (for quiz generation).
+        
+        Reads an index range from a random point of the ``random_key``
+        permutation (wrapping around once) instead of ORDER BY random() over the
+        whole bank. A few extra rows are read and sampled from, so the same
+        neighbours do not always come together. Database errors are logged and
+        propagated.
+        """
+        if count <= 0:
             return []
+        
+        try:
+            async with AsyncSessionLocal() as db:
+                conditions = self._question_conditions(search_criteria, session_dialect(db))
+                window = count * SAMPLE_OVERSAMPLING
+                start = random.random()
+                
+                query = (
+                    select(BankQuestion)
+                    .where(*conditions, BankQuestion.random_key >= start)
+                    .order_by(BankQuestion.random_key)
+                    .limit(window)
+                )
+                candidates = list((await db.execute(query)).scalars().all())
+                
+                if len(candidates) < window:
+                    wrapped = (
+                        select(BankQuestion)
+                        .where(*conditions, BankQuestion.random_key < start)
+                        .order_by(BankQuestion.random_key)
+                        .limit(window - len(candidates))
+                    )
+                    candidates.extend((await db.execute(wrapped)).scalars().all())
+                
+                if len(candidates) < count:
+                    logger.warning(f"Only {len(candidates)} questions match sampling criteria, {count} requested")
+                return random.sample(candidates, min(count, len(candidates)))
+                
+        except Exception as e:
+            # Сбой БД — не «нет подходящих вопросов»: пусть вызывающий вернёт ошибку
+            logger.error(f"Error sampling questions: {e}")
+            raise
     
     async def get_question_statistics(self, question_id: int) -> Dict[str, Any]:
         """Get comprehensive statistics for a question."""
@@ -303,136 +397,132 @@ class ItemAnalysisService:
     """Service for performing item analysis on questions."""
     
     async def analyze_question(self, question_id: int, quiz_id: Optional[int] = None) -> ItemAnalysis:
-        """Perform comprehensive item analysis on a question."""
+        """Perform comprehensive item analysis on a question.
+
+        Runs the quiz-level engine so that discrimination and point-biserial are
+        measured against total quiz scores, not the item's own points.
+        """
+        result = await self.analyze_quiz(quiz_id=quiz_id, question_ids=[question_id])
+        return result["analyses"][0]
+
+    async def analyze_quiz(self, quiz_id: Optional[int] = None,
+                           question_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Analyze all items of a quiz from a single response-matrix query.
+
+        Every submission that answered any of the requested items is loaded with
+        all of its responses, so total scores cover the whole quiz. Without
+        ``question_ids`` every item of the quiz is analyzed. All ``ItemAnalysis``
+        rows and ``BankQuestion`` statistics are written in one transaction.
+        """
+        if quiz_id is None and not question_ids:
+            raise ValueError("quiz_id or question_ids is required")
+
         try:
             async with AsyncSessionLocal() as db:
-                # Get question responses
-                query = select(QuestionResponse).where(QuestionResponse.question_id == question_id)
-                if quiz_id:
-                    query = query.where(QuestionResponse.quiz_submission_id.in_(
-                        select(QuizSubmission.id).where(QuizSubmission.quiz_id == quiz_id)
-                    ))
-                
-                responses = await db.execute(query)
-                response_list = responses.scalars().all()
-                
-                if len(response_list) < 10:  # Minimum sample size
-                    logger.warning(f"Insufficient responses for reliable analysis: {len(response_list)}")
-                
-                # Perform analysis
-                analysis_results = self._calculate_item_statistics(response_list)
-                
-                # Create or update analysis record
-                existing_analysis = await db.execute(
-                    select(ItemAnalysis).where(
-                        and_(
-                            ItemAnalysis.question_id == question_id,
-                            ItemAnalysis.quiz_id == quiz_id
-                        )
+                rows = (await db.execute(self._response_matrix_query(quiz_id, question_ids))).all()
+                matrix = ResponseMatrix.from_rows(rows)
+
+                stats = item_statistics(matrix)
+                test_reliability = reliability(matrix)
+                alpha_if_deleted = test_reliability["alpha_if_deleted"]
+
+                targets = list(dict.fromkeys(question_ids)) if question_ids else matrix.item_ids.tolist()
+                analysis_date = datetime.utcnow()
+                analyses = []
+                for question_id in targets:
+                    results = self._finalize_item_statistics(stats.get(question_id), analysis_date)
+                    if question_id in alpha_if_deleted:
+                        results["group_performance"]["alpha_if_deleted"] = alpha_if_deleted[question_id]
+                    analyses.append(ItemAnalysis(question_id=question_id, quiz_id=quiz_id, **results))
+
+                small = [a.question_id for a in analyses if a.sample_size < 10]  # Minimum sample size
+                if small:
+                    logger.warning(f"Insufficient responses for reliable analysis of questions {small}")
+
+                # Предыдущий анализ тех же заданий в этом квизе заменяется целиком
+                quiz_filter = ItemAnalysis.quiz_id.is_(None) if quiz_id is None else ItemAnalysis.quiz_id == quiz_id
+                await db.execute(
+                    delete(ItemAnalysis).where(
+                        and_(ItemAnalysis.question_id.in_(targets), quiz_filter)
                     )
                 )
-                
-                analysis_obj = existing_analysis.scalar_one_or_none()
-                
-                if analysis_obj:
-                    # Update existing analysis
-                    await db.execute(
-                        update(ItemAnalysis)
-                        .where(ItemAnalysis.id == analysis_obj.id)
-                        .values(**analysis_results, updated_at=datetime.utcnow())
-                    )
-                    await db.refresh(analysis_obj)
-                else:
-                    # Create new analysis
-                    analysis_obj = ItemAnalysis(
-                        question_id=question_id,
-                        quiz_id=quiz_id,
-                        **analysis_results
-                    )
-                    db.add(analysis_obj)
-                
+                db.add_all(analyses)
+                await self._update_question_statistics(db, analyses)
                 await db.commit()
-                
-                # Update question statistics
-                await self._update_question_statistics(db, question_id, analysis_results)
-                
-                logger.info(f"Completed item analysis for question {question_id}")
-                return analysis_obj
-                
+
+                logger.info(
+                    f"Completed item analysis for {len(analyses)} questions "
+                    f"({matrix.shape[0]} submissions, quiz {quiz_id})"
+                )
+                return {
+                    "quiz_id": quiz_id,
+                    "submissions": matrix.shape[0],
+                    "analyses": analyses,
+                    "reliability": {
+                        key: value for key, value in test_reliability.items() if key != "alpha_if_deleted"
+                    }
+                }
+
         except Exception as e:
-            logger.error(f"Error analyzing question: {e}")
+            logger.error(f"Error analyzing quiz {quiz_id}: {e}")
             raise
-    
-    def _calculate_item_statistics(self, responses: List[QuestionResponse]) -> Dict[str, Any]:
-        """Calculate classical test theory statistics for a question."""
-        if not responses:
+
+    @staticmethod
+    def _response_matrix_query(quiz_id: Optional[int], question_ids: Optional[List[int]]):
+        """All responses of the submissions in scope, one row per (submission, item)."""
+        scope = select(QuestionResponse.quiz_submission_id)
+        if question_ids:
+            scope = scope.where(QuestionResponse.question_id.in_(question_ids))
+        if quiz_id is not None:
+            scope = scope.where(QuestionResponse.quiz_submission_id.in_(
+                select(quiz_submissions.c.id).where(quiz_submissions.c.quiz_id == quiz_id)
+            ))
+
+        return (
+            select(
+                QuestionResponse.quiz_submission_id,
+                QuestionResponse.question_id,
+                QuestionResponse.is_correct,
+                QuestionResponse.points_earned,
+                QuestionResponse.selected_options
+            )
+            .where(QuestionResponse.quiz_submission_id.in_(scope))
+            # Повторный ответ на то же задание перекрывает предыдущий
+            .order_by(QuestionResponse.id)
+        )
+
+    def _finalize_item_statistics(self, stats: Optional[Dict[str, Any]], analysis_date: datetime) -> Dict[str, Any]:
+        """Add quality assessment to engine output (or mark the item as lacking data)."""
+        if not stats or not stats["sample_size"]:
             return {
                 "sample_size": 0,
                 "difficulty_index": None,
                 "discrimination_index": None,
                 "point_biserial_correlation": None,
                 "quality_score": 0,
-                "recommendation": "insufficient_data"
+                "quality_flags": [],
+                "recommendation": "insufficient_data",
+                "distractor_analysis": {},
+                "group_performance": {},
+                "analysis_date": analysis_date
             }
-        
-        sample_size = len(responses)
-        correct_responses = sum(1 for r in responses if r.is_correct)
-        
-        # Difficulty Index (P-value)
-        difficulty_index = correct_responses / sample_size
-        
-        # For discrimination analysis, we need total scores
-        # This is a simplified version - in practice, you'd use total quiz scores
-        total_scores = [r.points_earned for r in responses]
-        
-        # Sort by total score and split into high/low groups
-        sorted_responses = sorted(responses, key=lambda r: r.points_earned, reverse=True)
-        group_size = max(1, sample_size // 3)  # Top and bottom 27%
-        
-        high_group = sorted_responses[:group_size]
-        low_group = sorted_responses[-group_size:]
-        
-        # Discrimination Index (D-value)
-        high_correct = sum(1 for r in high_group if r.is_correct)
-        low_correct = sum(1 for r in low_group if r.is_correct)
-        
-        discrimination_index = (high_correct / len(high_group)) - (low_correct / len(low_group))
-        
-        # Point-biserial correlation (simplified)
-        if len(set(total_scores)) > 1:  # Need variance in scores
-            correct_scores = [r.points_earned for r in responses if r.is_correct]
-            incorrect_scores = [r.points_earned for r in responses if not r.is_correct]
-            
-            if correct_scores and incorrect_scores:
-                mean_correct = statistics.mean(correct_scores)
-                mean_incorrect = statistics.mean(incorrect_scores)
-                overall_std = statistics.stdev(total_scores)
-                
-                point_biserial = ((mean_correct - mean_incorrect) / overall_std) * \
-                               (correct_responses / sample_size * (1 - correct_responses / sample_size)) ** 0.5
-            else:
-                point_biserial = 0
-        else:
-            point_biserial = 0
-        
-        # Quality assessment
+
         quality_score, quality_flags, recommendation = self._assess_question_quality(
-            difficulty_index, discrimination_index, point_biserial, sample_size
+            stats["difficulty_index"], stats["discrimination_index"],
+            stats["point_biserial_correlation"], stats["sample_size"]
         )
-        
-        # Distractor analysis (for multiple choice)
-        distractor_analysis = self._analyze_distractors(responses)
-        
+        distractor_analysis = dict(stats["distractor_analysis"], analysis_date=analysis_date.isoformat())
         return {
-            "sample_size": sample_size,
-            "difficulty_index": difficulty_index,
-            "discrimination_index": discrimination_index,
-            "point_biserial_correlation": point_biserial,
+            "sample_size": stats["sample_size"],
+            "difficulty_index": stats["difficulty_index"],
+            "discrimination_index": stats["discrimination_index"],
+            "point_biserial_correlation": stats["point_biserial_correlation"],
             "quality_score": quality_score,
             "quality_flags": quality_flags,
             "recommendation": recommendation,
             "distractor_analysis": distractor_analysis,
-            "analysis_date": datetime.utcnow()
+            "group_performance": dict(stats["group_performance"]),
+            "analysis_date": analysis_date
         }
     
     def _assess_question_quality(self, difficulty: float, discrimination: float, 
@@ -483,81 +573,31 @@ class ItemAnalysisService:
         
         return max(0, quality_score), quality_flags, recommendation
     
-    def _analyze_distractors(self, responses: List[QuestionResponse]) -> Dict[str, Any]:
-        """Analyze distractor effectiveness for multiple choice questions."""
-        if not responses:
-            return {}
-        
-        # Count selections for each option
-        option_counts = defaultdict(int)
-        total_responses = len(responses)
-        
-        for response in responses:
-            if response.selected_options:
-                try:
-                    selected = json.loads(response.selected_options) if isinstance(response.selected_options, str) else response.selected_options
-                    if isinstance(selected, list):
-                        for option in selected:
-                            option_counts[str(option)] += 1
-                    else:
-                        option_counts[str(selected)] += 1
-                except (json.JSONDecodeError, TypeError):
-                    continue
-        
-        # Calculate percentages and effectiveness
-        distractor_stats = {}
-        for option, count in option_counts.items():
-            percentage = (count / total_responses) * 100
-            distractor_stats[option] = {
-                "count": count,
-                "percentage": round(percentage, 1),
-                "is_effective": 5 <= percentage <= 25  # Good distractors attract 5-25% of responses
+    async def _update_question_statistics(self, db: AsyncSession, analyses: List[ItemAnalysis]):
+        """Copy analysis results to the questions (one bulk UPDATE by primary key)."""
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": analysis.question_id,
+                "difficulty_index": analysis.difficulty_index,
+                "discrimination_index": analysis.discrimination_index,
+                "point_biserial_correlation": analysis.point_biserial_correlation,
+                "needs_review": analysis.recommendation in ["revise", "discard"],
+                "review_reason": ", ".join(analysis.quality_flags) if analysis.quality_flags else None,
+                "last_analyzed": now
             }
-        
-        return {
-            "option_statistics": distractor_stats,
-            "total_responses": total_responses,
-            "analysis_date": datetime.utcnow().isoformat()
-        }
-    
-    async def _update_question_statistics(self, db: AsyncSession, question_id: int, analysis: Dict[str, Any]):
-        """Update question statistics based on analysis results."""
-        try:
-            needs_review = analysis["recommendation"] in ["revise", "discard"]
-            review_reason = ", ".join(analysis["quality_flags"]) if analysis["quality_flags"] else None
-            
-            await db.execute(
-                update(BankQuestion)
-                .where(BankQuestion.id == question_id)
-                .values(
-                    difficulty_index=analysis["difficulty_index"],
-                    discrimination_index=analysis["discrimination_index"],
-                    point_biserial_correlation=analysis["point_biserial_correlation"],
-                    needs_review=needs_review,
-                    review_reason=review_reason,
-                    last_analyzed=datetime.utcnow()
-                )
-            )
-            await db.commit()
-            
-        except Exception as e:
-            logger.error(f"Error updating question statistics: {e}")
+            for analysis in analyses
+            if analysis.sample_size
+        ]
+        if rows:
+            await db.execute(update(BankQuestion), rows)
     
     async def bulk_analyze_questions(self, question_ids: List[int], quiz_id: Optional[int] = None) -> List[ItemAnalysis]:
         """Perform bulk item analysis on multiple questions."""
         try:
-            analyses = []
-            
-            for question_id in question_ids:
-                try:
-                    analysis = await self.analyze_question(question_id, quiz_id)
-                    analyses.append(analysis)
-                except Exception as e:
-                    logger.error(f"Error analyzing question {question_id}: {e}")
-                    continue
-            
-            logger.info(f"Completed bulk analysis of {len(analyses)} questions")
-            return analyses
+            result = await self.analyze_quiz(quiz_id=quiz_id, question_ids=question_ids)
+            logger.info(f"Completed bulk analysis of {len(result['analyses'])} questions")
+            return result["analyses"]
             
         except Exception as e:
             logger.error(f"Error in bulk analysis: {e}")
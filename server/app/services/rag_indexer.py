@@ -6,7 +6,13 @@ Indexes Canvas content, course materials, and educational resources for AI-power
 
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Union
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime
 import hashlib
 import json
@@ -21,7 +27,7 @@ from app.db.session import AsyncSessionLocal
 from app.models.course import Course
 from app.models.assignment import Assignment
 from app.models.page import Page
-from app.models.discussion import Discussion
+from app.models.discussion import DiscussionTopic
 from app.models.quiz import Quiz
 
 logger = logging.getLogger(__name__)
@@ -74,13 +80,125 @@ class Document:
         return doc
 
 
+class EmbeddingCache:
+    """LRU of embeddings keyed by (model, text hash), optionally backed by ``.npy`` files.
+    
+    Thread-safe: used from the embedding worker pool and the event loop.
+    """
+    
+    def __init__(self, max_entries: int = 10000, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(model_id: str, text: str) -> str:
+        return hashlib.sha1(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.npy"
+    
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get(self, key: str, disk: bool = True) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+        
+        if disk and self.directory is not None:
+            try:
+                vector = np.load(self._path(key))
+            except FileNotFoundError:
+                vector = None
+            except Exception as e:
+                logger.warning(f"Failed to read cached embedding {key}: {e}")
+                vector = None
+            if vector is not None:
+                self._remember(key, vector)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+        
+        if disk:
+            with self._lock:
+                self.misses += 1
+        return None
+    
+    def put(self, key: str, vector: np.ndarray):
+        self._remember(key, vector)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp_path = path.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.save(f, vector)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to persist embedding {key}: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "directory": str(self.directory) if self.directory else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
 class EmbeddingService:
-    """Service for generating text embeddings."""
+    """Service for generating text embeddings.
     
-    def __init__(self):
+    Model calls run in a dedicated thread pool, never on the event loop.
+    Concurrent ``aembed_text`` calls within ``batch_window`` seconds are
+    encoded as one batch; results are cached by (model, text hash).
+    """
+    
+    def __init__(
+        self,
+        cache: Optional[EmbeddingCache] = None,
+        workers: Optional[int] = None,
+        batch_window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        fallback_path: Optional[str] = None
+    ):
         self.model_name = getattr(settings, 'EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
         self.model = None
+        self.model_id = "random"
         self.dimension = 384  # Default for MiniLM
+        self.cache = cache or EmbeddingCache(
+            settings.RAG_EMBEDDING_CACHE_SIZE, settings.RAG_EMBEDDING_CACHE_DIR or None
+        )
+        self.batch_window = (settings.RAG_EMBEDDING_BATCH_WINDOW_MS if batch_window_ms is None else batch_window_ms) / 1000
+        self.max_batch = max(1, max_batch or settings.RAG_EMBED_BATCH_SIZE)
+        self.fallback_path = Path(fallback_path or settings.RAG_TFIDF_PATH)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers or settings.RAG_EMBEDDING_WORKERS),
+            thread_name_prefix="embedding"
+        )
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        
+        self.batches = 0
+        self.batched_texts = 0
         self._load_model()
     
     def _load_model(self):
@@ -89,6 +207,7 @@ class EmbeddingService:
             # Try to use sentence-transformers
             from sentence_transformers import SentenceTransformer
             self.model = SentenceTransformer(self.model_name)
+            self.model_id = self.model_name
             self.dimension = self.model.get_sentence_embedding_dimension()
             logger.info(f"Loaded embedding model: {self.model_name} (dim: {self.dimension})")
         except Exception as e:
@@ -97,57 +216,183 @@ class EmbeddingService:
             self._setup_fallback_embeddings()
     
     def _setup_fallback_embeddings(self):
-        """Setup fallback embedding method."""
+        """Setup fallback embedding method (a persisted fitted TF-IDF when available)."""
         try:
             from sklearn.feature_extraction.text import TfidfVectorizer
-            self.model = TfidfVectorizer(max_features=384, stop_words='english')
+            self.model = TfidfVectorizer(max_features=384)
+            self.model_id = "tfidf:unfitted"
             self.dimension = 384
-            logger.info("Using TF-IDF fallback embeddings")
+            if self.fallback_path.exists():
+                with open(self.fallback_path, "rb") as f:
+                    self._set_fitted_vectorizer(pickle.load(f))
+                logger.info(f"Using TF-IDF fallback embeddings from {self.fallback_path} (dim: {self.dimension})")
+            else:
+                logger.info("Using TF-IDF fallback embeddings (fitted on the first indexing run)")
         except Exception as e:
             logger.warning(f"TF-IDF fallback failed: {e}")
             # Use random embeddings as last resort
             self.model = None
+            self.model_id = "random"
             self.dimension = 384
             logger.warning("Using random embeddings (for testing only)")
     
-    def embed_text(self, text: str) -> np.ndarray:
-        """Generate embedding for text."""
-        if not text or not text.strip():
-            return np.zeros(self.dimension)
+    def _uses_tfidf(self) -> bool:
+        return hasattr(self.model, 'transform') and not hasattr(self.model, 'encode')
+    
+    @property
+    def needs_fit(self) -> bool:
+        """True while the TF-IDF fallback has no vocabulary (it would only return zeros)."""
+        return self._uses_tfidf() and not hasattr(self.model, 'vocabulary_')
+    
+    def _set_fitted_vectorizer(self, vectorizer):
+        self.model = vectorizer
+        self.dimension = len(vectorizer.vocabulary_)
+        vocabulary = json.dumps(sorted(vectorizer.vocabulary_.items()), ensure_ascii=False)
+        self.model_id = f"tfidf:{hashlib.sha1(vocabulary.encode('utf-8')).hexdigest()[:16]}"
+    
+    def fit_fallback(self, texts: List[str]) -> bool:
+        """Fit the TF-IDF fallback on the indexed corpus and persist it (no-op for other models)."""
+        texts = [text for text in texts if text and text.strip()]
+        if not self._uses_tfidf() or not texts:
+            return False
+        try:
+            vectorizer = self.model.__class__(**self.model.get_params())
+            vectorizer.fit(texts)
+        except ValueError as e:
+            # e.g. empty vocabulary
+            logger.warning(f"Failed to fit TF-IDF fallback: {e}")
+            return False
+        self._set_fitted_vectorizer(vectorizer)
         
+        tmp_path = self.fallback_path.with_name(self.fallback_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(vectorizer, f)
+            os.replace(tmp_path, self.fallback_path)
+        except Exception as e:
+            logger.warning(f"Failed to persist TF-IDF fallback: {e}")
+        logger.info(f"Fitted TF-IDF fallback on {len(texts)} documents (dim: {self.dimension})")
+        return True
+    
+    async def afit_fallback(self, texts: List[str]) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.fit_fallback, texts)
+    
+    def _random_embedding(self, text: str) -> np.ndarray:
+        # Stable across processes (unlike hash()), so cached vectors stay valid
+        seed = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:16], 16)
+        return np.random.default_rng(seed).normal(0, 1, self.dimension)
+    
+    def _compute(self, texts: List[str]) -> List[np.ndarray]:
+        """Run the model on ``texts`` (no cache)."""
         try:
             if hasattr(self.model, 'encode'):
-                # SentenceTransformer
-                embedding = self.model.encode([text])[0]
-                return np.array(embedding)
+                # SentenceTransformer batch encoding
+                embeddings = self.model.encode(texts, batch_size=self.max_batch)
+                return [np.array(emb) for emb in embeddings]
             elif hasattr(self.model, 'transform'):
                 # TF-IDF
-                embedding = self.model.transform([text]).toarray()[0]
-                return embedding
+                if self.needs_fit:
+                    return [np.zeros(self.dimension) for _ in texts]
+                return list(self.model.transform(texts).toarray())
             else:
                 # Random fallback
-                np.random.seed(hash(text) % 2**32)
-                return np.random.normal(0, 1, self.dimension)
+                return [self._random_embedding(text) for text in texts]
         except Exception as e:
-            logger.error(f"Error generating embedding: {e}")
-            return np.zeros(self.dimension)
+            logger.error(f"Error generating embeddings: {e}")
+            return [np.zeros(self.dimension) for _ in texts]
+    
+    def embed_text(self, text: str) -> np.ndarray:
+        """Generate embedding for text (blocking; use ``aembed_text`` from async code)."""
+        return self.embed_batch([text])[0]
     
     def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
-        """Generate embeddings for multiple texts."""
+        """Generate embeddings for multiple texts (blocking; use ``aembed_batch`` from async code)."""
         if not texts:
             return []
         
-        try:
-            if hasattr(self.model, 'encode'):
-                # SentenceTransformer batch encoding
-                embeddings = self.model.encode(texts)
-                return [np.array(emb) for emb in embeddings]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = np.zeros(self.dimension)
+                continue
+            vector = self.cache.get(self.cache.key(self.model_id, text))
+            if vector is not None:
+                results[i] = vector
             else:
-                # Fallback to individual encoding
-                return [self.embed_text(text) for text in texts]
-        except Exception as e:
-            logger.error(f"Error in batch embedding: {e}")
-            return [self.embed_text(text) for text in texts]
+                missing.setdefault(text, []).append(i)
+        
+        if missing:
+            unique = list(missing.keys())
+            for text, vector in zip(unique, self._compute(unique)):
+                # Zero vectors mean "no embedding" (errors, unfitted fallback) — not cached
+                if np.any(vector):
+                    self.cache.put(self.cache.key(self.model_id, text), vector)
+                for i in missing[text]:
+                    results[i] = vector
+        
+        return results
+    
+    async def aembed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """Embed texts in the embedding worker pool."""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.embed_batch, list(texts))
+    
+    async def aembed_text(self, text: str) -> np.ndarray:
+        """Embed one text; concurrent calls are micro-batched into one model call."""
+        if not text or not text.strip():
+            return np.zeros(self.dimension)
+        cached = self.cache.get(self.cache.key(self.model_id, text), disk=False)
+        if cached is not None:
+            return cached
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_pending()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush_pending)
+        return await future
+    
+    def _flush_pending(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        
+        texts = list(dict.fromkeys(text for text, _ in pending))
+        self.batches += 1
+        self.batched_texts += len(pending)
+        job = asyncio.get_running_loop().run_in_executor(self._executor, self.embed_batch, texts)
+        
+        def deliver(job: asyncio.Future):
+            try:
+                vectors = dict(zip(texts, job.result()))
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            for text, future in pending:
+                if not future.done():
+                    future.set_result(vectors[text])
+        
+        job.add_done_callback(deliver)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_id,
+            "dimension": self.dimension,
+            "query_batches": self.batches,
+            "batched_queries": self.batched_texts,
+            "cache": self.cache.get_stats()
+        }
 
 
 class VectorStore:
@@ -160,13 +405,15 @@ class VectorStore:
     
     def add_documents(self, documents: List[Document]):
         """Add documents to the store."""
+        known = set(self.doc_ids)
         for doc in documents:
             if doc.embedding is None:
                 logger.warning(f"Document {doc.doc_id} has no embedding")
                 continue
             
             self.documents[doc.doc_id] = doc
-            if doc.doc_id not in self.doc_ids:
+            if doc.doc_id not in known:
+                known.add(doc.doc_id)
                 self.doc_ids.append(doc.doc_id)
         
         # Rebuild embedding matrix
@@ -252,6 +499,15 @@ class VectorStore:
             return True
         return False
     
+    def remove_documents(self, doc_ids: List[str], rebuild: bool = True) -> int:
+        """Remove several documents with a single rebuild of the embedding matrix."""
+        removed = {doc_id for doc_id in doc_ids if self.documents.pop(doc_id, None) is not None}
+        if removed:
+            self.doc_ids = [doc_id for doc_id in self.doc_ids if doc_id not in removed]
+            if rebuild:
+                self._rebuild_embeddings()
+        return len(removed)
+    
     def clear(self):
         """Clear all documents."""
         self.documents.clear()
@@ -267,13 +523,57 @@ class VectorStore:
         }
 
 
+def chunk_text(text: str, chunk_size: int, overlap: int = 0) -> List[str]:
+    """Split text into pieces of at most ``chunk_size`` characters.
+    
+    Breaks at a paragraph, line, sentence or word boundary in the second half
+    of the window when there is one; consecutive pieces share ``overlap`` chars.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    if chunk_size <= 0 or len(text) <= chunk_size:
+        return [text]
+    overlap = max(0, min(overlap, chunk_size // 2))
+    
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(separator)
+                if cut > chunk_size // 2:
+                    end = start + cut + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
 class RAGIndexer:
     """Main RAG indexing service."""
     
+    # Course ids per IN (...) query when collecting content
+    COURSES_PER_QUERY = 500
+    
     def __init__(self):
         self.embedding_service = EmbeddingService()
         self.vector_store = VectorStore()
         self.index_file = Path("rag_index.json")
+        self.embed_batch_size = max(1, settings.RAG_EMBED_BATCH_SIZE)
+        self.chunk_size = settings.RAG_CHUNK_SIZE
+        self.chunk_overlap = settings.RAG_CHUNK_OVERLAP
+        self.reindex_delay = settings.RAG_REINDEX_DELAY
+        self.last_run_stats: Dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+        self._dirty_courses: set = set()
+        self._reindex_task: Optional[asyncio.Task] = None
         self.load_index()
     
     def save_index(self):
@@ -318,170 +618,272 @@ class RAGIndexer:
         except Exception as e:
             logger.error(f"Failed to load RAG index: {e}")
     
+    def _content_hash(self, content: str, metadata: Dict[str, Any]) -> str:
+        """Hash of everything that affects the stored chunks and their embeddings."""
+        key = json.dumps(
+            [self.embedding_service.model_id, self.chunk_size, self.chunk_overlap, content, metadata],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+    
+    async def _collect_sources(self, course_ids: List[int], db: AsyncSession) -> List[Dict[str, Any]]:
+        """Load indexable content of the given courses (five queries in total)."""
+        courses_result = await db.execute(select(Course).where(Course.id.in_(course_ids)))
+        courses = {course.id: course for course in courses_result.scalars().all()}
+        if not courses:
+            return []
+        ids = list(courses.keys())
+        
+        sources = []
+        
+        def add(source_key: str, heading: str, body: Optional[str], course: Course, metadata: Dict[str, Any]):
+            sources.append({
+                "source_key": source_key,
+                "heading": heading,
+                "body": body or "",
+                "metadata": {"course_id": course.id, "course_name": course.title, **metadata}
+            })
+        
+        # Course descriptions
+        for course in courses.values():
+            if course.description:
+                add(f"course:{course.id}", course.title, course.description, course,
+                    {"type": "course", "source": "course_description"})
+        
+        # Assignments
+        result = await db.execute(select(Assignment).where(Assignment.course_id.in_(ids)))
+        for assignment in result.scalars().all():
+            add(f"assignment:{assignment.id}", f"Assignment: {assignment.title}", assignment.description,
+                courses[assignment.course_id],
+                {"type": "assignment", "assignment_id": assignment.id,
+                 "assignment_title": assignment.title, "source": "assignment"})
+        
+        # Pages
+        result = await db.execute(select(Page).where(Page.course_id.in_(ids)))
+        for page in result.scalars().all():
+            add(f"page:{page.id}", f"Page: {page.title}", page.body, courses[page.course_id],
+                {"type": "page", "page_id": page.id, "page_title": page.title, "source": "course_page"})
+        
+        # Discussions
+        result = await db.execute(select(DiscussionTopic).where(DiscussionTopic.course_id.in_(ids)))
+        for topic in result.scalars().all():
+            add(f"discussion:{topic.id}", f"Discussion: {topic.title}", topic.body, courses[topic.course_id],
+                {"type": "discussion", "discussion_id": topic.id,
+                 "discussion_title": topic.title, "source": "discussion"})
+        
+        # Quizzes
+        result = await db.execute(select(Quiz).where(Quiz.course_id.in_(ids)))
+        for quiz in result.scalars().all():
+            add(f"quiz:{quiz.id}", f"Quiz: {quiz.title}", quiz.description, courses[quiz.course_id],
+                {"type": "quiz", "quiz_id": quiz.id, "quiz_title": quiz.title, "source": "quiz"})
+        
+        return sources
+    
+    def _chunk_documents(self, source: Dict[str, Any], content_hash: str) -> List[Document]:
+        """Split one source into chunk documents with stable ids ``<source_key>#<n>``."""
+        heading, body = source["heading"], source["body"]
+        if body and len(heading) + len(body) + 2 > self.chunk_size:
+            pieces = chunk_text(body, self.chunk_size - len(heading) - 2, self.chunk_overlap)
+        else:
+            pieces = [body] if body else [""]
+        
+        documents = []
+        for i, piece in enumerate(pieces):
+            metadata = {
+                **source["metadata"],
+                "source_key": source["source_key"],
+                "content_hash": content_hash,
+                "chunk": i,
+                "chunks": len(pieces)
+            }
+            content = f"{heading}\n\n{piece}" if piece else heading
+            documents.append(Document(content=content, metadata=metadata, doc_id=f"{source['source_key']}#{i}"))
+        return documents
+    
+    def _indexed_sources(self, course_ids: Optional[set]) -> Dict[Any, Dict[str, Any]]:
+        """source_key -> {"hash", "doc_ids"} for indexed documents (all courses when ``course_ids`` is None)."""
+        indexed: Dict[Any, Dict[str, Any]] = {}
+        for doc_id, doc in self.vector_store.documents.items():
+            if course_ids is not None and doc.metadata.get("course_id") not in course_ids:
+                continue
+            # Documents from older index files have no source_key and are always replaced
+            source_key = doc.metadata.get("source_key") or ("legacy", doc_id)
+            entry = indexed.setdefault(source_key, {"hash": doc.metadata.get("content_hash"), "doc_ids": []})
+            entry["doc_ids"].append(doc_id)
+        return indexed
+    
+    async def _embed_documents(self, documents: List[Document]):
+        """Embed in batches of ``embed_batch_size`` in the embedding worker pool."""
+        for start in range(0, len(documents), self.embed_batch_size):
+            batch = documents[start:start + self.embed_batch_size]
+            embeddings = await self.embedding_service.aembed_batch([doc.content for doc in batch])
+            for doc, embedding in zip(batch, embeddings):
+                doc.embedding = embedding
+                doc.metadata["embedding_model"] = self.embedding_service.model_id
+    
+    def _outdated_documents(self, skip_course_ids: set) -> Dict[str, Any]:
+        """doc_id -> course_id of documents embedded with another model, outside ``skip_course_ids``."""
+        model_id = self.embedding_service.model_id
+        return {
+            doc_id: doc.metadata.get("course_id")
+            for doc_id, doc in self.vector_store.documents.items()
+            if doc.metadata.get("embedding_model") != model_id
+            and doc.metadata.get("course_id") not in skip_course_ids
+        }
+    
+    async def index_courses(self, course_ids: List[int], db: AsyncSession, prune: bool = False) -> Dict[str, Any]:
+        """Incrementally (re)index the given courses.
+        
+        Only new or changed sources (by content hash) are chunked and embedded;
+        documents of deleted content are removed. With ``prune=True`` documents
+        of courses not in ``course_ids`` are removed as well (full re-index).
+        """
+        async with self._lock:
+            started = time.monotonic()
+            course_ids = list(dict.fromkeys(course_ids))
+            
+            sources = []
+            for start in range(0, len(course_ids), self.COURSES_PER_QUERY):
+                sources.extend(await self._collect_sources(course_ids[start:start + self.COURSES_PER_QUERY], db))
+            
+            if self.embedding_service.needs_fit:
+                # CPU-only deployment: fit the TF-IDF fallback on the corpus first
+                corpus = [source["heading"] + "\n\n" + source["body"] for source in sources]
+                corpus += [doc.content for doc in self.vector_store.documents.values()]
+                await self.embedding_service.afit_fallback(corpus)
+            
+            indexed = self._indexed_sources(None if prune else set(course_ids))
+            new_documents: List[Document] = []
+            stale_ids: List[str] = []
+            unchanged = 0
+            
+            # Vectors of another model (e.g. the TF-IDF fallback was just fitted) are not
+            # comparable and may differ in dimension: drop them in the other courses too
+            # and re-index those courses shortly. Courses of this run are re-embedded below,
+            # since the content hash includes the model id.
+            outdated = {} if prune else self._outdated_documents(set(course_ids))
+            stale_ids.extend(outdated)
+            
+            for source in sources:
+                content_hash = self._content_hash(source["heading"] + "\n\n" + source["body"], source["metadata"])
+                previous = indexed.pop(source["source_key"], None)
+                if previous and previous["hash"] == content_hash:
+                    unchanged += 1
+                    continue
+                if previous:
+                    stale_ids.extend(previous["doc_ids"])
+                new_documents.extend(self._chunk_documents(source, content_hash))
+            
+            # Whatever is left was deleted (or comes from an older index format)
+            for entry in indexed.values():
+                stale_ids.extend(entry["doc_ids"])
+            
+            if new_documents:
+                logger.info(f"Generating embeddings for {len(new_documents)} chunks")
+                await self._embed_documents(new_documents)
+            
+            if stale_ids or new_documents:
+                self.vector_store.remove_documents(stale_ids, rebuild=not new_documents)
+                if new_documents:
+                    self.vector_store.add_documents(new_documents)
+                self.save_index()
+            for course_id in set(outdated.values()):
+                self.schedule_reindex(course_id)
+            
+            stats = {
+                "courses": len(course_ids),
+                "sources": len(sources),
+                "unchanged": unchanged,
+                "embedded_chunks": len(new_documents),
+                "removed_documents": len(stale_ids),
+                "outdated_documents": len(outdated),
+                "duration_seconds": round(time.monotonic() - started, 3),
+                "finished_at": datetime.utcnow().isoformat()
+            }
+            self.last_run_stats = stats
+            logger.info(
+                f"Indexed {len(course_ids)} courses: {unchanged} sources unchanged, "
+                f"{len(new_documents)} chunks embedded, {len(stale_ids)} documents removed"
+            )
+            return stats
+    
     async def index_course_content(self, course_id: int, db: AsyncSession):
         """Index all content for a specific course."""
         try:
-            logger.info(f"Starting to index course {course_id}")
-            
-            # Get course
-            course_result = await db.execute(
-                select(Course).where(Course.id == course_id)
-            )
-            course = course_result.scalar_one_or_none()
-            if not course:
-                logger.warning(f"Course {course_id} not found")
-                return
-            
-            documents = []
-            
-            # Index course description
-            if course.description:
-                doc = Document(
-                    content=f"{course.name}\n\n{course.description}",
-                    metadata={
-                        "type": "course",
-                        "course_id": course.id,
-                        "course_name": course.name,
-                        "source": "course_description"
-                    }
-                )
-                documents.append(doc)
-            
-            # Index assignments
-            assignments_result = await db.execute(
-                select(Assignment).where(Assignment.course_id == course_id)
-            )
-            assignments = assignments_result.scalars().all()
-            
-            for assignment in assignments:
-                content = f"Assignment: {assignment.title}"
-                if assignment.description:
-                    content += f"\n\n{assignment.description}"
-                
-                doc = Document(
-                    content=content,
-                    metadata={
-                        "type": "assignment",
-                        "course_id": course.id,
-                        "course_name": course.name,
-                        "assignment_id": assignment.id,
-                        "assignment_title": assignment.title,
-                        "assignment_type": assignment.assignment_type,
-                        "source": "assignment"
-                    }
-                )
-                documents.append(doc)
-            
-            # Index pages
-            pages_result = await db.execute(
-                select(Page).where(Page.course_id == course_id)
-            )
-            pages = pages_result.scalars().all()
-            
-            for page in pages:
-                content = f"Page: {page.title}"
-                if page.body:
-                    content += f"\n\n{page.body}"
-                
-                doc = Document(
-                    content=content,
-                    metadata={
-                        "type": "page",
-                        "course_id": course.id,
-                        "course_name": course.name,
-                        "page_id": page.id,
-                        "page_title": page.title,
-                        "source": "course_page"
-                    }
-                )
-                documents.append(doc)
-            
-            # Index discussions
-            discussions_result = await db.execute(
-                select(Discussion).where(Discussion.course_id == course_id)
-            )
-            discussions = discussions_result.scalars().all()
-            
-            for discussion in discussions:
-                content = f"Discussion: {discussion.title}"
-                if discussion.message:
-                    content += f"\n\n{discussion.message}"
-                
-                doc = Document(
-                    content=content,
-                    metadata={
-                        "type": "discussion",
-                        "course_id": course.id,
-                        "course_name": course.name,
-                        "discussion_id": discussion.id,
-                        "discussion_title": discussion.title,
-                        "source": "discussion"
-                    }
-                )
-                documents.append(doc)
-            
-            # Index quizzes
-            quizzes_result = await db.execute(
-                select(Quiz).where(Quiz.course_id == course_id)
-            )
-            quizzes = quizzes_result.scalars().all()
-            
-            for quiz in quizzes:
-                content = f"Quiz: {quiz.title}"
-                if quiz.description:
-                    content += f"\n\n{quiz.description}"
-                
-                doc = Document(
-                    content=content,
-                    metadata={
-                        "type": "quiz",
-                        "course_id": course.id,
-                        "course_name": course.name,
-                        "quiz_id": quiz.id,
-                        "quiz_title": quiz.title,
-                        "source": "quiz"
-                    }
-                )
-                documents.append(doc)
-            
-            # Generate embeddings
-            logger.info(f"Generating embeddings for {len(documents)} documents")
-            texts = [doc.content for doc in documents]
-            embeddings = self.embedding_service.embed_batch(texts)
-            
-            for doc, embedding in zip(documents, embeddings):
-                doc.embedding = embedding
-            
-            # Add to vector store
-            self.vector_store.add_documents(documents)
-            
-            # Save index
-            self.save_index()
-            
-            logger.info(f"Successfully indexed {len(documents)} documents for course {course_id}")
-            
+            return await self.index_courses([course_id], db)
         except Exception as e:
             logger.error(f"Error indexing course {course_id}: {e}")
     
     async def index_all_courses(self):
-        """Index content for all courses."""
+        """Index content for all courses (only changed content is re-embedded)."""
         try:
             async with AsyncSessionLocal() as db:
-                courses_result = await db.execute(select(Course))
-                courses = courses_result.scalars().all()
-                
-                logger.info(f"Starting to index {len(courses)} courses")
-                
-                for course in courses:
-                    await self.index_course_content(course.id, db)
-                    # Small delay to prevent overwhelming the system
-                    await asyncio.sleep(0.1)
+                courses_result = await db.execute(select(Course.id))
+                course_ids = list(courses_result.scalars().all())
                 
+                logger.info(f"Starting to index {len(course_ids)} courses")
+                await self.index_courses(course_ids, db, prune=True)
                 logger.info("Completed indexing all courses")
                 
         except Exception as e:
             logger.error(f"Error indexing all courses: {e}")
     
+    def schedule_reindex(self, course_id: Optional[int]):
+        """Re-index a course shortly after its content changed (called after CRUD writes).
+        
+        Changes arriving within ``reindex_delay`` are merged into one run.
+        """
+        if not course_id:
+            return
+        self._dirty_courses.add(course_id)
+        if self._reindex_task is None or self._reindex_task.done():
+            self._reindex_task = asyncio.create_task(self._reindex_dirty())
+    
+    async def _reindex_dirty(self):
+        await asyncio.sleep(self.reindex_delay)
+        while self._dirty_courses:
+            course_ids = sorted(self._dirty_courses)
+            self._dirty_courses.clear()
+            try:
+                async with AsyncSessionLocal() as db:
+                    await self.index_courses(course_ids, db)
+            except Exception as e:
+                logger.error(f"Error re-indexing courses {course_ids}: {e}")
+    
+    def _search_by_embedding(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int,
+        course_id: Optional[int],
+        content_type: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        # Build metadata filter
+        filter_metadata = {}
+        if course_id:
+            filter_metadata["course_id"] = course_id
+        if content_type:
+            filter_metadata["type"] = content_type
+        
+        # Search vector store
+        results = self.vector_store.search(
+            query_embedding, 
+            top_k=top_k,
+            filter_metadata=filter_metadata if filter_metadata else None
+        )
+        
+        # Format results
+        formatted_results = []
+        for result in results:
+            doc = result["document"]
+            formatted_results.append({
+                "content": doc.content,
+                "metadata": doc.metadata,
+                "score": result["score"],
+                "doc_id": result["doc_id"]
+            })
+        
+        return formatted_results
+    
     def search(
         self, 
         query: str, 
@@ -489,38 +891,25 @@ class RAGIndexer:
         course_id: Optional[int] = None,
         content_type: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Search for relevant content."""
+        """Search for relevant content (blocking; use ``asearch`` from async code)."""
         try:
-            # Generate query embedding
             query_embedding = self.embedding_service.embed_text(query)
-            
-            # Build metadata filter
-            filter_metadata = {}
-            if course_id:
-                filter_metadata["course_id"] = course_id
-            if content_type:
-                filter_metadata["type"] = content_type
-            
-            # Search vector store
-            results = self.vector_store.search(
-                query_embedding, 
-                top_k=top_k,
-                filter_metadata=filter_metadata if filter_metadata else None
-            )
-            
-            # Format results
-            formatted_results = []
-            for result in results:
-                doc = result["document"]
-                formatted_results.append({
-                    "content": doc.content,
-                    "metadata": doc.metadata,
-                    "score": result["score"],
-                    "doc_id": result["doc_id"]
-                })
-            
-            return formatted_results
-            
+            return self._search_by_embedding(query_embedding, top_k, course_id, content_type)
+        except Exception as e:
+            logger.error(f"Error in RAG search: {e}")
+            return []
+    
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 5,
+        course_id: Optional[int] = None,
+        content_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Search for relevant content; the query is embedded in the worker pool."""
+        try:
+            query_embedding = await self.embedding_service.aembed_text(query)
+            return self._search_by_embedding(query_embedding, top_k, course_id, content_type)
         except Exception as e:
             logger.error(f"Error in RAG search: {e}")
             return []
@@ -539,7 +928,9 @@ class RAGIndexer:
             **store_stats,
             "content_types": type_counts,
             "embedding_model": self.embedding_service.model_name,
+            "embedding": self.embedding_service.get_stats(),
             "index_file": str(self.index_file),
+            "last_run": self.last_run_stats,
             "last_updated": datetime.utcnow().isoformat()
         }
 
@@ -1,57 +1,206 @@
-import asyncio
+"""
+Request rate limiting (GCRA) backed by a single atomic Redis script.
+
+The Generic Cell Rate Algorithm stores one value per key: the theoretical
+arrival time (TAT) of the next request. A limit of ``limit`` requests per
+``window_seconds`` gives an emission interval T = window / limit and a burst
+tolerance of the whole window, so there is no 2x burst at window edges and the
+key always carries a PX expiry set in the same call.
+
+Workers keep the last Redis answer per key and admit a small share of the
+remaining allowance locally (``RATE_LIMIT_LOCAL_FRACTION``) without a round
+trip; those requests are charged to Redis with the next call for the key.
+"""
+
+import logging
+import math
 import time
-from typing import Optional
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
 
 import redis.asyncio as redis
 from fastapi import HTTPException, Request, status
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1] = key; ARGV = emission interval ms, burst tolerance ms,
+# debt (requests already admitted locally, always charged)
+# Returns {allowed, remaining, retry_after_ms, reset_after_ms}
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local debt = tonumber(ARGV[3])
+
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+tat = tat + emission * debt
+
+local new_tat = tat + emission
+local allow_at = new_tat - tolerance
+
+if now < allow_at then
+    if debt > 0 then
+        redis.call('SET', KEYS[1], tat, 'PX', math.max(math.ceil(tat - now), 1))
+    end
+    local remaining = math.floor((tolerance - (tat - now)) / emission)
+    if remaining < 0 then remaining = 0 end
+    return {0, remaining, allow_at - now, tat - now}
+end
+
+redis.call('SET', KEYS[1], new_tat, 'PX', math.max(math.ceil(new_tat - now), 1))
+local remaining = math.floor((tolerance - (new_tat - now)) / emission)
+return {1, remaining, 0, new_tat - now}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of one rate limit check."""
+    allowed: bool
+    limit: int
+    window_seconds: int
+    remaining: int
+    reset_after: float
+    retry_after: float = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        """IETF RateLimit-* headers (plus Retry-After when rejected)."""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(max(self.remaining, 0)),
+            "RateLimit-Reset": str(max(math.ceil(self.reset_after), 0)),
+            "RateLimit-Policy": f"{self.limit};w={self.window_seconds}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
 
 class RateLimiter:
-    def __init__(self, redis_url: str, prefix: str = "ratelimit:") -> None:
+    def __init__(self, redis_url: str, prefix: str = "ratelimit:",
+                 local_fraction: float = 0.25, local_max_age: float = 1.0) -> None:
         self.client: redis.Redis = redis.from_url(redis_url, decode_responses=True)
         self.prefix = prefix
+        self.local_fraction = local_fraction
+        self.local_max_age = local_max_age
+        self._script = self.client.register_script(GCRA_SCRIPT)
+        # key -> (local allowance left, requests admitted locally not yet charged, expires_at)
+        self._local: Dict[str, Tuple[int, int, float]] = {}
+
+        self.local_hits = 0
+        self.redis_calls = 0
 
     def _key(self, bucket: str, identifier: str) -> str:
         return f"{self.prefix}{bucket}:{identifier}"
 
-    async def check(self, bucket: str, identifier: str, limit: int, window_seconds: int) -> None:
-        """Fixed window counter using Redis INCR + EXPIRE.
-        Raises HTTP 429 if limit exceeded.
-        """
-        key = self._key(bucket, identifier)
+    def _local_admit(self, key: str, limit: int, window_seconds: int) -> Optional[RateLimitResult]:
+        """Admit without Redis while the key is clearly under its limit."""
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        allowance, pending, expires_at = entry
+        if allowance <= 0 or time.monotonic() >= expires_at:
+            return None
+        self._local[key] = (allowance - 1, pending + 1, expires_at)
+        self.local_hits += 1
+        return RateLimitResult(
+            allowed=True, limit=limit, window_seconds=window_seconds,
+            remaining=allowance - 1, reset_after=window_seconds
+        )
+
+    async def _redis_check(self, key: str, limit: int, window_seconds: int) -> RateLimitResult:
+        _, pending, _ = self._local.pop(key, (0, 0, 0.0))
+        emission_ms = window_seconds * 1000 / limit
+        self.redis_calls += 1
         try:
-            # increment
-            current = await self.client.incr(key)
-            if current == 1:
-                await self.client.expire(key, window_seconds)
-            if current > limit:
-                ttl = await self.client.ttl(key)
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail={
-                        "message": "Too many requests",
-                        "retry_after": max(ttl, 1) if ttl and ttl > 0 else window_seconds,
-                    },
-                )
-        except HTTPException:
-            raise
+            allowed, remaining, retry_after_ms, reset_after_ms = await self._script(
+                keys=[key], args=[emission_ms, window_seconds * 1000, pending]
+            )
         except Exception:
-            # Fail-open on Redis errors
-            return
+            # Вернём неучтённые локальные запросы, чтобы списать их при следующем вызове
+            if pending:
+                self._local[key] = (0, pending, 0.0)
+            raise
+
+        remaining = int(remaining)
+        allowance = int(remaining * self.local_fraction)
+        if allowed and allowance > 0:
+            self._local[key] = (allowance, 0, time.monotonic() + min(self.local_max_age, window_seconds))
+
+        return RateLimitResult(
+            allowed=bool(int(allowed)), limit=limit, window_seconds=window_seconds,
+            remaining=remaining, reset_after=int(reset_after_ms) / 1000,
+            retry_after=int(retry_after_ms) / 1000
+        )
+
+    async def check(self, bucket: str, identifier: str, limit: int, window_seconds: int,
+                    request: Optional[Request] = None) -> Optional[RateLimitResult]:
+        """GCRA check of one request.
+
+        Raises HTTP 429 (with RateLimit-* and Retry-After headers) if the limit
+        is exceeded. With ``request`` the result is stored in
+        ``request.state.rate_limit`` for RateLimitHeadersMiddleware.
+        """
+        key = self._key(bucket, identifier)
+        result = self._local_admit(key, limit, window_seconds)
+        if result is None:
+            try:
+                result = await self._redis_check(key, limit, window_seconds)
+            except Exception as e:
+                # Fail-open on Redis errors
+                logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+                return None
+
+        if request is not None:
+            current = getattr(request.state, "rate_limit", None)
+            # Several limits on one request: report the tightest
+            if current is None or result.remaining <= current.remaining:
+                request.state.rate_limit = result
+
+        if not result.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail={
+                    "message": "Too many requests",
+                    "retry_after": max(math.ceil(result.retry_after), 1),
+                },
+                headers=result.headers(),
+            )
+        return result
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "local_keys": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_calls": self.redis_calls
+        }
 
 
-rate_limiter = RateLimiter(settings.REDIS_URL)
+rate_limiter = RateLimiter(
+    settings.REDIS_URL,
+    local_fraction=settings.RATE_LIMIT_LOCAL_FRACTION,
+    local_max_age=settings.RATE_LIMIT_LOCAL_MAX_AGE
+)
+
+
+def client_ip(request: Request) -> str:
+    # Identify by IP for unauth endpoints; honor X-Forwarded-For if present
+    forwarded = request.headers.get("x-forwarded-for")
+    return forwarded.split(",")[0].strip() if forwarded else (request.client.host if request.client else "unknown")
 
 
 def limit(bucket: str, limit: int, window_seconds: int):
     async def dependency(request: Request):
-        # Identify by IP for unauth endpoints; honor X-Forwarded-For if present
-        forwarded = request.headers.get("x-forwarded-for")
-        client_ip = forwarded.split(",")[0].strip() if forwarded else (request.client.host if request.client else "unknown")
-        identifier = client_ip
-        await rate_limiter.check(bucket=bucket, identifier=identifier, limit=limit, window_seconds=window_seconds)
+        await rate_limiter.check(
+            bucket=bucket, identifier=client_ip(request), limit=limit,
+            window_seconds=window_seconds, request=request
+        )
     return dependency
-
-
@@ -20,3 +20,13 @@ def _create_client() -> redis.Redis:
 redis_client: redis.Redis = _create_client()
 
 
+
+
+class RedisService:
+    """Accessor for the shared client (used as ``redis_service.get_client()``)."""
+
+    def get_client(self) -> redis.Redis:
+        return redis_client
+
+
+redis_service = RedisService()
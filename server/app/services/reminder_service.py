@@ -1,9 +1,10 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Set
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.session import get_async_session
 from app.crud.reminder import reminder_crud
 from app.services.notification import NotificationService
@@ -21,32 +22,64 @@ class ReminderService:
         self._running = False
 
     async def process_pending_reminders(self, db: AsyncSession) -> int:
-        """Обработать все готовые к отправке напоминания"""
-        try:
-            # Получаем готовые к отправке напоминания
-            pending = await reminder_crud.get_pending_reminders(db, limit=100)
-            
-            sent_count = 0
-            for reminder in pending:
+        """Обработать все готовые к отправке напоминания.
+
+        Напоминания захватываются пачками через FOR UPDATE SKIP LOCKED, поэтому
+        несколько реплик могут работать параллельно без двойной отправки.
+        Пачка рассылается конкурентно, успешные отмечаются одним UPDATE,
+        после чего берется следующая пачка, пока очередь не опустеет.
+        """
+        batch_size = max(1, settings.REMINDER_BATCH_SIZE)
+        semaphore = asyncio.Semaphore(max(1, settings.REMINDER_DISPATCH_CONCURRENCY))
+        failed_ids: Set[int] = set()
+        sent_count = 0
+
+        async def dispatch(reminder: ScheduledReminder) -> bool:
+            async with semaphore:
                 try:
-                    success = await self._send_reminder(reminder)
+                    return await self._send_reminder(reminder)
+                except Exception as e:
+                    logger.error(f"Error sending reminder {reminder.id}: {str(e)}")
+                    return False
+
+        try:
+            while True:
+                # Захватываем пачку; неудачные в этом проходе не берем повторно
+                pending = await reminder_crud.claim_pending_reminders(
+                    db, limit=batch_size, exclude_ids=failed_ids
+                )
+                if not pending:
+                    # Завершаем пустую транзакцию
+                    await db.commit()
+                    break
+
+                results = await asyncio.gather(*(dispatch(r) for r in pending))
+
+                sent_ids = []
+                for reminder, success in zip(pending, results):
                     if success:
-                        await reminder_crud.mark_reminder_sent(db, reminder.id)
-                        sent_count += 1
+                        sent_ids.append(reminder.id)
                         logger.info(f"Sent reminder {reminder.id} to user {reminder.user_id}")
                     else:
+                        failed_ids.add(reminder.id)
                         logger.error(f"Failed to send reminder {reminder.id}")
-                except Exception as e:
-                    logger.error(f"Error sending reminder {reminder.id}: {str(e)}")
-            
+
+                # Commit снимает блокировки с неудачных, они будут повторены в следующем тике
+                await reminder_crud.mark_reminders_sent(db, sent_ids)
+                sent_count += len(sent_ids)
+
+                if len(pending) < batch_size:
+                    break
+
             if sent_count > 0:
                 logger.info(f"Processed {sent_count} reminders")
-            
+
             return sent_count
-            
+
         except Exception as e:
             logger.error(f"Error processing reminders: {str(e)}")
-            return 0
+            await db.rollback()
+            return sent_count
 
     async def _send_reminder(self, reminder: ScheduledReminder) -> bool:
         """Отправить конкретное напоминание"""
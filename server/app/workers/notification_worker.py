@@ -9,7 +9,7 @@ import asyncio
 import signal
 import sys
 from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
 
 from app.services.notification_dlq import (
@@ -19,6 +19,7 @@ from app.services.notification_dlq import (
     RetryStrategy
 )
 from app.services.notification_service import notification_service
+from app.services.notification_metrics import notification_metrics_collector
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -63,7 +64,8 @@ class NotificationWorker:
             asyncio.create_task(self._process_notifications()),
             asyncio.create_task(self._process_delayed_retries()),
             asyncio.create_task(self._cleanup_expired()),
-            asyncio.create_task(self._report_stats())
+            asyncio.create_task(self._report_stats()),
+            asyncio.create_task(self._flush_delivery_metrics())
         ]
         
         try:
@@ -71,6 +73,11 @@ class NotificationWorker:
         except Exception as e:
             logger.error(f"Worker {self.worker_id} error: {e}")
         finally:
+            # Flush whatever closed minutes are still in memory
+            try:
+                await notification_metrics_collector.flush_metrics()
+            except Exception as e:
+                logger.error(f"Error flushing delivery metrics on shutdown: {e}")
             logger.info(f"Worker {self.worker_id} stopped")
     
     async def _process_notifications(self):
@@ -303,46 +310,31 @@ class NotificationWorker:
                 await asyncio.sleep(3600)
     
     async def _cleanup_old_records(self):
-        """Clean up old notification records from database."""
+        """Drop expired notification partitions and provision upcoming ones."""
         try:
-            from app.db.session import AsyncSessionLocal
-            from sqlalchemy import text
+            from app.services.data_retention_policy import data_retention_manager
             
-            async with AsyncSessionLocal() as db:
-                # Delete old notification logs (keep for 30 days)
-                cleanup_date = datetime.utcnow() - timedelta(days=30)
-                
-                # Delete delivery attempts first (foreign key constraint)
-                delete_attempts_sql = """
-                DELETE FROM notification_delivery_attempts 
-                WHERE message_id IN (
-                    SELECT id FROM notification_log 
-                    WHERE created_at < :cleanup_date
-                    AND status IN ('sent', 'expired', 'poisoned')
-                )
-                """
-                
-                result = await db.execute(text(delete_attempts_sql), {"cleanup_date": cleanup_date})
-                attempts_deleted = result.rowcount
-                
-                # Delete notification logs
-                delete_logs_sql = """
-                DELETE FROM notification_log 
-                WHERE created_at < :cleanup_date
-                AND status IN ('sent', 'expired', 'poisoned')
-                """
-                
-                result = await db.execute(text(delete_logs_sql), {"cleanup_date": cleanup_date})
-                logs_deleted = result.rowcount
-                
-                await db.commit()
-                
-                if logs_deleted > 0 or attempts_deleted > 0:
-                    logger.info(f"Cleaned up {logs_deleted} notification logs and {attempts_deleted} delivery attempts")
+            result = await data_retention_manager.manage_partitions(dry_run=False)
+            dropped = [name for names in result["dropped_partitions"].values() for name in names]
+            
+            if dropped:
+                logger.info(f"Dropped expired notification partitions: {', '.join(dropped)}")
+            for error in result["errors"]:
+                logger.error(f"Partition maintenance error: {error}")
                     
         except Exception as e:
             logger.error(f"Error cleaning up old records: {e}")
     
+    async def _flush_delivery_metrics(self):
+        """Periodically flush in-memory delivery rollups to the database."""
+        while self.running:
+            try:
+                await asyncio.sleep(60)  # Rollups are per minute
+                await notification_metrics_collector.flush_metrics()
+                
+            except Exception as e:
+                logger.error(f"Error flushing delivery metrics: {e}")
+    
     async def _report_stats(self):
         """Report worker statistics periodically."""
         while self.running:
@@ -17,14 +17,20 @@ from fastapi.responses import JSONResponse
 from fastapi.exception_handlers import RequestValidationError
 from fastapi.exceptions import RequestValidationError
 import logging
-import contextvars
 from app.core.config import settings
 from app.services.notification import NotificationService
 from app.middleware.security_headers import SecurityHeadersMiddleware
+from app.middleware.correlation import CorrelationIdMiddleware, correlation_id_var
 from app.middleware.observability import ObservabilityMiddleware, AuthenticationMetricsMiddleware
 from app.middleware.ai_quota import create_ai_quota_middleware
-from app.middleware.api_versioning import APIVersioningMiddleware, ResponseStandardizationMiddleware, APIMetricsMiddleware
+from app.middleware.api_versioning import APIVersioningMiddleware, APIMetricsMiddleware, api_metrics_publisher
 from app.middleware.page_tracking import create_page_tracking_middleware
+from app.middleware.rate_limit_headers import RateLimitHeadersMiddleware
+from app.services.attendance_analytics import pageview_buffer
+from app.core.rbac import audit_log_buffer
+from app.services.lti_ags_service import close_lti_ags_service
+from app.services.lti_jwks import jwks_cache
+from app.services.llm_providers import close_llm_providers
 from app.observability.tracing import setup_tracing
 from app.observability.metrics import init_global_metrics
 from app.services.scheduler import start_deadline_scheduler
@@ -90,9 +96,22 @@ async def lifespan(app: FastAPI):
     await advanced_scheduler.start()
     
     await create_initial_data()
+    
+    # Start page view flusher (fed by PageViewTrackingMiddleware)
+    await pageview_buffer.start()
+    # Publish per-worker API latency histograms to Redis for the cluster view
+    await api_metrics_publisher.start()
+    # Batched RBAC audit writes
+    await audit_log_buffer.start()
     yield
     
     # Cleanup on shutdown
+    await audit_log_buffer.stop()
+    await close_lti_ags_service()
+    await jwks_cache.close()
+    await close_llm_providers()
+    await api_metrics_publisher.stop()
+    await pageview_buffer.stop()
     await advanced_scheduler.stop()
 
 app = FastAPI(title="EduAnalytics API", lifespan=lifespan)
@@ -190,40 +209,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
     allow_headers=cors_headers,
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
 )
 
-# Correlation ID middleware
-import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
-
-class CorrelationIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        correlation_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        token = correlation_id_var.set(correlation_id)
-        # bind to Sentry scope if available
-        try:
-            with sentry_sdk.configure_scope() as scope:
-                scope.set_tag("correlation_id", correlation_id)
-        except Exception:
-            pass
-        # Attach to request state
-        request.state.correlation_id = correlation_id
-        try:
-            response = await call_next(request)
-        finally:
-            correlation_id_var.reset(token)
-        response.headers["X-Request-ID"] = correlation_id
-        return response
-
+# Все middleware ниже — чистые ASGI-классы: тело ответа не буферизуется, стриминг сохраняется.
+# ResponseStandardizationMiddleware не подключается: под BaseHTTPMiddleware он никогда не срабатывал,
+# а включение изменило бы формат всех JSON-ответов.
 app.add_middleware(CorrelationIdMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 app.add_middleware(ObservabilityMiddleware)
 app.add_middleware(AuthenticationMetricsMiddleware)
 app.add_middleware(create_ai_quota_middleware())
 app.add_middleware(APIMetricsMiddleware)
-app.add_middleware(ResponseStandardizationMiddleware)
 app.add_middleware(APIVersioningMiddleware, default_version="v1")
 app.add_middleware(create_page_tracking_middleware())
+app.add_middleware(RateLimitHeadersMiddleware)
 
 # Подключение маршрутов пользователей
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
@@ -290,8 +290,6 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # Для расширения: добавьте middlewares, обработчики ошибок и т.д.
 
 # Настройка структурированного JSON-логирования с корреляционным ID
-correlation_id_var = contextvars.ContextVar("correlation_id", default=None)
-
 class CorrelationIdFilter(logging.Filter):
     def filter(self, record):
         record.correlation_id = correlation_id_var.get()
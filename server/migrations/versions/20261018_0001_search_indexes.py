@@ -0,0 +1,71 @@
+"""Search indexes: pg_trgm GIN indexes and full-text search_vector columns
+
+Revision ID: search_indexes_0001
+Revises: 
+Create Date: 2026-10-18 12:00:00
+
+Backs app.core.search.SEARCH_SPECS. Indexes are built CONCURRENTLY so the
+tables stay writable; every statement is idempotent.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'search_indexes_0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRIGRAM_INDEXES = [
+    ("ix_users_username_trgm", "users", "username"),
+    ("ix_courses_title_trgm", "courses", "title"),
+    ("ix_courses_description_trgm", "courses", "description"),
+]
+
+# table -> (title column, body column); weights A/B, config 'simple'
+FULLTEXT_TABLES = {
+    "assignments": ("title", "description"),
+    "pages": ("title", "body"),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    for table, (title, body) in FULLTEXT_TABLES.items():
+        op.execute(f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce({title}, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce({body}, '')), 'B')
+            ) STORED
+        """)
+
+    with op.get_context().autocommit_block():
+        for index_name, table, column in TRIGRAM_INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+        for table in FULLTEXT_TABLES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_vector "
+                f"ON {table} USING gin (search_vector)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for index_name, _, _ in TRIGRAM_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+        for table in FULLTEXT_TABLES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_search_vector")
+
+    for table in FULLTEXT_TABLES:
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
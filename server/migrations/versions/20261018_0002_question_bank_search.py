@@ -0,0 +1,110 @@
+"""Question bank search: tags GIN index, search_vector and random_key
+
+Revision ID: question_bank_search_0002
+Revises: search_indexes_0001
+Create Date: 2026-10-18 15:00:00
+
+Backs QuestionBankService.search_questions / sample_questions:
+
+- GIN index on (tags::jsonb), matched by ``tags::jsonb ?| array[...]``;
+- ``search_vector``: question text (A) + string values of options and
+  correct answers (B), config 'simple' as in app.core.search;
+- ``random_key`` with a (question_bank_id, random_key) index for sampling.
+
+Both columns are added as plain nullable columns, so the ALTERs only touch
+the catalog. A trigger keeps ``search_vector`` current for new and edited
+rows, ``random_key`` gets a default for new rows, and existing rows are
+backfilled in id ranges of BACKFILL_BATCH_SIZE, each committed on its own,
+so no statement locks or rewrites the whole table.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'question_bank_search_0002'
+down_revision: Union[str, Sequence[str], None] = 'search_indexes_0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _search_vector(row: str) -> str:
+    return f"""
+        setweight(to_tsvector('simple', coalesce({row}question_text, '')), 'A') ||
+        setweight(json_to_tsvector('simple', coalesce({row}options, '{{}}'::json), '["string"]'), 'B') ||
+        setweight(json_to_tsvector('simple', coalesce({row}correct_answers, '{{}}'::json), '["string"]'), 'B')
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE bank_questions ADD COLUMN IF NOT EXISTS search_vector tsvector")
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION bank_questions_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {_search_vector("NEW.")};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS bank_questions_search_vector ON bank_questions")
+    op.execute("""
+        CREATE TRIGGER bank_questions_search_vector
+        BEFORE INSERT OR UPDATE OF question_text, options, correct_answers ON bank_questions
+        FOR EACH ROW EXECUTE FUNCTION bank_questions_search_vector_update()
+    """)
+
+    op.execute("ALTER TABLE bank_questions ADD COLUMN IF NOT EXISTS random_key double precision")
+    op.execute("ALTER TABLE bank_questions ALTER COLUMN random_key SET DEFAULT random()")
+
+    # Each backfill batch commits on its own; indexes are built once rows are filled
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text("SELECT max(id) FROM bank_questions")).scalar() or 0
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            bind.execute(sa.text(f"""
+                UPDATE bank_questions
+                SET search_vector = {_search_vector("")},
+                    random_key = coalesce(random_key, random())
+                WHERE id > :start AND id <= :end
+                  AND (search_vector IS NULL OR random_key IS NULL)
+            """), {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bank_questions_tags "
+            "ON bank_questions USING gin ((tags::jsonb))"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bank_questions_search_vector "
+            "ON bank_questions USING gin (search_vector)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bank_questions_bank_random_key "
+            "ON bank_questions (question_bank_id, random_key)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_bank_questions_random_key "
+            "ON bank_questions (random_key)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for index_name in (
+            "ix_bank_questions_tags",
+            "ix_bank_questions_search_vector",
+            "ix_bank_questions_bank_random_key",
+            "ix_bank_questions_random_key",
+        ):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+    op.execute("DROP TRIGGER IF EXISTS bank_questions_search_vector ON bank_questions")
+    op.execute("DROP FUNCTION IF EXISTS bank_questions_search_vector_update()")
+    op.execute("ALTER TABLE bank_questions DROP COLUMN IF EXISTS random_key")
+    op.execute("ALTER TABLE bank_questions DROP COLUMN IF EXISTS search_vector")
@@ -0,0 +1,54 @@
+"""LTI grade sync log table
+
+Revision ID: lti_grade_sync_log_0003
+Revises: question_bank_search_0002
+Create Date: 2026-10-18 18:00:00
+
+Audit rows written by LTIAGSService._log_grade_syncs. The table used to be
+created lazily by the service; statements are idempotent so databases that
+already have it upgrade cleanly.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'lti_grade_sync_log_0003'
+down_revision: Union[str, Sequence[str], None] = 'question_bank_search_0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("idx_grade_sync_assignment", "assignment_id"),
+    ("idx_grade_sync_student", "student_id"),
+    ("idx_grade_sync_status", "status"),
+    ("idx_grade_sync_synced_at", "synced_at"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS lti_grade_sync_log (
+            sync_id VARCHAR(36) PRIMARY KEY,
+            platform_id VARCHAR(255) NOT NULL,
+            assignment_id INTEGER NOT NULL REFERENCES assignments(id) ON DELETE CASCADE,
+            student_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            score DECIMAL(10,2) NOT NULL,
+            max_score DECIMAL(10,2) NOT NULL,
+            line_item_url TEXT NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            error_message TEXT,
+            synced_at TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+    for index_name, column in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON lti_grade_sync_log ({column})")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS lti_grade_sync_log")
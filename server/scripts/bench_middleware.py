@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of the HTTP middleware stack.
+
+Builds a small FastAPI app with one JSON and one streaming endpoint and drives
+it in-process (no sockets) with three stacks:
+
+  none      - no middleware, the baseline
+  basehttp  - nine pass-through BaseHTTPMiddleware layers (what the old stack
+              paid per request before any of its own logic)
+  current   - the middleware registered in main.py, in the same order
+
+Usage:
+    python scripts/bench_middleware.py [--requests 2000] [--stack current]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+STACKS = ("none", "basehttp", "current")
+LAYERS = 9
+
+
+class PassThroughMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/courses/{course_id}")
+    async def get_course(course_id: int):
+        return {"id": course_id, "name": "Course", "modules": list(range(20))}
+
+    @app.get("/api/stream")
+    async def stream():
+        async def chunks():
+            for i in range(10):
+                yield f"data: {i}\n\n".encode()
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    if stack == "basehttp":
+        for _ in range(LAYERS):
+            app.add_middleware(PassThroughMiddleware)
+    elif stack == "current":
+        from app.middleware.correlation import CorrelationIdMiddleware
+        from app.middleware.security_headers import SecurityHeadersMiddleware
+        from app.middleware.observability import ObservabilityMiddleware, AuthenticationMetricsMiddleware
+        from app.middleware.ai_quota import create_ai_quota_middleware
+        from app.middleware.api_versioning import APIVersioningMiddleware, APIMetricsMiddleware
+        from app.middleware.page_tracking import create_page_tracking_middleware
+        from app.middleware.rate_limit_headers import RateLimitHeadersMiddleware
+
+        app.add_middleware(CorrelationIdMiddleware)
+        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(ObservabilityMiddleware)
+        app.add_middleware(AuthenticationMetricsMiddleware)
+        app.add_middleware(create_ai_quota_middleware())
+        app.add_middleware(APIMetricsMiddleware)
+        app.add_middleware(APIVersioningMiddleware, default_version="v1")
+        app.add_middleware(create_page_tracking_middleware())
+        app.add_middleware(RateLimitHeadersMiddleware)
+
+    return app
+
+
+async def call(app, path: str):
+    """Drive one GET through the ASGI app; returns (status, body messages)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    messages = []
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Like a real server: block until the response is done, then disconnect
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(scope, receive, send)
+    status = messages[0]["status"]
+    body_messages = [m for m in messages if m["type"] == "http.response.body" and m.get("body")]
+    return status, len(body_messages)
+
+
+async def run(stack: str, requests: int):
+    app = build_app(stack)
+    # Lifespan is not needed; warm up routing / middleware build
+    for _ in range(50):
+        await call(app, "/api/courses/1")
+
+    results = {}
+    for path in ("/api/courses/1", "/api/stream"):
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            status, chunks = await call(app, path)
+            timings.append((time.perf_counter() - start) * 1e6)
+        results[path] = (statistics.median(timings), statistics.mean(timings), status, chunks)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--stack", choices=STACKS + ("all",), default="all")
+    args = parser.parse_args()
+
+    stacks = STACKS if args.stack == "all" else (args.stack,)
+    baseline = None
+    print(f"{'stack':<10} {'endpoint':<16} {'median us':>10} {'mean us':>10} {'overhead us':>12} {'chunks':>7}")
+    for stack in stacks:
+        results = asyncio.run(run(stack, args.requests))
+        if stack == "none":
+            baseline = results
+        for path, (median, mean, status, chunks) in results.items():
+            overhead = median - baseline[path][0] if baseline else float("nan")
+            print(f"{stack:<10} {path:<16} {median:>10.1f} {mean:>10.1f} {overhead:>12.1f} {chunks:>7}")
+
+
+if __name__ == "__main__":
+    main()
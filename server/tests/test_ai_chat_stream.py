@@ -0,0 +1,97 @@
+"""Tests for the AI chat routes: memory survives disconnects, shared reply cache."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.api.v1.routes import ai as ai_routes
+from app.services.ai_semantic_cache import SemanticResponseCache
+
+USER = SimpleNamespace(id=7, username="t", role="teacher")
+
+
+class WordEmbedder:
+    VOCAB = ["when", "is", "the", "lab", "3", "deadline"]
+
+    async def aembed_text(self, text):
+        return np.array([text.split().count(w) for w in self.VOCAB], dtype=float)
+
+
+def _payload(message="Когда дедлайн?"):
+    return ai_routes.ChatRequest(message=message)
+
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_function_stream_stores_partial_turn_on_disconnect():
+    append_turn = AsyncMock()
+    with patch.object(ai_routes.rate_limiter, "check", AsyncMock()), \
+            patch.object(ai_routes.memory, "get_history", AsyncMock(return_value="")), \
+            patch.object(ai_routes.memory, "append_turn", append_turn), \
+            patch.object(ai_routes, "stream_function_calls", lambda *a, **k: _stream("В пят", "ницу")):
+        response = await ai_routes.ai_function_chat_stream(_payload(), request=SimpleNamespace(), current_user=USER)
+        body = response.body_iterator
+        assert await body.__anext__() == "data: В пят\n\n"
+        # Клиент отключился после первого фрагмента
+        await body.aclose()
+
+    append_turn.assert_awaited_once_with(7, "Когда дедлайн?", "В пят")
+
+
+@pytest.mark.asyncio
+async def test_function_stream_stores_full_turn():
+    append_turn = AsyncMock()
+    with patch.object(ai_routes.rate_limiter, "check", AsyncMock()), \
+            patch.object(ai_routes.memory, "get_history", AsyncMock(return_value="")), \
+            patch.object(ai_routes.memory, "append_turn", append_turn), \
+            patch.object(ai_routes, "stream_function_calls", lambda *a, **k: _stream("В пят", "ницу")):
+        response = await ai_routes.ai_function_chat_stream(_payload(), request=SimpleNamespace(), current_user=USER)
+        events = [event async for event in response.body_iterator]
+
+    assert events[-1] == "data: [END]\n\n"
+    append_turn.assert_awaited_once_with(7, "Когда дедлайн?", "В пятницу")
+
+
+@pytest.mark.asyncio
+async def test_reply_cache_is_shared_only_for_prompts_without_personal_parts():
+    prompts = []
+
+    class FakeAIService:
+        last_call_ok = True
+
+        async def generate_reply(self, user_message, user_context, role=None, language="ru"):
+            prompts.append(user_context)
+            return f"answer {len(prompts)}"
+
+    cache = SemanticResponseCache(enabled=True, threshold=0.85, embedding_service=WordEmbedder())
+    history = AsyncMock(return_value="")
+    request = SimpleNamespace(headers={})
+
+    async def ask(user, **fields):
+        payload = ai_routes.ChatRequest(message="When is the lab 3 deadline?", course_id=7, **fields)
+        return (await ai_routes.ai_chat(payload, request=request, current_user=user)).reply
+
+    with patch.object(ai_routes.rate_limiter, "check", AsyncMock()), \
+            patch.object(ai_routes.memory, "get_history", history), \
+            patch.object(ai_routes.memory, "append_turn", AsyncMock()), \
+            patch.object(ai_routes.tools, "gather_context", AsyncMock(return_value="")), \
+            patch.object(ai_routes, "AIService", FakeAIService), \
+            patch.object(ai_routes, "semantic_response_cache", cache):
+        first = SimpleNamespace(id=1, username="alice", role="student")
+        second = SimpleNamespace(id=2, username="bob", role="student")
+        assert await ask(first) == "answer 1"
+        # Другой студент того же курса получает ответ из кэша
+        assert await ask(second) == "answer 1"
+        assert "alice" not in prompts[0]
+
+        # С FrontendContext или историей промпт личный — кэш не используется
+        assert await ask(second, context="page: grades") == "answer 2"
+        history.return_value = "user: привет"
+        assert await ask(second) == "answer 3"
+        assert "bob" in prompts[-1]
@@ -0,0 +1,97 @@
+"""Tests for concurrent AI function execution and streamed second pass."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services import ai_function_calling
+from app.services.ai_function_calling import FunctionRegistry
+
+
+def _registry(**kwargs):
+    registry = FunctionRegistry(**kwargs)
+    calls = []
+
+    async def slow_tool(x: int):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return {"x": x}
+
+    async def hanging_tool():
+        await asyncio.sleep(10)
+
+    async def big_tool():
+        return {"rows": list(range(1000))}
+
+    registry.register("slow", "", {}, slow_tool)
+    registry.register("hang", "", {}, hanging_tool)
+    registry.register("big", "", {}, big_tool)
+    return registry, calls
+
+
+@pytest.mark.asyncio
+async def test_calls_run_concurrently_in_order_with_timeout_and_cap():
+    registry, calls = _registry(timeout=0.2, max_result_chars=100)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await registry.execute_function_calls([
+        {"name": "slow", "arguments": {"x": 1}},
+        {"name": "slow", "arguments": {"x": 2}},
+        {"name": "hang", "arguments": {}},
+        {"name": "big", "arguments": {}},
+        {"name": "missing", "arguments": {}},
+        {"name": "slow", "arguments": {"x": 1}},
+    ])
+    elapsed = loop.time() - start
+
+    assert elapsed < 0.4
+    assert [r["name"] for r in results] == ["slow", "slow", "hang", "big", "missing", "slow"]
+    assert results[0]["result"] == {"x": 1} and results[1]["result"] == {"x": 2}
+    assert "timed out" in results[2]["error"]
+    assert results[3]["truncated"] is True and len(results[3]["result"]) == 101
+    assert "not found" in results[4]["error"]
+    # Одинаковые вызовы в одном ответе выполняются один раз
+    assert sorted(calls) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_results_memoized_per_scope():
+    registry, calls = _registry(cache_ttl=30)
+    call = [{"name": "slow", "arguments": {"x": 1}}]
+
+    first, duplicate = await registry.execute_function_calls(call * 2, scope=(1, "teacher"))
+    first["result"]["x"] = 99
+    assert duplicate["result"] == {"x": 1}
+    [again] = await registry.execute_function_calls(call, scope=(1, "teacher"))
+    assert again["result"] == {"x": 1}
+    assert calls == [1]
+    assert registry.cache_hits == 1
+
+    await registry.execute_function_calls(call, scope=(2, "student"))
+    assert calls == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_second_pass_is_streamed():
+    registry, _ = _registry()
+    first_pass = 'Нужно: ```function_call\n{"name": "slow", "arguments": {"x": 3}}\n```'
+
+    async def fake_stream(self, user_message, user_context="", role=None, language="ru"):
+        assert 'Результат: {"x": 3}' in user_message
+        for chunk in ("Ответ ", "готов"):
+            yield chunk
+
+    with patch.object(ai_function_calling, "function_registry", registry), \
+            patch("app.services.ai_service.AIService.generate_reply", AsyncMock(return_value=first_pass)), \
+            patch("app.services.ai_service.AIService.generate_stream", fake_stream):
+        chunks = [c async for c in ai_function_calling.stream_function_calls("сравни", "ctx", scope=(1, "teacher"))]
+    assert chunks == ["Ответ ", "готов"]
+
+
+@pytest.mark.asyncio
+async def test_reply_without_function_calls_is_single_pass():
+    reply = AsyncMock(return_value="Просто ответ")
+    with patch("app.services.ai_service.AIService.generate_reply", reply):
+        assert await ai_function_calling.process_function_calls("привет") == "Просто ответ"
+    reply.assert_awaited_once()
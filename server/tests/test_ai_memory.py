@@ -0,0 +1,143 @@
+"""Tests for the Redis chat memory: pipelined appends, compaction, token budget."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.services.ai_memory import ChatMemoryRepository, build_history_stub, estimate_tokens
+
+
+class FakeRedis:
+    """Lists/strings subset of redis.asyncio with round-trip counting."""
+
+    def __init__(self):
+        self.lists = {}
+        self.strings = {}
+        self.ttls = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _slice(self, items, start, end):
+        n = len(items)
+        start = max(n + start, 0) if start < 0 else start
+        end = n + end if end < 0 else end
+        return items[start:end + 1]
+
+    def _rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    def _ltrim(self, key, start, end):
+        self.lists[key] = self._slice(self.lists.get(key, []), start, end)
+        return True
+
+    def _lrange(self, key, start, end):
+        return self._slice(self.lists.get(key, []), start, end)
+
+    def _expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    def _get(self, key):
+        return self.strings.get(key)
+
+    def _set(self, key, value, ex=None):
+        self.strings[key] = value
+        if ex:
+            self.ttls[key] = ex
+        return True
+
+    async def lrange(self, key, start, end):
+        self.round_trips += 1
+        return self._lrange(key, start, end)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [getattr(self.redis, f"_{name}")(*args, **kwargs) for name, args, kwargs in self.ops]
+
+
+def _repo(**kwargs):
+    kwargs.setdefault("summarizer", None)
+    client = FakeRedis()
+    return ChatMemoryRepository(client=client, ttl=3600, max_messages_per_user=50, **kwargs), client
+
+
+@pytest.mark.asyncio
+async def test_turn_is_one_round_trip_with_ttl_and_compact_entries():
+    repo, client = _repo(compact_after=30)
+
+    await repo.append_turn(1, "Когда дедлайн?", "В пятницу")
+
+    assert client.round_trips == 1
+    assert client.ttls == {"ai:history:1": 3600, "ai:history:1:summary": 3600}
+    assert json.loads(client.lists["ai:history:1"][0]) == ["user", "Когда дедлайн?", estimate_tokens("Когда дедлайн?")]
+    # Старый формат записей по-прежнему читается
+    client.lists["ai:history:1"].insert(0, json.dumps({"role": "user", "content": "привет"}))
+    messages = await repo.get_recent_messages(1)
+    assert [m["content"] for m in messages] == ["привет", "Когда дедлайн?", "В пятницу"]
+
+
+def test_history_is_selected_by_token_budget_without_cutting_messages():
+    messages = [
+        {"role": "user", "content": "a" * 300},
+        {"role": "assistant", "content": "b" * 60},
+        {"role": "user", "content": "c\nc"},
+    ]
+    stub = build_history_stub(messages, max_tokens=40, summary="Студент готовится к экзамену")
+
+    assert stub.splitlines() == ["summary: Студент готовится к экзамену", "assistant: " + "b" * 60, "user: c c"]
+    assert build_history_stub(messages, max_tokens=5) == "user: c c"
+    assert build_history_stub([], max_tokens=5, summary="x" * 100) == ""
+
+
+@pytest.mark.asyncio
+async def test_old_messages_are_compacted_in_background():
+    seen = []
+
+    async def summarizer(previous, messages):
+        seen.append((previous, [m["content"] for m in messages]))
+        return f"{previous}+{len(messages)}"
+
+    repo, client = _repo(compact_after=4, keep_recent=2, summarizer=summarizer)
+    for i in range(2):
+        await repo.append_turn(7, f"q{i}", f"a{i}")
+    assert not repo._compacting
+
+    await repo.append_turn(7, "q2", "a2")
+    await asyncio.gather(*repo._compacting.values())
+
+    assert seen == [("", ["q0", "a0", "q1", "a1"])]
+    assert client.strings["ai:history:7:summary"] == "+4"
+    assert [json.loads(x)[1] for x in client.lists["ai:history:7"]] == ["q2", "a2"]
+
+    history = await repo.get_history(7, max_tokens=100)
+    assert history.splitlines() == ["summary: +4", "user: q2", "assistant: a2"]
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_messages_appended_meanwhile():
+    repo, client = _repo(compact_after=100, keep_recent=1)
+
+    async def slow_summarizer(previous, messages):
+        await repo.append_message(3, "user", "new")
+        return "summary"
+
+    repo.summarizer = slow_summarizer
+    await repo.append_turn(3, "q", "a")
+    assert await repo.compact(3)
+    assert [json.loads(x)[1] for x in client.lists["ai:history:3"]] == ["a", "new"]
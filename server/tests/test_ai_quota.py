@@ -0,0 +1,94 @@
+"""Tests for the atomic AI quota reserve/commit protocol."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.models.user import UserRole
+from app.services.ai_quota_manager import AIQuotaManager
+
+
+def _manager(reserve_results=None):
+    manager = AIQuotaManager()
+    manager._reserve_script = AsyncMock(side_effect=reserve_results or [])
+    manager._commit_script = AsyncMock(return_value=1)
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_reserve_checks_and_counts_in_one_call():
+    manager = _manager([[1, 5, 1200]])
+
+    allowed, usage, reservation = await manager.reserve(7, UserRole.student, "chat", estimated_tokens=400)
+
+    assert allowed is True
+    manager._reserve_script.assert_awaited_once()
+    kwargs = manager._reserve_script.await_args.kwargs
+    assert kwargs["keys"][0].startswith("ai_quota:requests:7:chat:")
+    assert kwargs["keys"][3].endswith(":users")
+    # student/chat: 50 + 10 burst requests, 10000 + 10*100 tokens
+    assert kwargs["args"][:3] == [60, 11000, 400]
+    assert usage.requests_used == 5 and usage.remaining_requests == 45
+    assert usage.remaining_tokens == 8800
+    assert reservation.reserved_tokens == 400
+
+
+@pytest.mark.asyncio
+async def test_rejected_reservation_and_unknown_service():
+    manager = _manager([[0, 60, 9000]])
+
+    allowed, usage, reservation = await manager.reserve(7, UserRole.student, "chat", estimated_tokens=100)
+    assert allowed is False and reservation is None
+    assert usage.remaining_requests == 0
+
+    assert await manager.reserve(7, UserRole.student, "batch_analysis") == (False, None, None)
+    assert manager._reserve_script.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_commit_reconciles_and_release_gives_back():
+    manager = _manager([[1, 1, 400], [1, 2, 800]])
+
+    _, _, reservation = await manager.reserve(7, UserRole.student, "chat", estimated_tokens=400)
+    assert await manager.commit(reservation, actual_tokens=250, request_duration=1.5)
+    args = manager._commit_script.await_args.kwargs["args"]
+    assert args[:2] == [0, -150]
+    assert '"tokens": 250' in args[3]
+
+    _, _, reservation = await manager.reserve(7, UserRole.student, "chat", estimated_tokens=400)
+    assert await manager.release(reservation)
+    assert manager._commit_script.await_args.kwargs["args"][:2] == [-1, -400]
+    assert manager._commit_script.await_args.kwargs["args"][3] == ""
+
+    assert await manager.commit(None) is False
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_fails_open():
+    manager = _manager([ConnectionError("redis down")])
+
+    assert await manager.reserve(7, UserRole.teacher, "chat", estimated_tokens=100) == (True, None, None)
+
+
+@pytest.mark.asyncio
+async def test_system_stats_read_from_daily_counters():
+    manager = _manager()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=[
+        {b"requests": b"42", b"tokens": b"9100", b"violations": b"3",
+         b"service:chat": b"30", b"service:analytics": b"12", b"service:recommendations": b"0"},
+        5,
+    ])
+    manager.redis = MagicMock()
+    manager.redis.pipeline.return_value = pipe
+
+    stats = await manager.get_system_usage_stats()
+
+    assert stats == {
+        "total_users_with_usage": 5,
+        "total_requests_today": 42,
+        "total_tokens_today": 9100,
+        "top_services": [{"service": "chat", "requests": 30}, {"service": "analytics", "requests": 12}],
+        "quota_violations_today": 3,
+    }
+    manager.redis.scan_iter.assert_not_called()
@@ -0,0 +1,117 @@
+"""Tests for the semantic AI response cache."""
+
+import asyncio
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services.ai_semantic_cache import SemanticResponseCache, normalize_question
+
+VOCAB = ["when", "is", "the", "lab", "3", "deadline", "due", "what", "this", "week", "grade"]
+
+
+class BagOfWords:
+    """Deterministic stand-in for EmbeddingService."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_text(self, text):
+        self.calls += 1
+        words = text.split()
+        return np.array([words.count(w) for w in VOCAB], dtype=float)
+
+    async def aembed_text(self, text):
+        return self.embed_text(text)
+
+
+def _cache(**kwargs):
+    kwargs.setdefault("threshold", 0.85)
+    return SemanticResponseCache(enabled=True, embedding_service=BagOfWords(), **kwargs)
+
+
+SCOPE = SemanticResponseCache.scope("student", course_id=7)
+CONTEXT = "- Ближайшие дедлайны (≤14д): 2"
+
+
+def test_normalize_question():
+    assert normalize_question("  When is the Lab-3   deadline?! ") == "when is the lab 3 deadline"
+
+
+@pytest.mark.asyncio
+async def test_similar_question_hits_within_scope_only():
+    cache = _cache()
+    await cache.store("When is the lab 3 deadline?", SCOPE, CONTEXT, "Friday")
+
+    assert await cache.lookup("when is lab 3 deadline", SCOPE, CONTEXT) == "Friday"
+    assert await cache.lookup("what is due this week", SCOPE, CONTEXT) is None
+    # Другой курс / другая роль — своя область
+    assert await cache.lookup("When is the lab 3 deadline?", SemanticResponseCache.scope("student", 8), CONTEXT) is None
+    assert await cache.lookup("When is the lab 3 deadline?", SemanticResponseCache.scope("teacher", 7), CONTEXT) is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+    assert stats["hit_rate"] == 0.25
+
+
+@pytest.mark.asyncio
+async def test_changed_context_invalidates_answer():
+    cache = _cache()
+    await cache.store("when is the lab 3 deadline", SCOPE, CONTEXT, "Friday")
+
+    assert await cache.lookup("when is the lab 3 deadline", SCOPE, "- Ближайшие дедлайны (≤14д): 3") is None
+    assert cache.get_stats()["stale"] == 1
+    assert await cache.lookup("when is the lab 3 deadline", SCOPE, CONTEXT) is None
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_lru_eviction():
+    cache = _cache(ttl=60, max_entries=2)
+    with patch("app.services.ai_semantic_cache.time.monotonic", return_value=1000.0):
+        await cache.store("lab 3 deadline", SCOPE, CONTEXT, "a")
+        await cache.store("what is due this week", SCOPE, CONTEXT, "b")
+        assert await cache.lookup("lab 3 deadline", SCOPE, CONTEXT) == "a"
+        await cache.store("grade", SCOPE, CONTEXT, "c")
+    # Вытеснена наименее недавно использованная запись
+    assert cache.get_stats()["evictions"] == 1
+    with patch("app.services.ai_semantic_cache.time.monotonic", return_value=1030.0):
+        assert await cache.lookup("what is due this week", SCOPE, CONTEXT) is None
+        assert await cache.lookup("lab 3 deadline", SCOPE, CONTEXT) == "a"
+    with patch("app.services.ai_semantic_cache.time.monotonic", return_value=1061.0):
+        assert await cache.lookup("lab 3 deadline", SCOPE, CONTEXT) is None
+    assert cache.get_stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_disabled_or_empty_embedding_is_never_cached():
+    disabled = SemanticResponseCache(enabled=False, embedding_service=BagOfWords())
+    await disabled.store("lab 3 deadline", SCOPE, CONTEXT, "a")
+    assert await disabled.lookup("lab 3 deadline", SCOPE, CONTEXT) is None
+    assert disabled._embedding_service.calls == 0
+
+    cache = _cache()
+    await cache.store("completely unknown words", SCOPE, CONTEXT, "a")
+    assert cache.get_stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scope_emptied_while_embedding_is_a_miss():
+    cache = _cache(max_entries=1)
+    await cache.store("lab 3 deadline", SCOPE, CONTEXT, "a")
+    embedder = cache._embedding_service
+
+    async def embed(text):
+        if text == "lab 3 deadline":
+            await asyncio.sleep(0.01)
+        return embedder.embed_text(text)
+
+    embedder.aembed_text = embed
+    lookup = asyncio.create_task(cache.lookup("lab 3 deadline", SCOPE, CONTEXT))
+    await asyncio.sleep(0)
+    # Запись другой области вытесняет единственную запись SCOPE, пока lookup ждёт эмбеддинг
+    await cache.store("grade", SemanticResponseCache.scope("teacher", 7), CONTEXT, "b")
+
+    assert await lookup is None
+    assert cache.get_stats()["misses"] == 1
@@ -0,0 +1,96 @@
+"""Tests for in-process AI chat context gathering."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.ai_tools import AiToolRegistry
+
+USER = SimpleNamespace(id=1, role="teacher")
+
+
+def _registry(**kwargs):
+    sessions = []
+
+    @asynccontextmanager
+    async def session_factory():
+        db = object()
+        sessions.append(db)
+        yield db
+
+    registry = AiToolRegistry(session_factory=session_factory, **kwargs)
+    return registry, sessions
+
+
+def _trends(first, last):
+    return {"series": [{"average_grade": first}, {"average_grade": last}]}
+
+
+@pytest.mark.asyncio
+async def test_course_and_student_context_runs_concurrently():
+    started = []
+
+    def slow(result):
+        async def call(*args, **kwargs):
+            started.append(args[0])
+            await asyncio.sleep(0.05)
+            return result
+        return call
+
+    due = (datetime.utcnow() + timedelta(days=3)).isoformat()
+    lookups = {
+        "course_overview": slow({"overview": {"assignments_count": 4, "average_grade": 81.5}}),
+        "course_trends": slow(_trends(70, 80)),
+        "student_performance": slow({"overall_performance": {
+            "courses_count": 2, "total_submissions": 9, "overall_average_grade": 77.0}}),
+        "student_trends": slow(_trends(80, 75.5)),
+        "course_assignments": slow({"assignments_analytics": [{"due_date": due}, {"due_date": None}]}),
+    }
+    registry, sessions = _registry()
+    with patch.multiple("app.services.ai_tools.course_analytics_service", **lookups):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        summary = await registry.gather_context(USER, role="teacher", student_id=5, course_id=3)
+        elapsed = loop.time() - start
+
+    assert elapsed < 0.2  # пять запросов по 50 мс — параллельно, а не последовательно
+    assert len(set(map(id, sessions))) == 5  # у каждого запроса своя сессия
+    assert summary.splitlines() == [
+        "- Курс #3: заданий=4, средняя=81.5",
+        "- Тренд курса: средняя 80 (+10 за период)",
+        "- Студент #5: курсов=2, сдач=9, средняя=77.0",
+        "- Тренд студента: средняя 75.5 (-4.5 за период)",
+        "- Ближайшие дедлайны (≤14д): 1",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_forbidden_and_failing_lookups_are_skipped():
+    forbidden = AsyncMock(side_effect=HTTPException(status_code=403, detail="Нет доступа к курсу"))
+    lookups = {
+        "course_overview": forbidden,
+        "course_trends": AsyncMock(side_effect=RuntimeError("db down")),
+        "course_assignments": AsyncMock(return_value={"assignments_analytics": []}),
+    }
+    registry, _ = _registry()
+    with patch.multiple("app.services.ai_tools.course_analytics_service", **lookups):
+        assert await registry.gather_context(USER, role="teacher", course_id=3) == ""
+    forbidden.assert_awaited_once()
+    assert forbidden.await_args.args[2] is USER
+
+
+@pytest.mark.asyncio
+async def test_role_without_permission_makes_no_lookups():
+    overview = AsyncMock()
+    registry, sessions = _registry()
+    with patch("app.services.ai_tools.course_analytics_service.course_overview", overview), \
+            patch("app.services.ai_tools.schedule_crud.get_schedules", AsyncMock(return_value=([1, 2], 2))):
+        assert await registry.gather_context(USER, role="student", course_id=3) == ""
+        summary = await registry.gather_context(USER, role="student")
+    overview.assert_not_called()
+    assert summary.startswith("- Ближайшие занятия: 2")
@@ -0,0 +1,155 @@
+"""Tests for offset/keyset pagination and count modes in QueryBuilder."""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, DateTime, Integer, Numeric, String
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+from app.core.api_pagination import (
+    APIParams, CountMode, FilterOperator, FilterSpec, InvalidCursorError, QueryBuilder,
+    SortDirection, decode_cursor, encode_cursor, paginated_query
+)
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    created_at = Column(DateTime)
+    price = Column(Numeric(10, 2))
+
+
+async def _session_factory(rows=25):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    base_time = datetime(2024, 1, 1)
+    async with session_factory() as db:
+        # Pairs of rows share created_at so the id tie-break matters
+        db.add_all([
+            Item(id=i, name=f"item-{i}", created_at=base_time + timedelta(minutes=i // 2),
+                 price=None if i % 4 == 0 else Decimal(i % 5) + Decimal("0.50"))
+            for i in range(1, rows + 1)
+        ])
+        await db.commit()
+    return engine, session_factory
+
+
+class TestCursor:
+    """Cursor encoding."""
+
+    def test_roundtrip_datetime(self):
+        value = datetime(2024, 5, 1, 12, 30)
+        cursor = encode_cursor("created_at", SortDirection.DESC, value, 42)
+        payload = decode_cursor(cursor)
+        assert payload == {"f": "created_at", "d": SortDirection.DESC, "v": value, "id": 42}
+
+    @pytest.mark.parametrize("value", [
+        Decimal("19.90"), UUID("12345678-1234-5678-1234-567812345678"), time(8, 15), None
+    ])
+    def test_roundtrip_non_json_types(self, value):
+        payload = decode_cursor(encode_cursor("v", SortDirection.ASC, value, 1))
+        assert payload["v"] == value and type(payload["v"]) is type(value)
+
+    def test_unknown_type_is_not_encoded(self):
+        with pytest.raises(TypeError):
+            encode_cursor("v", SortDirection.ASC, object(), 1)
+
+    def test_rejects_garbage(self):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor("not-a-cursor")
+
+
+class TestKeysetPagination:
+    """Walking all pages with cursors returns every row once, in order."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("sort_by, sort_dir", [
+        ("created_at", SortDirection.DESC), ("created_at", SortDirection.ASC), (None, SortDirection.ASC),
+        ("price", SortDirection.ASC), ("price", SortDirection.DESC)
+    ])
+    async def test_walk_matches_offset_order(self, sort_by, sort_dir):
+        engine, session_factory = await _session_factory()
+        async with session_factory() as db:
+            everything = await paginated_query(
+                Item, db, APIParams(per_page=100, sort_by=sort_by, sort_dir=sort_dir)
+            )
+            expected = [item.id for item in everything.items]
+
+            seen, cursor = [], None
+            while True:
+                page = await paginated_query(
+                    Item, db, APIParams(per_page=7, sort_by=sort_by, sort_dir=sort_dir,
+                                        cursor=cursor, count=CountMode.NONE)
+                )
+                seen.extend(item.id for item in page.items)
+                assert page.total is None
+                if not page.has_next:
+                    assert page.next_cursor is None
+                    break
+                cursor = page.next_cursor
+
+        assert seen == expected
+        assert len(seen) == 25
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_deeper_offset_pages_issue_no_cursor(self):
+        engine, session_factory = await _session_factory()
+        async with session_factory() as db:
+            first = await paginated_query(Item, db, APIParams(page=1, per_page=5, sort_by="price"))
+            second = await paginated_query(Item, db, APIParams(page=2, per_page=5, sort_by="price"))
+        assert first.next_cursor is not None
+        assert second.has_next and second.next_cursor is None
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_cursor_for_other_sort_is_rejected(self):
+        engine, session_factory = await _session_factory()
+        async with session_factory() as db:
+            page = await paginated_query(Item, db, APIParams(per_page=5, sort_by="created_at"))
+            with pytest.raises(HTTPException) as exc_info:
+                await paginated_query(Item, db, APIParams(per_page=5, sort_by="name", cursor=page.next_cursor))
+        assert exc_info.value.status_code == 400
+        await engine.dispose()
+
+
+class TestCountModes:
+    """Exact, capped and skipped totals."""
+
+    @pytest.mark.asyncio
+    async def test_offset_page_metadata(self):
+        engine, session_factory = await _session_factory()
+        async with session_factory() as db:
+            page = await paginated_query(Item, db, APIParams(page=3, per_page=10))
+        assert [item.id for item in page.items] == [5, 4, 3, 2, 1]
+        assert page.total == 25 and page.pages == 3
+        assert not page.has_next and page.has_prev
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_capped_count(self):
+        engine, session_factory = await _session_factory()
+        async with session_factory() as db:
+            builder = QueryBuilder(Item, db, count_cap=10)
+            builder.apply_filters([FilterSpec("id", FilterOperator.GT, 5)])
+            builder.apply_sorting(None).apply_pagination(APIParams(per_page=5).pagination)
+            items, total = await builder.execute(CountMode.ESTIMATE)
+            assert len(items) == 5 and builder.has_next
+            assert total == 10 and builder.total_estimated
+
+            builder = QueryBuilder(Item, db, count_cap=100)
+            builder.apply_sorting(None).apply_pagination(APIParams(per_page=5).pagination)
+            _, total = await builder.execute(CountMode.ESTIMATE)
+            assert total == 25 and not builder.total_estimated
+        await engine.dispose()
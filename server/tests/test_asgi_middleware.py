@@ -0,0 +1,116 @@
+"""Tests for the pure ASGI middleware stack."""
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.api_versioning import (
+    APIVersioningMiddleware, APIMetricsMiddleware, merge_api_metrics_snapshots
+)
+from app.middleware.correlation import CorrelationIdMiddleware
+from app.middleware.security_headers import SecurityHeadersMiddleware
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/courses/{course_id}")
+    async def get_course(course_id: int):
+        return {"id": course_id}
+
+    @app.post("/api/items")
+    async def create_item(request: Request):
+        return await request.json()
+
+    @app.get("/api/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"data: {i}\n\n".encode()
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    app.add_middleware(CorrelationIdMiddleware)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(APIMetricsMiddleware)
+    app.add_middleware(APIVersioningMiddleware, default_version="v1")
+    return app
+
+
+class TestASGIMiddleware:
+    """Test headers, request body replay and streaming through the stack."""
+
+    def test_headers_are_added(self):
+        client = TestClient(_build_app())
+        response = client.get("/api/courses/1", headers={"X-Request-ID": "abc"})
+
+        assert response.status_code == 200
+        assert response.json() == {"id": 1}
+        assert response.headers["X-Content-Type-Options"] == "nosniff"
+        assert response.headers["X-API-Version"] == "v1"
+        assert "X-Processing-Time" in response.headers
+
+    def test_request_body_is_replayed(self):
+        client = TestClient(_build_app())
+        response = client.post("/api/items", json={"name": "quiz"})
+
+        assert response.status_code == 200
+        assert response.json() == {"name": "quiz"}
+
+    @pytest.mark.asyncio
+    async def test_streaming_response_is_not_buffered(self):
+        app = _build_app()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": "/api/stream", "raw_path": b"/api/stream",
+            "query_string": b"", "root_path": "", "headers": [(b"host", b"test")],
+            "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        }
+        messages = []
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+
+        chunks = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+        assert chunks == [b"data: 0\n\n", b"data: 1\n\n", b"data: 2\n\n"]
+
+
+class TestAPIMetrics:
+    """Test per-endpoint latency histograms and cross-worker merging."""
+
+    def test_percentiles_and_normalized_endpoints(self):
+        middleware = APIMetricsMiddleware(app=None)
+        for i in range(1, 101):
+            middleware._update_metrics(middleware._get_endpoint_key("GET", f"/api/courses/{i}"), 200, i / 1000)
+        middleware._update_metrics("GET /api/courses/{id}", 500, 0.05)
+
+        summary = middleware.get_metrics_summary()
+        stats = summary["endpoints"]["GET /api/courses/{id}"]
+        assert summary["total_requests"] == 101
+        assert stats["error_count"] == 1
+        assert stats["p50_response_time"] == pytest.approx(0.05, rel=0.05)
+        assert stats["p99_response_time"] == pytest.approx(0.099, rel=0.05)
+
+    def test_merge_worker_snapshots(self):
+        first, second = APIMetricsMiddleware(app=None), APIMetricsMiddleware(app=None)
+        for i in range(1, 51):
+            first._update_metrics("GET /api/items", 200, i / 1000)
+        for i in range(51, 101):
+            second._update_metrics("GET /api/items", 404, i / 1000)
+
+        merged = merge_api_metrics_snapshots([first.snapshot(), second.snapshot()])
+        stats = merged["endpoints"]["GET /api/items"]
+        assert merged["workers"] == 2
+        assert stats["request_count"] == 100
+        assert stats["error_count"] == 50
+        assert stats["p50_response_time"] == pytest.approx(0.05, rel=0.05)
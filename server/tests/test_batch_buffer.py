@@ -0,0 +1,25 @@
+"""Tests for the generic background batch writer."""
+
+import pytest
+
+from app.core.batch_buffer import BatchBuffer
+
+
+@pytest.mark.asyncio
+async def test_batches_go_to_callback_and_failures_are_counted():
+    written = []
+
+    async def write_batch(batch):
+        if "bad" in batch:
+            raise RuntimeError("db down")
+        written.append(batch)
+
+    buffer = BatchBuffer(write_batch, name="Test", max_size=5, batch_size=2)
+    for item in ["a", "b", "bad", "c", "d", "e"]:
+        buffer.enqueue(item)
+
+    assert await buffer.flush() == 3
+    assert written == [["a", "b"], ["d"]]
+    stats = buffer.get_stats()
+    assert (stats["enqueued"], stats["dropped"], stats["failed"], stats["batches"]) == (5, 1, 2, 2)
+    assert len(buffer) == 0
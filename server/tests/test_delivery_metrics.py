@@ -0,0 +1,51 @@
+"""Tests for the in-process delivery metrics aggregator flush protocol."""
+
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.notification_metrics import DeliveryMetricsAggregator
+
+
+def _closed_minute():
+    return datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=2)
+
+
+@pytest.mark.asyncio
+async def test_rollups_are_upserted_and_marked_only_after_commit():
+    aggregator = DeliveryMetricsAggregator()
+    minute = _closed_minute()
+    aggregator.record("email", 1, "sent", latency_ms=120, timestamp=minute)
+    aggregator.record("email", 1, "failed", timestamp=minute)
+    db = AsyncMock()
+
+    written = await aggregator.flush(db)
+    sql = str(db.execute.await_args.args[0])
+    assert "ON CONFLICT (bucket_start, channel, priority, source) DO UPDATE" in sql
+    assert db.execute.await_args.args[1][0]["attempts"] == 2
+
+    # Коммит не прошёл — те же строки записываются повторно
+    assert len(await aggregator.flush(db)) == 1
+    assert db.execute.await_count == 2
+
+    aggregator.mark_flushed(written)
+    assert await aggregator.flush(db) == []
+    assert db.execute.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_late_attempt_rewrites_flushed_minute():
+    aggregator = DeliveryMetricsAggregator()
+    minute = _closed_minute()
+    aggregator.record("sms", None, "sent", latency_ms=50, timestamp=minute)
+    db = AsyncMock()
+    written = await aggregator.flush(db)
+
+    aggregator.record("sms", None, "retrying", timestamp=minute)
+    aggregator.mark_flushed(written)
+
+    written = await aggregator.flush(db)
+    assert len(written) == 1
+    row = db.execute.await_args.args[1][0]
+    assert (row["attempts"], row["sent"], row["retried"]) == (2, 1, 1)
@@ -0,0 +1,166 @@
+"""Tests for the async gradebook layer and bulk grade import."""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.api.v1.routes.gradebook import _parse_grades_csv
+from app.crud.gradebook import CRUDGradebook
+from app.db.base import Base
+from app.models import Assignment, Course, GradebookEntry, GradebookHistory, Student, User
+from app.schemas.gradebook import GradebookBulkImport
+
+TABLES = [User.__table__, Course.__table__, Assignment.__table__, Student.__table__,
+          GradebookEntry.__table__, GradebookHistory.__table__]
+
+
+async def _session_factory(students=5):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=TABLES))
+
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add(User(id=1, username="teacher@example.com", role="teacher", hashed_password="x"))
+        db.add_all([
+            User(id=100 + i, username=f"student{i}@example.com", role="student", hashed_password="x")
+            for i in range(students)
+        ])
+        db.add(Student(id=1, full_name="Иван Иванов", email="ivan@example.com", user_id=100))
+        db.add(Course(id=1, title="Математика", start_date=datetime(2024, 1, 1),
+                      end_date=datetime(2024, 6, 1), owner_id=1))
+        db.add(Assignment(id=3, title="Экзамен", due_date=datetime(2024, 5, 1), course_id=1))
+        await db.commit()
+    statements.clear()
+    return engine, session_factory, statements
+
+
+def _import(grades, assignment_id=3):
+    return GradebookBulkImport(course_id=1, assignment_id=assignment_id, grades=grades)
+
+
+class TestGradebookBulkImport:
+    """Bulk upsert: one transaction, constant query count, one notification."""
+
+    @pytest.mark.asyncio
+    async def test_bulk_upsert_and_history(self):
+        engine, session_factory, statements = await _session_factory(students=50)
+        crud = CRUDGradebook()
+        async with session_factory() as db:
+            teacher = await db.get(User, 1)
+            background = BackgroundTasks()
+            result = await crud.bulk_upsert(
+                db,
+                import_in=_import([{"student_id": 100 + i, "grade_value": 70 + i % 30} for i in range(50)]),
+                current_user=teacher,
+                background_tasks=background
+            )
+            assert (result.created, result.updated, result.unchanged) == (50, 0, 0)
+            # Query count does not depend on the number of students
+            assert len(statements) <= 8
+
+            payload = background.tasks[0].args[0]
+            assert len(background.tasks) == 1
+            assert payload["event_type"] == "grades_imported"
+            assert payload["course_name"] == "Математика"
+            assert len(payload["grades"]) == 50
+            assert payload["grades"][0]["student_name"] == "Иван Иванов"
+
+            # Re-import: one change, one new comment, the rest unchanged
+            grades = [{"student_id": 100 + i, "grade_value": 70 + i % 30} for i in range(50)]
+            grades[1]["grade_value"] = 99
+            grades[2]["comment"] = "Пересдача"
+            result = await crud.bulk_upsert(db, import_in=_import(grades), current_user=teacher,
+                                            background_tasks=BackgroundTasks())
+            assert (result.created, result.updated, result.unchanged) == (0, 2, 48)
+
+            entry = (await db.execute(
+                select(GradebookEntry).where(GradebookEntry.student_id == 101)
+            )).scalar_one()
+            await db.refresh(entry)
+            assert entry.grade_value == 99
+            history_count = (await db.execute(select(func.count(GradebookHistory.id)))).scalar()
+            assert history_count == 52
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_unknown_students_reject_whole_import(self):
+        engine, session_factory, _ = await _session_factory()
+        async with session_factory() as db:
+            teacher = await db.get(User, 1)
+            with pytest.raises(HTTPException) as exc_info:
+                await CRUDGradebook().bulk_upsert(
+                    db, current_user=teacher,
+                    import_in=_import([{"student_id": 100, "grade_value": 80}, {"student_id": 1, "grade_value": 80}])
+                )
+            assert exc_info.value.status_code == 422
+            assert exc_info.value.detail["student_ids"] == [1]
+            assert (await db.execute(select(func.count(GradebookEntry.id)))).scalar() == 0
+
+            with pytest.raises(HTTPException) as exc_info:
+                await CRUDGradebook().bulk_upsert(
+                    db, current_user=teacher,
+                    import_in=_import([{"student_id": 100, "grade_value": 80}], assignment_id=99)
+                )
+            assert exc_info.value.status_code == 404
+        await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_create_entry_writes_history_in_same_transaction(self):
+        engine, session_factory, _ = await _session_factory()
+        async with session_factory() as db:
+            teacher = await db.get(User, 1)
+            from app.schemas.gradebook import GradebookEntryCreate
+            with patch("app.crud.gradebook.NotificationService.send_webhook") as send_webhook:
+                entry = await CRUDGradebook().create_entry(
+                    db, current_user=teacher,
+                    entry_in=GradebookEntryCreate(course_id=1, student_id=100, assignment_id=3, grade_value=85.5)
+                )
+            history = (await db.execute(select(GradebookHistory))).scalars().all()
+            assert [h.entry_id for h in history] == [entry.id]
+            payload = send_webhook.call_args[0][0]
+            assert payload["event_type"] == "grade_created"
+            assert payload["student_name"] == "Иван Иванов"
+            assert payload["assignment_title"] == "Экзамен"
+        await engine.dispose()
+
+
+class TestGradesCsv:
+    """CSV parsing for /gradebook/bulk/csv."""
+
+    def test_parse_csv(self):
+        content = "﻿student_id,grade,comment\n100,85,Хорошо\n101,\"90,5\",\n\n".encode("utf-8")
+        import_in = _parse_grades_csv(content, 1, 3)
+        assert [(g.student_id, g.grade_value, g.comment) for g in import_in.grades] == [
+            (100, 85.0, "Хорошо"), (101, 90.5, None)
+        ]
+
+    def test_parse_csv_reports_rows(self):
+        content = "student_id,grade_value\n100,85\n101,150\n".encode("utf-8")
+        with pytest.raises(HTTPException) as exc_info:
+            _parse_grades_csv(content, 1, 3)
+        assert exc_info.value.status_code == 422
+        assert exc_info.value.detail[0]["row"] == 3
+
+    def test_parse_csv_rejects_extra_cells(self):
+        content = "student_id,grade\n100,85\n\n101,90,late,extra\n".encode("utf-8")
+        with pytest.raises(HTTPException) as exc_info:
+            _parse_grades_csv(content, 1, 3)
+        assert exc_info.value.status_code == 422
+        assert exc_info.value.detail[0]["row"] == 4
+
+    def test_parse_csv_row_numbers_skip_blank_lines(self):
+        content = "student_id,grade\n\n100,85\n101,150\n".encode("utf-8")
+        with pytest.raises(HTTPException) as exc_info:
+            _parse_grades_csv(content, 1, 3)
+        assert exc_info.value.detail[0]["row"] == 4
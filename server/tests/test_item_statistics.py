@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from app.services.item_statistics import ResponseMatrix, item_statistics, reliability, upper_lower_groups
+
+
+# 10 submissions x 4 one-point items; rows are (submission, question, correct, points, options)
+CORRECT = np.array([
+    [1, 1, 1, 1],
+    [1, 1, 1, 0],
+    [1, 1, 0, 1],
+    [1, 1, 1, 0],
+    [1, 0, 1, 0],
+    [1, 1, 0, 0],
+    [0, 1, 0, 0],
+    [1, 0, 0, 0],
+    [0, 0, 1, 0],
+    [0, 0, 0, 0],
+])
+ITEMS = [11, 12, 13, 14]
+
+
+def _rows(correct=CORRECT, options=None):
+    rows = []
+    for i, answers in enumerate(correct):
+        for j, value in enumerate(answers):
+            selected = options(i, j, value) if options else None
+            rows.append((100 + i, ITEMS[j], bool(value), float(value), selected))
+    return rows
+
+
+def test_matrix_pivots_rows_and_keeps_last_duplicate():
+    rows = [(2, 7, False, 0.0, None), (1, 7, True, 1.0, None), (2, 7, True, 2.0, None), (1, 9, True, 3.0, None)]
+    matrix = ResponseMatrix.from_rows(rows)
+
+    assert matrix.submission_ids.tolist() == [1, 2]
+    assert matrix.item_ids.tolist() == [7, 9]
+    assert matrix.scores[1, 0] == 2.0
+    assert not matrix.answered[1, 1]
+    assert matrix.column(9) == 1
+    assert matrix.column(8) is None
+
+
+def test_item_statistics_use_total_scores():
+    stats = item_statistics(ResponseMatrix.from_rows(_rows()))
+    totals = CORRECT.sum(axis=1)
+
+    assert stats[11]["sample_size"] == 10
+    assert stats[11]["difficulty_index"] == pytest.approx(0.7)
+
+    # Группы по 27% от 10 = 3 человека с лучшими и худшими суммарными баллами
+    upper, lower = upper_lower_groups(totals.astype(float))
+    assert sorted(upper.tolist()) == [0, 1, 2]
+    assert sorted(lower.tolist()) == [7, 8, 9]
+    expected_d = CORRECT[upper, 0].mean() - CORRECT[lower, 0].mean()
+    assert stats[11]["discrimination_index"] == pytest.approx(expected_d, abs=1e-4)
+    assert stats[11]["group_performance"]["group_size"] == 3
+
+    # Скорректированный коэффициент: корреляция с суммой по остальным заданиям
+    for j, item_id in enumerate(ITEMS):
+        rest = totals - CORRECT[:, j]
+        expected = np.corrcoef(CORRECT[:, j], rest)[0, 1]
+        assert stats[item_id]["point_biserial_correlation"] == pytest.approx(expected, abs=1e-4)
+
+
+def test_unanswered_items_are_excluded_not_zero():
+    rows = [row for row in _rows() if not (row[1] == 14 and row[0] >= 105)]
+    stats = item_statistics(ResponseMatrix.from_rows(rows))
+
+    assert stats[14]["sample_size"] == 5
+    assert stats[14]["difficulty_index"] == pytest.approx(2 / 5)
+
+
+def test_reliability_matches_formulas():
+    result = reliability(ResponseMatrix.from_rows(_rows()))
+
+    k = CORRECT.shape[1]
+    totals = CORRECT.sum(axis=1)
+    alpha = k / (k - 1) * (1 - CORRECT.var(axis=0, ddof=1).sum() / totals.var(ddof=1))
+    p = CORRECT.mean(axis=0)
+    kr20 = k / (k - 1) * (1 - (p * (1 - p)).sum() / totals.var())
+
+    assert result["complete_submissions"] == 10
+    assert result["cronbach_alpha"] == pytest.approx(alpha, abs=1e-4)
+    assert result["kr20"] == pytest.approx(kr20, abs=1e-4)
+
+    reduced = np.delete(CORRECT, 0, axis=1)
+    alpha_without_first = 3 / 2 * (1 - reduced.var(axis=0, ddof=1).sum() / reduced.sum(axis=1).var(ddof=1))
+    assert result["alpha_if_deleted"][11] == pytest.approx(alpha_without_first, abs=1e-4)
+
+
+def test_reliability_needs_two_items_and_complete_submissions():
+    rows = [(1, 5, True, 1.0, None), (2, 5, False, 0.0, None)]
+    result = reliability(ResponseMatrix.from_rows(rows))
+    assert result["kr20"] is None
+    assert result["cronbach_alpha"] is None
+
+    assert reliability(ResponseMatrix.from_rows([]))["items"] == 0
+    assert item_statistics(ResponseMatrix.from_rows([])) == {}
+
+
+def test_distractor_statistics_by_group():
+    # Верный вариант "A"; сильные ошибаются выбором "B", слабые выбирают "C"
+    def options(i, j, value):
+        if j != 0:
+            return None
+        if value:
+            return ["A"]
+        return '"B"' if i < 8 else '["C"]'
+
+    stats = item_statistics(ResponseMatrix.from_rows(_rows(options=options)))
+    option_stats = stats[11]["distractor_analysis"]["option_statistics"]
+
+    assert option_stats["A"]["count"] == 7
+    assert option_stats["B"]["count"] == 1
+    assert option_stats["C"]["count"] == 2
+    assert option_stats["C"]["percentage"] == 20.0
+    assert option_stats["C"]["is_effective"] is True
+    assert option_stats["C"]["lower_rate"] == pytest.approx(2 / 3, abs=1e-4)
+    assert option_stats["C"]["discrimination"] < 0
+    assert option_stats["A"]["discrimination"] > 0
+    assert stats[12]["distractor_analysis"]["option_statistics"] == {}
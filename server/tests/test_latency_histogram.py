@@ -0,0 +1,54 @@
+"""Tests for the fixed-memory latency histogram."""
+
+import random
+
+import pytest
+
+from app.observability.histogram import LatencyHistogram
+
+
+class TestLatencyHistogram:
+    """Test LatencyHistogram accuracy and merging."""
+
+    def test_empty_histogram(self):
+        histogram = LatencyHistogram()
+        assert histogram.count == 0
+        assert histogram.quantile(0.5) is None
+        assert histogram.mean is None
+
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(42)
+        values = sorted(rng.lognormvariate(5, 1) for _ in range(20000))
+        histogram = LatencyHistogram(relative_accuracy=0.02)
+        for value in values:
+            histogram.record(value)
+
+        for q in (0.5, 0.95, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            assert histogram.quantile(q) == pytest.approx(exact, rel=0.05)
+
+    def test_memory_is_fixed(self):
+        histogram = LatencyHistogram()
+        buckets_before = len(histogram.counts)
+        for value in (0, 0.5, 1, 10, 1e9):
+            histogram.record(value)
+        assert len(histogram.counts) == buckets_before
+        assert histogram.min_seen == 0
+        assert histogram.max_seen == 1e9
+
+    def test_merge_and_roundtrip(self):
+        first, second = LatencyHistogram(), LatencyHistogram()
+        for value in range(1, 101):
+            first.record(value)
+        for value in range(101, 201):
+            second.record(value)
+
+        merged = LatencyHistogram.from_dict(first.to_dict()).merge(second)
+        assert merged.count == 200
+        assert merged.min_seen == 1
+        assert merged.max_seen == 200
+        assert merged.quantile(0.5) == pytest.approx(100, rel=0.05)
+
+    def test_merge_rejects_different_layouts(self):
+        with pytest.raises(ValueError):
+            LatencyHistogram(relative_accuracy=0.02).merge(LatencyHistogram(relative_accuracy=0.05))
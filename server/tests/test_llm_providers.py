@@ -0,0 +1,150 @@
+"""Tests for async LLM providers (pooled client, streaming, concurrency cap)."""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.services.ai_service import AIService
+from app.services.llm_providers import (
+    GeminiProvider, LLMProviderError, OllamaProvider, OpenRouterProvider
+)
+
+MESSAGES = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+
+
+def _with_transport(provider, handler):
+    provider._client = httpx.AsyncClient(base_url=provider.base_url, transport=httpx.MockTransport(handler))
+    return provider
+
+
+async def _collect(provider):
+    return [chunk async for chunk in provider.stream(MESSAGES)]
+
+
+@pytest.mark.asyncio
+async def test_openrouter_complete_and_sse_stream():
+    def handler(request):
+        body = json.loads(request.content)
+        assert request.url.path == "/api/v1/chat/completions"
+        assert request.headers["Authorization"] == "Bearer key"
+        if not body["stream"]:
+            return httpx.Response(200, json={"choices": [{"message": {"content": " answer "}}]})
+        events = [
+            ": OPENROUTER PROCESSING",
+            'data: {"choices": [{"delta": {"content": "Hel"}}]}',
+            'data: {"choices": [{"delta": {"content": "lo"}}]}',
+            "data: [DONE]",
+        ]
+        return httpx.Response(200, text="\n\n".join(events), headers={"Content-Type": "text/event-stream"})
+
+    provider = _with_transport(OpenRouterProvider("m", api_key="key", base_url="https://openrouter.ai/api/v1"), handler)
+    assert await provider.complete(MESSAGES) == "answer"
+    assert await _collect(provider) == ["Hel", "lo"]
+
+
+@pytest.mark.asyncio
+async def test_gemini_uses_system_instruction_and_streams():
+    def handler(request):
+        body = json.loads(request.content)
+        assert body["systemInstruction"] == {"parts": [{"text": "sys"}]}
+        assert body["contents"] == [{"role": "user", "parts": [{"text": "hi"}]}]
+        assert request.url.path.endswith(":streamGenerateContent")
+        chunk = {"candidates": [{"content": {"parts": [{"text": "Сәлем"}]}}]}
+        return httpx.Response(200, text=f"data: {json.dumps(chunk)}\r\n\r\n")
+
+    provider = _with_transport(GeminiProvider("gemini-1.5-flash", api_key="k",
+                                              base_url="https://generativelanguage.googleapis.com/v1beta"), handler)
+    assert await _collect(provider) == ["Сәлем"]
+
+
+@pytest.mark.asyncio
+async def test_ollama_stream_handles_split_ndjson():
+    lines = [json.dumps({"message": {"content": part}}) for part in ("a", "b", "c")]
+
+    async def body():
+        text = "\n".join(lines) + "\n"
+        # Строки JSON приходят разрезанными по границам сетевых пакетов
+        for i in range(0, len(text), 7):
+            yield text[i:i + 7].encode()
+
+    provider = _with_transport(OllamaProvider("tinyllama", base_url="http://ollama:11434"),
+                               lambda request: httpx.Response(200, content=body()))
+    assert await _collect(provider) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped_per_provider():
+    active = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json={"message": {"content": "ok"}})
+
+    provider = _with_transport(OllamaProvider("m", base_url="http://ollama", max_concurrency=2), handler)
+    replies = await asyncio.gather(*(provider.complete(MESSAGES) for _ in range(6)))
+    assert replies == ["ok"] * 6
+    assert peak == 2
+    assert provider.get_stats()["requests"] == 6
+
+
+@pytest.mark.asyncio
+async def test_errors_are_wrapped_and_service_falls_back():
+    provider = _with_transport(OllamaProvider("m", base_url="http://ollama"), lambda request: httpx.Response(503))
+    with pytest.raises(LLMProviderError):
+        await provider.complete(MESSAGES)
+    with pytest.raises(LLMProviderError):
+        await _collect(provider)
+    assert provider.errors == 2
+
+    with patch("app.services.ai_service.get_llm_provider", return_value=provider), \
+            patch("app.services.ai_service.settings.AI_PROVIDER", "ollama"):
+        service = AIService()
+        assert (await service.generate_reply("q")).startswith("Произошла ошибка")
+        chunks = [chunk async for chunk in service.generate_stream("q")]
+    assert chunks[0].startswith("Ошибка AI")
+
+
+@pytest.mark.asyncio
+async def test_only_transient_errors_are_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if request.url.path == "/boom":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(int(request.headers["X-Status"]))
+
+    class Provider(OllamaProvider):
+        status, path = "401", "/api/chat"
+
+        def _path(self, stream):
+            return self.path
+
+        def _headers(self):
+            return {"X-Status": self.status}
+
+    provider = _with_transport(Provider("m", base_url="http://ollama"), handler)
+    with patch("app.services.ai_service.get_llm_provider", return_value=provider), \
+            patch("app.services.ai_service.settings.AI_PROVIDER", "ollama"):
+        service = AIService()
+        for status, path, attempts in [("401", "/api/chat", 1), ("400", "/api/chat", 1),
+                                       ("429", "/api/chat", 2), ("502", "/api/chat", 2), ("200", "/boom", 2)]:
+            calls.clear()
+            provider.status, provider.path = status, path
+            assert (await service.generate_reply("q")).startswith("Произошла ошибка")
+            assert len(calls) == attempts, status
+
+    # Занятый слот — не повод для повтора
+    busy = OllamaProvider("m", base_url="http://ollama", timeout=0.01, max_concurrency=1)
+    await busy._semaphore.acquire()
+    with pytest.raises(LLMProviderError) as exc:
+        await busy.complete(MESSAGES)
+    assert not exc.value.retryable
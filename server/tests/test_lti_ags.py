@@ -0,0 +1,151 @@
+"""Tests for AGS token caching and score submission retries."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+pytest.importorskip("jwt")
+
+from app.services.lti_ags_service import LTIAGSService, PlatformTokenCache, Score
+
+PLATFORM = "https://canvas.example.edu"
+
+
+def _service(handler, **kwargs):
+    lti = SimpleNamespace(
+        platforms={PLATFORM: SimpleNamespace(client_id="tool", auth_token_url=f"{PLATFORM}/login/oauth2/token")},
+        private_key="unused",
+        key_id="kid-1"
+    )
+    service = LTIAGSService(lti, **kwargs)
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+class Platform:
+    """Token endpoint plus a scores endpoint that can answer 429/401 first."""
+
+    def __init__(self, score_statuses=None, expires_in=3600):
+        self.token_requests = 0
+        self.score_requests = []
+        self.score_statuses = list(score_statuses or [])
+        self.expires_in = expires_in
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/token"):
+            self.token_requests += 1
+            return httpx.Response(200, json={
+                "access_token": f"token-{self.token_requests}", "expires_in": self.expires_in
+            })
+        self.score_requests.append(request)
+        if self.score_statuses:
+            code = self.score_statuses.pop(0)
+            return httpx.Response(code, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={})
+
+
+def _score(user="u1"):
+    return Score(userId=user, scoreGiven=9, scoreMaximum=10, activityProgress="Completed",
+                 gradingProgress="FullyGraded")
+
+
+@pytest.mark.asyncio
+async def test_token_is_requested_once_per_scope_set():
+    platform = Platform()
+    service = _service(platform)
+    with patch("app.services.lti_ags_service.jwt.encode", return_value="assertion"):
+        tokens = await asyncio.gather(*(
+            service.get_access_token(PLATFORM, ["b", "a"]) for _ in range(20)
+        ))
+        assert set(tokens) == {"token-1"}
+        assert platform.token_requests == 1
+
+        # Другой набор scope — другой токен; порядок scope не важен
+        await service.get_access_token(PLATFORM, ["a", "b"])
+        await service.get_access_token(PLATFORM, ["c"])
+    assert platform.token_requests == 2
+    assert service.token_cache.hits == 20
+
+
+@pytest.mark.asyncio
+async def test_token_refreshed_before_expiry():
+    platform = Platform(expires_in=30)
+    service = _service(platform, token_refresh_margin=60)
+    with patch("app.services.lti_ags_service.jwt.encode", return_value="assertion"):
+        await service.get_access_token(PLATFORM, ["a"])
+        await service.get_access_token(PLATFORM, ["a"])
+    assert platform.token_requests == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_scores_share_token_and_retry_on_429():
+    platform = Platform(score_statuses=[429, 429])
+    service = _service(platform, concurrency=4)
+    with patch("app.services.lti_ags_service.jwt.encode", return_value="assertion"):
+        await asyncio.gather(*(
+            service._post_score(PLATFORM, f"{PLATFORM}/api/lti/courses/1/line_items/7?type=x", _score(f"u{i}"))
+            for i in range(10)
+        ))
+
+    assert platform.token_requests == 1
+    assert len(platform.score_requests) == 12
+    assert platform.score_requests[0].url.path == "/api/lti/courses/1/line_items/7/scores"
+    assert platform.score_requests[0].url.params["type"] == "x"
+
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_refreshed_once():
+    platform = Platform(score_statuses=[401])
+    service = _service(platform)
+    with patch("app.services.lti_ags_service.jwt.encode", return_value="assertion"):
+        assert await service.submit_score(PLATFORM, f"{PLATFORM}/line_items/1", _score()) is True
+    assert platform.token_requests == 2
+    assert platform.score_requests[-1].headers["Authorization"] == "Bearer token-2"
+
+
+@pytest.mark.asyncio
+async def test_retries_are_bounded():
+    platform = Platform(score_statuses=[503] * 10)
+    service = _service(platform, max_retries=2)
+    with patch("app.services.lti_ags_service.jwt.encode", return_value="assertion"):
+        with pytest.raises(httpx.HTTPStatusError):
+            await service._post_score(PLATFORM, f"{PLATFORM}/line_items/1", _score())
+    assert len(platform.score_requests) == 3
+
+
+def test_invalidate_keeps_newer_token():
+    cache = PlatformTokenCache(refresh_margin=0)
+    key = cache.key(PLATFORM, ["a"])
+    cache.set(key, "new", 100)
+    cache.invalidate(key, "old")
+    assert cache.get(key) == "new"
+    cache.invalidate(key, "new")
+    assert cache.get(key) is None
+
+
+@pytest.mark.asyncio
+async def test_grade_sync_log_failure_leaves_session_usable():
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    service = _service(Platform())
+    row = service._grade_sync_row(PLATFORM, 1, 2, 9.5, 10, f"{PLATFORM}/line_items/1", "success")
+    async with AsyncSession(engine) as db:
+        await db.execute(text("CREATE TABLE marker (id INTEGER)"))
+        await db.execute(text("INSERT INTO marker VALUES (1)"))
+        # Таблицы нет (миграция не применена) — ошибка журналирования не ломает транзакцию
+        await service._log_grade_syncs(db, [row])
+        await db.execute(text(
+            "CREATE TABLE lti_grade_sync_log (sync_id TEXT, platform_id TEXT, assignment_id INT, "
+            "student_id INT, score REAL, max_score REAL, line_item_url TEXT, status TEXT, "
+            "error_message TEXT, synced_at TIMESTAMP)"
+        ))
+        await service._log_grade_syncs(db, [row])
+        await db.commit()
+        assert (await db.execute(text("SELECT count(*) FROM marker"))).scalar() == 1
+        assert (await db.execute(text("SELECT status FROM lti_grade_sync_log"))).scalars().all() == ["success"]
+    await engine.dispose()
@@ -0,0 +1,137 @@
+"""Tests for the LTI platform JWKS cache."""
+
+import asyncio
+import base64
+from unittest.mock import patch
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.services.lti_jwks import JWKSCache, JWKSKeyNotFound
+
+URL = "https://canvas.example.edu/api/lti/security/jwks"
+
+
+def _b64(value: int) -> str:
+    return base64.urlsafe_b64encode(value.to_bytes((value.bit_length() + 7) // 8, "big")).decode().rstrip("=")
+
+
+def _jwk(kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+    numbers = key.public_numbers()
+    return key, {"kty": "RSA", "kid": kid, "alg": "RS256", "use": "sig", "n": _b64(numbers.n), "e": _b64(numbers.e)}
+
+
+class Platform:
+    def __init__(self, jwks, cache_control="max-age=600"):
+        self.jwks = jwks
+        self.cache_control = cache_control
+        self.requests = 0
+        self.down = False
+
+    def __call__(self, request):
+        self.requests += 1
+        if self.down:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"keys": self.jwks}, headers={"Cache-Control": self.cache_control})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(platform, **kwargs):
+    cache = JWKSCache(**kwargs)
+    cache._client = httpx.AsyncClient(transport=httpx.MockTransport(platform))
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_keys_are_parsed_once_and_shared():
+    key1, jwk1 = _jwk("k1")
+    platform = Platform([jwk1, {"kty": "EC", "kid": "ec"}])
+    cache = _cache(platform)
+
+    keys = await asyncio.gather(*(cache.get_key(URL, "k1") for _ in range(10)))
+    assert platform.requests == 1
+    assert all(k.public_numbers() == key1.public_numbers() for k in keys)
+    # Токен без kid — первый ключ набора
+    assert (await cache.get_key(URL)).public_numbers() == key1.public_numbers()
+
+
+@pytest.mark.asyncio
+async def test_ttl_follows_cache_control():
+    _, jwk1 = _jwk("k1")
+    platform = Platform([jwk1], cache_control="public, max-age=120")
+    cache = _cache(platform)
+    clock = Clock()
+    with patch("app.services.lti_jwks.time.monotonic", clock):
+        await cache.get_key(URL, "k1")
+        clock.now += 100
+        await cache.get_key(URL, "k1")
+        assert platform.requests == 1
+        clock.now += 30
+        await cache.get_key(URL, "k1")
+        assert platform.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refreshes_at_most_once_per_interval():
+    _, jwk1 = _jwk("k1")
+    key2, jwk2 = _jwk("k2")
+    platform = Platform([jwk1])
+    cache = _cache(platform, refresh_interval=30)
+    clock = Clock()
+    with patch("app.services.lti_jwks.time.monotonic", clock):
+        await cache.get_key(URL, "k1")
+
+        clock.now += 60
+        with pytest.raises(JWKSKeyNotFound):
+            await cache.get_key(URL, "forged")
+        assert platform.requests == 2
+        with pytest.raises(JWKSKeyNotFound):
+            await cache.get_key(URL, "forged")
+        assert platform.requests == 2
+
+        # Платформа сменила ключ: новый kid подхватывается после интервала
+        platform.jwks = [jwk1, jwk2]
+        clock.now += 31
+        assert (await cache.get_key(URL, "k2")).public_numbers() == key2.public_numbers()
+        assert platform.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_stale_keys_served_while_platform_is_down():
+    key1, jwk1 = _jwk("k1")
+    platform = Platform([jwk1], cache_control="max-age=60")
+    cache = _cache(platform, refresh_interval=30, stale_ttl=3600)
+    clock = Clock()
+    with patch("app.services.lti_jwks.time.monotonic", clock):
+        await cache.get_key(URL, "k1")
+        platform.down = True
+
+        clock.now += 120
+        assert (await cache.get_key(URL, "k1")).public_numbers() == key1.public_numbers()
+        assert cache.stale_served == 1
+        # Следующие запросы в пределах refresh_interval не ходят в сеть
+        await cache.get_key(URL, "k1")
+        assert platform.requests == 2
+
+        clock.now += 4000
+        with pytest.raises(httpx.HTTPStatusError):
+            await cache.get_key(URL, "k1")
+
+
+@pytest.mark.asyncio
+async def test_first_fetch_failure_is_raised():
+    platform = Platform([])
+    platform.down = True
+    cache = _cache(platform)
+    with pytest.raises(httpx.HTTPStatusError):
+        await cache.get_key(URL, "k1")
+    await cache.prefetch(URL)  # logged, not raised
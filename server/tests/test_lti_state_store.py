@@ -0,0 +1,110 @@
+"""Tests for the Redis-backed LTI nonce and launch store."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.lti_state_store import LTIStateStore
+
+PLATFORM = "https://canvas.example.edu"
+
+
+class FakeRedis:
+    """Just the commands the store uses, with NX / GETDEL semantics."""
+
+    def __init__(self, fail=False):
+        self.data = {}
+        self.ttls = {}
+        self.fail = fail
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    async def set(self, key, value, nx=False, ex=None):
+        self._check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.ttls[key] = ex
+        return True
+
+    async def getdel(self, key):
+        self._check()
+        await asyncio.sleep(0)
+        self.ttls.pop(key, None)
+        return self.data.pop(key, None)
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+
+def _session(rows=None):
+    result = MagicMock()
+    result.fetchone.return_value = rows
+    db = AsyncMock()
+    db.execute.return_value = result
+    session = MagicMock()
+    session.return_value.__aenter__.return_value = db
+    return session, db
+
+
+def _launch_data():
+    return SimpleNamespace(deployment_id="d1", user_id="u1", context_id="c1", resource_link_id="r1",
+                           message_type="LtiResourceLinkRequest", target_link_uri="https://tool/launch")
+
+
+@pytest.mark.asyncio
+async def test_nonce_is_accepted_once_without_database():
+    redis = FakeRedis()
+    store = LTIStateStore(nonce_ttl=300)
+    session, db = _session()
+    with patch("app.services.redis_service.redis_service.get_client", return_value=redis), \
+            patch("app.services.lti_state_store.AsyncSessionLocal", session):
+        await store.store_nonce("n1", PLATFORM, "s1")
+        assert redis.ttls[f"lti:nonce:{PLATFORM}:n1"] == 300
+
+        results = await asyncio.gather(*(store.consume_nonce("n1", PLATFORM, "s1") for _ in range(5)))
+        assert results.count(True) == 1
+
+        await store.store_launch("l1", PLATFORM, _launch_data(), {"sub": "u1"})
+        assert await store.get_launch("l1") == {"sub": "u1"}
+
+    # Успешный запуск не пишет в базу; в таблицу смотрят только повторы
+    assert all("INSERT" not in str(call.args[0]) for call in db.execute.call_args_list)
+    assert store.get_stats()["sql_writes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_nonce_bound_to_state():
+    redis = FakeRedis()
+    store = LTIStateStore()
+    with patch("app.services.redis_service.redis_service.get_client", return_value=redis):
+        await store.store_nonce("n1", PLATFORM, "s1")
+        assert await store.consume_nonce("n1", PLATFORM, "forged-state") is False
+        assert await store.consume_nonce("n1", "https://other.example.edu", "s1") is False
+        assert await store.consume_nonce(None, PLATFORM) is False
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_database_when_redis_is_down():
+    redis = FakeRedis(fail=True)
+    store = LTIStateStore(redis_retry_after=30)
+    session, db = _session(rows=("n1",))
+    with patch("app.services.redis_service.redis_service.get_client", return_value=redis), \
+            patch("app.services.lti_state_store.AsyncSessionLocal", session):
+        await store.store_nonce("n1", PLATFORM, "s1")
+        assert await store.consume_nonce("n1", PLATFORM, "s1") is True
+        await store.store_launch("l1", PLATFORM, _launch_data(), {"sub": "u1"})
+
+    statements = [str(call.args[0]) for call in db.execute.call_args_list]
+    assert "INSERT INTO lti_nonces" in statements[0]
+    assert "RETURNING nonce" in statements[1]
+    assert json.loads(db.execute.call_args_list[2].args[1]["launch_data"]) == {"sub": "u1"}
+    stats = store.get_stats()
+    assert stats["sql_writes"] == 2
+    assert stats["redis_enabled"] is False
@@ -280,31 +280,18 @@ class TestCRUDNotificationIntegration:
         call_args = mock_send_webhook.call_args[0][0]
         assert call_args["event_type"] == "feedback_created"
     
-    @patch.object(CRUDGradebook, 'get_entry_by_unique_key', return_value=None)
-    @patch.object(CRUDGradebook, '_send_grade_notification')
-    @patch('app.database.get_db')
-    def test_gradebook_create_with_notification(self, mock_get_db, mock_send_notification, mock_get_entry_by_unique_key):
+    @pytest.mark.asyncio
+    @patch.object(CRUDGradebook, 'get_entry_by_unique_key', new_callable=AsyncMock, return_value=None)
+    @patch.object(CRUDGradebook, '_validate_related_objects', new_callable=AsyncMock, return_value=("Математика", "Домашнее задание 1"))
+    @patch.object(CRUDGradebook, '_notify', new_callable=AsyncMock)
+    async def test_gradebook_create_with_notification(self, mock_notify, mock_validate, mock_get_entry_by_unique_key):
         """Тест создания записи в журнале с уведомлением"""
-        # Patch db.query chains for course, student, assignment, and ensure no duplicate entry
-        mock_db = Mock(spec=Session)
-        mock_get_db.return_value = mock_db
+        mock_db = AsyncMock()
+        mock_db.add = Mock()
         mock_user = Mock()
         mock_user.role = "teacher"
         mock_user.id = 1
         mock_user.username = "teacher@example.com"
-        course_mock = MagicMock()
-        student_mock = MagicMock()
-        assignment_mock = MagicMock()
-        course_mock.name = "Математика"
-        student_mock.first_name = "Иван"
-        student_mock.last_name = "Иванов"
-        student_mock.id = 2
-        student_user_mock = MagicMock()
-        student_user_mock.username = "student@example.com"
-        assignment_mock.title = "Домашнее задание 1"
-        assignment_mock.id = 3
-        # Ensure no duplicate entry by returning None for the duplicate check
-        mock_db.query.return_value.filter.return_value.first.side_effect = [course_mock, student_mock, student_user_mock, assignment_mock, None]
         entry_data = GradebookEntryCreate(
             course_id=1,
             student_id=2,
@@ -313,12 +300,16 @@ class TestCRUDNotificationIntegration:
             comment="Отличная работа"
         )
         crud_gradebook = CRUDGradebook()
-        result = crud_gradebook.create_entry(
+        result = await crud_gradebook.create_entry(
             db=mock_db,
             entry_in=entry_data,
             current_user=mock_user
         )
-        assert mock_send_notification.called
+        # Запись и история — одна транзакция
+        assert mock_db.add.call_count == 2
+        mock_db.commit.assert_awaited_once()
+        assert mock_notify.called
+        assert mock_notify.call_args[0][3] == "grade_created"
     @patch('app.database.get_db')
     def test_schedule_create_with_notification(self, mock_get_db):
         mock_db = Mock(spec=Session)
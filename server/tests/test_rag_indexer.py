@@ -0,0 +1,240 @@
+"""Tests for incremental RAG indexing and the embedding service."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.services.rag_indexer import (
+    Document, EmbeddingCache, EmbeddingService, RAGIndexer, VectorStore, chunk_text
+)
+
+
+class CountingEmbedder:
+    model_name = model_id = "test-model"
+    dimension = 4
+    needs_fit = False
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_batch(self, texts):
+        self.batches.append(list(texts))
+        return [np.array([len(t), 1.0, 0.0, 0.0]) for t in texts]
+
+    async def aembed_batch(self, texts):
+        return self.embed_batch(texts)
+
+
+def _source(kind, source_id, course_id, body, title="T"):
+    return {
+        "source_key": f"{kind}:{source_id}",
+        "heading": f"{kind.title()}: {title}",
+        "body": body,
+        "metadata": {"course_id": course_id, "course_name": "C", "type": kind, f"{kind}_id": source_id},
+    }
+
+
+def _indexer(tmp_path, sources, batch_size=64, chunk_size=2000):
+    indexer = RAGIndexer()
+    indexer.embedding_service = CountingEmbedder()
+    indexer.vector_store = VectorStore()
+    indexer.index_file = tmp_path / "rag_index.json"
+    indexer.embed_batch_size = batch_size
+    indexer.chunk_size = chunk_size
+    indexer.chunk_overlap = 20
+
+    async def collect(course_ids, db):
+        return [s for s in sources if s["metadata"]["course_id"] in course_ids]
+
+    indexer._collect_sources = collect
+    return indexer
+
+
+def test_chunk_text_prefers_boundaries_and_overlaps():
+    text = " ".join(f"Sentence number {i}." for i in range(100))
+    chunks = chunk_text(text, 200, overlap=30)
+
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    assert all(c.endswith(".") for c in chunks[:-1])
+    assert chunks[0][-20:] in chunks[1]  # перекрытие соседних фрагментов
+    assert chunk_text("short", 200) == ["short"]
+    assert chunk_text("  ", 200) == []
+
+
+@pytest.mark.asyncio
+async def test_only_new_or_changed_content_is_embedded(tmp_path):
+    sources = [
+        _source("page", 1, 10, "Intro to vectors"),
+        _source("assignment", 2, 10, "Solve problems 1-5"),
+        _source("quiz", 3, 20, "Weekly quiz"),
+    ]
+    indexer = _indexer(tmp_path, sources)
+    # Документ из индекса старого формата (без source_key) заменяется
+    legacy = Document("Page: T\n\nIntro to vectors", {"course_id": 10, "type": "page"})
+    legacy.embedding = np.ones(4)
+    indexer.vector_store.add_documents([legacy])
+
+    stats = await indexer.index_courses([10, 20], db=None)
+    assert stats["embedded_chunks"] == 3 and stats["removed_documents"] == 1
+    assert sorted(indexer.vector_store.documents) == ["assignment:2#0", "page:1#0", "quiz:3#0"]
+
+    stats = await indexer.index_courses([10, 20], db=None)
+    assert stats["embedded_chunks"] == 0 and stats["unchanged"] == 3
+    assert len(indexer.embedding_service.batches) == 1
+
+    sources[0]["body"] = "Intro to vectors and matrices"
+    del sources[1]
+    stats = await indexer.index_courses([10], db=None)
+    assert stats == {**stats, "unchanged": 0, "embedded_chunks": 1, "removed_documents": 2}
+    assert indexer.embedding_service.batches[-1] == ["Page: T\n\nIntro to vectors and matrices"]
+    assert sorted(indexer.vector_store.documents) == ["page:1#0", "quiz:3#0"]
+    assert indexer.vector_store.embeddings.shape == (2, 4)
+    assert indexer.index_file.exists()
+
+
+@pytest.mark.asyncio
+async def test_large_documents_are_chunked_and_batched_across_courses(tmp_path):
+    long_body = "\n\n".join(f"Paragraph {i} " + "x" * 80 for i in range(20))
+    sources = [_source("page", i, 100 + i % 3, long_body if i == 0 else f"body {i}") for i in range(10)]
+    indexer = _indexer(tmp_path, sources, batch_size=4, chunk_size=300)
+
+    stats = await indexer.index_courses([100, 101, 102], db=None)
+
+    chunks = [d for d in indexer.vector_store.documents.values() if d.metadata["source_key"] == "page:0"]
+    assert len(chunks) > 1
+    assert all(len(d.content) <= 300 for d in chunks)
+    assert all(d.content.startswith("Page: T\n\n") for d in chunks)
+    assert {d.metadata["chunks"] for d in chunks} == {len(chunks)}
+    assert stats["embedded_chunks"] == len(chunks) + 9
+    assert all(len(batch) <= 4 for batch in indexer.embedding_service.batches)
+    assert len(indexer.embedding_service.batches) == -(-stats["embedded_chunks"] // 4)
+
+
+@pytest.mark.asyncio
+async def test_prune_removes_courses_that_no_longer_exist(tmp_path):
+    sources = [_source("page", 1, 10, "a"), _source("page", 2, 11, "b")]
+    indexer = _indexer(tmp_path, sources)
+    await indexer.index_courses([10, 11], db=None)
+
+    await indexer.index_courses([10], db=None, prune=True)
+    assert list(indexer.vector_store.documents) == ["page:1#0"]
+
+
+@pytest.mark.asyncio
+async def test_model_change_drops_vectors_of_other_courses(tmp_path):
+    sources = [_source("page", 1, 10, "a"), _source("page", 2, 20, "b")]
+    indexer = _indexer(tmp_path, sources)
+    await indexer.index_courses([10, 20], db=None)
+
+    # Например, TF-IDF обучен заново: другой словарь и размерность
+    embedder = indexer.embedding_service
+    embedder.model_id, embedder.dimension = "tfidf:new", 3
+    embedder.embed_batch = lambda texts: [np.array([len(t), 1.0, 0.0]) for t in texts]
+    indexer.schedule_reindex = MagicMock()
+
+    stats = await indexer.index_courses([20], db=None)
+
+    assert stats["outdated_documents"] == 1 and stats["embedded_chunks"] == 1
+    assert list(indexer.vector_store.documents) == ["page:2#0"]
+    assert indexer.vector_store.embeddings.shape == (1, 3)
+    indexer.schedule_reindex.assert_called_once_with(10)
+
+
+@pytest.mark.asyncio
+async def test_crud_changes_are_debounced_into_one_run(tmp_path):
+    indexer = _indexer(tmp_path, [])
+    indexer.reindex_delay = 0.01
+    indexer.index_courses = AsyncMock()
+
+    @asynccontextmanager
+    async def session():
+        yield "db"
+
+    with patch("app.services.rag_indexer.AsyncSessionLocal", session):
+        indexer.schedule_reindex(2)
+        indexer.schedule_reindex(1)
+        indexer.schedule_reindex(2)
+        indexer.schedule_reindex(None)
+        await asyncio.wait_for(indexer._reindex_task, timeout=1)
+
+    indexer.index_courses.assert_awaited_once_with([1, 2], "db")
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(list(texts))
+        return [[len(t), 1.0] for t in texts]
+
+
+def _service(tmp_path, **kwargs):
+    with patch.object(EmbeddingService, "_load_model", lambda self: None):
+        service = EmbeddingService(
+            cache=EmbeddingCache(max_entries=100, directory=str(tmp_path / "cache")),
+            fallback_path=str(tmp_path / "tfidf.pkl"),
+            **kwargs
+        )
+    service.model = FakeEncoder()
+    service.model_id = "fake"
+    service.dimension = 2
+    return service
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_micro_batched_and_cached(tmp_path):
+    service = _service(tmp_path, batch_window_ms=20)
+
+    vectors = await asyncio.gather(*(service.aembed_text(q) for q in ["ab", "abc", "ab", "abcd", ""]))
+
+    assert service.model.calls == [["ab", "abc", "abcd"]]
+    assert [list(v) for v in vectors[:4]] == [[2, 1], [3, 1], [2, 1], [4, 1]]
+    assert not np.any(vectors[4])
+
+    await service.aembed_text("abc")
+    batch = await service.aembed_batch(["ab", "xyz"])
+    assert list(batch[1]) == [3, 1]
+    assert service.model.calls[1:] == [["xyz"]]
+    assert service.get_stats()["query_batches"] == 1
+
+    # Кэш на диске переживает перезапуск
+    restarted = _service(tmp_path)
+    assert list(restarted.embed_text("abcd")) == [4, 1]
+    assert restarted.model.calls == []
+    assert restarted.cache.get_stats()["disk_hits"] == 1
+
+
+def test_cache_is_keyed_by_model_and_bounded(tmp_path):
+    cache = EmbeddingCache(max_entries=2)
+    cache.put(cache.key("m1", "a"), np.ones(2))
+    assert cache.get(cache.key("m2", "a")) is None
+    cache.put(cache.key("m1", "b"), np.ones(2))
+    cache.put(cache.key("m1", "c"), np.ones(2))
+    assert cache.get(cache.key("m1", "a")) is None
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_tfidf_fallback_is_fitted_and_persisted(tmp_path):
+    pytest.importorskip("sklearn")
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    service = _service(tmp_path)
+    service.model = TfidfVectorizer(max_features=384)
+    service.model_id = "tfidf:unfitted"
+    assert service.needs_fit
+    assert not np.any(service.embed_text("linear algebra"))
+
+    assert service.fit_fallback(["linear algebra basics", "calculus limits", "algebra homework"])
+    assert not service.needs_fit
+    assert np.any(service.embed_text("linear algebra"))
+
+    with patch.object(EmbeddingService, "_load_model", lambda self: None):
+        restarted = EmbeddingService(cache=EmbeddingCache(), fallback_path=str(tmp_path / "tfidf.pkl"))
+    restarted._setup_fallback_embeddings()
+    assert restarted.model_id == service.model_id
+    assert np.allclose(restarted.embed_text("linear algebra"), service.embed_text("linear algebra"))
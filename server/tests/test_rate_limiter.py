@@ -0,0 +1,82 @@
+"""Tests for the GCRA rate limiter and RateLimit-* headers."""
+
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.middleware.rate_limit_headers import RateLimitHeadersMiddleware
+from app.services.rate_limiter import RateLimiter, RateLimitResult
+
+
+def _limiter(script_results, local_fraction=0.25):
+    limiter = RateLimiter("redis://localhost:6379/0", local_fraction=local_fraction, local_max_age=60)
+    limiter._script = AsyncMock(side_effect=script_results)
+    return limiter
+
+
+class TestRateLimiter:
+    """Local pre-check, debt accounting and rejection."""
+
+    @pytest.mark.asyncio
+    async def test_local_allowance_skips_redis_and_is_charged_later(self):
+        # remaining=40 -> 10 requests may be admitted locally
+        limiter = _limiter([[1, 40, 0, 1500], [1, 28, 0, 3000]])
+
+        first = await limiter.check("api", "u1", limit=100, window_seconds=60)
+        assert first.remaining == 40
+        for _ in range(10):
+            await limiter.check("api", "u1", limit=100, window_seconds=60)
+        assert limiter._script.await_count == 1
+        assert limiter.local_hits == 10
+
+        await limiter.check("api", "u1", limit=100, window_seconds=60)
+        assert limiter._script.await_count == 2
+        # The ten local admissions are sent as debt
+        assert limiter._script.await_args.kwargs["args"][2] == 10
+
+    @pytest.mark.asyncio
+    async def test_rejection_has_headers(self):
+        limiter = _limiter([[0, 0, 2500, 30000]])
+        with pytest.raises(HTTPException) as exc_info:
+            await limiter.check("auth:token", "1.2.3.4", limit=10, window_seconds=60)
+        exc = exc_info.value
+        assert exc.status_code == 429
+        assert exc.headers["Retry-After"] == "3"
+        assert exc.headers["RateLimit-Remaining"] == "0"
+        assert exc.headers["RateLimit-Policy"] == "10;w=60"
+
+    @pytest.mark.asyncio
+    async def test_fails_open_on_redis_error(self):
+        limiter = _limiter(ConnectionError("down"))
+        assert await limiter.check("api", "u1", limit=10, window_seconds=60) is None
+
+
+class TestRateLimitHeaders:
+    """Headers reach the response through request.state."""
+
+    def test_headers_added_to_response(self):
+        app = FastAPI()
+        app.add_middleware(RateLimitHeadersMiddleware)
+
+        async def limited(request: Request):
+            request.state.rate_limit = RateLimitResult(
+                allowed=True, limit=20, window_seconds=60, remaining=7, reset_after=12.2
+            )
+
+        @app.get("/limited", dependencies=[Depends(limited)])
+        async def endpoint():
+            return {"ok": True}
+
+        @app.get("/free")
+        async def free():
+            return {"ok": True}
+
+        client = TestClient(app)
+        response = client.get("/limited")
+        assert response.headers["RateLimit-Limit"] == "20"
+        assert response.headers["RateLimit-Remaining"] == "7"
+        assert response.headers["RateLimit-Reset"] == "13"
+        assert "Retry-After" not in response.headers
+        assert "RateLimit-Limit" not in client.get("/free").headers
@@ -0,0 +1,131 @@
+"""Tests for the compiled RBAC matrix, enrollment cache and audit buffer."""
+
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.rbac import (
+    AccessContext, Action, AuditLogBuffer, AuditLogEntry, ContextType, EnrollmentCache,
+    RBACMatrix, RBACService, ResourceType
+)
+from app.models.user import User, UserRole
+
+
+def _audit_entry(entry_id, granted=True):
+    return AuditLogEntry(
+        entry_id=entry_id, user_id=1, user_role="student", resource_type="course",
+        resource_id="10", action="read", access_granted=granted, reason="test",
+        ip_address=None, user_agent=None, timestamp=datetime.utcnow(),
+        additional_context={"path": "/courses/10"}
+    )
+
+
+def _session_returning(course_ids):
+    result = MagicMock()
+    result.fetchall.return_value = [MagicMock(course_id=course_id) for course_id in course_ids]
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+    return session
+
+
+class TestCompiledMatrix:
+    """The compiled lookups must agree with the original permission lists."""
+
+    def test_matches_linear_scan(self):
+        matrix = RBACMatrix()
+        for role, permissions in matrix.permissions_matrix.items():
+            for resource_type in ResourceType:
+                for action in Action:
+                    for context_type in ContextType:
+                        expected = any(
+                            p.resource_type == resource_type and p.action == action and p.context_type == context_type
+                            for p in permissions
+                        )
+                        assert matrix.has_permission(role, resource_type, action, context_type) == expected
+
+                    first = next(
+                        (p for p in permissions if p.resource_type == resource_type and p.action == action), None
+                    )
+                    assert matrix.find_permission(role, resource_type, action) is first
+
+    def test_accepts_string_roles(self):
+        matrix = RBACMatrix()
+        assert matrix.has_permission("admin", ResourceType.USER, Action.DELETE) == \
+            matrix.has_permission(UserRole.admin, ResourceType.USER, Action.DELETE)
+        assert not matrix.has_permission("unknown", ResourceType.USER, Action.READ)
+        assert matrix.get_role_permissions("unknown") == []
+
+
+class TestEnrollmentCache:
+    """One query per user until invalidated."""
+
+    @pytest.mark.asyncio
+    async def test_caches_and_invalidates(self):
+        cache = EnrollmentCache(ttl=60)
+        session = _session_returning([10, 11])
+        with patch("app.core.rbac.AsyncSessionLocal", return_value=session):
+            assert await cache.is_enrolled(1, 10)
+            assert await cache.is_enrolled(1, 11)
+            assert not await cache.is_enrolled(1, 12)
+            assert session.execute.await_count == 1
+
+            cache.invalidate(1)
+            assert await cache.is_enrolled(1, 10)
+            assert session.execute.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_course_check_skips_lookup_without_course_permission(self):
+        service = RBACService()
+        user = User(id=1, username="student", role="student")
+        context = AccessContext(user=user, resource_type=ResourceType.MIGRATION,
+                                action=Action.DELETE, course_id=10)
+        with patch("app.core.rbac.enrollment_cache") as cache:
+            cache.is_enrolled = AsyncMock(return_value=True)
+            assert not await service._check_course_permission(context)
+            cache.is_enrolled.assert_not_awaited()
+
+
+class TestAuditLogBuffer:
+    """Audit entries are queued and written in multi-row inserts."""
+
+    def test_drops_when_full(self):
+        buffer = AuditLogBuffer(max_size=1)
+        assert buffer.enqueue(_audit_entry("a"))
+        assert not buffer.enqueue(_audit_entry("b"))
+        assert buffer.get_stats()["dropped"] == 1
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_batches(self):
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.execute(text("""
+                CREATE TABLE rbac_audit_log (
+                    entry_id TEXT PRIMARY KEY, user_id INTEGER, user_role TEXT, resource_type TEXT,
+                    resource_id TEXT, action TEXT, access_granted BOOLEAN, reason TEXT,
+                    ip_address TEXT, user_agent TEXT, timestamp TIMESTAMP, additional_context TEXT
+                )
+            """))
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        buffer = AuditLogBuffer(batch_size=2)
+        buffer._table_ready = True
+        for i in range(5):
+            buffer.enqueue(_audit_entry(f"entry-{i}", granted=i % 2 == 0))
+
+        with patch("app.core.rbac.AsyncSessionLocal", session_factory):
+            assert await buffer.flush() == 5
+
+        async with session_factory() as db:
+            rows = (await db.execute(text(
+                "SELECT entry_id, access_granted, additional_context FROM rbac_audit_log ORDER BY entry_id"
+            ))).fetchall()
+        assert [row.entry_id for row in rows] == [f"entry-{i}" for i in range(5)]
+        assert [bool(row.access_granted) for row in rows] == [True, False, True, False, True]
+        assert rows[0].additional_context == '{"path": "/courses/10"}'
+        assert buffer.get_stats() == {"queued": 0, "written": 5, "dropped": 0, "failed": 0}
+        await engine.dispose()
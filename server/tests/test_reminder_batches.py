@@ -0,0 +1,135 @@
+"""Tests for batched reminder dispatch: claim, send concurrently, bulk-mark."""
+
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.crud.reminder import reminder_crud
+from app.services.reminder_service import ReminderService
+
+
+class ReminderQueue:
+    """In-memory stand-in for claim_pending_reminders / mark_reminders_sent."""
+
+    def __init__(self, count):
+        self.reminders = [SimpleNamespace(id=i, user_id=100 + i, is_sent=False) for i in range(1, count + 1)]
+        self.claims = []
+        self.marked = []
+
+    async def claim(self, db, limit=100, exclude_ids=None):
+        excluded = set(exclude_ids or [])
+        self.claims.append(sorted(excluded))
+        return [r for r in self.reminders if not r.is_sent and r.id not in excluded][:limit]
+
+    async def mark(self, db, reminder_ids, commit=True):
+        self.marked.append(list(reminder_ids))
+        for reminder in self.reminders:
+            if reminder.id in reminder_ids:
+                reminder.is_sent = True
+        return len(reminder_ids)
+
+
+async def _run(queue, failing=(), batch_size=2, db=None):
+    service = ReminderService()
+    sent = []
+
+    async def send(reminder):
+        sent.append(reminder.id)
+        return reminder.id not in failing
+
+    service._send_reminder = send
+    db = db or AsyncMock()
+    with patch.object(reminder_crud, "claim_pending_reminders", queue.claim), \
+            patch.object(reminder_crud, "mark_reminders_sent", queue.mark), \
+            patch("app.services.reminder_service.settings.REMINDER_BATCH_SIZE", batch_size):
+        count = await service.process_pending_reminders(db)
+    return count, sent
+
+
+@pytest.mark.asyncio
+async def test_batches_are_drained_until_queue_is_empty():
+    queue = ReminderQueue(5)
+
+    count, sent = await _run(queue)
+
+    assert count == 5
+    assert sorted(sent) == [1, 2, 3, 4, 5]
+    assert queue.marked == [[1, 2], [3, 4], [5]]
+    assert all(r.is_sent for r in queue.reminders)
+
+
+@pytest.mark.asyncio
+async def test_failed_reminders_are_skipped_for_the_run_and_retried_next_time():
+    queue = ReminderQueue(4)
+
+    count, sent = await _run(queue, failing={2})
+
+    assert count == 3
+    assert sent.count(2) == 1
+    # После неудачи id 2 исключается из следующих захватов в этом проходе
+    assert queue.claims[1:] == [[2]] * (len(queue.claims) - 1)
+    assert [r.id for r in queue.reminders if not r.is_sent] == [2]
+
+    count, sent = await _run(queue)
+    assert (count, sent) == (1, [2])
+
+
+@pytest.mark.asyncio
+async def test_error_rolls_back_and_returns_partial_count():
+    queue = ReminderQueue(4)
+    mark = queue.mark
+    calls = 0
+
+    async def flaky_mark(db, reminder_ids, commit=True):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("connection lost")
+        return await mark(db, reminder_ids, commit)
+
+    queue.mark = flaky_mark
+    db = AsyncMock()
+
+    count, _ = await _run(queue, db=db)
+
+    assert count == 2
+    db.rollback.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_successes_are_marked_with_one_bulk_update():
+    db = MagicMock()
+    db.execute = AsyncMock(return_value=SimpleNamespace(rowcount=2))
+    db.commit = AsyncMock()
+
+    assert await reminder_crud.mark_reminders_sent(db, [3, 7]) == 2
+
+    db.execute.assert_awaited_once()
+    statement = db.execute.await_args.args[0]
+    compiled = statement.compile(dialect=postgresql.dialect())
+    assert str(compiled).startswith("UPDATE scheduled_reminders SET ")
+    assert compiled.params["is_sent"] is True
+    assert [3, 7] in compiled.params.values()
+    db.commit.assert_awaited_once()
+
+    db.execute.reset_mock()
+    assert await reminder_crud.mark_reminders_sent(db, []) == 0
+    db.execute.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_claim_skips_locked_rows_and_excluded_ids():
+    db = MagicMock()
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = []
+    db.execute = AsyncMock(return_value=result)
+
+    await reminder_crud.claim_pending_reminders(db, limit=50, exclude_ids={4, 9})
+
+    compiled = db.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    assert "FOR UPDATE OF scheduled_reminders SKIP LOCKED" in sql
+    assert "NOT IN" in sql
+    assert sorted(next(v for v in compiled.params.values() if isinstance(v, list))) == [4, 9]
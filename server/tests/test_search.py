@@ -0,0 +1,67 @@
+"""Tests for the pluggable search backends."""
+
+from unittest.mock import patch
+
+from sqlalchemy import JSON, column, select, table
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from app.core.search import (
+    SearchBackendType, apply_search, build_search, json_array_contains_any, resolve_backend
+)
+from app.models.course import Course
+from app.models.page import Page
+from app.models.user import User
+
+
+def _pg_sql(query):
+    return str(query.compile(dialect=asyncpg.dialect()))
+
+
+def _sqlite_sql(query):
+    return str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+class TestSearchBackends:
+    """Backend selection and generated SQL."""
+
+    def test_backend_selection(self):
+        assert resolve_backend(User, "postgresql") == SearchBackendType.TRIGRAM
+        assert resolve_backend(Page, "postgresql") == SearchBackendType.FULLTEXT
+        assert resolve_backend(User, "sqlite") == SearchBackendType.ILIKE
+        with patch("app.core.search.settings.SEARCH_BACKEND", "ilike"):
+            assert resolve_backend(User, "postgresql") == SearchBackendType.ILIKE
+
+    def test_trigram_query_is_ranked(self):
+        sql = _pg_sql(apply_search(select(Course), Course, "algebra", "postgresql"))
+        assert "courses.title ILIKE $1" in sql
+        assert "<% courses.description" in sql
+        assert "ORDER BY greatest(word_similarity(" in sql
+
+    def test_short_terms_skip_similarity(self):
+        condition, rank = build_search(User, "ab", None, "postgresql")
+        sql = _pg_sql(select(User).where(condition))
+        assert "<%" not in sql
+        assert rank is not None
+
+    def test_fulltext_query(self):
+        sql = _pg_sql(apply_search(select(Page), Page, "exam schedule", "postgresql"))
+        assert "pages.search_vector @@ websearch_to_tsquery(" in sql
+        assert "ORDER BY ts_rank_cd(pages.search_vector" in sql
+
+    def test_sqlite_fallback_is_plain_ilike(self):
+        condition, rank = build_search(Course, "algebra", None, "sqlite")
+        assert rank is None
+        sql = _sqlite_sql(select(Course).where(condition))
+        assert "lower(courses.title) LIKE lower('%algebra%')" in sql
+        assert build_search(Course, "   ", None, "postgresql") == (None, None)
+
+    def test_json_tags_use_jsonb_any_on_postgres(self):
+        tags = table("bank_questions", column("tags", JSON))
+        condition = json_array_contains_any(tags.c.tags, ["algebra", "", "limits"], "postgresql")
+        sql = _pg_sql(select(tags).where(condition))
+        assert "CAST(bank_questions.tags AS JSONB) ?| $1::TEXT[]" in sql
+
+        fallback = _sqlite_sql(select(tags).where(json_array_contains_any(tags.c.tags, ["algebra"], "sqlite")))
+        assert "LIKE '%\"algebra\"%'" in fallback
+        assert json_array_contains_any(tags.c.tags, [], "postgresql") is None
@@ -0,0 +1,163 @@
+"""Tests for monthly notification partitions: naming, ranges and retention drops."""
+
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import re
+
+import pytest
+
+from app.services.migration_manager import TimePartitionManager
+
+
+def _partition(name, upper):
+    return {"name": name, "bound": None, "upper": upper}
+
+
+def _db(live_by_partition, partitions):
+    """Session stub: the partition listing (name, upper[, lower]), then one EXISTS query per candidate."""
+    executed = []
+
+    async def execute(statement, params=None):
+        sql = str(statement)
+        executed.append(sql)
+        result = MagicMock()
+        if "pg_inherits" in sql:
+            result.fetchall.return_value = [
+                SimpleNamespace(name=name, bound=f"FOR VALUES FROM ({lower}) TO ('{upper}')")
+                for name, upper, *rest in partitions
+                for lower in [f"'{rest[0]}'" if rest else "MINVALUE"]
+            ]
+        else:
+            result.scalar.return_value = next(
+                (live for name, live in live_by_partition.items() if name in sql), False
+            )
+        return result
+
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=execute)
+    return db, executed
+
+
+def test_partition_names_and_month_arithmetic():
+    manager = TimePartitionManager()
+    month = manager.month_start(datetime(2026, 11, 17, 13, 45, 10))
+
+    assert month == datetime(2026, 11, 1)
+    assert manager.partition_name("notification_log", month) == "notification_log_y2026m11"
+    assert manager.add_months(month, 2) == datetime(2027, 1, 1)
+    assert manager.add_months(datetime(2027, 1, 1), -1) == datetime(2026, 12, 1)
+    assert manager._bound(datetime(2027, 1, 1)) == "2027-01-01 00:00:00+00"
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_created_for_current_and_upcoming_months():
+    manager = TimePartitionManager()
+    spec = manager.specs["notification_log"]
+    db, executed = _db({}, [("notification_log_y2026m12", "2027-01-01 00:00:00+00", "2026-12-01 00:00:00+00")])
+
+    created = await manager.create_partitions_ahead(db, spec, months_ahead=2, start=datetime(2026, 11, 20))
+
+    assert created == ["notification_log_y2026m11", "notification_log_y2027m01"]
+    assert "FOR VALUES FROM ('2026-11-01 00:00:00+00') TO ('2026-12-01 00:00:00+00')" in executed[1]
+
+
+def test_only_partitions_ending_before_cutoff_expire():
+    partitions = [
+        _partition("notification_log_legacy", datetime(2026, 9, 1)),
+        _partition("notification_log_y2026m09", datetime(2026, 10, 1)),
+        _partition("notification_log_y2026m10", datetime(2026, 11, 1)),
+        _partition("notification_log_default", None),
+    ]
+
+    expired = TimePartitionManager.expired_partitions(partitions, cutoff=datetime(2026, 10, 1))
+
+    assert expired == ["notification_log_legacy", "notification_log_y2026m09"]
+
+
+@pytest.mark.asyncio
+async def test_partitions_with_undelivered_notifications_are_kept():
+    manager = TimePartitionManager()
+    partitions = [
+        ("notification_log_y2026m07", "2026-08-01 00:00:00+00"),
+        ("notification_log_y2026m08", "2026-09-01 00:00:00+00"),
+    ]
+    db, executed = _db({"notification_log_y2026m07": True}, partitions)
+
+    dropped = await manager.drop_partitions_before(db, "notification_log", datetime(2026, 9, 15), dry_run=False)
+
+    assert dropped == ["notification_log_y2026m08"]
+    assert any("status NOT IN ('sent', 'expired', 'poisoned')" in sql for sql in executed)
+    assert not any("DROP TABLE notification_log_y2026m07" in sql for sql in executed)
+    assert "DROP TABLE notification_log_y2026m08" in executed[-1]
+
+
+class PartitionCatalog:
+    """Tiny stand-in for PostgreSQL range partitioning: rejects rows outside
+    an attached partition's range and overlapping partitions."""
+
+    BOUND = re.compile(r"FOR VALUES FROM \((MINVALUE|'[^']+')\) TO \('([^']+)'\)")
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.partitions = {}
+
+    @staticmethod
+    def _parse(value):
+        return datetime.fromisoformat(value.strip("'")).replace(tzinfo=None)
+
+    def _add(self, name, sql):
+        lower, upper = self.BOUND.search(sql).groups()
+        lower = None if lower == "MINVALUE" else self._parse(lower)
+        upper = self._parse(upper)
+        for other, (other_lower, other_upper) in self.partitions.items():
+            if (other_lower is None or other_lower < upper) and (lower is None or lower < other_upper):
+                raise RuntimeError(f'partition "{name}" would overlap partition "{other}"')
+        self.partitions[name] = (lower, upper)
+        return lower, upper
+
+    async def execute(self, statement, params=None):
+        sql = " ".join(str(statement).split())
+        result = MagicMock()
+        if "SELECT relkind" in sql:
+            result.scalar.return_value = "r"
+        elif "FROM pg_constraint" in sql:
+            result.fetchall.return_value = []
+        elif sql.startswith("SELECT max("):
+            result.scalar.return_value = max(self.rows)
+        elif "ATTACH PARTITION" in sql:
+            name = re.search(r"ATTACH PARTITION (\w+)", sql).group(1)
+            lower, upper = self._add(name, sql)
+            if any(row >= upper for row in self.rows):
+                raise RuntimeError(f'partition constraint of relation "{name}" is violated by some row')
+        elif "PARTITION OF" in sql:
+            self._add(re.search(r"EXISTS (\w+) PARTITION OF", sql).group(1), sql)
+        elif "pg_inherits" in sql:
+            result.fetchall.return_value = [
+                SimpleNamespace(
+                    name=name,
+                    bound=f"FOR VALUES FROM ({'MINVALUE' if lower is None else repr(str(lower))}) TO ('{upper}')"
+                )
+                for name, (lower, upper) in sorted(self.partitions.items())
+            ]
+        return result
+
+
+@pytest.mark.asyncio
+async def test_legacy_table_with_current_month_rows_is_converted():
+    manager = TimePartitionManager()
+    spec = manager.specs["notification_log"]
+    now = datetime.utcnow()
+    catalog = PartitionCatalog(rows=[manager.add_months(now, -2), now])
+
+    assert await manager.ensure_partitioned(catalog, spec) == "converted"
+    created = await manager.create_partitions_ahead(catalog, spec, months_ahead=2)
+
+    next_month = manager.add_months(manager.month_start(now), 1)
+    assert catalog.partitions["notification_log_legacy"] == (None, next_month)
+    # The current month stays in the legacy partition; monthly ones start after it
+    assert created == [
+        manager.partition_name("notification_log", next_month),
+        manager.partition_name("notification_log", manager.add_months(next_month, 1)),
+    ]
@@ -0,0 +1,64 @@
+"""Tests for the authenticated-user identity cache."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.security import create_access_token, get_current_user
+from app.core.user_cache import UserIdentityCache
+from app.models.user import User
+
+
+def _user(user_id=1, username="teacher@example.com", role="teacher"):
+    return User(id=user_id, username=username, role=role)
+
+
+class TestUserIdentityCache:
+    """Test LRU behaviour, TTL and invalidation (local level only)."""
+
+    @pytest.mark.asyncio
+    async def test_set_get_and_invalidate(self):
+        cache = UserIdentityCache(use_redis=False)
+        await cache.set("teacher@example.com", 0, _user())
+
+        identity = await cache.get("teacher@example.com", 0)
+        assert identity == {"id": 1, "username": "teacher@example.com", "role": "teacher"}
+        assert await cache.get("teacher@example.com", 1) is None
+
+        await cache.invalidate("teacher@example.com")
+        assert await cache.get("teacher@example.com", 0) is None
+        assert cache.get_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_ttl(self):
+        cache = UserIdentityCache(max_size=2, use_redis=False)
+        for i in range(3):
+            await cache.set(f"user{i}", 0, _user(user_id=i, username=f"user{i}"))
+        assert cache.get_local("user0") is None
+        assert cache.get_local("user2")["id"] == 2
+
+        expired = UserIdentityCache(local_ttl=-1, use_redis=False)
+        await expired.set("user", 0, _user())
+        assert expired.get_local("user") is None
+
+
+class TestGetCurrentUserCache:
+    """get_current_user hits the database only on a cache miss."""
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_skips_database(self):
+        cache = UserIdentityCache(use_redis=False)
+        token = create_access_token({"sub": "teacher@example.com", "role": "teacher"})
+
+        result = MagicMock()
+        result.scalars.return_value.first.return_value = _user(user_id=7)
+        db = AsyncMock()
+        db.execute.return_value = result
+
+        with patch("app.core.security.user_identity_cache", cache):
+            first = await get_current_user(token=token, db=db)
+            second = await get_current_user(token=token, db=db)
+
+        assert first.id == second.id == 7
+        assert second.role == "teacher"
+        assert db.execute.await_count == 1
@@ -120,8 +120,10 @@ const AIChat = () => {
           const parts = buffer.split('\n\n');
           buffer = parts.pop() || '';
           for (const part of parts) {
-            if (part.startsWith('data: ')) {
-              const chunk = part.replace(/^data: /, '');
+            // Многострочный ответ приходит несколькими полями data: в одном событии
+            const dataLines = part.split('\n').filter(line => line.startsWith('data: '));
+            if (dataLines.length) {
+              const chunk = dataLines.map(line => line.slice(6)).join('\n');
               if (chunk !== '[END]') accumulated += chunk;
             }
           }
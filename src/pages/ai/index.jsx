@@ -124,15 +124,19 @@ const AIPage = () => {
         for (const part of parts) {
           const lines = part.split('\n');
           let isEnd = false;
+          const dataLines = [];
           for (const line of lines) {
             if (line.startsWith('event: end')) {
               isEnd = true;
             } else if (line.startsWith('data: ')) {
-              const data = line.slice(6);
-              if (data === '[END]') continue;
-              setMessages(prev => prev.map(m => m.id === aiId ? { ...m, content: (m.content || '') + data } : m));
+              dataLines.push(line.slice(6));
             }
           }
+          // Поля data: одного события склеиваются через перевод строки
+          const data = dataLines.join('\n');
+          if (dataLines.length && data !== '[END]') {
+            setMessages(prev => prev.map(m => m.id === aiId ? { ...m, content: (m.content || '') + data } : m));
+          }
           if (isEnd) {
             // finalize
           }